@@ -0,0 +1,118 @@
+"""Corpora sintéticos para os benchmarks (1k / 100k / 1M chunks).
+
+Cada chunk é uma sequência de palavras sorteadas de um vocabulário fixo (distribuição
+Zipf, como texto real). Os vetores são gerados com as mesmas palavras-vetor do
+`FakeOpenAI`, somados em blocos com numpy — assim um índice de 1M chunks fica pronto
+em segundos e as consultas embutidas pelo cliente falso caem nos vizinhos certos.
+"""
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.backend.rag.quantization import write_index_files
+
+from .fake_openai import _word_vector
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+SUBJECTS = ["matematica", "portugues", "ciencias", "historia", "geografia", "ingles"]
+_SYLLABLES = ["ba", "ce", "di", "fo", "gu", "la", "me", "ni", "po", "ra", "se", "ti", "vo", "xa", "zu"]
+BLOCK = 10_000
+
+
+def parse_size(value: str) -> int:
+    key = value.strip().lower()
+    if key in SIZES:
+        return SIZES[key]
+    if key.endswith("k"):
+        return int(float(key[:-1]) * 1_000)
+    if key.endswith("m"):
+        return int(float(key[:-1]) * 1_000_000)
+    return int(key)
+
+
+def vocabulary(size: int = 5_000) -> List[str]:
+    """Palavras pseudo-PT determinísticas (mesmo vocabulário em toda execução)."""
+    words = []
+    n = len(_SYLLABLES)
+    for i in range(size):
+        parts, x = [], i
+        for _ in range(3):
+            parts.append(_SYLLABLES[x % n])
+            x //= n
+        # Depois de n³ combinações, um sufixo numérico mantém as palavras únicas
+        suffix = str(i // n ** 3) if i >= n ** 3 else ""
+        words.append("".join(parts) + suffix)
+    return words
+
+
+class SyntheticCorpus:
+    def __init__(self, dim: int = 256, vocab_size: int = 5_000, words_per_chunk: int = 40, seed: int = 7) -> None:
+        self.dim = dim
+        self.words = vocabulary(vocab_size)
+        self.words_per_chunk = words_per_chunk
+        self.seed = seed
+        self.word_vectors = np.stack([_word_vector(w, dim) for w in self.words])
+        ranks = np.arange(1, vocab_size + 1, dtype="float64")
+        self._probs = (1.0 / ranks) / (1.0 / ranks).sum()
+
+    def _sample(self, rng: np.random.Generator, count: int, length: int) -> np.ndarray:
+        return rng.choice(len(self.words), size=(count, length), p=self._probs)
+
+    def chunk_text(self, ids: np.ndarray) -> str:
+        return " ".join(self.words[i] for i in ids)
+
+    def build_index(
+        self,
+        n_chunks: int,
+        target_dir: Path,
+        quantization: str = "none",
+        embed_model: str = "text-embedding-3-large",
+    ) -> Tuple[Path, float]:
+        """Grava o índice no layout do retriever (via `write_index_files`); devolve (dir, MB em disco).
+
+        `embed_model` só vai para o index_info.json — precisa casar com o do agente.
+        """
+        rng = np.random.default_rng(self.seed)
+        vectors = np.empty((n_chunks, self.dim), dtype="float32")
+        meta: List[Dict] = []
+        for start in range(0, n_chunks, BLOCK):
+            count = min(BLOCK, n_chunks - start)
+            ids = self._sample(rng, count, self.words_per_chunk)
+            vectors[start:start + count] = self.word_vectors[ids].sum(axis=1)
+            for j in range(count):
+                n = start + j
+                meta.append({
+                    "id": f"sintetico_{n // 100}.txt::#{n % 100}",
+                    "source": f"sintetico_{n // 100}.txt",
+                    "subject": SUBJECTS[n % len(SUBJECTS)],
+                    "text": self.chunk_text(ids[j]),
+                })
+        write_index_files(
+            target_dir,
+            vectors,
+            meta,
+            embed_model=embed_model,
+            dimensions=self.dim,
+            quantization=quantization,
+        )
+        size_mb = sum(p.stat().st_size for p in target_dir.iterdir()) / 1e6
+        return target_dir, size_mb
+
+    def queries(self, count: int, length: int = 8, seed: int = 11) -> List[str]:
+        rng = np.random.default_rng(seed)
+        return [self.chunk_text(ids) for ids in self._sample(rng, count, length)]
+
+    def write_documents(self, target_dir: Path, n_docs: int, paragraphs: int = 20, seed: int = 13) -> int:
+        """Arquivos .txt para o cenário de ingestão; devolve o total de bytes escritos."""
+        target_dir.mkdir(parents=True, exist_ok=True)
+        rng = np.random.default_rng(seed)
+        total = 0
+        for d in range(n_docs):
+            ids = self._sample(rng, paragraphs, 60)
+            text = "\n".join(self.chunk_text(row) + "." for row in ids)
+            path = target_dir / f"doc_{d:05d}.txt"
+            path.write_text(text, encoding="utf-8")
+            total += len(text.encode("utf-8"))
+        return total
@@ -0,0 +1,191 @@
+"""Backend OpenAI falso e determinístico para benchmarks offline.
+
+- `FakeOpenAI`: expõe `embeddings.create(model=..., input=[...], dimensions=None)` como o SDK
+  `openai`. Cada texto vira a soma de vetores pseudoaleatórios das suas palavras (semente =
+  hash da palavra), normalizada; textos com palavras em comum ficam próximos, então a busca
+  por similaridade se comporta como a de verdade.
+- `FakeModel`/`FakeModelProvider`: implementam a interface `Model` do openai-agents e respondem
+  com texto fixo (ou JSON válido do `output_type` do agente) após uma latência configurável;
+  `reply` troca a resposta por um texto escolhido pelo teste (p.ex. JSON inválido).
+
+Nenhuma chamada de rede é feita.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from agents import ModelSettings, RunConfig, Usage
+from agents.items import ModelResponse
+from agents.models.interface import Model, ModelProvider
+from openai.types.responses import ResponseOutputMessage, ResponseOutputText
+
+MODEL_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass
+class Latency:
+    """Latência simulada: `base` segundos por chamada + `per_item` por texto/token de saída."""
+    base: float = 0.0
+    per_item: float = 0.0
+
+    def seconds(self, items: int) -> float:
+        return self.base + self.per_item * items
+
+
+def _word_vector(word: str, dim: int) -> np.ndarray:
+    seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).standard_normal(dim).astype("float32")
+
+
+class FakeEmbeddings:
+    def __init__(self, latency: Latency, dim: Optional[int] = None) -> None:
+        self.latency = latency
+        self.dim = dim
+        self.calls = 0
+        self._word_cache: Dict[tuple, np.ndarray] = {}
+
+    def _vector(self, text: str, dim: int) -> np.ndarray:
+        vec = np.zeros(dim, dtype="float32")
+        for word in _WORD.findall(text.lower()):
+            key = (word, dim)
+            wv = self._word_cache.get(key)
+            if wv is None:
+                wv = self._word_cache[key] = _word_vector(word, dim)
+            vec += wv
+        norm = float(np.linalg.norm(vec))
+        if norm == 0:
+            vec[0] = 1.0
+            return vec
+        return vec / norm
+
+    def create(self, model: str, input: List[str], dimensions: Optional[int] = None, **_: Any):
+        self.calls += 1
+        texts = [input] if isinstance(input, str) else list(input)
+        dim = dimensions or self.dim or MODEL_DIMENSIONS.get(model, 1536)
+        delay = self.latency.seconds(len(texts))
+        if delay:
+            time.sleep(delay)
+        data = [
+            SimpleNamespace(index=i, embedding=self._vector(text, dim).tolist(), object="embedding")
+            for i, text in enumerate(texts)
+        ]
+        tokens = sum(max(1, len(t) // 4) for t in texts)
+        return SimpleNamespace(
+            data=data,
+            model=model,
+            usage=SimpleNamespace(prompt_tokens=tokens, total_tokens=tokens),
+        )
+
+
+class FakeOpenAI:
+    """Substituto do `openai.OpenAI` para o que o RAG usa (embeddings)."""
+
+    def __init__(self, latency: Optional[Latency] = None, dim: Optional[int] = None) -> None:
+        self.embeddings = FakeEmbeddings(latency or Latency(), dim)
+
+
+def _example_for_schema(schema: Dict[str, Any]) -> Any:
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: _example_for_schema(sub) for name, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_example_for_schema(schema.get("items", {"type": "string"}))]
+    if kind == "integer":
+        return 80
+    if kind == "number":
+        return 0.8
+    if kind == "boolean":
+        return True
+    return "texto simulado"
+
+
+@dataclass
+class FakeModel(Model):
+    name: str
+    latency: Latency = field(default_factory=Latency)
+    reply_tokens: int = 120
+    calls: int = 0
+    # Texto devolvido em vez do simulado; recebe a entrada da rodada
+    reply: Optional[Callable[[Any], str]] = None
+
+    def _reply(self, output_schema) -> str:
+        if output_schema is not None and not output_schema.is_plain_text():
+            return json.dumps(_example_for_schema(output_schema.json_schema()), ensure_ascii=False)
+        return ("Resposta simulada do tutor. " * (self.reply_tokens // 4 or 1)).strip()
+
+    async def get_response(
+        self,
+        system_instructions,
+        input,
+        model_settings: ModelSettings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing,
+        *,
+        previous_response_id=None,
+        conversation_id=None,
+        prompt=None,
+    ) -> ModelResponse:
+        self.calls += 1
+        await asyncio.sleep(self.latency.seconds(self.reply_tokens))
+        text = self.reply(input) if self.reply is not None else self._reply(output_schema)
+        input_tokens = len(json.dumps(input, ensure_ascii=False, default=str)) // 4
+        message = ResponseOutputMessage(
+            id=f"msg_{uuid.uuid4().hex}",
+            content=[ResponseOutputText(text=text, type="output_text", annotations=[])],
+            role="assistant",
+            status="completed",
+            type="message",
+        )
+        return ModelResponse(
+            output=[message],
+            usage=Usage(
+                requests=1,
+                input_tokens=input_tokens,
+                output_tokens=len(text) // 4,
+                total_tokens=input_tokens + len(text) // 4,
+            ),
+            response_id=None,
+        )
+
+    def stream_response(self, *args, **kwargs):
+        raise NotImplementedError("FakeModel não suporta streaming")
+
+
+class FakeModelProvider(ModelProvider):
+    def __init__(self, latency: Optional[Latency] = None, reply_tokens: int = 120) -> None:
+        self.latency = latency or Latency()
+        self.reply_tokens = reply_tokens
+        self.models: Dict[str, FakeModel] = {}
+
+    def get_model(self, model_name: Optional[str]) -> Model:
+        name = model_name or "fake-default"
+        if name not in self.models:
+            self.models[name] = FakeModel(name, self.latency, self.reply_tokens)
+        return self.models[name]
+
+
+class FakeRunner:
+    """Substitui `Runner` nos módulos dos servidores: roda o loop real do SDK com o modelo falso."""
+
+    def __init__(self, provider: FakeModelProvider) -> None:
+        self.provider = provider
+
+    async def run(self, agent, input, **kwargs):
+        from agents import Runner
+
+        kwargs.setdefault("run_config", RunConfig(model_provider=self.provider, tracing_disabled=True))
+        return await Runner.run(agent, input, **kwargs)
@@ -0,0 +1,402 @@
+"""Suíte de benchmarks offline (sem rede, sem chave real da OpenAI).
+
+    python -m benchmarks.run                              # cenários padrão, corpus 1k
+    python -m benchmarks.run --sizes 1k,100k,1m --queries 500
+    python -m benchmarks.run --scenarios chat,grade --concurrency 32 --model-latency 0.2
+    python -m benchmarks.run --compare benchmarks/results/anterior.json
+
+Cenários: ingest (chunk + embed + índice), search (`search_chunks` p50/p99 por tamanho
+de corpus), chat e grade (`/api/chat` e `/api/grade` sob carga concorrente, via ASGI) e
+progress (taxa de escrita do ProgressTracker). O resultado vai para
+`benchmarks/results/<timestamp>.json`; com `--compare`, métricas que pioraram além de
+`--threshold` são listadas e o processo sai com código 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.backend.rag.quantization import resident_bytes
+
+from .corpus import SyntheticCorpus, parse_size
+from .fake_openai import FakeModelProvider, FakeOpenAI, FakeRunner, Latency
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SCENARIOS = ("ingest", "search", "chat", "grade", "progress")
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Resumo de latências (segundos → ms)."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000
+
+    return {
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+class Bench:
+    """Instala os fakes nos módulos do backend e isola bancos/índices num diretório temporário."""
+
+    def __init__(self, args: argparse.Namespace, workdir: Path) -> None:
+        self.args = args
+        self.workdir = workdir
+        self.fake_client = FakeOpenAI(Latency(args.embed_latency, args.embed_latency_per_item), dim=args.dim)
+        self.provider = FakeModelProvider(Latency(args.model_latency), reply_tokens=args.reply_tokens)
+        self.corpus = SyntheticCorpus(dim=args.dim)
+        self._index_dirs: Dict[str, Path] = {}
+
+        from src.backend import openai_client, openai_gateway, progress_tracker, session_store
+        from src.backend.rag import ingest, retriever
+
+        self.retriever = retriever
+        self.ingest = ingest
+        openai_client.set_openai_client(self.fake_client)
+        # Sem --openai-limits o gateway só limita a concorrência: o benchmark mede o backend, não a cota
+        limits = json.loads(args.openai_limits) if args.openai_limits else {"*": {"rpm": 0, "tpm": 0}}
+        openai_gateway.set_gateway(openai_gateway.OpenAIGateway(limits, max_concurrency=args.openai_concurrency))
+        retriever._get_agent_index_dir = lambda agent_id: self._index_dirs.get(agent_id, workdir / "missing")
+
+        progress_tracker.DB_PATH = workdir / "progress.db"
+        progress_tracker._init_db()
+        session_store.set_session_store(session_store.SQLiteSessionStore(workdir / "sessions.db"))
+
+    def use_index(self, agent_id: str, index_dir: Path) -> None:
+        self._index_dirs[agent_id] = index_dir
+        self.retriever.clear_cache(agent_id)
+
+    def index_for(self, n_chunks: int) -> Dict[str, Any]:
+        target = self.workdir / "index" / str(n_chunks)
+        start = time.perf_counter()
+        _, size_mb = self.corpus.build_index(n_chunks, target, quantization=self.args.quantization)
+        return {"dir": target, "build_s": round(time.perf_counter() - start, 3), "disk_mb": round(size_mb, 2)}
+
+    def server(self):
+        from src.backend import server_fastapi, session_window
+
+        runner = FakeRunner(self.provider)
+        server_fastapi.Runner = runner
+        session_window.Runner = runner
+        server_fastapi.grade_cache.clear()
+        return server_fastapi
+
+
+# --- cenários ---
+
+
+def bench_ingest(bench: Bench) -> Dict[str, Any]:
+    args = bench.args
+    data_dir = bench.workdir / "ingest_data"
+    index_dir = bench.workdir / "ingest_index"
+    index_dir.mkdir(parents=True, exist_ok=True)
+    total_bytes = bench.corpus.write_documents(data_dir, args.ingest_docs)
+    bench.ingest.DATA_DIR = data_dir
+    bench.ingest.INDEX_DIR = index_dir
+
+    calls_before = bench.fake_client.embeddings.calls
+    start = time.perf_counter()
+    bench.ingest.main(["--dimensions", str(args.dim), "--quantization", args.quantization])
+    elapsed = time.perf_counter() - start
+    chunks = len(json.loads((index_dir / "meta.json").read_text(encoding="utf-8")))
+    return {
+        "docs": args.ingest_docs,
+        "mb": round(total_bytes / 1e6, 3),
+        "chunks": chunks,
+        "embed_calls": bench.fake_client.embeddings.calls - calls_before,
+        "elapsed_s": round(elapsed, 3),
+        "chunks_per_s": round(chunks / elapsed, 1),
+        "mb_per_s": round(total_bytes / 1e6 / elapsed, 3),
+    }
+
+
+def bench_search(bench: Bench) -> Dict[str, Any]:
+    args = bench.args
+    queries = bench.corpus.queries(args.queries)
+    results: Dict[str, Any] = {}
+    for label in args.sizes:
+        n_chunks = parse_size(label)
+        built = bench.index_for(n_chunks)
+        bench.use_index("tutor", built["dir"])
+
+        start = time.perf_counter()
+        bench.retriever.search_chunks(queries[0], k=args.k, agent_id="tutor")
+        cold = time.perf_counter() - start
+        index, _ = bench.retriever._load_agent_index("tutor")
+
+        samples: List[float] = []
+        hits = 0
+        for q in queries:
+            start = time.perf_counter()
+            hits += len(bench.retriever.search_chunks(q, k=args.k, agent_id="tutor"))
+            samples.append(time.perf_counter() - start)
+        results[label] = {
+            "chunks": n_chunks,
+            "index_build_s": built["build_s"],
+            "index_disk_mb": built["disk_mb"],
+            "index_resident_mb": round(resident_bytes(index) / 1e6, 2),
+            "cold_query_ms": round(cold * 1000, 3),
+            "queries": len(queries),
+            "avg_hits": round(hits / len(queries), 2),
+            "qps_per_s": round(len(samples) / sum(samples), 1),
+            **percentiles(samples),
+        }
+    return results
+
+
+async def _load(
+    requests: int,
+    concurrency: int,
+    send: Callable[[int], Any],
+) -> Dict[str, Any]:
+    """Dispara `requests` chamadas com no máximo `concurrency` simultâneas."""
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: List[float] = []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await send(i)
+            samples.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(requests / elapsed, 1),
+        **percentiles(samples),
+    }
+
+
+def _client(app):
+    import httpx
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+
+def bench_chat(bench: Bench) -> Dict[str, Any]:
+    args = bench.args
+    server = bench.server()
+    bench.use_index("tutor", bench.index_for(parse_size(args.sizes[0]))["dir"])
+    queries = bench.corpus.queries(args.requests, seed=17)
+    sessions = max(1, args.requests // 4)
+
+    async def main() -> Dict[str, Any]:
+        async with _client(server.app) as client:
+            return await _load(
+                args.requests,
+                args.concurrency,
+                lambda i: client.post("/api/chat", json={
+                    "message": queries[i],
+                    "sessionId": f"bench_{i % sessions}",
+                    "agentId": "tutor",
+                }),
+            )
+
+    return {"model_latency": args.model_latency, **asyncio.run(main())}
+
+
+def bench_grade(bench: Bench) -> Dict[str, Any]:
+    args = bench.args
+    server = bench.server()
+    answers = bench.corpus.queries(args.requests, seed=19)
+    # Uma fração das respostas se repete para exercitar o cache de correção
+    repeat_every = max(1, int(1 / args.grade_repeat)) if args.grade_repeat > 0 else 0
+
+    def body(i: int) -> Dict[str, Any]:
+        answer = answers[0] if repeat_every and i % repeat_every == 0 else answers[i]
+        return {
+            "answer": answer,
+            "question": "Explique o conceito com um exemplo.",
+            "sessionId": f"bench_{i % 16}",
+            "agentId": "tutor",
+        }
+
+    async def main() -> Dict[str, Any]:
+        async with _client(server.app) as client:
+            return await _load(args.requests, args.concurrency, lambda i: client.post("/api/grade", json=body(i)))
+
+    stats = asyncio.run(main())
+    return {"model_latency": args.model_latency, "cache": server.grade_cache.stats(), **stats}
+
+
+def bench_progress(bench: Bench) -> Dict[str, Any]:
+    from src.backend.progress_tracker import ProgressTracker, XpAward
+
+    args = bench.args
+    tracker = ProgressTracker()
+    n = args.progress_writes
+
+    start = time.perf_counter()
+    samples: List[float] = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        tracker.award_xp(f"bench_{i % 32}", "tutor", 5, reason="bench", payload={"i": i})
+        samples.append(time.perf_counter() - t0)
+    single = time.perf_counter() - start
+
+    awards = [XpAward(f"bench_{i % 32}", "tutor", 5, reason="bench", payload={"i": i}) for i in range(n)]
+    start = time.perf_counter()
+    for offset in range(0, n, args.progress_batch):
+        tracker.award_xp_batch(awards[offset:offset + args.progress_batch])
+    batched = time.perf_counter() - start
+
+    return {
+        "writes": n,
+        "single_writes_per_s": round(n / single, 1),
+        "batch_size": args.progress_batch,
+        "batch_writes_per_s": round(n / batched, 1),
+        **{f"single_{key}": value for key, value in percentiles(samples).items()},
+    }
+
+
+RUNNERS: Dict[str, Callable[[Bench], Dict[str, Any]]] = {
+    "ingest": bench_ingest,
+    "search": bench_search,
+    "chat": bench_chat,
+    "grade": bench_grade,
+    "progress": bench_progress,
+}
+
+
+# --- resultados ---
+
+
+def _flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Lista métricas que pioraram mais que `threshold` (latência subiu / vazão caiu)."""
+    now = _flatten(current["scenarios"])
+    before = _flatten(baseline.get("scenarios", {}))
+    regressions = []
+    for name, old in sorted(before.items()):
+        new = now.get(name)
+        if new is None or old <= 0:
+            continue
+        if name.endswith("_ms") or (name.endswith("_s") and not name.endswith("_per_s")):
+            change = (new - old) / old
+        elif name.endswith("_per_s"):
+            change = (old - new) / old
+        else:
+            continue
+        if change > threshold:
+            regressions.append(f"{name}: {old:g} → {new:g} ({change:+.0%} pior)")
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks offline do MentorIA (backend OpenAI falso).")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Lista separada por vírgulas")
+    parser.add_argument("--sizes", default="1k", help="Tamanhos de corpus para o search: 1k,100k,1m")
+    parser.add_argument("--dim", type=int, default=256, help="Dimensão dos embeddings falsos")
+    parser.add_argument("--quantization", default="none", help="none, fp16, sq8 ou binary (ingest/search)")
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--ingest-docs", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200, help="Requisições por cenário de API")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--model-latency", type=float, default=0.05, help="Segundos por resposta do modelo falso")
+    parser.add_argument("--reply-tokens", type=int, default=120)
+    parser.add_argument("--openai-concurrency", type=int, default=16, help="Chamadas simultâneas no gateway")
+    parser.add_argument("--openai-limits", default="", help='Limites do gateway, ex.: \'{"*": {"rpm": 500, "tpm": 200000}}\'')
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Segundos por chamada de embeddings")
+    parser.add_argument("--embed-latency-per-item", type=float, default=0.0)
+    parser.add_argument("--grade-repeat", type=float, default=0.25, help="Fração de respostas repetidas no grade")
+    parser.add_argument("--progress-writes", type=int, default=500)
+    parser.add_argument("--progress-batch", type=int, default=50)
+    parser.add_argument("--output", type=Path, default=None, help="Arquivo JSON de saída")
+    parser.add_argument("--compare", type=Path, default=None, help="JSON anterior para comparar")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Piora tolerada no --compare (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    args.sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"cenários desconhecidos: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    # Os endpoints recusam requisições sem chave; ela nunca chega a ser usada.
+    # Só aqui, e não na importação: os testes importam este módulo.
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-offline")
+    with tempfile.TemporaryDirectory(prefix="mentoria-bench-") as tmp:
+        bench = Bench(args, Path(tmp))
+        scenarios: Dict[str, Any] = {}
+        for name in args.scenarios:
+            print(f"▶ {name}…", flush=True)
+            scenarios[name] = RUNNERS[name](bench)
+            print(json.dumps(scenarios[name], ensure_ascii=False, indent=2), flush=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        },
+        "scenarios": scenarios,
+    }
+    output = args.output or RESULTS_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Resultados salvos em {output}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"Regressões (> {args.threshold:.0%}) em relação a {args.compare}:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"Sem regressões em relação a {args.compare}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,6 +3,7 @@ let sessionId = crypto.randomUUID();
 let currentSection = 'chat';
 let currentAgent = 'tutor';
 let cachedProgress = null;
+let progressStream = null;
 
 const messagesEl = document.getElementById('messages');
 const form = document.getElementById('form');
@@ -23,7 +24,12 @@ function showSection(section) {
   currentSection = section;
 
   if (section === 'missions' || section === 'profile') {
-    refreshProgress().catch(() => {});
+    // Com o stream aberto, o cache já está em dia: só redesenha
+    if (progressStream && cachedProgress) {
+      updateProgressViews(cachedProgress);
+    } else {
+      refreshProgress().catch(() => {});
+    }
   }
 
   if (section === 'admin') {
@@ -46,7 +52,7 @@ function setAgent(agentId) {
     agentSelect.value = agentId;
   }
   addMessage(`Tutor alternado para **${agentLabel(agentId)}**. Vamos continuar?`, 'bot');
-  refreshProgress().catch(() => {});
+  openProgressStream();
   showSection('chat');
 }
 
@@ -61,7 +67,7 @@ if (agentSelect) {
   currentAgent = agentSelect.value;
   agentSelect.addEventListener('change', (event) => {
     currentAgent = event.target.value;
-    refreshProgress().catch(() => {});
+    openProgressStream();
   });
 }
 
@@ -71,6 +77,10 @@ function agentLabel(agentId) {
       return 'Tutor Atendimento & Vendas';
     case 'helper':
       return 'Tutor Saúde Comunitária';
+    case 'assessment':
+      return 'Avaliador';
+    case 'auto':
+      return 'Escolha automática';
     default:
       return 'Tutor Tech Frontend';
   }
@@ -114,6 +124,13 @@ function addMessage(content, who = 'bot', meta = {}) {
     bubble.appendChild(xpEl);
   }
 
+  if (who === 'bot' && meta.routedAgent) {
+    const routeEl = document.createElement('div');
+    routeEl.className = 'sources';
+    routeEl.innerHTML = `Respondido por <strong>${agentLabel(meta.routedAgent)}</strong>.`;
+    bubble.appendChild(routeEl);
+  }
+
   if (who === 'bot' && meta.nextTask) {
     const nextEl = document.createElement('div');
     nextEl.className = 'sources';
@@ -147,6 +164,8 @@ async function sendMessage(text) {
         message: text,
         sessionId,
         agentId: currentAgent,
+        // Com a versão em cache, o servidor devolve só o progresso que mudou
+        progressSince: cachedProgress ? cachedProgress.version : undefined,
       }),
     });
 
@@ -162,9 +181,20 @@ async function sendMessage(text) {
       sources: data.sources || [],
       xpAwarded: data.xpAwarded,
       nextTask: data.nextTask,
+      routedAgent: data.routing ? data.routing.agent : null,
     });
 
-    if (data.progress) {
+    if (data.progress && data.progress.delta) {
+      applyProgressDelta({
+        agentId: data.agent,
+        xp: data.totalXp,
+        badges: data.badges || [],
+        pathPosition: data.progress.pathPosition,
+        gaps: data.progress.gaps,
+        events: data.progress.events,
+        version: data.progress.version,
+      });
+    } else if (data.progress) {
       updateProgressViews({
         xp: data.totalXp,
         goal: data.progress.goal,
@@ -172,6 +202,7 @@ async function sendMessage(text) {
         pathPosition: data.progress.pathPosition,
         gaps: data.progress.gaps,
         recentEvents: data.progress.recentEvents,
+        version: data.progress.version,
       });
     }
   } catch (error) {
@@ -340,6 +371,40 @@ function renderProfile(progress) {
   }
 }
 
+// Aplica um delta publicado pelo servidor (XP, badges, trilha, lacunas, eventos novos)
+function applyProgressDelta(delta) {
+  if (!cachedProgress || delta.agentId !== currentAgent) return;
+  const next = { ...cachedProgress };
+  if (delta.xp !== undefined) next.xp = delta.xp;
+  if (delta.badges) next.badges = delta.badges;
+  if (delta.pathPosition) next.pathPosition = delta.pathPosition;
+  if (delta.gaps) next.gaps = delta.gaps;
+  if (delta.events && delta.events.length) {
+    const known = new Set((next.recentEvents || []).map((event) => event.id));
+    const fresh = delta.events.filter((event) => !known.has(event.id)).reverse();
+    next.recentEvents = [...fresh, ...(next.recentEvents || [])].slice(0, 10);
+  }
+  if (delta.version !== undefined) next.version = Math.max(next.version || 0, delta.version);
+  updateProgressViews(next);
+}
+
+// Um stream SSE por sessão/agente substitui o polling de /api/progress
+function openProgressStream() {
+  if (progressStream) progressStream.close();
+  progressStream = null;
+  // O cache (e a versão) era do agente anterior: espera o snapshot do novo
+  cachedProgress = null;
+  if (typeof EventSource === 'undefined') {
+    refreshProgress().catch(() => {});
+    return;
+  }
+  const url = `/api/progress/stream?sessionId=${encodeURIComponent(sessionId)}&agentId=${encodeURIComponent(currentAgent)}`;
+  const stream = new EventSource(url);
+  stream.addEventListener('snapshot', (event) => updateProgressViews(JSON.parse(event.data)));
+  stream.addEventListener('delta', (event) => applyProgressDelta(JSON.parse(event.data)));
+  progressStream = stream;
+}
+
 async function refreshProgress() {
   try {
     const res = await fetch(`/api/progress?sessionId=${encodeURIComponent(sessionId)}&agentId=${encodeURIComponent(currentAgent)}`);
@@ -357,7 +422,7 @@ async function checkAPI() {
   if (statusEl) statusEl.textContent = 'Verificando...';
 
   try {
-    const res = await fetch('/health');
+    const res = await fetch('/livez');
     if (statusEl) statusEl.textContent = res.ok ? '✅ Conectado' : '❌ Erro';
   } catch (error) {
     if (statusEl) statusEl.textContent = '❌ Servidor offline';
@@ -392,8 +457,59 @@ async function saveAPIKey() {
   }
 }
 
+// A ingestão roda num worker fora da API; o progresso chega pelo SSE do job
+let ingestJob = null;
+let ingestStream = null;
+
+function showIngestJob(job) {
+  const statusEl = document.getElementById('ingest-status');
+  const cancelEl = document.getElementById('ingest-cancel');
+  const labels = { queued: 'Na fila', running: 'Processando', done: '✅ Concluído', failed: '❌ Falhou', cancelled: 'Cancelado' };
+  const percent = Math.round((job.progress || 0) * 100);
+  let text = `${labels[job.state] || job.state} — ${percent}%`;
+  if (job.message) text += ` · ${job.message}`;
+  if (job.error) text += ` · ${job.error}`;
+  if (statusEl) statusEl.textContent = text;
+  if (cancelEl) cancelEl.hidden = !['queued', 'running'].includes(job.state);
+}
+
 async function runIngest() {
-  alert('Use `python src/backend/rag/ingest.py` para reindexar o acervo. Endpoint remoto opcional.');
+  const agentSelect = document.getElementById('config-agent-select');
+  const agentId = agentSelect ? agentSelect.value : 'tutor';
+  try {
+    const res = await fetch('/api/jobs', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ kind: 'ingest', params: { agents: [agentId] } }),
+    });
+    const job = await res.json();
+    if (!res.ok) {
+      alert('Falha ao iniciar a ingestão: ' + (job.detail || res.status));
+      return;
+    }
+    ingestJob = job;
+    showIngestJob(job);
+    if (ingestStream) ingestStream.close();
+    ingestStream = new EventSource(`/api/jobs/${job.id}/stream`);
+    ingestStream.addEventListener('progress', (event) => showIngestJob(JSON.parse(event.data)));
+    ingestStream.addEventListener('done', (event) => {
+      showIngestJob(JSON.parse(event.data));
+      ingestStream.close();
+      ingestStream = null;
+    });
+  } catch (error) {
+    alert('Erro ao conectar ao backend.');
+  }
+}
+
+async function cancelIngest() {
+  if (!ingestJob) return;
+  try {
+    const res = await fetch(`/api/jobs/${ingestJob.id}/cancel`, { method: 'POST' });
+    if (res.ok) showIngestJob(await res.json());
+  } catch (error) {
+    // o SSE mostra o estado final
+  }
 }
 
 async function searchRAG() {
@@ -500,24 +616,30 @@ function resetAgentConfig() {
 
 async function checkHealth() {
   try {
-    const res = await fetch('/health');
+    const res = await fetch('/livez');
     document.getElementById('server-status').textContent = res.ok ? '✅ Online' : '❌ Erro';
   } catch (error) {
     document.getElementById('server-status').textContent = '❌ Offline';
   }
 
+  // /readyz só lê o estado dos índices: nenhuma chamada de embeddings é feita
   try {
-    const res = await fetch('/api/debug/retriever?q=test&k=1');
-    document.getElementById('embed-status').textContent = res.ok ? '✅ Funcionando' : '❌ Erro';
-  } catch (error) {
-    document.getElementById('embed-status').textContent = '❌ Erro';
-  }
-
-  try {
-    const res = await fetch('/api/debug/retriever?q=test&k=1');
+    const res = await fetch(`/readyz?agentId=${encodeURIComponent(currentAgent)}`);
     const data = await res.json();
-    document.getElementById('rag-status').textContent = data.hits ? '✅ Indexado' : '⚠️ Vazio';
+    const index = (data.agents || {})[currentAgent] || {};
+    document.getElementById('embed-status').textContent = data.openaiKey
+      ? `✅ ${index.embed_model || 'Chave configurada'}`
+      : '⚠️ Sem chave';
+    if (index.state === 'mismatch') {
+      document.getElementById('rag-status').textContent = '❌ Modelo divergente';
+    } else if (index.state === 'missing' || !index.vectors) {
+      document.getElementById('rag-status').textContent = '⚠️ Vazio';
+    } else {
+      const warmth = index.warm ? 'carregado' : 'no disco';
+      document.getElementById('rag-status').textContent = `✅ Indexado (${index.vectors} trechos, ${warmth})`;
+    }
   } catch (error) {
+    document.getElementById('embed-status').textContent = '❌ Erro';
     document.getElementById('rag-status').textContent = '❌ Erro';
   }
 }
@@ -528,5 +650,5 @@ addMessage(
   'bot',
 );
 
-refreshProgress().catch(() => {});
+openProgressStream();
 checkAPI();
\ No newline at end of file
@@ -21,7 +21,7 @@ fi
 
 export PYTHONPATH="$PWD"
 
-python src/backend/rag/ingest.py
+python -m src.backend.rag.ingest
 exec uvicorn src.backend.server_fastapi:app --host 127.0.0.1 --port 8000 --reload
 
 
@@ -1,4 +1,16 @@
-from agents import Agent
+import ast
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from agents import Agent, ItemHelpers, RunHooks
+from pydantic import BaseModel, Field
+
+from .config import get_agent_config
+
+# Incrementar sempre que ASSESSMENT_PROMPT ou AssessmentResult mudarem: invalida avaliações em cache.
+ASSESSMENT_PROMPT_VERSION = "2"
 
 ASSESSMENT_PROMPT = """Você é o avaliador pedagógico dos Mentores Manduvi.
 Avalie respostas de alunos de forma criteriosa, seguindo este formato JSON SEMPRE:
@@ -22,9 +34,200 @@ Regras:
 - Sempre ofereça uma próxima ação concreta no campo "remedial_task".
 """
 
+# Avaliador no chat (`agentId="auto"` roteia "corrige minha resposta" para cá): mesmos
+# critérios, mas a resposta é conversa com o aluno, não o JSON do /api/grade.
+ASSESSMENT_CHAT_PROMPT = """Você é o avaliador pedagógico dos Mentores Manduvi, conversando com o aluno no chat.
+Quando o aluno enviar uma resposta para correção:
+- diga em uma frase se ela está correta, parcialmente correta ou incorreta;
+- explique os pontos fortes e o que precisa ser corrigido, com tom encorajador e objetivo, em PT-BR;
+- termine com uma próxima ação concreta (um exercício curto ou um tópico para revisar).
+Se faltar a pergunta ou o enunciado, peça ao aluno antes de avaliar.
+Cite fontes do acervo quando mencionar fatos (formato: (Fonte: nome_do_arquivo)).
+Responda em texto corrido; nunca em JSON nem com campos como "score" ou "xp_awarded".
+"""
+
+REPAIR_PROMPT = """Você converte avaliações pedagógicas já escritas para o formato estruturado.
+NÃO reavalie a resposta do aluno: apenas transcreva nota, feedback, XP, tarefa de reforço,
+lacunas e pontos fortes que estiverem no texto recebido. Campos ausentes ficam vazios
+(listas vazias, texto vazio) e xp_awarded segue a regra: 90-100 → 10, 70-89 → 5, 40-69 → 2, abaixo de 40 → 0.
+"""
+
+# Texto máximo enviado para o reparo; a avaliação cabe com folga nesse limite.
+REPAIR_INPUT_LIMIT = 6000
+# O reparo só transcreve: um modelo mais barato que o do avaliador basta
+ASSESSMENT_REPAIR_MODEL = os.getenv("ASSESSMENT_REPAIR_MODEL", "gpt-4.1-nano")
+
+
+class AssessmentResult(BaseModel):
+    """Schema estruturado da avaliação (mesmos campos de ASSESSMENT_PROMPT)."""
+    score: int = Field(description="Nota de 0 a 100.")
+    feedback: str = Field(description="Texto curto explicando pontos fortes e correções.")
+    xp_awarded: int = Field(description="XP concedido: 0, 2, 5 ou 10.")
+    remedial_task: str = Field(description="Tarefa prática para reforçar.")
+    gaps: List[str] = Field(description="Lacunas detectadas.")
+    strengths: List[str] = Field(description="Pontos positivos.")
+
+
+class AssessmentParseError(ValueError):
+    """A saída do avaliador não pôde ser interpretada como avaliação."""
+
 
 def build_assessment_agent() -> Agent:
+    """Avaliador com saída estruturada (`AssessmentResult`).
+
+    JSON fora do schema faz o SDK levantar `ModelBehaviorError` sem o texto cru (os dados
+    do modelo ficam fora dos logs por padrão); quem roda o avaliador passa `RawOutputHooks`
+    para guardar o texto e tentar o parser tolerante e o reparo.
+    """
     return Agent(
         name="Avaliador Manduvi",
         instructions=ASSESSMENT_PROMPT,
+        output_type=AssessmentResult,
     )
+
+
+class RawOutputHooks(RunHooks):
+    """Guarda o texto da última resposta do modelo na execução."""
+
+    def __init__(self) -> None:
+        self.text: Optional[str] = None
+
+    async def on_llm_end(self, context: Any, agent: Any, response: Any) -> None:
+        texts = [ItemHelpers.extract_last_text(item) for item in response.output]
+        self.text = "".join(text for text in texts if text) or self.text
+
+
+def build_assessment_chat_agent() -> Agent:
+    """Avaliador para o chat: feedback em texto; nota e XP continuam só no /api/grade."""
+    config = get_agent_config("assessment")
+    return Agent(name=config.name, instructions=ASSESSMENT_CHAT_PROMPT, model=config.model)
+
+
+def build_assessment_repair_agent() -> Agent:
+    """Agente barato que só reformata uma avaliação já gerada (não corrige de novo)."""
+    return Agent(
+        name="Reparo de Avaliação",
+        instructions=REPAIR_PROMPT,
+        model=ASSESSMENT_REPAIR_MODEL,
+        output_type=AssessmentResult,
+    )
+
+
+def build_repair_input(raw_output: str) -> str:
+    return f"Avaliação a transcrever:\n\n{raw_output[:REPAIR_INPUT_LIMIT]}"
+
+
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_JSON_LITERALS = {"true": "True", "false": "False", "null": "None"}
+_JSON_LITERAL = re.compile(r"\b(true|false|null)\b")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+def _balanced_object(text: str) -> Optional[str]:
+    """Retorna o primeiro objeto `{...}` balanceado do texto, respeitando strings."""
+    start = text.find("{")
+    while start != -1:
+        depth = 0
+        quote: Optional[str] = None
+        escaped = False
+        for i in range(start, len(text)):
+            ch = text[i]
+            if quote:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == quote:
+                    quote = None
+            elif ch in ("\"", "'"):
+                quote = ch
+            elif ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        start = text.find("{", start + 1)
+    return None
+
+
+def _loads_tolerant(candidate: str) -> Any:
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        pass
+    cleaned = _TRAILING_COMMA.sub(r"\1", candidate.translate(_SMART_QUOTES))
+    try:
+        return json.loads(cleaned)
+    except json.JSONDecodeError:
+        pass
+    # Aspas simples / True / None no estilo Python
+    try:
+        return ast.literal_eval(_JSON_LITERAL.sub(lambda m: _JSON_LITERALS[m.group(1)], cleaned))
+    except (ValueError, SyntaxError):
+        return None
+
+
+def _coerce_int(value: Any) -> int:
+    if isinstance(value, str):
+        match = re.search(r"-?\d+(?:[.,]\d+)?", value)
+        value = match.group(0).replace(",", ".") if match else 0
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _coerce_list(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value if v is not None and str(v).strip()]
+    return [str(value)]
+
+
+def _normalize(data: Dict[str, Any]) -> Dict[str, Any]:
+    if "score" not in data:
+        raise AssessmentParseError("avaliação sem campo 'score'")
+    normalized = dict(data)
+    normalized["score"] = max(0, min(100, _coerce_int(data.get("score"))))
+    normalized["xp_awarded"] = max(0, _coerce_int(data.get("xp_awarded")))
+    if "gaps" in data:
+        normalized["gaps"] = _coerce_list(data.get("gaps"))
+    if "strengths" in data:
+        normalized["strengths"] = _coerce_list(data.get("strengths"))
+    return normalized
+
+
+def parse_assessment_output(output: Any) -> Dict[str, Any]:
+    """Converte a saída do avaliador em dict.
+
+    Aceita o `AssessmentResult` estruturado e, como fallback, texto com JSON quase válido:
+    cercas de código, prosa ao redor, vírgulas sobrando, aspas tipográficas ou simples.
+    Levanta AssessmentParseError se nada aproveitável for encontrado.
+    """
+    if isinstance(output, BaseModel):
+        return _normalize(output.model_dump())
+    if isinstance(output, dict):
+        return _normalize(output)
+    if not isinstance(output, str):
+        raise AssessmentParseError(f"tipo de saída inesperado: {type(output).__name__}")
+
+    text = output.strip()
+    candidates = [text]
+    fenced = _FENCE.search(text)
+    if fenced:
+        candidates.append(fenced.group(1).strip())
+    obj = _balanced_object(text)
+    if obj:
+        candidates.append(obj)
+
+    for candidate in candidates:
+        data = _loads_tolerant(candidate)
+        if isinstance(data, dict):
+            return _normalize(data)
+    raise AssessmentParseError("nenhum objeto JSON encontrado na saída do avaliador")
@@ -1,5 +1,5 @@
 """Configurações individuais por agente."""
-from typing import Dict, Any
+from typing import Dict, Any, List
 from dataclasses import dataclass
 
 
@@ -14,9 +14,18 @@ class AgentConfig:
     rag_k: int = 6
     rag_chunk_size: int = 800
     rag_overlap: int = 150
+    # Re-ranking local (MMR + sobreposição lexical) sobre k × rag_rerank_fetch candidatos
+    rag_rerank: bool = False
+    rag_rerank_fetch: int = 4
+    rag_mmr_lambda: float = 0.7
+    rag_snippet_chars: int = 1200
     system_prompt: str = ""
     tools_enabled: bool = True
     filters: Dict[str, Any] = None
+    # Intenções do chat: {intenção: palavras-chave}, em ordem de prioridade (None = padrão de intents.py)
+    intents: Dict[str, List[str]] = None
+    # Exemplos rotulados para o fallback por embeddings (INTENT_EMBEDDINGS=1)
+    intent_examples: Dict[str, List[str]] = None
 
 
 # Configurações padrão por agente
@@ -35,7 +44,7 @@ AGENT_CONFIGS: Dict[str, AgentConfig] = {
 - Explique simples, depois aprofunde com exemplos.
 - Quando precisar de fatos do acervo, chame a ferramenta `retriever`.
 - Sempre cite as fontes assim: (Fonte: {source})
-- Termine com 2–3 exercícios práticos.
+- Termine com 2–3 exercícios práticos: chame a ferramenta `exercise_bank` com o tópico e use os itens prontos; escreva exercícios novos só se ela vier vazia.
 - Se faltar evidência no acervo, diga explicitamente e proponha próximo passo.
 - Responda em PT-BR, tom acolhedor e objetivo.""",
         tools_enabled=True,
@@ -124,7 +133,8 @@ def update_agent_config(agent_id: str, **kwargs) -> AgentConfig:
     
     config = AGENT_CONFIGS[agent_id]
     for key, value in kwargs.items():
-        if hasattr(config, key):
+        # None = campo não enviado; mantém o valor atual
+        if value is not None and hasattr(config, key):
             setattr(config, key, value)
     
     return config
@@ -1,7 +1,8 @@
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 import json
 
-from agents import Agent
+from agents import Agent, function_tool
+from ..exercise_bank import create_exercise_bank_tool
 from ..rag.retriever import search_chunks
 from .config import get_agent_config
 
@@ -36,7 +37,7 @@ def create_tutor_agent(agent_id: str = "tutor") -> Agent:
         return Agent(
             name=config.name,
             instructions=config.system_prompt,
-            tools=[retriever_tool] if config.tools_enabled else [],
+            tools=[function_tool(retriever_tool), create_exercise_bank_tool(agent_id)] if config.tools_enabled else [],
         )
     except TypeError:
         def retriever_tool_wrapper(inputs: Dict[str, Any]) -> str:
@@ -63,7 +64,14 @@ def create_tutor_agent(agent_id: str = "tutor") -> Agent:
         )
 
 
-# Agente padrão
-tutor_agent = create_tutor_agent("tutor")
+_default_tutor: Optional[Agent] = None
+
+
+def get_tutor_agent() -> Agent:
+    """Agente tutor padrão, criado no primeiro uso (não na importação)."""
+    global _default_tutor
+    if _default_tutor is None:
+        _default_tutor = create_tutor_agent("tutor")
+    return _default_tutor
 
 
@@ -0,0 +1,448 @@
+"""Banco de exercícios e tarefas de reforço gerados offline, servidos da memória.
+
+Os mesmos tópicos da BNCC aparecem para milhares de alunos; em vez de o tutor escrever
+2–3 exercícios e o avaliador uma `remedial_task` a cada turno, um job em lote gera
+itens por tópico/lacuna (as strings que `ProgressTracker.update_gaps` grava) e os
+agentes os consultam pela ferramenta `exercise_bank`.
+
+    python -m src.backend.exercise_bank --from-progress --limit 50
+    python -m src.backend.exercise_bank --topic "frações equivalentes" --exercises 5 --remedial 3
+
+A chave de cada tópico é o texto normalizado (sem acento, minúsculas), então "Frações
+equivalentes" e "fracoes equivalentes" caem no mesmo lugar. O servidor carrega o banco
+inteiro na primeira consulta e recarrega quando o arquivo muda (o job roda em outro
+processo).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from agents import Agent, function_tool
+from pydantic import BaseModel, Field
+
+from . import telemetry
+from .agents.config import get_agent_config
+from .intents import normalize
+from .openai_gateway import BATCH, get_gateway, priority
+from .progress_tracker import DB_DIR
+from .usage import get_usage_recorder, usage_scope
+
+logger = logging.getLogger(__name__)
+
+EXERCISE_BANK_PATH = Path(os.getenv("EXERCISE_BANK_PATH", str(DB_DIR / "exercise_bank.db")))
+# Itens devolvidos por consulta da ferramenta
+EXERCISE_BANK_ITEMS = int(os.getenv("EXERCISE_BANK_ITEMS", "3"))
+# Sobreposição mínima de palavras (Jaccard) para aceitar um tópico parecido
+EXERCISE_BANK_MIN_OVERLAP = float(os.getenv("EXERCISE_BANK_MIN_OVERLAP", "0.5"))
+
+KINDS = ("exercise", "remedial")
+# Referência a uma tarefa do banco na `remedial_task` do avaliador: "banco:<id>"
+REF_PATTERN = re.compile(r"^\s*banco:(\d+)\s*$")
+
+# Incrementar quando GENERATION_PROMPT ou ExerciseSet mudarem (fica gravado em cada item)
+GENERATION_PROMPT_VERSION = "1"
+
+GENERATION_PROMPT = """Você prepara material de reforço para os Mentores Manduvi (alinhado à BNCC).
+Para o tópico ou lacuna recebido, escreva:
+- exercises: exercícios práticos curtos, do mais simples ao mais desafiador, cada um autocontido;
+- remedial_tasks: tarefas de reforço para quem errou o tópico (uma ação concreta cada, 1–2 frases).
+Não inclua as respostas. Escreva em PT-BR, tom acolhedor e objetivo."""
+
+
+class ExerciseSet(BaseModel):
+    exercises: List[str] = Field(description="Exercícios práticos sobre o tópico.")
+    remedial_tasks: List[str] = Field(description="Tarefas de reforço para a lacuna.")
+
+
+def topic_key(topic: str) -> str:
+    return normalize(topic).strip(" .;:!?")
+
+
+def _words(text: str) -> set:
+    return {word for word in re.findall(r"\w+", text) if len(word) > 2}
+
+
+class ExerciseBank:
+    def __init__(self, path: Path = EXERCISE_BANK_PATH) -> None:
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._items: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self._by_id: Dict[int, Dict[str, Any]] = {}
+        self._topics: Dict[str, str] = {}
+        self._topic_pattern: Optional[re.Pattern] = None
+        self._loaded = False
+        self._loaded_mtime: Optional[float] = None
+        self.hits = 0
+        self.misses = 0
+
+    # ---- gravação (job offline) ----
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS exercises (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                topic_key TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                body TEXT NOT NULL,
+                model TEXT,
+                prompt_version TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (topic_key, kind, body)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_exercises_topic ON exercises (topic_key, kind)")
+        return conn
+
+    def add(self, topic: str, kind: str, bodies: Sequence[str], model: Optional[str] = None, replace: bool = False) -> int:
+        """Grava itens do tópico (repetidos são ignorados); devolve quantos entraram."""
+        if kind not in KINDS:
+            raise ValueError(f"Tipo de item inválido: {kind} (use {', '.join(KINDS)})")
+        key = topic_key(topic)
+        with self._connect() as conn:
+            if replace:
+                conn.execute("DELETE FROM exercises WHERE topic_key = ? AND kind = ?", (key, kind))
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO exercises (topic_key, topic, kind, body, model, prompt_version)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [(key, topic.strip(), kind, body.strip(), model, GENERATION_PROMPT_VERSION) for body in bodies if body.strip()],
+            )
+            added = conn.total_changes - before
+        conn.close()
+        self._loaded = False
+        return added
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """{topic_key: {kind: itens}} do arquivo (usado pelo job para pular tópicos prontos)."""
+        counts: Dict[str, Dict[str, int]] = {}
+        if not self.path.exists():
+            return counts
+        with self._connect() as conn:
+            for key, kind, total in conn.execute("SELECT topic_key, kind, COUNT(*) FROM exercises GROUP BY topic_key, kind"):
+                counts.setdefault(key, {})[kind] = total
+        conn.close()
+        return counts
+
+    # ---- leitura (servidor) ----
+
+    def _ensure_loaded(self) -> None:
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if self._loaded and mtime == self._loaded_mtime:
+            return
+        with self._lock:
+            items: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+            by_id: Dict[int, Dict[str, Any]] = {}
+            topics: Dict[str, str] = {}
+            if mtime is not None:
+                with self._connect() as conn:
+                    rows = conn.execute("SELECT id, topic_key, topic, kind, body FROM exercises ORDER BY id").fetchall()
+                conn.close()
+                for item_id, key, topic, kind, body in rows:
+                    item = {"id": item_id, "topic": topic, "kind": kind, "text": body}
+                    items.setdefault((key, kind), []).append(item)
+                    by_id[item_id] = item
+                    topics.setdefault(key, topic)
+            # Tópicos mais longos primeiro: "frações equivalentes" antes de "frações"
+            keys = sorted(topics, key=len, reverse=True)
+            pattern = re.compile(r"\b(?:" + "|".join(re.escape(k) for k in keys) + r")\b") if keys else None
+            self._items, self._by_id, self._topics, self._topic_pattern = items, by_id, topics, pattern
+            self._loaded, self._loaded_mtime = True, mtime
+
+    def resolve_topic(self, text: str) -> Optional[str]:
+        """Chave do banco para um tópico/lacuna: exata, contida no texto ou com palavras em comum."""
+        self._ensure_loaded()
+        key = topic_key(text)
+        if not key or not self._topics:
+            return None
+        if key in self._topics:
+            return key
+        found = self._topic_pattern.search(key) if self._topic_pattern else None
+        if found:
+            return found.group(0)
+        words = _words(key)
+        best, best_overlap = None, 0.0
+        for candidate in self._topics:
+            other = _words(candidate)
+            if not words or not other:
+                continue
+            overlap = len(words & other) / len(words | other)
+            if overlap > best_overlap:
+                best, best_overlap = candidate, overlap
+        return best if best_overlap >= EXERCISE_BANK_MIN_OVERLAP else None
+
+    def lookup(self, topic: str, kind: str = "exercise", limit: int = EXERCISE_BANK_ITEMS, seed: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Até `limit` itens do tópico; `seed` (p.ex. a sessão) varia a amostra entre alunos."""
+        key = self.resolve_topic(topic)
+        pool = self._items.get((key, kind), []) if key else []
+        if not pool:
+            self.misses += 1
+            return []
+        self.hits += 1
+        if len(pool) <= limit:
+            return list(pool)
+        return random.Random(seed).sample(pool, limit)
+
+    def topics_in(self, text: str) -> List[str]:
+        """Tópicos do banco citados num texto (p.ex. o enunciado de uma questão)."""
+        self._ensure_loaded()
+        if self._topic_pattern is None:
+            return []
+        return list(dict.fromkeys(m.group(0) for m in self._topic_pattern.finditer(topic_key(text))))
+
+    def get(self, item_id: int) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        return self._by_id.get(item_id)
+
+    def expand_ref(self, text: Optional[str], question: Optional[str] = None) -> Tuple[Optional[str], Optional[int]]:
+        """("banco:12" → texto do item 12, 12); outros textos voltam como vieram.
+
+        Id desconhecido (inventado pelo modelo ou apagado por um `--refresh`): vale uma
+        tarefa de reforço do banco para os tópicos de `question`; sem nenhuma, o texto original.
+        """
+        match = REF_PATTERN.match(text or "")
+        if not match:
+            return text, None
+        item = self.get(int(match.group(1)))
+        if item is None:
+            for key in self.topics_in(question or ""):
+                found = self.lookup(key, "remedial", limit=1, seed=question)
+                if found:
+                    item = found[0]
+                    break
+        return (item["text"], item["id"]) if item else (text, None)
+
+    def version(self) -> str:
+        """Muda quando os itens mudam (entra na chave do cache de avaliações com "banco:<id>")."""
+        self._ensure_loaded()
+        return f"{len(self._by_id)}:{max(self._by_id, default=0)}"
+
+    def stats(self) -> Dict[str, int]:
+        return {"topics": len(self._topics), "items": len(self._by_id), "hits": self.hits, "misses": self.misses}
+
+
+_bank: Optional[ExerciseBank] = None
+_bank_lock = threading.Lock()
+
+
+def get_exercise_bank() -> ExerciseBank:
+    global _bank
+    if _bank is None:
+        with _bank_lock:
+            if _bank is None:
+                _bank = ExerciseBank()
+    return _bank
+
+
+def set_exercise_bank(bank: Optional[ExerciseBank]) -> None:
+    global _bank
+    with _bank_lock:
+        _bank = bank
+
+
+def exercise_bank_payload(topic: str, kind: str = "exercise") -> str:
+    """Resposta JSON da ferramenta: {"topic": str|null, "items": [{"id", "text"}]}."""
+    items = get_exercise_bank().lookup(topic, kind if kind in KINDS else "exercise")
+    return json.dumps(
+        {"topic": items[0]["topic"] if items else None, "items": [{"id": i["id"], "text": i["text"]} for i in items]},
+        ensure_ascii=False,
+    )
+
+
+def create_exercise_bank_tool(agent_id: str = "tutor"):
+    """Ferramenta `exercise_bank` para os agentes (itens prontos em vez de gerar no turno)."""
+
+    def exercise_bank(topic: str, kind: str = "exercise") -> str:
+        """
+        Busca exercícios prontos (kind="exercise") ou tarefas de reforço (kind="remedial")
+        para um tópico ou lacuna. Retorna JSON: {"topic": str|null, "items": [{"id": int, "text": str}]}.
+        Lista vazia = tópico fora do banco; só então escreva itens novos.
+        """
+        return exercise_bank_payload(topic, kind)
+
+    return function_tool(exercise_bank)
+
+
+def remedial_hint(question: Optional[str], limit: int = EXERCISE_BANK_ITEMS) -> Optional[str]:
+    """Trecho do prompt do avaliador com tarefas do banco para os tópicos da questão.
+
+    O avaliador pode responder `remedial_task` só com "banco:<id>" (poucos tokens);
+    o servidor troca a referência pelo texto com `expand_ref`.
+    """
+    bank = get_exercise_bank()
+    items: List[Dict[str, Any]] = []
+    for key in bank.topics_in(question or ""):
+        items.extend(bank.lookup(key, "remedial", limit=limit))
+    if not items:
+        return None
+    lines = [f"- banco:{item['id']} ({item['topic']}): {item['text']}" for item in items[:limit]]
+    return (
+        "Tarefas de reforço já prontas no banco:\n" + "\n".join(lines) +
+        "\nSe uma delas servir, responda remedial_task apenas com o id (ex.: banco:12)."
+    )
+
+
+def _collect_lookups() -> List[Tuple[Dict[str, str], float]]:
+    if _bank is None:
+        return []
+    return [({"result": "hit"}, _bank.hits), ({"result": "miss"}, _bank.misses)]
+
+
+telemetry.register_collector("mentoria_exercise_bank_lookups_total", "counter", _collect_lookups)
+
+
+# ---- job offline ----
+
+def progress_gaps(db_path: Optional[Path] = None) -> Counter:
+    """Lacunas registradas no progress.db, contadas por aluno (sessão × agente)."""
+    from . import progress_tracker
+
+    path = Path(db_path or progress_tracker.DB_PATH)
+    counts: Counter = Counter()
+    labels: Dict[str, str] = {}
+    if not path.exists():
+        return counts
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute("SELECT gaps FROM progress WHERE gaps IS NOT NULL AND gaps != '[]'").fetchall()
+    for (raw,) in rows:
+        try:
+            gaps = json.loads(raw)
+        except json.JSONDecodeError:
+            continue
+        keys = set()
+        for gap in gaps if isinstance(gaps, list) else []:
+            key = topic_key(gap) if isinstance(gap, str) else ""
+            if key:
+                # Variações de acento/caixa contam como a mesma lacuna (rótulo = 1ª grafia vista)
+                labels.setdefault(key, gap.strip())
+                keys.add(key)
+        counts.update(labels[key] for key in keys)
+    return counts
+
+
+def build_generator_agent(model: Optional[str] = None) -> Agent:
+    return Agent(
+        name="Gerador de Exercícios",
+        instructions=GENERATION_PROMPT,
+        model=model or get_agent_config("tutor").model,
+        output_type=ExerciseSet,
+    )
+
+
+async def generate_topics(
+    topics: Sequence[str],
+    runner: Any,
+    bank: ExerciseBank,
+    exercises: int = 5,
+    remedial: int = 3,
+    concurrency: int = 4,
+    model: Optional[str] = None,
+    replace: bool = False,
+    progress: Optional[Callable[[str, int], None]] = None,
+) -> Dict[str, int]:
+    """Gera e grava itens para cada tópico; devolve {tópico: itens gravados}."""
+    agent = build_generator_agent(model)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    results: Dict[str, int] = {}
+
+    async def one(topic: str) -> None:
+        prompt = f"Tópico/lacuna: {topic}\nGere {exercises} exercícios e {remedial} tarefas de reforço."
+        try:
+            async with semaphore:
+                result = await get_gateway().run_agent(runner, agent, prompt, max_tokens=200 * (exercises + remedial), level=BATCH)
+            output = result.final_output
+            data = output if isinstance(output, ExerciseSet) else ExerciseSet.model_validate(
+                json.loads(output) if isinstance(output, str) else output
+            )
+        except Exception:
+            # Um tópico com falha não derruba o lote; roda de novo na próxima execução
+            logger.exception("Falha ao gerar itens para %r", topic)
+            results[topic] = 0
+            return
+        added = bank.add(topic, "exercise", data.exercises[:exercises], model=agent.model, replace=replace)
+        added += bank.add(topic, "remedial", data.remedial_tasks[:remedial], model=agent.model, replace=replace)
+        results[topic] = added
+        if progress:
+            progress(topic, added)
+
+    with priority(BATCH):
+        await asyncio.gather(*(one(topic) for topic in topics))
+    return results
+
+
+def main(argv: Optional[List[str]] = None, runner: Any = None) -> Dict[str, int]:
+    parser = argparse.ArgumentParser(description="Gera o banco de exercícios e tarefas de reforço.")
+    parser.add_argument("--topic", action="append", dest="topics", default=[], help="Tópico/lacuna (repetível)")
+    parser.add_argument("--topics-file", type=Path, help="Um tópico por linha")
+    parser.add_argument("--from-progress", action="store_true", help="Usa as lacunas gravadas no progress.db")
+    parser.add_argument("--min-students", type=int, default=1, help="Só lacunas de pelo menos N alunos")
+    parser.add_argument("--limit", type=int, default=50, help="Máximo de tópicos por execução")
+    parser.add_argument("--exercises", type=int, default=5)
+    parser.add_argument("--remedial", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--model", default=None, help="Modelo do gerador (padrão: o do tutor)")
+    parser.add_argument("--refresh", action="store_true", help="Regera tópicos que já estão no banco")
+    parser.add_argument("--dry-run", action="store_true", help="Só lista os tópicos que seriam gerados")
+    args = parser.parse_args(argv)
+
+    topics: List[str] = list(args.topics)
+    if args.topics_file:
+        topics += [line.strip() for line in args.topics_file.read_text(encoding="utf-8").splitlines() if line.strip()]
+    if args.from_progress:
+        topics += [gap for gap, students in progress_gaps().most_common() if students >= args.min_students]
+    if not topics:
+        parser.error("Informe --topic, --topics-file ou --from-progress.")
+
+    bank = get_exercise_bank()
+    existing = {} if args.refresh else bank.counts()
+    selected: Dict[str, str] = {}
+    for topic in topics:
+        key = topic_key(topic)
+        done = existing.get(key, {})
+        if key and key not in selected and (done.get("exercise", 0) < args.exercises or done.get("remedial", 0) < args.remedial):
+            selected[key] = topic
+    chosen = list(selected.values())[: args.limit]
+    print(f"{len(chosen)} tópico(s) para gerar" + (f" (de {len(selected)})" if len(selected) > len(chosen) else ""))
+    if args.dry_run or not chosen:
+        for topic in chosen:
+            print(f"  - {topic}")
+        return {}
+
+    if runner is None:
+        from agents import Runner as runner
+
+    with usage_scope("exercise_bank"):
+        results = asyncio.run(generate_topics(
+            chosen, runner, bank,
+            exercises=args.exercises,
+            remedial=args.remedial,
+            concurrency=args.concurrency,
+            model=args.model,
+            replace=args.refresh,
+            progress=lambda topic, added: print(f"  {topic}: {added} item(ns)"),
+        ))
+    get_usage_recorder().flush()
+    print(f"Banco em {bank.path}: {sum(results.values())} item(ns) novo(s)")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Cache de avaliações para respostas idênticas (correção sem histórico de sessão)."""
+import asyncio
+import copy
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_answer(answer: str) -> str:
+    """Normaliza a resposta para que variações triviais (caixa, espaços) caiam na mesma chave."""
+    text = unicodedata.normalize("NFKC", answer or "")
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def grade_cache_key(
+    question: Optional[str],
+    expected: Optional[str],
+    rubric: Optional[str],
+    answer: str,
+    prompt_version: str,
+) -> str:
+    raw = json.dumps(
+        [prompt_version, (question or "").strip(), (expected or "").strip(), (rubric or "").strip(), normalize_answer(answer)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class GradeCache:
+    """LRU com TTL em memória; chamadas simultâneas com a mesma chave compartilham uma execução."""
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 86400) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic(), copy.deepcopy(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Retorna (avaliação, veio_do_cache). Falhas não são guardadas."""
+        while True:
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached, True
+
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            try:
+                value = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # A execução original foi cancelada (ex.: timeout); tenta de novo por conta própria
+                if pending.cancelled():
+                    continue
+                raise
+            self.hits += 1
+            return copy.deepcopy(value), True
+
+        self.misses += 1
+        future: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Evita "Future exception was never retrieved" quando ninguém mais esperava
+            future.exception()
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return copy.deepcopy(value), False
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
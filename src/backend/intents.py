@@ -0,0 +1,199 @@
+"""Classificação da intenção de cada mensagem do chat (practice | review | chat).
+
+A intenção decide o XP do turno e a próxima tarefa sugerida. O caminho rápido é uma
+única regex compilada por agente, sobre o texto sem acentos e em minúsculas, com as
+palavras-chave como prefixos de palavra ("pratic" pega "praticar", "Prática"...).
+
+Opcionalmente (`INTENT_EMBEDDINGS=1`), mensagens sem palavra-chave são comparadas com
+exemplos rotulados no espaço de embeddings do índice do agente. O embedding da
+mensagem fica no cache de consultas do retriever, então a busca de fontes do mesmo
+turno não paga outra chamada.
+
+As palavras-chave e os exemplos podem ser trocados por agente em `AgentConfig.intents`
+e `AgentConfig.intent_examples`; a ordem das intenções é a prioridade.
+"""
+import asyncio
+import logging
+import os
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .agents.config import get_agent_config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTENT = "chat"
+
+DEFAULT_INTENTS: Dict[str, List[str]] = {
+    "practice": [
+        "pratic", "practic", "exercici", "exercis", "test", "quiz", "desafi",
+        "simulad", "trein", "me avali", "questoes para resolver",
+    ],
+    "review": ["revis", "review", "recapitul", "resum", "relembr", "rever"],
+}
+
+DEFAULT_INTENT_EXAMPLES: Dict[str, List[str]] = {
+    "practice": [
+        "Quero fazer umas questões sobre frações",
+        "Me passa um problema para eu resolver",
+        "Posso tentar responder uma pergunta sobre isso?",
+        "Vamos ver se eu aprendi mesmo",
+    ],
+    "review": [
+        "Pode repassar o que vimos na última aula?",
+        "Explica de novo o conteúdo de ontem",
+        "Não lembro mais como funciona, volta nessa parte",
+    ],
+    "chat": [
+        "O que é fotossíntese?",
+        "Oi, tudo bem?",
+        "Por que o céu é azul?",
+    ],
+}
+
+# Fallback por embeddings para mensagens sem palavra-chave (custa uma chamada por mensagem nova)
+INTENT_EMBEDDINGS = os.getenv("INTENT_EMBEDDINGS", "0") == "1"
+# Similaridade mínima (cosseno) com o exemplo mais próximo para aceitar o rótulo
+INTENT_EMBED_THRESHOLD = float(os.getenv("INTENT_EMBED_THRESHOLD", "0.6"))
+
+_SPACES = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas, sem acentos e com espaços simples ("Exercício" → "exercicio")."""
+    text = text or ""
+    if not text.isascii():
+        decomposed = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _SPACES.sub(" ", text.casefold()).strip()
+
+
+class KeywordMatcher:
+    """Todas as palavras-chave numa regex só, com um grupo nomeado por intenção."""
+
+    def __init__(self, intents: Dict[str, Sequence[str]]) -> None:
+        self.intents = [intent for intent, keywords in intents.items() if keywords]
+        groups = []
+        for position, intent in enumerate(self.intents):
+            keywords = sorted({re.escape(normalize(k)) for k in intents[intent]}, key=len, reverse=True)
+            groups.append(f"(?P<i{position}>{'|'.join(keywords)})")
+        self.pattern = re.compile(r"\b(?:" + "|".join(groups) + ")") if groups else None
+
+    def match(self, message: str) -> Optional[str]:
+        """Intenção de maior prioridade com palavra-chave na mensagem, ou None."""
+        if self.pattern is None:
+            return None
+        found = {m.lastgroup for m in self.pattern.finditer(normalize(message))}
+        if not found:
+            return None
+        return self.intents[min(int(group[1:]) for group in found)]
+
+
+class ExampleMatcher:
+    """Vizinho mais próximo entre exemplos rotulados, no espaço de embeddings do agente."""
+
+    def __init__(self, agent_id: str, examples: Dict[str, Sequence[str]], threshold: float = INTENT_EMBED_THRESHOLD) -> None:
+        self.agent_id = agent_id
+        self.threshold = threshold
+        self.labels = [intent for intent, texts in examples.items() for _ in texts]
+        self.texts = [text for texts in examples.values() for text in texts]
+        self._vectors = None
+        self._vectors_model: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _example_vectors(self):
+        from .rag import retriever
+
+        model = retriever.get_index_info(self.agent_id).get("embed_model")
+        with self._lock:
+            if self._vectors is None or self._vectors_model != model:
+                vectors = retriever.embed_queries(self.texts, self.agent_id)
+                # O modelo só é conhecido depois que o índice carrega
+                self._vectors_model = retriever.get_index_info(self.agent_id).get("embed_model")
+                self._vectors = vectors
+            return self._vectors
+
+    def match(self, message: str) -> Optional[Tuple[str, float]]:
+        """(intenção, similaridade) do exemplo mais próximo acima do limiar, ou None."""
+        from .rag import retriever
+
+        if not self.texts:
+            return None
+        vectors = self._example_vectors()
+        if vectors is None:
+            return None
+        query = retriever.embed_queries([message], self.agent_id)
+        scores = vectors @ query[0]
+        best = int(scores.argmax())
+        if scores[best] < self.threshold:
+            return None
+        return self.labels[best], float(scores[best])
+
+
+class IntentClassifier:
+    def __init__(
+        self,
+        intents: Dict[str, Sequence[str]],
+        examples: Optional[ExampleMatcher] = None,
+        default: str = DEFAULT_INTENT,
+    ) -> None:
+        self.keywords = KeywordMatcher(intents)
+        self.examples = examples
+        self.default = default
+
+    def classify(self, message: str) -> str:
+        intent = self.keywords.match(message)
+        if intent is None and self.examples is not None:
+            intent = self._match_examples(message)
+        return intent or self.default
+
+    async def classify_async(self, message: str) -> str:
+        """Como `classify`, mas o fallback por embeddings roda fora do event loop."""
+        intent = self.keywords.match(message)
+        if intent is None and self.examples is not None:
+            intent = await asyncio.to_thread(self._match_examples, message)
+        return intent or self.default
+
+    def _match_examples(self, message: str) -> Optional[str]:
+        try:
+            found = self.examples.match(message)
+        except Exception:
+            # Sem rede/índice o turno segue com a intenção padrão
+            logger.warning("Classificação de intenção por embeddings falhou", exc_info=True)
+            return None
+        return found[0] if found else None
+
+
+_classifiers: Dict[str, Tuple[Tuple[Dict, Dict, bool], IntentClassifier]] = {}
+_classifiers_lock = threading.Lock()
+
+
+def get_intent_classifier(agent_id: str) -> IntentClassifier:
+    """Classificador do agente, recompilado só quando a configuração de intenções é trocada.
+
+    `update_agent_config` substitui os dicionários, então a identidade basta como versão.
+    """
+    config = get_agent_config(agent_id)
+    intents = config.intents or DEFAULT_INTENTS
+    examples = config.intent_examples or DEFAULT_INTENT_EXAMPLES
+    cached = _classifiers.get(agent_id)
+    if cached is not None:
+        (cached_intents, cached_examples, embeddings), classifier = cached
+        if cached_intents is intents and cached_examples is examples and embeddings == INTENT_EMBEDDINGS:
+            return classifier
+    fingerprint = (intents, examples, INTENT_EMBEDDINGS)
+    with _classifiers_lock:
+        matcher = ExampleMatcher(agent_id, examples) if INTENT_EMBEDDINGS else None
+        classifier = IntentClassifier(intents, matcher)
+        _classifiers[agent_id] = (fingerprint, classifier)
+    return classifier
+
+
+def detect_intent(message: str, agent_id: str = "tutor") -> str:
+    return get_intent_classifier(agent_id).classify(message)
+
+
+async def detect_intent_async(message: str, agent_id: str = "tutor") -> str:
+    return await get_intent_classifier(agent_id).classify_async(message)
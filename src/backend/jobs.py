@@ -0,0 +1,749 @@
+"""Fila de jobs em segundo plano (ingestão, re-embedding) num sqlite, com workers em processos próprios.
+
+O servidor só enfileira, consulta e cancela; quem executa é um worker fora dos
+processos da API, com prioridade de CPU reduzida, então uma reindexação não disputa
+latência com o chat:
+
+    python -m src.backend.jobs worker
+    python -m src.backend.jobs enqueue ingest '{"agents": ["tutor"], "dimensions": 1024}'
+
+Com `JOB_WORKERS` > 0 (padrão 1) o próprio servidor sobe esses processos na
+inicialização e os encerra no desligamento. Com vários processos da API (`uvicorn
+--workers N`), só o que pegar a trava `<jobs.db>.spawn.lock` sobe os workers.
+
+Cada job grava progresso e um checkpoint a cada lote. O worker renova um heartbeat
+enquanto roda; se o processo morre, outro worker retoma o job depois de
+`JOB_STALE_SECONDS`, a partir do último checkpoint (na ingestão, os lotes de
+embeddings já gravados em `JOBS_WORK_DIR/<id>/` não são pedidos de novo).
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .progress_tracker import DB_DIR
+from .usage import get_usage_recorder, usage_scope
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = Path(os.getenv("JOBS_DB_PATH", str(DB_DIR / "jobs.db")))
+# Lotes de embeddings já gerados pelos jobs em andamento (apagados ao terminar)
+JOBS_WORK_DIR = Path(os.getenv("JOBS_WORK_DIR", str(DB_DIR / "jobs")))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))
+# Sem heartbeat por esse tempo, o worker é dado como morto e o job volta para a fila
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+# Retomadas após queda do worker antes de o job falhar de vez
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+# `nice` dos processos worker (0 = mesma prioridade da API)
+JOB_WORKER_NICE = int(os.getenv("JOB_WORKER_NICE", "10"))
+
+STATES = ("queued", "running", "done", "failed", "cancelled")
+TERMINAL_STATES = ("done", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Cancelamento pedido pela API; o job para no próximo checkpoint."""
+
+
+class JobInterrupted(Exception):
+    """O worker está desligando (ou perdeu o job): o job volta para a fila com o checkpoint."""
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds")
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str
+    params: Dict[str, Any]
+    state: str
+    progress: float = 0.0
+    message: Optional[str] = None
+    checkpoint: Dict[str, Any] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    version: int = 0
+    cancel_requested: bool = False
+    worker: Optional[str] = None
+    created_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    heartbeat_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "state": self.state,
+            "progress": round(self.progress, 4),
+            "message": self.message,
+            "result": self.result,
+            "error": self.error,
+            "attempts": self.attempts,
+            "version": self.version,
+            "cancelRequested": self.cancel_requested,
+            "createdAt": _iso(self.created_at),
+            "startedAt": _iso(self.started_at),
+            "finishedAt": _iso(self.finished_at),
+        }
+
+
+def _row_to_job(row: sqlite3.Row) -> Job:
+    return Job(
+        id=row["id"],
+        kind=row["kind"],
+        params=json.loads(row["params"] or "{}"),
+        state=row["state"],
+        progress=row["progress"] or 0.0,
+        message=row["message"],
+        checkpoint=json.loads(row["checkpoint"] or "{}"),
+        result=json.loads(row["result"]) if row["result"] else None,
+        error=row["error"],
+        attempts=row["attempts"],
+        version=row["version"],
+        cancel_requested=bool(row["cancel_requested"]),
+        worker=row["worker"],
+        created_at=row["created_at"],
+        started_at=row["started_at"],
+        finished_at=row["finished_at"],
+        heartbeat_at=row["heartbeat_at"],
+    )
+
+
+class JobQueue:
+    """Fila persistente; várias instâncias (processos) podem usar o mesmo arquivo."""
+
+    def __init__(self, path: Path = JOBS_DB_PATH, stale_seconds: float = JOB_STALE_SECONDS) -> None:
+        self.path = Path(path)
+        self.stale_seconds = stale_seconds
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'queued',
+                    progress REAL NOT NULL DEFAULT 0,
+                    message TEXT,
+                    checkpoint TEXT,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    heartbeat_at REAL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, id)")
+            self._initialized = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _execute(self, query: str, params: tuple = ()) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute(query, params).rowcount
+        finally:
+            conn.close()
+
+    # ---- API ----
+
+    def enqueue(self, kind: str, params: Optional[Dict[str, Any]] = None) -> Job:
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO jobs (kind, params, created_at) VALUES (?, ?, ?)",
+                (kind, json.dumps(params or {}, ensure_ascii=False), time.time()),
+            )
+            job_id = cursor.lastrowid
+        finally:
+            conn.close()
+        logger.info("Job %s enfileirado (%s)", job_id, kind)
+        return self.get(job_id)
+
+    def get(self, job_id: int) -> Optional[Job]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return _row_to_job(row) if row else None
+
+    def list(self, state: Optional[str] = None, limit: int = 50) -> List[Job]:
+        query, params = "SELECT * FROM jobs", ()
+        if state:
+            query, params = query + " WHERE state = ?", (state,)
+        conn = self._connect()
+        try:
+            rows = conn.execute(query + " ORDER BY id DESC LIMIT ?", params + (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [_row_to_job(row) for row in rows]
+
+    def finished_after(self, since: float) -> List[Job]:
+        """Jobs concluídos com sucesso depois de `since` (o servidor recarrega os índices deles)."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE state = 'done' AND finished_at > ? ORDER BY finished_at", (since,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [_row_to_job(row) for row in rows]
+
+    def cancel(self, job_id: int) -> Optional[Job]:
+        """Na fila: cancela na hora. Rodando: o worker para no próximo checkpoint."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                """
+                UPDATE jobs SET state = 'cancelled', finished_at = ?, message = 'Cancelado', version = version + 1
+                WHERE id = ? AND state = 'queued'
+                """,
+                (now, job_id),
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, version = version + 1 WHERE id = ? AND state = 'running'",
+                (job_id,),
+            )
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    # ---- worker ----
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """Pega o próximo job da fila, ou um `running` cujo worker parou de dar sinal."""
+        now = time.time()
+        stale = now - self.stale_seconds
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                """
+                UPDATE jobs SET state = 'failed', finished_at = ?, version = version + 1,
+                    error = 'Worker caiu ' || attempts || ' vezes durante o job'
+                WHERE state = 'running' AND heartbeat_at < ? AND attempts >= ?
+                """,
+                (now, stale, JOB_MAX_ATTEMPTS),
+            )
+            row = conn.execute(
+                """
+                SELECT id FROM jobs
+                WHERE state = 'queued' OR (state = 'running' AND heartbeat_at < ?)
+                ORDER BY id LIMIT 1
+                """,
+                (stale,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                """
+                UPDATE jobs SET state = 'running', worker = ?, attempts = attempts + 1,
+                    started_at = COALESCE(started_at, ?), heartbeat_at = ?, version = version + 1
+                WHERE id = ?
+                """,
+                (worker, now, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: int, worker: str) -> Optional[bool]:
+        """Renova o sinal de vida; devolve se há cancelamento pedido (None = o job não é mais deste worker)."""
+        conn = self._connect()
+        try:
+            updated = conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker = ? AND state = 'running'",
+                (time.time(), job_id, worker),
+            ).rowcount
+            if not updated:
+                return None
+            return bool(conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+        finally:
+            conn.close()
+
+    def report(
+        self,
+        job_id: int,
+        worker: str,
+        progress: Optional[float] = None,
+        message: Optional[str] = None,
+        checkpoint: Optional[Dict[str, Any]] = None,
+    ) -> Optional[bool]:
+        """Grava progresso/checkpoint (com heartbeat); mesmo retorno de `heartbeat`."""
+        conn = self._connect()
+        try:
+            updated = conn.execute(
+                """
+                UPDATE jobs SET progress = COALESCE(?, progress), message = COALESCE(?, message),
+                    checkpoint = COALESCE(?, checkpoint), heartbeat_at = ?, version = version + 1
+                WHERE id = ? AND worker = ? AND state = 'running'
+                """,
+                (
+                    progress,
+                    message,
+                    json.dumps(checkpoint, ensure_ascii=False) if checkpoint is not None else None,
+                    time.time(),
+                    job_id,
+                    worker,
+                ),
+            ).rowcount
+            if not updated:
+                return None
+            return bool(conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()[0])
+        finally:
+            conn.close()
+
+    def finish(
+        self,
+        job_id: int,
+        worker: str,
+        state: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        message: Optional[str] = None,
+    ) -> None:
+        self._execute(
+            """
+            UPDATE jobs SET state = ?, result = ?, error = ?, message = COALESCE(?, message),
+                progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END,
+                finished_at = ?, version = version + 1
+            WHERE id = ? AND worker = ?
+            """,
+            (
+                state,
+                json.dumps(result, ensure_ascii=False) if result is not None else None,
+                error,
+                message,
+                state,
+                time.time(),
+                job_id,
+                worker,
+            ),
+        )
+
+    def release(self, job_id: int, worker: str) -> None:
+        """Devolve o job à fila com o checkpoint (desligamento do worker não conta como tentativa)."""
+        self._execute(
+            """
+            UPDATE jobs SET state = 'queued', worker = NULL, attempts = MAX(0, attempts - 1), version = version + 1
+            WHERE id = ? AND worker = ? AND state = 'running'
+            """,
+            (job_id, worker),
+        )
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
+
+
+def set_job_queue(queue: Optional[JobQueue]) -> None:
+    global _queue
+    with _queue_lock:
+        _queue = queue
+
+
+# ---- tipos de job ----
+
+class JobContext:
+    """O que o handler enxerga: parâmetros, checkpoint, pasta de trabalho e `report`."""
+
+    def __init__(self, job: Job, queue: JobQueue, worker: str, stopping: threading.Event) -> None:
+        self.job = job
+        self.queue = queue
+        self.worker = worker
+        self.params = job.params
+        self.checkpoint: Dict[str, Any] = dict(job.checkpoint)
+        self.work_dir = JOBS_WORK_DIR / str(job.id)
+        self._stopping = stopping
+        self.cancel_requested = threading.Event()
+
+    def report(self, progress: Optional[float] = None, message: Optional[str] = None, checkpoint: Optional[Dict[str, Any]] = None) -> None:
+        """Grava o avanço e para aqui se houve cancelamento ou desligamento."""
+        if checkpoint is not None:
+            self.checkpoint.update(checkpoint)
+        status = self.queue.report(
+            self.job.id, self.worker, progress, message, self.checkpoint if checkpoint is not None else None
+        )
+        if status is None:
+            raise JobInterrupted("O job foi retomado por outro worker.")
+        if status or self.cancel_requested.is_set():
+            raise JobCancelled()
+        if self._stopping.is_set():
+            raise JobInterrupted("Worker desligando.")
+
+
+@dataclass
+class JobKind:
+    run: Callable[[JobContext], Optional[Dict[str, Any]]]
+    # Valida/normaliza os parâmetros na hora de enfileirar (ValueError = 400 na API)
+    validate: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+
+
+JOB_KINDS: Dict[str, JobKind] = {}
+
+
+def register_job_kind(kind: str, run: Callable[[JobContext], Optional[Dict[str, Any]]], validate=None) -> None:
+    JOB_KINDS[kind] = JobKind(run, validate)
+
+
+def enqueue(kind: str, params: Optional[Dict[str, Any]] = None, queue: Optional[JobQueue] = None) -> Job:
+    spec = JOB_KINDS.get(kind)
+    if spec is None:
+        raise ValueError(f"Tipo de job desconhecido: {kind} (use {', '.join(sorted(JOB_KINDS))})")
+    params = dict(params or {})
+    if spec.validate is not None:
+        params = spec.validate(params)
+    return (queue or get_job_queue()).enqueue(kind, params)
+
+
+# Parâmetros do job → flags do `python -m src.backend.rag.ingest`
+INGEST_FLAGS = {
+    "agents": "--agent",
+    "name": "--name",
+    "dimensions": "--dimensions",
+    "quantization": "--quantization",
+    "tenant": "--tenant",
+    "subject": "--subject",
+    "dataDir": "--data-dir",
+    "embedModel": "--embed-model",
+    "chunkSize": "--chunk-size",
+    "overlap": "--overlap",
+}
+
+
+def ingest_argv(params: Dict[str, Any], reembed: bool = False) -> List[str]:
+    unknown = set(params) - set(INGEST_FLAGS)
+    if unknown:
+        raise ValueError(f"Parâmetros desconhecidos: {', '.join(sorted(unknown))}")
+    argv: List[str] = ["--reembed"] if reembed else []
+    for key, flag in INGEST_FLAGS.items():
+        value = params.get(key)
+        if value is None:
+            continue
+        for item in value if isinstance(value, list) else [value]:
+            argv += [flag, str(item)]
+    return argv
+
+
+def _resolve_data_dir(data_dir: Any) -> str:
+    """`dataDir` relativo a `rag/data/`; fora dela é recusado (o conteúdo volta nas respostas do RAG)."""
+    from .rag import ingest
+
+    root = Path(ingest.DATA_DIR).resolve()
+    path = (root / str(data_dir)).resolve()
+    if path != root and root not in path.parents:
+        raise ValueError(f"dataDir precisa ficar dentro de {root}.")
+    return str(path)
+
+
+def _validate_ingest(params: Dict[str, Any], reembed: bool = False) -> Dict[str, Any]:
+    from .agents.config import get_agent_config
+    from .rag import ingest
+
+    if isinstance(params.get("agents"), str):
+        params["agents"] = [params["agents"]]
+    if params.get("dataDir") is not None:
+        params["dataDir"] = _resolve_data_dir(params["dataDir"])
+    try:
+        ingest.parse_args(ingest_argv(params, reembed))
+    except SystemExit:
+        raise ValueError("Parâmetros de ingestão inválidos (veja `python -m src.backend.rag.ingest --help`).")
+    agents = params.get("agents") or []
+    if agents:
+        # O worker é outro processo: leva a configuração em vigor no servidor
+        config = get_agent_config(agents[0])
+        params.setdefault("embedModel", config.embed_model)
+        params.setdefault("chunkSize", config.rag_chunk_size)
+        params.setdefault("overlap", config.rag_overlap)
+    return params
+
+
+class CheckpointedEmbedder:
+    """`embed` do ingest que grava cada lote em disco e pula, na retomada, os lotes já feitos."""
+
+    def __init__(self, ctx: JobContext, start: float = 0.05, end: float = 0.95) -> None:
+        self.ctx = ctx
+        self.start, self.end = start, end
+
+    def __call__(self, texts: List[str], dimensions: Optional[int] = None, model: str = ""):
+        import numpy as np
+
+        from .rag import ingest
+
+        fingerprint = hashlib.sha256(
+            json.dumps([model, dimensions, texts], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        saved = self.ctx.checkpoint.get("embeddings") or {}
+        parts_dir = self.ctx.work_dir / "embeddings"
+        done = 0
+        if saved.get("fingerprint") == fingerprint and parts_dir.exists():
+            done = int(saved.get("done", 0))
+            logger.info("Job %s retomando os embeddings em %d/%d", self.ctx.job.id, done, len(texts))
+        elif parts_dir.exists():
+            # Outro corpus/modelo: os lotes antigos não servem
+            shutil.rmtree(parts_dir)
+        parts_dir.mkdir(parents=True, exist_ok=True)
+
+        for offset in range(done, len(texts), ingest.EMBED_BATCH_SIZE):
+            batch = ingest.embed_texts(texts[offset:offset + ingest.EMBED_BATCH_SIZE], dimensions, model)
+            np.save(parts_dir / f"{offset:09d}.npy", batch)
+            done = offset + len(batch)
+            self.ctx.report(
+                self.start + (self.end - self.start) * done / len(texts),
+                f"Embeddings {done}/{len(texts)}",
+                checkpoint={"embeddings": {"fingerprint": fingerprint, "done": done}},
+            )
+        parts = [np.load(path) for path in sorted(parts_dir.glob("*.npy"))]
+        return np.concatenate(parts) if parts else np.zeros((0, 0), dtype="float32")
+
+
+def _run_ingest(ctx: JobContext, reembed: bool = False) -> Optional[Dict[str, Any]]:
+    from .rag import ingest
+    from .rag.shards import shard_id
+
+    try:
+        args = ingest.parse_args(ingest_argv(ctx.params, reembed))
+    except SystemExit:
+        raise ValueError("Parâmetros de ingestão inválidos.")
+    if args.data_dir is not None:
+        # Jobs gravados direto no jobs.db não passaram pela validação da API
+        args.data_dir = Path(_resolve_data_dir(args.data_dir))
+    ctx.report(0.0, "Lendo os documentos…")
+    try:
+        info = ingest.run(args, embed=CheckpointedEmbedder(ctx), log=lambda text: ctx.report(message=text))
+    except SystemExit as exc:
+        raise RuntimeError(str(exc))
+    if info is None:
+        raise RuntimeError("Nenhum documento para indexar.")
+    return {
+        "agents": args.agents or [],
+        "shard": shard_id(args.tenant, args.subject) if args.tenant else None,
+        "name": info.get("name"),
+        "vectors": info.get("count"),
+        "dimensions": info.get("dimensions"),
+        "embedModel": info.get("embed_model"),
+        "version": info.get("version"),
+    }
+
+
+register_job_kind("ingest", _run_ingest, _validate_ingest)
+register_job_kind(
+    "reembed",
+    lambda ctx: _run_ingest(ctx, reembed=True),
+    lambda params: _validate_ingest(params, reembed=True),
+)
+
+
+# ---- worker ----
+
+class Worker:
+    def __init__(self, queue: Optional[JobQueue] = None, name: Optional[str] = None) -> None:
+        self.queue = queue or get_job_queue()
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+
+    def stop(self) -> None:
+        self.stopping.set()
+
+    def _heartbeat(self, ctx: JobContext, done: threading.Event) -> None:
+        while not done.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                if self.queue.heartbeat(ctx.job.id, self.name):
+                    ctx.cancel_requested.set()
+            except Exception:
+                logger.warning("Heartbeat do job %s falhou", ctx.job.id, exc_info=True)
+
+    def run_once(self) -> Optional[Job]:
+        """Executa um job da fila até o fim (ou até cancelar/interromper); None se a fila está vazia."""
+        job = self.queue.claim(self.name)
+        if job is None:
+            return None
+        spec = JOB_KINDS.get(job.kind)
+        ctx = JobContext(job, self.queue, self.name, self.stopping)
+        done = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(ctx, done), daemon=True)
+        beat.start()
+        logger.info("Job %s (%s) iniciado, tentativa %d", job.id, job.kind, job.attempts)
+        try:
+            if spec is None:
+                raise RuntimeError(f"Tipo de job desconhecido: {job.kind}")
+            with usage_scope(f"job:{job.kind}"):
+                result = spec.run(ctx)
+            self.queue.finish(job.id, self.name, "done", result=result, message="Concluído")
+        except JobCancelled:
+            self.queue.finish(job.id, self.name, "cancelled", message="Cancelado")
+        except JobInterrupted:
+            self.queue.release(job.id, self.name)
+            logger.info("Job %s devolvido à fila (checkpoint mantido)", job.id)
+            return self.queue.get(job.id)
+        except Exception as exc:
+            logger.exception("Job %s falhou", job.id)
+            self.queue.finish(job.id, self.name, "failed", error=str(exc) or type(exc).__name__)
+        finally:
+            done.set()
+            beat.join()
+            self._flush_usage()
+        shutil.rmtree(ctx.work_dir, ignore_errors=True)
+        return self.queue.get(job.id)
+
+    def _flush_usage(self) -> None:
+        try:
+            get_usage_recorder().flush()
+        except Exception:
+            logger.warning("Falha ao gravar o uso de tokens do job", exc_info=True)
+
+    def run_forever(self, poll_seconds: float = JOB_POLL_SECONDS) -> None:
+        logger.info("Worker %s aguardando jobs em %s", self.name, self.queue.path)
+        while not self.stopping.is_set():
+            try:
+                job = self.run_once()
+            except Exception:
+                logger.exception("Falha ao buscar job")
+                job = None
+            if job is None:
+                self.stopping.wait(poll_seconds)
+
+
+# Trava mantida pelo processo da API que subiu os workers
+_spawn_lock: Optional[Any] = None
+
+
+def _claim_spawn_lock() -> bool:
+    """Elege um único processo da API por fila para subir workers (flock, liberado se ele morrer)."""
+    global _spawn_lock
+    if _spawn_lock is not None:
+        return True
+    try:
+        import fcntl
+    except ImportError:
+        # Sem flock (Windows): vale um processo da API por fila
+        return True
+    path = get_job_queue().path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handle = open(path.with_name(path.name + ".spawn.lock"), "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _spawn_lock = handle
+    return True
+
+
+def _release_spawn_lock() -> None:
+    global _spawn_lock
+    if _spawn_lock is not None:
+        _spawn_lock.close()
+        _spawn_lock = None
+
+
+def spawn_workers(count: int) -> List[subprocess.Popen]:
+    """Sobe `count` processos worker (chamado pelo servidor na inicialização).
+
+    Só um processo da API por fila faz isso; nos demais devolve `[]`.
+    """
+    if not _claim_spawn_lock():
+        logger.info("Workers da fila já são geridos por outro processo da API")
+        return []
+    root = Path(__file__).resolve().parents[2]
+    return [
+        subprocess.Popen([sys.executable, "-m", "src.backend.jobs", "worker"], cwd=root)
+        for _ in range(count)
+    ]
+
+
+def stop_workers(processes: List[subprocess.Popen], timeout: float = 10.0) -> None:
+    """SIGTERM: o job em andamento volta para a fila no próximo checkpoint."""
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout)
+        except Exception:
+            process.kill()
+    _release_spawn_lock()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Fila de jobs do MentorIA (ingestão, re-embedding).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("worker", help="Executa jobs da fila até receber SIGTERM/SIGINT")
+    enqueue_parser = sub.add_parser("enqueue", help="Enfileira um job")
+    enqueue_parser.add_argument("kind", choices=sorted(JOB_KINDS))
+    enqueue_parser.add_argument("params", nargs="?", default="{}", help="Parâmetros em JSON")
+    list_parser = sub.add_parser("list", help="Lista os jobs recentes")
+    list_parser.add_argument("--state", choices=STATES, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "enqueue":
+        print(json.dumps(enqueue(args.kind, json.loads(args.params)).to_dict(), ensure_ascii=False, indent=2))
+    elif args.command == "list":
+        for job in get_job_queue().list(args.state):
+            print(f"{job.id:>5}  {job.kind:<8} {job.state:<9} {job.progress:>6.1%}  {job.message or ''}")
+    else:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+        if JOB_WORKER_NICE and hasattr(os, "nice"):
+            os.nice(JOB_WORKER_NICE)
+        worker = Worker()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: worker.stop())
+        worker.run_forever()
+
+
+if __name__ == "__main__":
+    main()
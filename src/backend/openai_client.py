@@ -0,0 +1,46 @@
+"""Cliente OpenAI compartilhado, criado só no primeiro uso.
+
+Importar o retriever/ingestão não lê `.env` nem instancia o cliente; quem precisa chama
+`get_openai_client()`. `reset_openai_client()` descarta a instância (p.ex. depois de
+trocar a chave em /api/config/api-key) e `set_openai_client()` injeta outra implementação
+(testes e benchmarks).
+"""
+import threading
+from typing import Any, Optional
+
+_client: Optional[Any] = None
+_lock = threading.Lock()
+_dotenv_loaded = False
+
+
+def load_env() -> None:
+    """Carrega o `.env` uma única vez por processo."""
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    _dotenv_loaded = True
+
+
+def get_openai_client() -> Any:
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                load_env()
+                from openai import OpenAI
+
+                _client = OpenAI()
+    return _client
+
+
+def set_openai_client(client: Optional[Any]) -> None:
+    global _client
+    with _lock:
+        _client = client
+
+
+def reset_openai_client() -> None:
+    set_openai_client(None)
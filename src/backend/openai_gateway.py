@@ -0,0 +1,616 @@
+"""Gateway das chamadas à OpenAI: limites por modelo, fila com prioridade e coalescência.
+
+Toda chamada (embeddings do retriever/ingestão, `Runner.run` do chat/correção/resumo)
+passa por aqui antes de ir à API:
+
+- token buckets por modelo, em requisições e tokens por minuto (`OPENAI_RATE_LIMITS`);
+- no máximo `OPENAI_MAX_CONCURRENCY` chamadas em andamento no processo;
+- fila com prioridade: `INTERACTIVE` (chat, busca do tutor) passa na frente de `BATCH`
+  (ingestão, correção em lote, avaliação, resumos de sessão);
+- embeddings idênticos em andamento (mesmo modelo, dimensão e textos) viram uma chamada só;
+- `max_tokens` do agente aplicado no `ModelSettings` e o consumo (`usage`) de cada
+  chamada registrado em `usage.py`, com troca para o modelo barato quando a sessão
+  passou do orçamento.
+
+A prioridade vem do contexto (`with priority(BATCH): ...`), então atravessa
+`asyncio.gather` e `asyncio.to_thread` sem mudar a assinatura de quem chama.
+O mesmo vale para as chamadas feitas de dentro de um `run_agent` (ferramentas do agente
+que buscam no índice): elas já estão cobertas pela vaga da execução, então passam na
+frente e não esperam outra vaga de concorrência — senão N execuções com ferramentas
+e `OPENAI_MAX_CONCURRENCY=N` travariam esperando umas pelas outras.
+`/metrics` expõe profundidade da fila, chamadas em andamento e coalescências; com
+`MENTORIA_TRACING=1`, também o tempo de espera na fila.
+"""
+import asyncio
+import contextvars
+import fnmatch
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from agents import ModelSettings, RunHooks
+from agents.usage import Usage
+
+from . import telemetry
+from .openai_client import get_openai_client
+from .usage import get_usage_recorder
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# Limites padrão (0 = sem limite); OPENAI_RATE_LIMITS='{"gpt-4o-mini": {"rpm": 500, "tpm": 200000}}'
+# sobrescreve por modelo ou padrão fnmatch ("text-embedding-*")
+DEFAULT_LIMITS: Dict[str, Dict[str, int]] = {
+    "text-embedding-*": {"rpm": 3000, "tpm": 1_000_000},
+    "*": {"rpm": 500, "tpm": 200_000},
+}
+OPENAI_RATE_LIMITS = os.getenv("OPENAI_RATE_LIMITS", "")
+MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+# Rajada permitida: quantos segundos de cota o bucket acumula
+BURST_SECONDS = float(os.getenv("OPENAI_BURST_SECONDS", "10"))
+# Tempo máximo na fila antes de desistir com GatewayBusyError
+QUEUE_TIMEOUT = float(os.getenv("OPENAI_QUEUE_TIMEOUT", "120"))
+# Pausa do modelo depois de um 429 que o cliente não conseguiu contornar
+RATE_LIMIT_COOLDOWN = float(os.getenv("OPENAI_RATE_LIMIT_COOLDOWN", "5"))
+
+WAIT_METRIC = "mentoria_openai_queue_wait_seconds"
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("mentoria_openai_priority", default=INTERACTIVE)
+# Dentro de um `run_agent` que já ocupa uma vaga de concorrência
+_inside_run: contextvars.ContextVar[bool] = contextvars.ContextVar("mentoria_openai_inside_run", default=False)
+
+
+class GatewayBusyError(RuntimeError):
+    """A chamada esperou mais que `OPENAI_QUEUE_TIMEOUT` na fila."""
+
+
+@contextmanager
+def priority(level: int) -> Iterator[None]:
+    """Define a prioridade das chamadas feitas dentro do bloco (e das tasks/threads criadas nele)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def estimate_tokens(texts: List[str]) -> int:
+    """~4 caracteres por token, como no chunking da ingestão."""
+    return sum(max(1, len(t) // 4) for t in texts)
+
+
+def load_limits(raw: str = "") -> Dict[str, Dict[str, int]]:
+    limits = {pattern: dict(values) for pattern, values in DEFAULT_LIMITS.items()}
+    if raw.strip():
+        for pattern, values in json.loads(raw).items():
+            limits.setdefault(pattern, {}).update(values)
+    return limits
+
+
+class TokenBucket:
+    """Cota de `per_minute` unidades por minuto, acumulando até `burst_seconds` de cota."""
+
+    def __init__(self, per_minute: int, burst_seconds: float = BURST_SECONDS) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def cost(self, amount: float) -> float:
+        # Um pedido maior que o bucket inteiro nunca caberia: cobra o bucket cheio
+        return min(amount, self.capacity)
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        missing = self.cost(amount) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float, now: float) -> None:
+        if not self.unlimited:
+            self._refill(now)
+            self.level -= self.cost(amount)
+
+    def adjust(self, amount: float) -> None:
+        """Devolve (ou cobra, se negativo) a diferença entre o estimado e o consumido."""
+        if not self.unlimited:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    __slots__ = ("model", "tokens", "priority", "seq", "nested", "enqueued_at", "granted", "event", "loop", "future")
+
+    def __init__(self, model: str, tokens: int, priority: int, seq: int, nested: bool = False) -> None:
+        self.model = model
+        self.tokens = tokens
+        self.priority = priority
+        self.seq = seq
+        self.nested = nested
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.event: Optional[threading.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.future: Optional["asyncio.Future[None]"] = None
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        # Chamadas de dentro de uma execução liberam a vaga dela: vão primeiro
+        return (not self.nested, self.priority, self.seq) < (not other.nested, other.priority, other.seq)
+
+    def wake(self) -> None:
+        if self.future is not None:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+        elif self.event is not None:
+            self.event.set()
+
+
+def _resolve(future: "asyncio.Future[None]") -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class _Lane:
+    """Estado de um modelo: buckets, fila e pausa após 429."""
+
+    def __init__(self, rpm: int, tpm: int) -> None:
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.queue: List[_Waiter] = []
+        self.paused_until = 0.0
+        self.granted = 0
+
+    def delay(self, waiter: _Waiter, now: float) -> float:
+        return max(
+            self.paused_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(waiter.tokens, now),
+        )
+
+
+class Ticket:
+    """Autorização de uma chamada; `used_tokens` (se conhecido) corrige o bucket na liberação.
+
+    `nested`: chamada feita dentro de um `run_agent`, que não ocupa vaga de concorrência.
+    """
+
+    __slots__ = ("model", "tokens", "nested", "used_tokens")
+
+    def __init__(self, model: str, tokens: int, nested: bool = False) -> None:
+        self.model = model
+        self.tokens = tokens
+        self.nested = nested
+        self.used_tokens: Optional[int] = None
+
+
+class _Flight:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _UsageHooks(RunHooks):
+    """Soma o `usage` de cada resposta do modelo durante a execução.
+
+    O SDK esconde os detalhes (`run_data`) de erros como `ModelBehaviorError`; somando
+    rodada a rodada, o consumo de uma execução que falha também entra no orçamento.
+    Os hooks do chamador (`hooks=`) continuam recebendo todos os eventos.
+    """
+
+    def __init__(self, inner: Optional[RunHooks] = None) -> None:
+        self.usage = Usage()
+        self.inner = inner
+
+    async def on_llm_start(self, context: Any, agent: Any, system_prompt: Any, input_items: Any) -> None:
+        if self.inner is not None:
+            await self.inner.on_llm_start(context, agent, system_prompt, input_items)
+
+    async def on_llm_end(self, context: Any, agent: Any, response: Any) -> None:
+        if getattr(response, "usage", None) is not None:
+            self.usage.add(response.usage)
+        if self.inner is not None:
+            await self.inner.on_llm_end(context, agent, response)
+
+    async def on_agent_start(self, context: Any, agent: Any) -> None:
+        if self.inner is not None:
+            await self.inner.on_agent_start(context, agent)
+
+    async def on_agent_end(self, context: Any, agent: Any, output: Any) -> None:
+        if self.inner is not None:
+            await self.inner.on_agent_end(context, agent, output)
+
+    async def on_handoff(self, context: Any, from_agent: Any, to_agent: Any) -> None:
+        if self.inner is not None:
+            await self.inner.on_handoff(context, from_agent, to_agent)
+
+    async def on_tool_start(self, context: Any, agent: Any, tool: Any) -> None:
+        if self.inner is not None:
+            await self.inner.on_tool_start(context, agent, tool)
+
+    async def on_tool_end(self, context: Any, agent: Any, tool: Any, result: Any) -> None:
+        if self.inner is not None:
+            await self.inner.on_tool_end(context, agent, tool, result)
+
+
+def _run_usage(result: Any) -> Any:
+    """`usage` do resultado (ou do `run_data` de um erro), quando o SDK expõe."""
+    return getattr(getattr(result, "context_wrapper", None), "usage", None)
+
+
+class OpenAIGateway:
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, int]]] = None,
+        max_concurrency: int = MAX_CONCURRENCY,
+        queue_timeout: float = QUEUE_TIMEOUT,
+    ) -> None:
+        self.limits = load_limits(OPENAI_RATE_LIMITS) if limits is None else limits
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._lanes: Dict[str, _Lane] = {}
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._flights: Dict[str, _Flight] = {}
+        self.coalesced = 0
+
+    # ---- fila e limites ----
+
+    def _limits_for(self, model: str) -> Dict[str, int]:
+        if model in self.limits:
+            return self.limits[model]
+        for pattern, values in self.limits.items():
+            if pattern != "*" and fnmatch.fnmatchcase(model, pattern):
+                return values
+        return self.limits.get("*", {})
+
+    def _lane(self, model: str) -> _Lane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            limits = self._limits_for(model)
+            lane = self._lanes[model] = _Lane(int(limits.get("rpm", 0)), int(limits.get("tpm", 0)))
+        return lane
+
+    def _dispatch_locked(self) -> Optional[float]:
+        """Libera quem pode começar; devolve em quantos segundos reavaliar (None = só na próxima liberação)."""
+        now = time.monotonic()
+        retry_in: Optional[float] = None
+        while True:
+            full = self._in_flight >= self.max_concurrency
+            best: Optional[Tuple[_Lane, _Waiter]] = None
+            for lane in self._lanes.values():
+                if not lane.queue:
+                    continue
+                head = lane.queue[0]
+                if full and not head.nested:
+                    continue
+                delay = lane.delay(head, now)
+                if delay > 0:
+                    retry_in = delay if retry_in is None else min(retry_in, delay)
+                elif best is None or head < best[1]:
+                    best = (lane, head)
+            if best is None:
+                break
+            lane, waiter = best
+            heapq.heappop(lane.queue)
+            lane.requests.take(1, now)
+            lane.tokens.take(waiter.tokens, now)
+            lane.granted += 1
+            if not waiter.nested:
+                self._in_flight += 1
+            waiter.granted = True
+            if telemetry.is_enabled():
+                telemetry.observe(
+                    WAIT_METRIC,
+                    now - waiter.enqueued_at,
+                    model=waiter.model,
+                    priority=PRIORITY_NAMES.get(waiter.priority, str(waiter.priority)),
+                )
+            waiter.wake()
+        return retry_in
+
+    def _enqueue(self, model: str, tokens: int, level: Optional[int]) -> _Waiter:
+        waiter = _Waiter(model, tokens, current_priority() if level is None else level, next(self._seq), _inside_run.get())
+        heapq.heappush(self._lane(model).queue, waiter)
+        return waiter
+
+    def _abandon_locked(self, waiter: _Waiter) -> None:
+        queue = self._lanes[waiter.model].queue
+        if waiter in queue:
+            queue.remove(waiter)
+            heapq.heapify(queue)
+
+    def _busy(self, model: str) -> GatewayBusyError:
+        return GatewayBusyError(f"Fila da OpenAI cheia para '{model}': tente novamente em instantes.")
+
+    def acquire(self, model: str, tokens: int = 0, level: Optional[int] = None) -> Ticket:
+        """Espera (bloqueando a thread) a vez de chamar `model` gastando ~`tokens`."""
+        deadline = time.monotonic() + self.queue_timeout
+        with self._lock:
+            waiter = self._enqueue(model, tokens, level)
+            waiter.event = threading.Event()
+        while True:
+            with self._lock:
+                retry_in = self._dispatch_locked()
+                if waiter.granted:
+                    return Ticket(model, tokens, waiter.nested)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._abandon_locked(waiter)
+                    raise self._busy(model)
+            waiter.event.wait(remaining if retry_in is None else min(retry_in, remaining))
+
+    async def acquire_async(self, model: str, tokens: int = 0, level: Optional[int] = None) -> Ticket:
+        """Versão assíncrona de `acquire`: espera sem bloquear o event loop."""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + self.queue_timeout
+        with self._lock:
+            waiter = self._enqueue(model, tokens, level)
+            waiter.loop, waiter.future = loop, loop.create_future()
+        try:
+            while True:
+                with self._lock:
+                    retry_in = self._dispatch_locked()
+                    if waiter.granted:
+                        return Ticket(model, tokens, waiter.nested)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._abandon_locked(waiter)
+                        raise self._busy(model)
+                try:
+                    timeout = remaining if retry_in is None else min(retry_in, remaining)
+                    await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._release_locked(Ticket(model, tokens, waiter.nested))
+                else:
+                    self._abandon_locked(waiter)
+            raise
+
+    def _release_locked(self, ticket: Ticket, error: Optional[BaseException] = None) -> None:
+        if not ticket.nested:
+            self._in_flight -= 1
+        lane = self._lanes[ticket.model]
+        if ticket.used_tokens is not None:
+            lane.tokens.adjust(ticket.tokens - ticket.used_tokens)
+        if error is not None and type(error).__name__ == "RateLimitError":
+            lane.paused_until = time.monotonic() + RATE_LIMIT_COOLDOWN
+        self._dispatch_locked()
+
+    def release(self, ticket: Ticket, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            self._release_locked(ticket, error)
+
+    @contextmanager
+    def slot(self, model: str, tokens: int = 0, level: Optional[int] = None) -> Iterator[Ticket]:
+        ticket = self.acquire(model, tokens, level)
+        try:
+            yield ticket
+        except BaseException as exc:
+            self.release(ticket, exc)
+            raise
+        else:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, model: str, tokens: int = 0, level: Optional[int] = None):
+        ticket = await self.acquire_async(model, tokens, level)
+        try:
+            yield ticket
+        except BaseException as exc:
+            self.release(ticket, exc)
+            raise
+        else:
+            self.release(ticket)
+
+    # ---- chamadas ----
+
+    def create_embeddings(
+        self,
+        model: str,
+        texts: List[str],
+        dimensions: Optional[int] = None,
+        level: Optional[int] = None,
+    ) -> Any:
+        """`embeddings.create` com limites; pedidos idênticos simultâneos compartilham a resposta."""
+        key = hashlib.sha256(json.dumps([model, dimensions, texts], ensure_ascii=False).encode("utf-8")).hexdigest()
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        params: Dict[str, Any] = {"model": model, "input": texts}
+        if dimensions:
+            params["dimensions"] = dimensions
+        try:
+            with self.slot(model, estimate_tokens(texts), level) as ticket:
+                started = time.perf_counter()
+                response = get_openai_client().embeddings.create(**params)
+                usage = getattr(response, "usage", None)
+                ticket.used_tokens = getattr(usage, "total_tokens", None)
+            # Só o líder registra: as chamadas coalescidas não custaram nada
+            tokens = getattr(usage, "prompt_tokens", None) or ticket.used_tokens or estimate_tokens(texts)
+            get_usage_recorder().record(model, "embedding", tokens, seconds=time.perf_counter() - started)
+            flight.result = response
+            return response
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    async def run_agent(
+        self,
+        runner: Any,
+        agent: Any,
+        input: Any,
+        max_tokens: int = 2000,
+        level: Optional[int] = None,
+        **kwargs: Any,
+    ) -> Any:
+        """`runner.run(agent, input, ...)` com limites do modelo do agente.
+
+        Uma execução conta como uma requisição, mesmo que o agente chame ferramentas e
+        faça mais de uma rodada; as chamadas das ferramentas herdam a vaga (não esperam
+        outra). Reserva entrada + `max_tokens` e o consumo real (`usage`) corrige o
+        bucket de tokens no fim; o consumo é registrado também quando a execução falha
+        (saída fora do formato, limite de rodadas). `max_tokens` também vai para o
+        `ModelSettings` (se o agente não define outro), e a sessão acima do orçamento
+        usa o modelo barato.
+        """
+        model = agent_model(agent)
+        recorder = get_usage_recorder()
+        fallback = recorder.budget_fallback(model)
+        agent = limit_agent(agent, max_tokens, fallback)
+        model = fallback or model
+        text = input if isinstance(input, str) else json.dumps(input, ensure_ascii=False, default=str)
+        budget = estimate_tokens([text]) + max_tokens
+        hooks = kwargs["hooks"] = _UsageHooks(kwargs.get("hooks"))
+        result: Any = None
+        async with self.aslot(model, budget, level) as ticket:
+            started = time.perf_counter()
+            token = _inside_run.set(True)
+            try:
+                result = await runner.run(agent, input, **kwargs)
+            except BaseException as exc:
+                result = getattr(exc, "run_data", None)
+                raise
+            finally:
+                _inside_run.reset(token)
+                usage = hooks.usage if hooks.usage.requests else _run_usage(result)
+                ticket.used_tokens = getattr(usage, "total_tokens", None) or None
+                if usage is not None:
+                    recorder.record(
+                        model,
+                        "llm",
+                        getattr(usage, "input_tokens", 0) or 0,
+                        getattr(usage, "output_tokens", 0) or 0,
+                        getattr(usage, "total_tokens", None),
+                        seconds=time.perf_counter() - started,
+                        requests=getattr(usage, "requests", 0) or 1,
+                    )
+        return result
+
+    # ---- métricas ----
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "coalesced": self.coalesced,
+                "models": {
+                    model: {
+                        "queued": len(lane.queue),
+                        "granted": lane.granted,
+                        "queued_by_priority": {
+                            name: sum(1 for w in lane.queue if w.priority == level)
+                            for level, name in PRIORITY_NAMES.items()
+                        },
+                    }
+                    for model, lane in self._lanes.items()
+                },
+            }
+
+
+def limit_agent(agent: Any, max_tokens: Optional[int], model: Optional[str] = None) -> Any:
+    """Cópia do agente com `max_tokens` no `ModelSettings` (se ele não define um) e, opcionalmente, outro modelo."""
+    settings = getattr(agent, "model_settings", None)
+    if not hasattr(agent, "clone") or not isinstance(settings, ModelSettings):
+        return agent
+    changes: Dict[str, Any] = {}
+    if max_tokens and settings.max_tokens is None:
+        changes["model_settings"] = settings.resolve(ModelSettings(max_tokens=max_tokens))
+    if model:
+        changes["model"] = model
+    return agent.clone(**changes) if changes else agent
+
+
+def agent_model(agent: Any) -> str:
+    """Modelo que o SDK vai usar para o agente (o padrão do SDK quando o agente não define)."""
+    model = getattr(agent, "model", None)
+    if isinstance(model, str) and model:
+        return model
+    name = getattr(model, "model", None)
+    if isinstance(name, str) and name:
+        return name
+    from agents.models import get_default_model
+
+    return get_default_model()
+
+
+_gateway: Optional[OpenAIGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_gateway() -> OpenAIGateway:
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = OpenAIGateway()
+    return _gateway
+
+
+def set_gateway(gateway: Optional[OpenAIGateway]) -> None:
+    global _gateway
+    with _gateway_lock:
+        _gateway = gateway
+
+
+def _collect(metric: Callable[[Dict[str, Any]], List[Tuple[Dict[str, str], float]]]) -> Callable:
+    def collect() -> List[Tuple[Dict[str, str], float]]:
+        return metric(_gateway.stats()) if _gateway is not None else []
+
+    return collect
+
+
+telemetry.register_collector(
+    "mentoria_openai_queue_depth",
+    "gauge",
+    _collect(lambda s: [
+        ({"model": model, "priority": name}, count)
+        for model, lane in s["models"].items()
+        for name, count in lane["queued_by_priority"].items()
+    ]),
+)
+telemetry.register_collector("mentoria_openai_in_flight", "gauge", _collect(lambda s: [({}, s["in_flight"])]))
+telemetry.register_collector(
+    "mentoria_openai_requests_total",
+    "counter",
+    _collect(lambda s: [({"model": model}, lane["granted"]) for model, lane in s["models"].items()]),
+)
+telemetry.register_collector("mentoria_openai_coalesced_total", "counter", _collect(lambda s: [({}, s["coalesced"])]))
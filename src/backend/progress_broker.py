@@ -0,0 +1,112 @@
+"""Publicação dos deltas de progresso para quem acompanha a sessão (SSE em /api/progress/stream).
+
+O `ProgressTracker` publica, depois de cada commit, só o que mudou (XP, badges, posição
+na trilha, lacunas, eventos novos) para as assinaturas de `(session_id, agent_id)`. Sem
+assinantes, publicar é uma consulta a um dicionário. Cada assinatura tem uma fila
+limitada; se o cliente ficar para trás, a fila é descartada e ele recebe `RESYNC`
+para pedir um snapshot novo, em vez de acumular memória no servidor.
+"""
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from . import telemetry
+
+# Deltas pendentes por conexão antes de forçar um resync
+PROGRESS_STREAM_QUEUE = 100
+
+RESYNC: Dict[str, Any] = {"type": "resync"}
+
+
+class Subscription:
+    def __init__(self, key: Tuple[str, str], loop: asyncio.AbstractEventLoop, max_queue: int) -> None:
+        self.key = key
+        self.loop = loop
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=max_queue)
+
+    def _push(self, delta: Dict[str, Any]) -> None:
+        # Roda no loop da assinatura
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            delta = RESYNC
+        self.queue.put_nowait(delta)
+
+    async def get(self) -> Dict[str, Any]:
+        return await self.queue.get()
+
+
+class ProgressBroker:
+    def __init__(self, max_queue: int = PROGRESS_STREAM_QUEUE) -> None:
+        self.max_queue = max_queue
+        self._subscriptions: Dict[Tuple[str, str], Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, session_id: str, agent_id: str) -> Subscription:
+        """Nova assinatura; precisa ser criada dentro do event loop que vai consumi-la."""
+        key = (session_id, agent_id)
+        subscription = Subscription(key, asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscriptions.setdefault(key, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.key)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscriptions[subscription.key]
+
+    def has_subscribers(self, session_id: str, agent_id: str) -> bool:
+        return (session_id, agent_id) in self._subscriptions
+
+    def publish(self, session_id: str, agent_id: str, delta: Dict[str, Any]) -> int:
+        """Entrega `delta` a todas as assinaturas (pode ser chamado de qualquer thread)."""
+        with self._lock:
+            subscribers = list(self._subscriptions.get((session_id, agent_id), ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._push, delta)
+            except RuntimeError:
+                # Loop já encerrado: a conexão morreu sem passar pelo unsubscribe
+                self.unsubscribe(subscription)
+        if subscribers:
+            self.published += 1
+        return len(subscribers)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sessions": len(self._subscriptions),
+                "subscribers": sum(len(s) for s in self._subscriptions.values()),
+                "published": self.published,
+            }
+
+
+_broker: Optional[ProgressBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_progress_broker() -> ProgressBroker:
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = ProgressBroker()
+    return _broker
+
+
+def set_progress_broker(broker: Optional[ProgressBroker]) -> None:
+    global _broker
+    with _broker_lock:
+        _broker = broker
+
+
+def _collect_subscribers() -> List[Tuple[Dict[str, str], float]]:
+    return [({}, _broker.stats()["subscribers"])] if _broker is not None else []
+
+
+telemetry.register_collector("mentoria_progress_stream_subscribers", "gauge", _collect_subscribers)
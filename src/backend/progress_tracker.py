@@ -1,12 +1,17 @@
 import json
+import os
 import sqlite3
 from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import transcripts
+from .progress_broker import get_progress_broker
+from .telemetry import traced
 
 
 DB_DIR = Path(__file__).resolve().parents[1] / "data"
-DB_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = DB_DIR / "progress.db"
 XP_GOAL = 300
 BADGE_THRESHOLDS = [
@@ -21,16 +26,36 @@ LEVEL_LABELS = [
     "Desafios Avançados",
     "Mentoria",
 ]
+# Textos do payload de eventos acima disso vão resumidos (o evento completo fica em /api/progress/events/{id})
+EVENT_SUMMARY_CHARS = int(os.getenv("PROGRESS_EVENT_SUMMARY_CHARS", "160"))
+# Máximo de eventos num delta (`progressSince`); acima disso o cliente recebe o progresso completo
+DELTA_MAX_EVENTS = 50
+# Retenção (0 = para sempre): transcrições completas e eventos antigos
+TRANSCRIPT_RETENTION_DAYS = int(os.getenv("PROGRESS_TRANSCRIPT_RETENTION_DAYS", "90"))
+EVENT_RETENTION_DAYS = int(os.getenv("PROGRESS_EVENT_RETENTION_DAYS", "0"))
+# VACUUM só quando as páginas livres passam dessa fração do arquivo
+VACUUM_FREE_RATIO = float(os.getenv("PROGRESS_VACUUM_FREE_RATIO", "0.2"))
+
+# Contadores de `usage_daily` e as dimensões aceitas em `usage_summary(group_by=...)`
+USAGE_COUNTERS = ("requests", "input_tokens", "output_tokens", "total_tokens", "cost_usd", "seconds")
+USAGE_GROUPS = {"day": "day", "agent": "agent_id", "session": "session_id", "model": "model", "kind": "kind"}
+
+
+# Bancos com o schema já criado neste processo (o schema sai do import e vai para o 1º uso)
+_initialized: set = set()
 
 
 def _connect() -> sqlite3.Connection:
+    if DB_PATH not in _initialized:
+        _init_db()
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
 
 def _init_db() -> None:
-    with _connect() as conn:
+    Path(DB_PATH).parent.mkdir(parents=True, exist_ok=True)
+    with sqlite3.connect(DB_PATH) as conn:
         conn.execute(
             """
             CREATE TABLE IF NOT EXISTS progress (
@@ -59,9 +84,77 @@ def _init_db() -> None:
             )
             """
         )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(events)")}
+        if "transcript_id" not in columns:
+            conn.execute("ALTER TABLE events ADD COLUMN transcript_id TEXT")
+        # Eventos recentes, versão e deltas são sempre lidos por sessão/agente em ordem de id
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_session ON events (session_id, agent_id, id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_transcript ON events (transcript_id)")
+        transcripts.create_table(conn)
+        # Tokens e custo por dia/agente/sessão/modelo (gravados em lote pelo UsageRecorder)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS usage_daily (
+                day TEXT NOT NULL,
+                agent_id TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                model TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                requests INTEGER NOT NULL DEFAULT 0,
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                total_tokens INTEGER NOT NULL DEFAULT 0,
+                cost_usd REAL NOT NULL DEFAULT 0,
+                seconds REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, agent_id, session_id, model, kind)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_session ON usage_daily (session_id, day)")
+    _initialized.add(DB_PATH)
+
+
+def _now() -> str:
+    # Mesmo formato do CURRENT_TIMESTAMP do SQLite (UTC)
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
 
+def split_payload(payload: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(prévia, excedente): textos longos viram prévia e o original vai para o excedente."""
+    preview: Dict[str, Any] = {}
+    overflow: Dict[str, Any] = {}
+    for key, value in payload.items():
+        if isinstance(value, str) and len(value) > EVENT_SUMMARY_CHARS:
+            preview[key] = value[:EVENT_SUMMARY_CHARS].rstrip() + "…"
+            overflow[key] = value
+        elif isinstance(value, (dict, list)) and len(json.dumps(value, ensure_ascii=False)) > EVENT_SUMMARY_CHARS:
+            overflow[key] = value
+        else:
+            preview[key] = value
+    return preview, overflow
 
-_init_db()
+
+def compact_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Evento com textos longos resumidos e listas/objetos grandes omitidos (`truncated`).
+
+    Eventos novos já são gravados assim; isto cobre linhas antigas ainda não migradas.
+    """
+    payload, overflow = split_payload(event.get("payload") or {})
+    compact = {**event, "payload": payload}
+    if overflow:
+        compact["truncated"] = True
+    return compact
+
+
+def _publish(deltas: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+    """Publica os deltas já commitados para quem acompanha a sessão (SSE)."""
+    broker = get_progress_broker()
+    for session_id, agent_id, delta in deltas:
+        if broker.has_subscribers(session_id, agent_id):
+            if "events" in delta:
+                delta = {**delta, "events": [compact_event(e) for e in delta["events"]]}
+                delta["version"] = delta["events"][-1]["id"]
+            broker.publish(session_id, agent_id, {"agentId": agent_id, **delta})
 
 
 @dataclass
@@ -73,52 +166,101 @@ class ProgressSummary:
     gaps: List[str]
     recent_events: List[Dict[str, Any]]
     awarded: int = 0
+    # Maior id de evento da sessão/agente: muda a cada gravação
+    version: int = 0
+    # Com `since`, `recent_events` traz só os eventos com id > since (resposta delta)
+    since: Optional[int] = None
+
+
+@dataclass
+class XpAward:
+    """XP a conceder numa gravação; `event_type` registra um evento extra junto."""
+    session_id: str
+    agent_id: str
+    amount: int
+    reason: str
+    payload: Optional[Dict[str, Any]] = None
+    gaps: Optional[List[str]] = None
+    event_type: Optional[str] = None
+    event_payload: Optional[Dict[str, Any]] = None
 
 
 class ProgressTracker:
     """Persistence layer para progresso, XP e eventos do aluno."""
 
-    def __init__(self) -> None:
-        _init_db()
-
+    @traced("progress.ensure_profile")
     def ensure_profile(self, session_id: str, agent_id: str) -> None:
         with _connect() as conn:
-            conn.execute(
-                """
-                INSERT OR IGNORE INTO progress (session_id, agent_id)
-                VALUES (?, ?)
-                """,
-                (session_id, agent_id),
-            )
+            self._ensure_profile(conn, session_id, agent_id)
 
+    def _ensure_profile(self, conn: sqlite3.Connection, session_id: str, agent_id: str) -> None:
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO progress (session_id, agent_id)
+            VALUES (?, ?)
+            """,
+            (session_id, agent_id),
+        )
+
+    @traced("progress.log_event")
     def log_event(self, session_id: str, agent_id: str, event_type: str, payload: Optional[Dict[str, Any]] = None) -> None:
         with _connect() as conn:
-            conn.execute(
-                """
-                INSERT INTO events (session_id, agent_id, type, payload)
-                VALUES (?, ?, ?, ?)
-                """,
-                (
-                    session_id,
-                    agent_id,
-                    event_type,
-                    json.dumps(payload or {}, ensure_ascii=False),
-                ),
-            )
+            event = self._insert_event(conn, session_id, agent_id, event_type, payload)
+        _publish([(session_id, agent_id, {"events": [event]})])
 
+    def _insert_event(
+        self,
+        conn: sqlite3.Connection,
+        session_id: str,
+        agent_id: str,
+        event_type: str,
+        payload: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """Grava o evento e o devolve no formato de `recentEvents` (com o id).
+
+        Textos longos (a resposta do chat, p.ex.) ficam só como prévia no evento; o
+        original vai comprimido para `transcripts`, referenciado por `transcript_id`.
+        """
+        ts = _now()
+        preview, overflow = split_payload(payload or {})
+        transcript_id = transcripts.store(conn, overflow) if overflow else None
+        cursor = conn.execute(
+            """
+            INSERT INTO events (session_id, agent_id, type, payload, ts, transcript_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                session_id,
+                agent_id,
+                event_type,
+                json.dumps(preview, ensure_ascii=False),
+                ts,
+                transcript_id,
+            ),
+        )
+        event = {"id": cursor.lastrowid, "type": event_type, "payload": preview, "timestamp": ts}
+        if transcript_id:
+            event["truncated"] = True
+        return event
+
+    @traced("progress.update_gaps")
     def update_gaps(self, session_id: str, agent_id: str, gaps: Optional[List[str]]) -> None:
         if gaps is None:
             return
-        self.ensure_profile(session_id, agent_id)
         with _connect() as conn:
-            conn.execute(
-                """
-                UPDATE progress
-                SET gaps = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE session_id = ? AND agent_id = ?
-                """,
-                (json.dumps(gaps, ensure_ascii=False), session_id, agent_id),
-            )
+            self._ensure_profile(conn, session_id, agent_id)
+            self._update_gaps(conn, session_id, agent_id, gaps)
+        _publish([(session_id, agent_id, {"gaps": gaps})])
+
+    def _update_gaps(self, conn: sqlite3.Connection, session_id: str, agent_id: str, gaps: List[str]) -> None:
+        conn.execute(
+            """
+            UPDATE progress
+            SET gaps = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE session_id = ? AND agent_id = ?
+            """,
+            (json.dumps(gaps, ensure_ascii=False), session_id, agent_id),
+        )
 
     def _compute_badges(self, xp: int) -> List[str]:
         return [name for threshold, name in BADGE_THRESHOLDS if xp >= threshold]
@@ -132,37 +274,209 @@ class ProgressTracker:
             "xpToNext": xp_to_next,
         }
 
-    def _fetch_recent_events(self, session_id: str, agent_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+    @traced("progress.fetch_recent_events")
+    def _fetch_recent_events(
+        self,
+        session_id: str,
+        agent_id: str,
+        limit: int = 10,
+        since: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Eventos mais recentes primeiro, já compactos; com `since`, só os de id maior."""
         with _connect() as conn:
             rows = conn.execute(
                 """
-                SELECT type, payload, ts
+                SELECT id, type, payload, ts, transcript_id
                 FROM events
-                WHERE session_id = ? AND agent_id = ?
-                ORDER BY ts DESC
+                WHERE session_id = ? AND agent_id = ? AND id > ?
+                ORDER BY id DESC
                 LIMIT ?
                 """,
-                (session_id, agent_id, limit),
+                (session_id, agent_id, since or 0, limit),
             ).fetchall()
+        return [compact_event(self._row_to_event(row)) for row in rows]
 
-        events: List[Dict[str, Any]] = []
-        for row in rows:
-            payload: Dict[str, Any] = {}
-            if row["payload"]:
-                try:
-                    payload = json.loads(row["payload"])
-                except json.JSONDecodeError:
-                    payload = {"raw": row["payload"]}
-            events.append(
-                {
-                    "type": row["type"],
-                    "payload": payload,
-                    "timestamp": row["ts"],
-                }
+    def _row_to_event(self, row: sqlite3.Row) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {}
+        if row["payload"]:
+            try:
+                payload = json.loads(row["payload"])
+            except json.JSONDecodeError:
+                payload = {"raw": row["payload"]}
+        event = {
+            "id": row["id"],
+            "type": row["type"],
+            "payload": payload,
+            "timestamp": row["ts"],
+        }
+        if row["transcript_id"]:
+            event["truncated"] = True
+        return event
+
+    @traced("progress.get_event")
+    def get_event(self, session_id: str, event_id: int) -> Optional[Dict[str, Any]]:
+        """Evento completo (sem resumo), só se pertencer à sessão.
+
+        Depois da retenção de transcrições, sobra a prévia gravada no evento.
+        """
+        with _connect() as conn:
+            row = conn.execute(
+                "SELECT id, agent_id, type, payload, ts, transcript_id FROM events WHERE id = ? AND session_id = ?",
+                (event_id, session_id),
+            ).fetchone()
+            if row is None:
+                return None
+            full = transcripts.load(conn, row["transcript_id"]) if row["transcript_id"] else None
+        event = {**self._row_to_event(row), "agentId": row["agent_id"]}
+        event.pop("truncated", None)
+        if full:
+            event["payload"] = {**event["payload"], **full}
+        return event
+
+    @traced("progress.vacuum")
+    def vacuum(
+        self,
+        transcript_retention_days: int = TRANSCRIPT_RETENTION_DAYS,
+        event_retention_days: int = EVENT_RETENTION_DAYS,
+        batch_size: int = 500,
+    ) -> Dict[str, Any]:
+        """Manutenção do progress.db (roda em segundo plano no servidor).
+
+        1. migra eventos antigos com textos longos para `transcripts` (em lotes);
+        2. solta as transcrições além da retenção (o evento mantém a prévia);
+        3. apaga eventos além da retenção, se configurada;
+        4. remove transcrições sem referência e roda VACUUM se sobrou muito espaço livre.
+        """
+        stats = {"migrated": 0, "expired": 0, "deleted_events": 0, "deleted_transcripts": 0, "vacuumed": False}
+        last_id = 0
+        with _connect() as conn:
+            while True:
+                rows = conn.execute(
+                    """
+                    SELECT id, payload FROM events
+                    WHERE transcript_id IS NULL AND id > ? AND length(payload) > ?
+                    ORDER BY id LIMIT ?
+                    """,
+                    (last_id, EVENT_SUMMARY_CHARS, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    last_id = row["id"]
+                    try:
+                        payload = json.loads(row["payload"] or "{}")
+                    except json.JSONDecodeError:
+                        continue
+                    preview, overflow = split_payload(payload if isinstance(payload, dict) else {})
+                    if not overflow:
+                        continue
+                    conn.execute(
+                        "UPDATE events SET payload = ?, transcript_id = ? WHERE id = ?",
+                        (json.dumps(preview, ensure_ascii=False), transcripts.store(conn, overflow), row["id"]),
+                    )
+                    stats["migrated"] += 1
+
+            if transcript_retention_days > 0:
+                stats["expired"] = conn.execute(
+                    "UPDATE events SET transcript_id = NULL WHERE transcript_id IS NOT NULL AND ts < datetime('now', ?)",
+                    (f"-{transcript_retention_days} days",),
+                ).rowcount
+            if event_retention_days > 0:
+                stats["deleted_events"] = conn.execute(
+                    "DELETE FROM events WHERE ts < datetime('now', ?)",
+                    (f"-{event_retention_days} days",),
+                ).rowcount
+            stats["deleted_transcripts"] = conn.execute(
+                """
+                DELETE FROM transcripts
+                WHERE NOT EXISTS (SELECT 1 FROM events WHERE events.transcript_id = transcripts.hash)
+                """
+            ).rowcount
+            pages = conn.execute("PRAGMA page_count").fetchone()[0]
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        conn.close()
+
+        if pages and free / pages > VACUUM_FREE_RATIO:
+            # VACUUM não roda dentro de transação: conexão em autocommit
+            vacuum_conn = sqlite3.connect(DB_PATH, isolation_level=None)
+            try:
+                vacuum_conn.execute("VACUUM")
+            finally:
+                vacuum_conn.close()
+            stats["vacuumed"] = True
+        stats["db_bytes"] = Path(DB_PATH).stat().st_size
+        return stats
+
+    # ---- uso de tokens ----
+
+    @traced("progress.add_usage")
+    def add_usage(self, rows: List[Dict[str, Any]]) -> None:
+        """Soma os agregados de uso ao `usage_daily` numa única transação."""
+        if not rows:
+            return
+        keys = ("day", "agent_id", "session_id", "model", "kind")
+        updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in USAGE_COUNTERS)
+        with _connect() as conn:
+            conn.executemany(
+                f"""
+                INSERT INTO usage_daily ({", ".join(keys + USAGE_COUNTERS)})
+                VALUES ({", ".join("?" for _ in keys + USAGE_COUNTERS)})
+                ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {updates}
+                """,
+                [tuple(row[k] for k in keys) + tuple(row.get(c, 0) for c in USAGE_COUNTERS) for row in rows],
             )
-        return events
+        conn.close()
+
+    def usage_summary(
+        self,
+        since_day: str,
+        group_by: List[str],
+        session_id: Optional[str] = None,
+        agent_id: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Totais desde `since_day` (AAAA-MM-DD) agrupados por `USAGE_GROUPS`, maior custo primeiro."""
+        columns = [USAGE_GROUPS[g] for g in group_by]
+        where, params = ["day >= ?"], [since_day]
+        if session_id:
+            where.append("session_id = ?")
+            params.append(session_id)
+        if agent_id:
+            where.append("agent_id = ?")
+            params.append(agent_id)
+        sums = ", ".join(f"SUM({c}) AS {c}" for c in USAGE_COUNTERS)
+        select = ", ".join(columns + [sums])
+        group = f"GROUP BY {', '.join(columns)}" if columns else ""
+        with _connect() as conn:
+            rows = conn.execute(
+                f"SELECT {select} FROM usage_daily WHERE {' AND '.join(where)} {group} ORDER BY cost_usd DESC, total_tokens DESC",
+                params,
+            ).fetchall()
+        conn.close()
+        return [dict(row) for row in rows if row["requests"] is not None]
+
+    def session_tokens(self, session_id: str, day: str) -> int:
+        with _connect() as conn:
+            row = conn.execute(
+                "SELECT COALESCE(SUM(total_tokens), 0) FROM usage_daily WHERE session_id = ? AND day = ?",
+                (session_id, day),
+            ).fetchone()
+        conn.close()
+        return int(row[0])
+
+    def _version(self, conn: sqlite3.Connection, session_id: str, agent_id: str) -> int:
+        return conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM events WHERE session_id = ? AND agent_id = ?",
+            (session_id, agent_id),
+        ).fetchone()[0]
+
+    @traced("progress.version")
+    def version(self, session_id: str, agent_id: str) -> int:
+        """Maior id de evento da sessão/agente (consulta só o índice de eventos)."""
+        with _connect() as conn:
+            return self._version(conn, session_id, agent_id)
 
-    def _load_profile(self, session_id: str, agent_id: str) -> ProgressSummary:
+    @traced("progress.load_profile")
+    def _load_profile(self, session_id: str, agent_id: str, since: Optional[int] = None) -> ProgressSummary:
         self.ensure_profile(session_id, agent_id)
         with _connect() as conn:
             row = conn.execute(
@@ -173,6 +487,7 @@ class ProgressTracker:
                 """,
                 (session_id, agent_id),
             ).fetchone()
+            version = self._version(conn, session_id, agent_id)
 
         xp_total = row["xp_total"] if row else 0
         badges: List[str] = []
@@ -202,7 +517,15 @@ class ProgressTracker:
         if not badges:
             badges = self._compute_badges(xp_total)
 
-        recent_events = self._fetch_recent_events(session_id, agent_id)
+        # Versão do cliente à frente da do servidor (outro agente/banco): manda tudo
+        if since is not None and since > version:
+            since = None
+        if since is None:
+            recent_events = self._fetch_recent_events(session_id, agent_id)
+        else:
+            recent_events = self._fetch_recent_events(session_id, agent_id, limit=DELTA_MAX_EVENTS + 1, since=since)
+            if len(recent_events) > DELTA_MAX_EVENTS:
+                since, recent_events = None, recent_events[:10]
         return ProgressSummary(
             xp=xp_total,
             goal=XP_GOAL,
@@ -210,8 +533,60 @@ class ProgressTracker:
             path_position=path_position,
             gaps=gaps,
             recent_events=recent_events,
+            version=version,
+            since=since,
         )
 
+    def _apply_award(self, conn: sqlite3.Connection, award: XpAward) -> Dict[str, Any]:
+        """Aplica XP, lacunas e eventos de um award dentro da transação `conn`; devolve o delta."""
+        self._ensure_profile(conn, award.session_id, award.agent_id)
+        row = conn.execute(
+            "SELECT xp_total FROM progress WHERE session_id = ? AND agent_id = ?",
+            (award.session_id, award.agent_id),
+        ).fetchone()
+        current_xp = row["xp_total"] if row else 0
+        new_xp = max(0, current_xp + max(0, award.amount))
+        badges = self._compute_badges(new_xp)
+        path_position = self._compute_path_position(new_xp)
+        conn.execute(
+            """
+            UPDATE progress
+            SET xp_total = ?, level = ?, badges = ?, path_position = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE session_id = ? AND agent_id = ?
+            """,
+            (
+                new_xp,
+                path_position["level"],
+                json.dumps(badges, ensure_ascii=False),
+                json.dumps(path_position, ensure_ascii=False),
+                award.session_id,
+                award.agent_id,
+            ),
+        )
+
+        delta: Dict[str, Any] = {
+            "xp": new_xp,
+            "awarded": award.amount,
+            "badges": badges,
+            "pathPosition": path_position,
+        }
+        if award.gaps:
+            self._update_gaps(conn, award.session_id, award.agent_id, award.gaps)
+            delta["gaps"] = award.gaps
+
+        event_payload = award.payload.copy() if award.payload else {}
+        event_payload.update({
+            "xp": award.amount,
+            "reason": award.reason,
+        })
+        events = [self._insert_event(conn, award.session_id, award.agent_id, "xp", event_payload)]
+
+        if award.event_type:
+            events.append(self._insert_event(conn, award.session_id, award.agent_id, award.event_type, award.event_payload))
+        delta["events"] = events
+        return delta
+
+    @traced("progress.award_xp")
     def award_xp(
         self,
         session_id: str,
@@ -220,46 +595,49 @@ class ProgressTracker:
         reason: str,
         payload: Optional[Dict[str, Any]] = None,
         gaps: Optional[List[str]] = None,
+        since: Optional[int] = None,
     ) -> ProgressSummary:
-        self.ensure_profile(session_id, agent_id)
+        """Concede XP; com `since` (versão do cliente) o resumo traz só os eventos novos."""
+        award = XpAward(session_id, agent_id, amount, reason, payload=payload, gaps=gaps)
         with _connect() as conn:
-            row = conn.execute(
-                "SELECT xp_total FROM progress WHERE session_id = ? AND agent_id = ?",
-                (session_id, agent_id),
-            ).fetchone()
-            current_xp = row["xp_total"] if row else 0
-            new_xp = max(0, current_xp + max(0, amount))
-            badges = self._compute_badges(new_xp)
-            path_position = self._compute_path_position(new_xp)
-            conn.execute(
-                """
-                UPDATE progress
-                SET xp_total = ?, level = ?, badges = ?, path_position = ?, updated_at = CURRENT_TIMESTAMP
-                WHERE session_id = ? AND agent_id = ?
-                """,
-                (
-                    new_xp,
-                    path_position["level"],
-                    json.dumps(badges, ensure_ascii=False),
-                    json.dumps(path_position, ensure_ascii=False),
-                    session_id,
-                    agent_id,
-                ),
-            )
-
-        if gaps:
-            self.update_gaps(session_id, agent_id, gaps)
-
-        event_payload = payload.copy() if payload else {}
-        event_payload.update({
-            "xp": amount,
-            "reason": reason,
-        })
-        self.log_event(session_id, agent_id, "xp", event_payload)
+            delta = self._apply_award(conn, award)
+        _publish([(session_id, agent_id, delta)])
 
-        summary = self._load_profile(session_id, agent_id)
+        summary = self._load_profile(session_id, agent_id, since=since)
         summary.awarded = amount
         return summary
 
-    def get_progress(self, session_id: str, agent_id: str) -> ProgressSummary:
-        return self._load_profile(session_id, agent_id)
+    @traced("progress.award_xp_batch")
+    def award_xp_batch(
+        self,
+        awards: List[XpAward],
+        since: Optional[int] = None,
+    ) -> Dict[Tuple[str, str], ProgressSummary]:
+        """Persiste vários awards numa única transação.
+
+        Retorna o resumo final de cada par (session_id, agent_id) afetado; `awarded`
+        soma o XP concedido àquele par no lote. `since` vale para todos os pares (use
+        com um único aluno, como no /api/grade).
+        """
+        if not awards:
+            return {}
+
+        with _connect() as conn:
+            deltas = [(award.session_id, award.agent_id, self._apply_award(conn, award)) for award in awards]
+        _publish(deltas)
+
+        awarded: Dict[Tuple[str, str], int] = {}
+        for award in awards:
+            key = (award.session_id, award.agent_id)
+            awarded[key] = awarded.get(key, 0) + award.amount
+
+        summaries: Dict[Tuple[str, str], ProgressSummary] = {}
+        for key, amount in awarded.items():
+            summary = self._load_profile(*key, since=since)
+            summary.awarded = amount
+            summaries[key] = summary
+        return summaries
+
+    @traced("progress.get_progress")
+    def get_progress(self, session_id: str, agent_id: str, since: Optional[int] = None) -> ProgressSummary:
+        return self._load_profile(session_id, agent_id, since=since)
@@ -0,0 +1,256 @@
+"""Avaliação de qualidade e latência da recuperação contra um conjunto rotulado.
+
+    python -m src.backend.rag.evaluate --qrels qrels.jsonl --agent tutor --agent helper --k 1,3,5,10
+
+Cada linha do `qrels.jsonl` é uma consulta rotulada:
+
+    {"query": "o que é fração equivalente?", "relevant": ["frações.pdf::#3"], "answers": ["fração equivalente"]}
+
+`relevant` lista ids de chunk (`meta.json`); `answers` lista trechos de texto — um hit que
+contém o trecho conta como relevante, o que mantém o rótulo válido quando o chunking muda.
+Para cada agente (índice + `rag_k` do `AgentConfig`) o relatório traz recall@k, MRR e
+nDCG@k, latência por consulta no `search_chunks` e no `search_chunks_batch`, e a memória
+do índice, lado a lado.
+"""
+import argparse
+import json
+import math
+import resource
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from ..agents.config import get_agent_config
+from ..openai_gateway import BATCH, priority
+from . import retriever
+from .quantization import resident_bytes
+
+DEFAULT_CUTOFFS = (1, 3, 5, 10)
+
+
+@dataclass
+class LabeledQuery:
+    query: str
+    relevant: List[str] = field(default_factory=list)
+    answers: List[str] = field(default_factory=list)
+
+    @property
+    def units(self) -> int:
+        return len(self.relevant) + len(self.answers)
+
+
+def load_qrels(path: Path) -> List[LabeledQuery]:
+    """Lê o conjunto rotulado (JSONL ou lista JSON)."""
+    text = Path(path).read_text(encoding="utf-8")
+    stripped = text.lstrip()
+    rows = json.loads(stripped) if stripped.startswith("[") else [
+        json.loads(line) for line in text.splitlines() if line.strip()
+    ]
+    labeled = []
+    for row in rows:
+        item = LabeledQuery(
+            query=row["query"],
+            relevant=list(row.get("relevant") or []),
+            answers=list(row.get("answers") or []),
+        )
+        if not item.units:
+            raise ValueError(f"Consulta sem rótulos: {item.query!r}")
+        labeled.append(item)
+    return labeled
+
+
+def _matched_units(hit: Dict[str, Any], item: LabeledQuery) -> List[int]:
+    """Índices das unidades relevantes (ids, depois trechos) que o hit satisfaz."""
+    units = [i for i, rid in enumerate(item.relevant) if hit.get("id") == rid]
+    snippet = (hit.get("snippet") or "").casefold()
+    offset = len(item.relevant)
+    units += [offset + i for i, answer in enumerate(item.answers) if answer.casefold() in snippet]
+    return units
+
+
+def score_ranking(hits: Sequence[Dict[str, Any]], item: LabeledQuery, cutoffs: Sequence[int]) -> Dict[str, float]:
+    """recall@k, nDCG@k e reciprocal rank de uma lista de hits (cada unidade conta uma vez)."""
+    credited: set = set()
+    gains: List[int] = []
+    first_rank: Optional[int] = None
+    for rank, hit in enumerate(hits, start=1):
+        new = set(_matched_units(hit, item)) - credited
+        if new and first_rank is None:
+            first_rank = rank
+        credited |= new
+        gains.append(1 if new else 0)
+
+    scores: Dict[str, float] = {"rr": 1.0 / first_rank if first_rank else 0.0}
+    for k in cutoffs:
+        top = gains[:k]
+        dcg = sum(g / math.log2(rank + 1) for rank, g in enumerate(top, start=1))
+        ideal = sum(1 / math.log2(rank + 1) for rank in range(1, min(item.units, k) + 1))
+        scores[f"recall@{k}"] = sum(top) / item.units
+        scores[f"ndcg@{k}"] = dcg / ideal if ideal else 0.0
+    return scores
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] * 1000, 3)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+
+def _rss_mb() -> float:
+    """Pico de memória residente do processo (ru_maxrss: KB no Linux, bytes no macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def index_memory(index: Any, meta: List[Dict]) -> Dict[str, Any]:
+    """Tamanho residente do índice (sem os vetores de re-ranking em mmap) e do metadata."""
+    return {
+        "vectors": int(index.ntotal),
+        "dim": int(index.d),
+        "index_type": type(index).__name__,
+        "index_mb": round(resident_bytes(index) / 1e6, 2),
+        "meta_mb": round(len(json.dumps(meta, ensure_ascii=False).encode("utf-8")) / 1e6, 2),
+    }
+
+
+def evaluate_agent(
+    agent_id: str,
+    qrels: List[LabeledQuery],
+    cutoffs: Sequence[int] = DEFAULT_CUTOFFS,
+    batch_size: int = 32,
+    use_agent_filters: bool = False,
+    rerank: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """Avalia o índice de `agent_id` pelos dois caminhos de busca."""
+    config = get_agent_config(agent_id)
+    cutoffs = sorted(set(cutoffs) | {config.rag_k})
+    depth = max(cutoffs)
+    filters = config.filters if use_agent_filters else None
+
+    rss_before = _rss_mb()
+    index, meta = retriever._load_agent_index(agent_id)
+    if index is None or meta is None:
+        return {"agent_id": agent_id, "error": "Índice não encontrado; rode a ingestão."}
+
+    single_hits, single_lat = [], []
+    for item in qrels:
+        start = time.perf_counter()
+        single_hits.append(retriever.search_chunks(
+            item.query, k=depth, agent_id=agent_id, filters=filters, rerank=rerank
+        ))
+        single_lat.append(time.perf_counter() - start)
+
+    batch_hits: List[List[Dict]] = []
+    batch_lat: List[float] = []
+    for offset in range(0, len(qrels), batch_size):
+        chunk = [item.query for item in qrels[offset:offset + batch_size]]
+        start = time.perf_counter()
+        batch_hits.extend(retriever.search_chunks_batch(
+            chunk, k=depth, agent_id=agent_id, filters=filters, rerank=rerank
+        ))
+        # Latência amortizada por consulta dentro do lote
+        batch_lat.extend([(time.perf_counter() - start) / len(chunk)] * len(chunk))
+
+    per_query = [score_ranking(hits, item, cutoffs) for hits, item in zip(single_hits, qrels)]
+    quality = {
+        name: round(sum(scores[name] for scores in per_query) / len(per_query), 4)
+        for name in per_query[0]
+    }
+    quality["mrr"] = quality.pop("rr")
+    mismatches = sum(
+        [h["id"] for h in a] != [h["id"] for h in b] for a, b in zip(single_hits, batch_hits)
+    )
+
+    return {
+        "agent_id": agent_id,
+        "rag_k": config.rag_k,
+        "embed_model": config.embed_model,
+        "index_info": retriever.get_index_info(agent_id),
+        "filters": filters,
+        "rerank": config.rag_rerank if rerank is None else rerank,
+        "queries": len(qrels),
+        "quality": quality,
+        "at_rag_k": {
+            "recall": quality[f"recall@{config.rag_k}"],
+            "ndcg": quality[f"ndcg@{config.rag_k}"],
+        },
+        "latency": {
+            "single": _percentiles(single_lat),
+            "batch": {**_percentiles(batch_lat), "batch_size": batch_size},
+        },
+        "batch_mismatches": mismatches,
+        "memory": {
+            **index_memory(index, meta),
+            "process_peak_rss_mb": _rss_mb(),
+            "rss_growth_mb": round(_rss_mb() - rss_before, 1),
+        },
+    }
+
+
+def _table(reports: List[Dict[str, Any]], cutoffs: Sequence[int]) -> str:
+    headers = ["agente", "rag_k", "R@rag_k"] + [f"R@{k}" for k in cutoffs] + ["MRR"] + [f"nDCG@{k}" for k in cutoffs]
+    headers += ["p50 ms", "p99 ms", "lote p50 ms", "quantização", "índice MB"]
+    rows = [headers]
+    for report in reports:
+        if "error" in report:
+            rows.append([report["agent_id"], report["error"]])
+            continue
+        q = report["quality"]
+        rows.append(
+            [report["agent_id"], str(report["rag_k"]), f"{report['at_rag_k']['recall']:.3f}"]
+            + [f"{q.get(f'recall@{k}', 0):.3f}" for k in cutoffs]
+            + [f"{q['mrr']:.3f}"]
+            + [f"{q.get(f'ndcg@{k}', 0):.3f}" for k in cutoffs]
+            + [
+                f"{report['latency']['single']['p50_ms']:.2f}",
+                f"{report['latency']['single']['p99_ms']:.2f}",
+                f"{report['latency']['batch']['p50_ms']:.2f}",
+                f"{report['index_info']['quantization']}/{report['memory']['dim']}",
+                f"{report['memory']['index_mb']:.1f}",
+            ]
+        )
+    widths = [max(len(row[i]) for row in rows if i < len(row)) for i in range(len(headers))]
+    return "\n".join("  ".join(cell.ljust(widths[i]) for i, cell in enumerate(row)) for row in rows)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Avalia recall/MRR/nDCG e latência do retriever.")
+    parser.add_argument("--qrels", type=Path, required=True, help="Consultas rotuladas (JSONL)")
+    parser.add_argument("--agent", action="append", dest="agents", help="Agente a avaliar (repetível)")
+    parser.add_argument("--k", default=",".join(map(str, DEFAULT_CUTOFFS)), help="Cortes, ex.: 1,3,5,10")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--use-agent-filters", action="store_true", help="Aplica os filtros do AgentConfig")
+    parser.add_argument(
+        "--rerank",
+        choices=["config", "on", "off"],
+        default="config",
+        help="Re-ranking MMR: segue o AgentConfig (padrão) ou força on/off",
+    )
+    parser.add_argument("--output", type=Path, default=None, help="Salva o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    qrels = load_qrels(args.qrels)
+    cutoffs = sorted({int(k) for k in args.k.split(",") if k.strip()})
+    rerank = {"config": None, "on": True, "off": False}[args.rerank]
+    # Rodando ao lado da API, a avaliação não disputa a cota com o chat
+    with priority(BATCH):
+        reports = [
+            evaluate_agent(agent_id, qrels, cutoffs, args.batch_size, args.use_agent_filters, rerank)
+            for agent_id in (args.agents or ["tutor"])
+        ]
+
+    print(_table(reports, cutoffs))
+    if args.output:
+        args.output.write_text(json.dumps(reports, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"Relatório salvo em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,26 @@
+import argparse
 import json
+import os
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 
-import faiss
 import numpy as np
-from dotenv import load_dotenv
-from openai import OpenAI
 from pypdf import PdfReader
 
-load_dotenv()
-client = OpenAI()
+from ..agents.config import get_agent_config
+from ..openai_gateway import BATCH, get_gateway
+from ..usage import get_usage_recorder, usage_scope
+from .quantization import QUANTIZATIONS, write_index_files
+from .registry import META_FILE, read_index_info, register_index
+from .shards import get_shard_cache, register_shard, shard_dir, shard_id
 
 DATA_DIR = Path(__file__).parent / "data"
 INDEX_DIR = Path(__file__).parent / "index"
-INDEX_DIR.mkdir(exist_ok=True, parents=True)
 
 EMBED_MODEL = "text-embedding-3-large"
+# Textos por chamada de embeddings (a API aceita até 2048; lotes menores dividem bem a cota de TPM)
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "256"))
 
 
 def read_pdf(path: Path) -> str:
@@ -45,19 +50,62 @@ def chunk_text(text: str, max_tokens: int = 800, overlap: int = 150) -> List[str
     return chunks
 
 
-def embed_texts(texts: List[str]) -> np.ndarray:
-    resp = client.embeddings.create(model=EMBED_MODEL, input=texts)
-    vecs = [d.embedding for d in resp.data]
+def embed_texts(texts: List[str], dimensions: Optional[int] = None, model: str = EMBED_MODEL) -> np.ndarray:
+    # Truncagem Matryoshka (`dimensions`): a API devolve o prefixo já renormalizado.
+    # Prioridade de lote: o chat e a busca do tutor passam na frente na fila do gateway.
+    vecs = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        resp = get_gateway().create_embeddings(model, texts[start:start + EMBED_BATCH_SIZE], dimensions, level=BATCH)
+        vecs.extend(d.embedding for d in resp.data)
     return np.array(vecs, dtype="float32")
 
 
-def main() -> None:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Gera embeddings e o índice FAISS do acervo.")
+    parser.add_argument(
+        "--dimensions",
+        type=int,
+        default=None,
+        help="Trunca os embeddings (ex.: 256, 1024) — só modelos text-embedding-3-*",
+    )
+    parser.add_argument(
+        "--quantization",
+        choices=QUANTIZATIONS,
+        default="none",
+        help="none (float32), fp16 (2x menor), sq8 (4x) ou binary (32x + re-ranking em fp16)",
+    )
+    parser.add_argument(
+        "--agent",
+        action="append",
+        dest="agents",
+        help="Gera o índice com o embed_model e o chunking do agente (repetível: agentes compartilham o índice)",
+    )
+    parser.add_argument("--name", default=None, help="Nome do índice em index/ (padrão: o primeiro --agent)")
+    parser.add_argument("--tenant", default=None, help="Escola dona do shard (exige --subject)")
+    parser.add_argument("--subject", default=None, help="Disciplina do shard, p.ex. matematica (exige --tenant)")
+    parser.add_argument("--data-dir", type=Path, default=None, help="Materiais a indexar (padrão: rag/data/)")
+    parser.add_argument(
+        "--reembed",
+        action="store_true",
+        help="Reaproveita os chunks do meta.json do índice e só refaz os embeddings (p.ex. após trocar o modelo)",
+    )
+    # O servidor grava a configuração em vigor no job (o worker não vê /api/agents/config)
+    parser.add_argument("--embed-model", default=None, help="Sobrepõe o embed_model do agente")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Sobrepõe o rag_chunk_size do agente")
+    parser.add_argument("--overlap", type=int, default=None, help="Sobrepõe o rag_overlap do agente")
+    args = parser.parse_args(argv)
+    if bool(args.tenant) != bool(args.subject):
+        parser.error("--tenant e --subject devem ser usados juntos")
+    if args.tenant and args.name:
+        parser.error("--name não se aplica a shards (o nome é <tenant>/<disciplina>)")
+    if args.reembed and args.data_dir:
+        parser.error("--reembed usa os chunks já indexados; não combine com --data-dir")
+    return args
+
+
+def load_documents(chunk_size: int = 800, overlap: int = 150, data_dir: Optional[Path] = None) -> List[Dict]:
     docs: List[Dict] = []
-    if not DATA_DIR.exists():
-        print(f"Diretório de dados não existe: {DATA_DIR}")
-        return
-
-    for f in DATA_DIR.rglob("*"):
+    for f in sorted((data_dir or DATA_DIR).rglob("*")):
         if f.is_dir():
             continue
         suffix = f.suffix.lower()
@@ -68,24 +116,116 @@ def main() -> None:
         else:
             continue
 
-        for i, c in enumerate(chunk_text(text)):
+        for i, c in enumerate(chunk_text(text, max_tokens=chunk_size, overlap=overlap)):
             docs.append({"id": f"{f.name}::#{i}", "source": f.name, "text": c})
-
-    if not docs:
-        print(f"Nenhum documento encontrado em {DATA_DIR}.")
-        return
-
-    print(f"Chunks: {len(docs)} — gerando embeddings ({EMBED_MODEL})…")
-    embs = embed_texts([d["text"] for d in docs])
-
-    faiss.normalize_L2(embs)
-    index = faiss.IndexFlatIP(embs.shape[1])
-    index.add(embs)
-
-    faiss.write_index(index, str(INDEX_DIR / "faiss.index"))
-    (INDEX_DIR / "meta.json").write_text(json.dumps(docs, ensure_ascii=False), encoding="utf-8")
-    print(f"OK! Índice salvo em {INDEX_DIR}/ (faiss.index + meta.json)")
-
+    return docs
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    with usage_scope("ingest"):
+        run(parse_args(argv))
+    get_usage_recorder().flush()
+
+
+def run(
+    args: argparse.Namespace,
+    embed: Callable[..., np.ndarray] = embed_texts,
+    log: Callable[[str], None] = print,
+) -> Optional[Dict]:
+    """Gera e registra o índice descrito por `args`; devolve o index_info (None se não há documentos).
+
+    `embed` e `log` são trocados pelo job de ingestão (checkpoints e progresso).
+    """
+    agents = args.agents or []
+    if agents:
+        configs = [get_agent_config(agent_id) for agent_id in agents]
+        models = {c.embed_model for c in configs}
+        if len(models) > 1:
+            raise SystemExit(
+                "Agentes com embed_model diferentes não podem compartilhar um índice: "
+                + ", ".join(f"{a}={c.embed_model}" for a, c in zip(agents, configs))
+            )
+        embed_model = models.pop()
+        # O chunking do índice compartilhado é o do primeiro agente
+        chunk_size, overlap = configs[0].rag_chunk_size, configs[0].rag_overlap
+        if any((c.rag_chunk_size, c.rag_overlap) != (chunk_size, overlap) for c in configs[1:]):
+            log(f"Aviso: usando o chunking de '{agents[0]}' ({chunk_size}/{overlap}) para todos os agentes.")
+        name = args.name or agents[0]
+        target_dir = INDEX_DIR / name
+    else:
+        # Sem --agent: índice global (fallback de todos os agentes com o modelo padrão)
+        embed_model, chunk_size, overlap = EMBED_MODEL, 800, 150
+        name = None
+        target_dir = INDEX_DIR
+
+    shard = None
+    if args.tenant:
+        try:
+            shard = shard_id(args.tenant, args.subject)
+        except ValueError as exc:
+            raise SystemExit(str(exc))
+        # Shard: o agente só define modelo e chunking; quem busca nele é o escopo da requisição
+        name = None
+        target_dir = shard_dir(shard, INDEX_DIR)
+
+    embed_model = args.embed_model or embed_model
+    chunk_size = args.chunk_size or chunk_size
+    overlap = overlap if args.overlap is None else args.overlap
+
+    if args.reembed:
+        meta_path = Path(target_dir) / META_FILE
+        if not meta_path.exists():
+            raise SystemExit(f"Nada para re-embutir: {meta_path} não existe.")
+        docs = json.loads(meta_path.read_text(encoding="utf-8"))
+        # Os chunks são os do índice atual
+        previous = read_index_info(target_dir)
+        chunk_size, overlap = previous.get("chunk_size", chunk_size), previous.get("overlap", overlap)
+    else:
+        data_dir = args.data_dir or DATA_DIR
+        if not data_dir.exists():
+            log(f"Diretório de dados não existe: {data_dir}")
+            return None
+
+        docs = load_documents(chunk_size, overlap, data_dir)
+        if not docs:
+            log(f"Nenhum documento encontrado em {data_dir}.")
+            return None
+
+    dims = f", {args.dimensions} dims" if args.dimensions else ""
+    log(f"Chunks: {len(docs)} — gerando embeddings ({embed_model}{dims})…")
+    embs = embed([d["text"] for d in docs], dimensions=args.dimensions, model=embed_model)
+
+    info = write_index_files(
+        target_dir,
+        embs,
+        docs,
+        embed_model=embed_model,
+        dimensions=args.dimensions,
+        quantization=args.quantization,
+        extra={
+            "name": shard or name,
+            "agents": agents,
+            "chunk_size": chunk_size,
+            "overlap": overlap,
+            "version": int(read_index_info(target_dir).get("version", 0)) + 1,
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+    )
+    if shard:
+        register_shard(shard, info, root=INDEX_DIR)
+        # Reingestão: a próxima busca recarrega o shard do disco
+        get_shard_cache().discard(shard)
+    elif name:
+        register_index(name, agents, info, root=INDEX_DIR)
+    log(
+        f"OK! Índice salvo em {target_dir}/ (faiss.index + meta.json + index_info.json; "
+        f"{info['dimensions']} dims, quantização {info['quantization']}, versão {info['version']})"
+    )
+    if shard:
+        log(f"Shard registrado: {shard}")
+    elif agents:
+        log(f"Agentes usando este índice: {', '.join(agents)}")
+    return info
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,185 @@
+"""Formatos de armazenamento do índice FAISS (float32, SQ8, fp16 e binário com re-ranking).
+
+Ao lado de `faiss.index` + `meta.json`, a ingestão grava `index_info.json` com o modelo
+de embeddings, a dimensão e a quantização usadas; o retriever lê esse arquivo para
+embutir as consultas exatamente como o índice foi construído.
+
+Memória residente por vetor de 3072 dims: none 12 KB · fp16 6 KB · sq8 3 KB ·
+binary 384 B (+ vetores fp16 em disco, mapeados com mmap, só para re-ranquear a shortlist).
+"""
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from .registry import INDEX_FILE, INFO_FILE, META_FILE
+
+RERANK_FILE = "vectors.f16.npy"
+
+QUANTIZATIONS = ("none", "sq8", "fp16", "binary")
+# Shortlist do índice binário = k × fator, re-ranqueada com os vetores em ponto flutuante
+BINARY_RERANK_FACTOR = int(os.getenv("RAG_BINARY_RERANK_FACTOR", "10"))
+
+
+class BinaryRerankIndex:
+    """Busca por Hamming nos bits de sinal e re-ranking por produto interno em fp16.
+
+    Expõe `search`, `ntotal` e `d` como um `faiss.Index` comum, então o retriever
+    não precisa saber qual formato está carregado.
+    """
+
+    def __init__(self, index: faiss.IndexBinary, vectors: np.ndarray, rerank_factor: int = BINARY_RERANK_FACTOR) -> None:
+        self.index = index
+        self.vectors = vectors
+        self.rerank_factor = max(1, rerank_factor)
+        self.ntotal = index.ntotal
+        self.d = index.d
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        shortlist = min(self.ntotal, max(k, k * self.rerank_factor))
+        _, candidates = self.index.search(binarize(queries), shortlist)
+        scores = np.full((len(queries), k), -np.inf, dtype="float32")
+        ids = np.full((len(queries), k), -1, dtype="int64")
+        for row, query in enumerate(queries):
+            cand = candidates[row][candidates[row] >= 0]
+            if not len(cand):
+                continue
+            # Leitura ordenada do mmap é mais amigável ao page cache
+            order = np.sort(cand)
+            sims = self.vectors[order].astype("float32") @ query
+            top = np.argsort(-sims)[:k]
+            scores[row, :len(top)] = sims[top]
+            ids[row, :len(top)] = order[top]
+        return scores, ids
+
+    def reconstruct_batch(self, ids: np.ndarray) -> np.ndarray:
+        return np.asarray(self.vectors[np.asarray(ids)], dtype="float32")
+
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """Bits de sinal empacotados (d/8 bytes por vetor)."""
+    return np.packbits(vectors > 0, axis=1)
+
+
+def build_index(vectors: np.ndarray, quantization: str = "none") -> Any:
+    """Constrói o índice para `vectors` já normalizados (produto interno = cosseno)."""
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Quantização inválida: {quantization} (use {', '.join(QUANTIZATIONS)})")
+    dim = vectors.shape[1]
+    if quantization == "none":
+        index = faiss.IndexFlatIP(dim)
+    elif quantization == "binary":
+        if dim % 8:
+            raise ValueError(f"Quantização binária exige dimensão múltipla de 8 (recebido {dim})")
+        index = faiss.IndexBinaryFlat(dim)
+        index.add(binarize(vectors))
+        return index
+    else:
+        qtype = faiss.ScalarQuantizer.QT_8bit if quantization == "sq8" else faiss.ScalarQuantizer.QT_fp16
+        index = faiss.IndexScalarQuantizer(dim, qtype, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def _replace_file(path: Path, write: Callable[[Path], None]) -> None:
+    """`write(tmp)` num temporário da mesma pasta, fsync e `os.replace` para `path`.
+
+    Quem já abriu o arquivo antigo (ex.: o mmap dos vetores do re-ranking) continua
+    lendo o conteúdo antigo; ninguém vê um arquivo pela metade.
+    """
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp)
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _write_text(text: str) -> Callable[[Path], None]:
+    return lambda tmp: tmp.write_text(text, encoding="utf-8")
+
+
+def _save_array(array: np.ndarray) -> Callable[[Path], None]:
+    def write(tmp: Path) -> None:
+        # Com um arquivo aberto o np.save não acrescenta ".npy" ao nome do temporário
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+
+    return write
+
+
+def _fsync_dir(index_dir: Path) -> None:
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(index_dir, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_index_files(
+    index_dir: Path,
+    vectors: np.ndarray,
+    docs: list,
+    embed_model: str,
+    dimensions: Optional[int] = None,
+    quantization: str = "none",
+    extra: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Normaliza, indexa e grava índice + meta + `index_info.json`; devolve o info.
+
+    Cada arquivo é trocado atomicamente e o `index_info.json` vai por último: é ele que
+    marca a gravação como concluída para quem recarrega o índice.
+    """
+    index_dir = Path(index_dir)
+    index_dir.mkdir(parents=True, exist_ok=True)
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    faiss.normalize_L2(vectors)
+    index = build_index(vectors, quantization)
+
+    if quantization == "binary":
+        _replace_file(index_dir / INDEX_FILE, lambda tmp: faiss.write_index_binary(index, str(tmp)))
+        _replace_file(index_dir / RERANK_FILE, _save_array(vectors.astype("float16")))
+    else:
+        _replace_file(index_dir / INDEX_FILE, lambda tmp: faiss.write_index(index, str(tmp)))
+    _replace_file(index_dir / META_FILE, _write_text(json.dumps(docs, ensure_ascii=False)))
+
+    info = {
+        "embed_model": embed_model,
+        "dimensions": int(vectors.shape[1]),
+        "requested_dimensions": dimensions,
+        "quantization": quantization,
+        "metric": "inner_product",
+        "count": int(vectors.shape[0]),
+        **(extra or {}),
+    }
+    _replace_file(index_dir / INFO_FILE, _write_text(json.dumps(info, ensure_ascii=False, indent=2)))
+    if quantization != "binary":
+        # Só depois do info novo: até ali um leitor ainda pode seguir o info binário antigo
+        (index_dir / RERANK_FILE).unlink(missing_ok=True)
+    _fsync_dir(index_dir)
+    return info
+
+
+def read_index(index_dir: Path, info: Dict[str, Any]) -> Any:
+    """Carrega o índice no formato indicado por `info`."""
+    index_path = str(Path(index_dir) / INDEX_FILE)
+    if info.get("quantization") == "binary":
+        vectors = np.load(Path(index_dir) / RERANK_FILE, mmap_mode="r")
+        return BinaryRerankIndex(faiss.read_index_binary(index_path), vectors)
+    return faiss.read_index(index_path)
+
+
+def resident_bytes(index: Any) -> int:
+    """Bytes que o índice ocupa em memória (os vetores do re-ranking ficam no mmap)."""
+    if isinstance(index, BinaryRerankIndex):
+        return int(faiss.serialize_index_binary(index.index).nbytes)
+    return int(faiss.serialize_index(index).nbytes)
@@ -0,0 +1,117 @@
+"""Registro dos índices RAG: qual índice cada agente usa e com que parâmetros foi construído.
+
+`index/registry.json` guarda, por índice, o `index_info.json` gravado na ingestão (modelo
+de embeddings, dimensão, quantização, chunking, versão) e o mapa agente → índice:
+
+    {"indexes": {"planner-small": {...}}, "agents": {"planner": "planner-small", "helper": "planner-small"},
+     "shards": {"escola-a/matematica": {...}}}
+
+Agentes apontando para o mesmo índice compartilham uma única cópia em memória no
+retriever. Um índice construído com um modelo diferente do `AgentConfig.embed_model`
+do agente é recusado com `IndexMismatchError` no carregamento.
+"""
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from ..agents.config import get_agent_config
+
+INDEX_FILE = "faiss.index"
+META_FILE = "meta.json"
+INFO_FILE = "index_info.json"
+INDEX_ROOT = Path(__file__).parent / "index"
+REGISTRY_FILE = "registry.json"
+# Modelo dos índices antigos, gravados antes do index_info.json
+LEGACY_EMBED_MODEL = "text-embedding-3-large"
+
+_lock = threading.Lock()
+
+
+class IndexMismatchError(RuntimeError):
+    """O índice foi construído com outro modelo de embeddings que o do agente."""
+
+
+def _registry_path(root: Path) -> Path:
+    return Path(root) / REGISTRY_FILE
+
+
+def load_registry(root: Optional[Path] = None) -> Dict[str, Any]:
+    path = _registry_path(root or INDEX_ROOT)
+    if not path.exists():
+        return {"indexes": {}, "agents": {}}
+    data = json.loads(path.read_text(encoding="utf-8"))
+    data.setdefault("indexes", {})
+    data.setdefault("agents", {})
+    return data
+
+
+def update_registry(mutate: Callable[[Dict[str, Any]], None], root: Optional[Path] = None) -> Dict[str, Any]:
+    """Lê, aplica `mutate` e grava o registry.json de forma atômica."""
+    with _lock:
+        data = load_registry(root)
+        mutate(data)
+        path = _registry_path(root or INDEX_ROOT)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+        return data
+
+
+def register_index(name: str, agents: List[str], info: Dict[str, Any], root: Optional[Path] = None) -> Dict[str, Any]:
+    """Grava/atualiza o índice `name` e aponta `agents` para ele (escrita atômica)."""
+
+    def mutate(data: Dict[str, Any]) -> None:
+        data["indexes"][name] = {**info, "registered_at": _now()}
+        for agent_id in agents:
+            data["agents"][agent_id] = name
+
+    return update_registry(mutate, root)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def read_index_info(index_dir: Path) -> Dict[str, Any]:
+    """`index_info.json` do diretório; índices antigos (sem o arquivo) devolvem {}."""
+    path = Path(index_dir) / INFO_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _has_index(path: Path) -> bool:
+    return (path / INDEX_FILE).exists() and (path / META_FILE).exists()
+
+
+def resolve_index_dir(agent_id: str, root: Optional[Path] = None) -> Optional[Path]:
+    """Diretório do índice do agente: registro → `index/<agente>` → índice global antigo."""
+    root = Path(root or INDEX_ROOT)
+    name = load_registry(root)["agents"].get(agent_id)
+    candidates = ([root / name] if name else []) + [root / agent_id, root]
+    for path in candidates:
+        if _has_index(path):
+            return path.resolve()
+    return None
+
+
+def effective_info(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Completa o info de índices antigos (sem `index_info.json`)."""
+    return {"embed_model": LEGACY_EMBED_MODEL, "quantization": "none", "version": 0, **info}
+
+
+def check_compatible(agent_id: str, info: Dict[str, Any], index_dir: Optional[Path] = None) -> None:
+    """Garante que o índice foi embutido com o mesmo modelo configurado para o agente."""
+    expected = get_agent_config(agent_id).embed_model
+    actual = effective_info(info)["embed_model"]
+    if expected and actual != expected:
+        where = f" em {index_dir}" if index_dir else ""
+        raise IndexMismatchError(
+            f"Índice{where} foi gerado com '{actual}', mas o agente '{agent_id}' usa '{expected}'. "
+            f"Rode `python -m src.backend.rag.ingest --agent {agent_id}` ou ajuste o embed_model."
+        )
+
@@ -0,0 +1,151 @@
+"""Re-ranking local e barato dos chunks recuperados (sem cross-encoder, sem chamada à API).
+
+O retriever busca `k × fetch_factor` candidatos no FAISS e esta etapa:
+1. combina o cosseno do FAISS com a sobreposição lexical entre consulta e chunk;
+2. escolhe `k` por MMR (Maximal Marginal Relevance), penalizando chunks parecidos com
+   os já escolhidos — a similaridade entre candidatos usa os vetores do próprio índice;
+3. recorta o snippet em volta dos termos da consulta em vez de pegar o início do texto.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Set
+
+import numpy as np
+
+# Palavras funcionais do PT-BR que não dizem nada sobre relevância
+STOPWORDS = {
+    "a", "ao", "aos", "as", "com", "como", "da", "das", "de", "do", "dos", "e", "em", "entre",
+    "essa", "esse", "esta", "este", "eu", "ela", "ele", "isso", "isto", "mais", "mas", "me",
+    "na", "nas", "no", "nos", "o", "os", "ou", "para", "pela", "pelo", "por", "qual", "quais",
+    "que", "quando", "se", "sem", "ser", "seu", "sua", "sobre", "um", "uma", "uns", "umas",
+}
+# Cosseno a partir do qual dois chunks contam como o mesmo conteúdo
+DUPLICATE_THRESHOLD = 0.95
+_WORD = re.compile(r"\w+", re.UNICODE)
+_SENTENCE_BREAK = re.compile(r"[.!?\n]\s")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas e sem acentos (“Fração” e “fracao” casam)."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def terms(text: str) -> Set[str]:
+    return {w for w in _WORD.findall(normalize(text)) if len(w) > 2 and w not in STOPWORDS}
+
+
+def lexical_overlap(query_terms: Set[str], text: str) -> float:
+    """Fração dos termos da consulta presentes no chunk (0–1)."""
+    if not query_terms:
+        return 0.0
+    return len(query_terms & terms(text)) / len(query_terms)
+
+
+def mmr(
+    relevance: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    diversity_lambda: float = 0.7,
+    duplicate_threshold: float = DUPLICATE_THRESHOLD,
+) -> List[int]:
+    """Índices (em `relevance`) escolhidos por MMR; `vectors` devem estar normalizados.
+
+    Candidatos quase idênticos a um já escolhido (cosseno ≥ `duplicate_threshold`, típico
+    do overlap entre chunks vizinhos) só entram se não sobrar outro.
+    """
+    if not len(relevance):
+        return []
+    similarity = vectors @ vectors.T
+    chosen: List[int] = []
+    best_sim = np.full(len(relevance), -np.inf)
+    remaining = np.ones(len(relevance), dtype=bool)
+    for _ in range(min(k, len(relevance))):
+        redundancy = np.where(np.isfinite(best_sim), best_sim, 0.0)
+        scores = diversity_lambda * relevance - (1 - diversity_lambda) * redundancy
+        scores[~remaining] = -np.inf
+        duplicates = remaining & (best_sim >= duplicate_threshold)
+        if (remaining & ~duplicates).any():
+            scores[duplicates] = -np.inf
+        pick = int(np.argmax(scores))
+        chosen.append(pick)
+        remaining[pick] = False
+        best_sim = np.maximum(best_sim, similarity[pick])
+    return chosen
+
+
+def extract_snippet(text: str, query_terms: Set[str], max_chars: int = 1200) -> str:
+    """Janela de até `max_chars` com mais ocorrências dos termos, alinhada a frases/palavras."""
+    if len(text) <= max_chars:
+        return text
+    normalized = normalize(text)
+    # NFKD + remoção de acentos pode mudar o tamanho; sem correspondência 1:1 usa o prefixo
+    if len(normalized) != len(text) or not query_terms:
+        return text[:max_chars]
+
+    positions = sorted(
+        m.start() for m in _WORD.finditer(normalized) if m.group() in query_terms
+    )
+    if not positions:
+        return text[:max_chars]
+
+    best_start, best_count, right = positions[0], 0, 0
+    for left, pos in enumerate(positions):
+        while right < len(positions) and positions[right] < pos + max_chars:
+            right += 1
+        if right - left > best_count:
+            best_start, best_count = pos, right - left
+
+    # Recua até o início da frase (no máximo 1/4 da janela) para o trecho não começar no meio
+    start = max(0, best_start - max_chars // 4)
+    breaks = [m.end() for m in _SENTENCE_BREAK.finditer(text, start, best_start)]
+    if breaks:
+        start = breaks[-1]
+    elif start > 0:
+        space = text.find(" ", start, best_start)
+        start = space + 1 if space >= 0 else start
+    end = min(len(text), start + max_chars)
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+
+    snippet = text[start:end].strip()
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+
+def rerank(
+    query: str,
+    candidates: Sequence[Dict],
+    vectors: np.ndarray,
+    k: int,
+    diversity_lambda: float = 0.7,
+    lexical_weight: float = 0.3,
+    snippet_chars: int = 1200,
+    query_terms: Optional[Set[str]] = None,
+) -> List[Dict]:
+    """Re-ranqueia `candidates` (com `score` do FAISS e `text`) e devolve os `k` escolhidos.
+
+    Cada hit ganha `score` combinado, `vector_score` original, `lexical` e o snippet recortado.
+    """
+    if not candidates:
+        return []
+    query_terms = terms(query) if query_terms is None else query_terms
+    vector_scores = np.array([c["score"] for c in candidates], dtype="float32")
+    lexical = np.array([lexical_overlap(query_terms, c["text"]) for c in candidates], dtype="float32")
+    relevance = (1 - lexical_weight) * vector_scores + lexical_weight * lexical
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.where(norms == 0, 1, norms)
+    order = mmr(relevance, unit.astype("float32"), k, diversity_lambda)
+
+    hits = []
+    for i in order:
+        hit = {key: value for key, value in candidates[i].items() if key != "text"}
+        hit.update({
+            "score": float(relevance[i]),
+            "vector_score": float(vector_scores[i]),
+            "lexical": round(float(lexical[i]), 3),
+            "snippet": extract_snippet(candidates[i]["text"], query_terms, snippet_chars),
+        })
+        hits.append(hit)
+    return hits
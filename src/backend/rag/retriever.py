@@ -1,83 +1,244 @@
+"""Busca semântica nos índices FAISS dos agentes.
+
+faiss/numpy e o cliente OpenAI só são carregados na primeira busca: importar este módulo
+(o que o servidor e os agentes fazem) não custa nada para quem nunca consulta o acervo.
+"""
+from __future__ import annotations
+
 import json
 import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Optional
-
-import faiss
-import numpy as np
-from dotenv import load_dotenv
-from openai import OpenAI
+from typing import TYPE_CHECKING, List, Dict, Optional, Sequence, Tuple
 
-load_dotenv()
-client = OpenAI()
+from ..telemetry import span, traced
+from ..agents.config import AgentConfig, get_agent_config
+from ..openai_client import get_openai_client
+from ..openai_gateway import get_gateway
+from .registry import (  # noqa: F401 - IndexMismatchError é reexportado
+    INDEX_FILE,
+    META_FILE,
+    IndexMismatchError,
+    check_compatible,
+    effective_info,
+    read_index_info,
+    resolve_index_dir,
+)
+from .shards import current_scope, fan_out
 
-EMBED_MODEL = "text-embedding-3-large"
+if TYPE_CHECKING:
+    import faiss
+    import numpy as np
 
-# Cache para índices por agente
+# Cache para índices por agente (agentes com o mesmo índice apontam para a mesma cópia)
 _index_cache = {}
 _meta_cache = {}
+_info_cache = {}
+# Cópia única por diretório de índice: {caminho resolvido: (index, meta, info)}
+_shared_cache: Dict[Path, Tuple] = {}
+_load_lock = threading.Lock()
+# Embeddings recentes de consultas (já normalizados): {(modelo, dimensões, texto): vetor}.
+# O classificador de intenções e a busca do mesmo turno pagam uma única chamada.
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "512"))
+_query_cache: "OrderedDict[Tuple[str, Optional[int], str], np.ndarray]" = OrderedDict()
+_query_lock = threading.Lock()
+
+
+def _get_agent_index_dir(agent_id: str) -> Optional[Path]:
+    """Retorna o diretório do índice de um agente (registro → index/<agente> → índice global)."""
+    return resolve_index_dir(agent_id)
 
 
-def _get_agent_index_dir(agent_id: str) -> Path:
-    """Retorna o diretório do índice para um agente específico."""
-    base_dir = Path(__file__).parent
-    return base_dir / "index" / agent_id
+def clear_cache(agent_id: Optional[str] = None) -> None:
+    """Descarta índices carregados (de um agente ou todos), p.ex. após uma nova ingestão.
 
+    Com `agent_id`, descarta pelo diretório do índice: os agentes que compartilham a
+    mesma cópia também recarregam, senão ela continuaria presa no `_shared_cache`.
+    """
+    with _load_lock:
+        if agent_id is None:
+            _index_cache.clear()
+            _meta_cache.clear()
+            _info_cache.clear()
+            _shared_cache.clear()
+            return
+        stale = {id(_index_cache[agent_id])} if agent_id in _index_cache else set()
+        index_dir = _get_agent_index_dir(agent_id)
+        if index_dir is not None:
+            entry = _shared_cache.pop(Path(index_dir).resolve(), None)
+            if entry is not None:
+                stale.add(id(entry[0]))
+        for path, entry in list(_shared_cache.items()):
+            if id(entry[0]) in stale:
+                _shared_cache.pop(path, None)
+        for agent in [agent_id] + [a for a, index in _index_cache.items() if id(index) in stale]:
+            _index_cache.pop(agent, None)
+            _meta_cache.pop(agent, None)
+            _info_cache.pop(agent, None)
 
+
+@traced("retriever.load_index")
 def _load_agent_index(agent_id: str) -> tuple[Optional[faiss.Index], Optional[List[Dict]]]:
-    """Carrega o índice FAISS e metadata para um agente específico."""
+    """Carrega o índice FAISS e metadata para um agente específico.
+
+    Levanta `IndexMismatchError` se o índice foi gerado com outro modelo de embeddings
+    que o `embed_model` do agente.
+    """
     if agent_id in _index_cache and agent_id in _meta_cache:
+        # O embed_model pode ter mudado em tempo de execução (/api/agents/config)
+        check_compatible(agent_id, _info_cache.get(agent_id) or {})
         return _index_cache[agent_id], _meta_cache[agent_id]
     
     index_dir = _get_agent_index_dir(agent_id)
-    index_path = index_dir / "faiss.index"
-    meta_path = index_dir / "meta.json"
+    if index_dir is None:
+        return None, None
+    index_dir = Path(index_dir).resolve()
+    if not (index_dir / INDEX_FILE).exists() or not (index_dir / META_FILE).exists():
+        return None, None
     
-    if not index_path.exists() or not meta_path.exists():
-        # Fallback para índice global se não existir específico
-        fallback_dir = Path(__file__).parent / "index"
-        fallback_index = fallback_dir / "faiss.index"
-        fallback_meta = fallback_dir / "meta.json"
-        
-        if fallback_index.exists() and fallback_meta.exists():
-            index_path = fallback_index
-            meta_path = fallback_meta
-        else:
-            return None, None
+    info = read_index_info(index_dir)
+    check_compatible(agent_id, info, index_dir)
     
-    try:
-        index = faiss.read_index(str(index_path))
-        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    with _load_lock:
+        shared = _shared_cache.get(index_dir)
+        if shared is None:
+            try:
+                from .quantization import read_index
+
+                index = read_index(index_dir, info)
+                meta = json.loads((index_dir / META_FILE).read_text(encoding="utf-8"))
+            except Exception:
+                return None, None
+            shared = _shared_cache[index_dir] = (index, meta, info)
         
+        index, meta, info = shared
         _index_cache[agent_id] = index
         _meta_cache[agent_id] = meta
-        
-        return index, meta
-    except Exception:
-        return None, None
+        _info_cache[agent_id] = info
+    
+    return index, meta
 
 
-def _embed_query(q: str) -> np.ndarray:
-    e = client.embeddings.create(model=EMBED_MODEL, input=[q]).data[0].embedding
-    v = np.array([e], dtype="float32")
-    faiss.normalize_L2(v)
+def prewarm(agent_ids: List[str]) -> Dict[str, str]:
+    """Carrega antecipadamente os índices (e o cliente OpenAI); devolve o status por agente."""
+    status: Dict[str, str] = {}
+    for agent_id in agent_ids:
+        try:
+            index, _ = _load_agent_index(agent_id)
+            status[agent_id] = "ok" if index is not None else "sem índice"
+        except Exception as exc:  # noqa: BLE001
+            status[agent_id] = f"erro: {exc}"
+    get_openai_client()
+    return status
+
+
+def index_status(agent_id: str) -> Dict:
+    """Estado do índice do agente para o /readyz — só lê disco/cache, nunca embute nada.
+
+    `state`: "missing" (sem índice), "cold" (no disco, ainda não carregado), "loaded"
+    ou "mismatch" (modelo do índice ≠ `embed_model` do agente).
+    """
+    index_dir = _get_agent_index_dir(agent_id)
+    if index_dir is None or not (Path(index_dir) / INDEX_FILE).exists() or not (Path(index_dir) / META_FILE).exists():
+        return {"state": "missing", "warm": False}
+    index_dir = Path(index_dir).resolve()
+
+    index = _index_cache.get(agent_id)
+    warm = index is not None
+    info = effective_info(_info_cache.get(agent_id) if warm else read_index_info(index_dir))
+    status = {
+        "state": "loaded" if warm else "cold",
+        "warm": warm,
+        "index_dir": str(index_dir),
+        "name": info.get("name"),
+        "embed_model": info["embed_model"],
+        "quantization": info["quantization"],
+        "version": info["version"],
+        "vectors": int(index.ntotal) if warm else info.get("count"),
+        "dimensions": int(index.d) if warm else info.get("dimensions"),
+        "meta_bytes": (index_dir / META_FILE).stat().st_size,
+    }
+    try:
+        check_compatible(agent_id, info, index_dir)
+    except IndexMismatchError as exc:
+        status.update({"state": "mismatch", "error": str(exc)})
+    return status
+
+
+def get_index_info(agent_id: str) -> Dict:
+    """Modelo/dimensão/quantização/versão do índice carregado para o agente."""
+    return effective_info(_info_cache.get(agent_id) or {})
+
+
+@traced("retriever.embed_query")
+def _embed_query(q: str, agent_id: str = "tutor") -> np.ndarray:
+    return _embed_queries([q], agent_id)
+
+
+def _embed_queries(queries: List[str], agent_id: str = "tutor") -> np.ndarray:
+    """Embeddings de várias consultas numa única chamada, com o modelo e a dimensão do índice."""
+    info = get_index_info(agent_id)
+    v = embed_texts(queries, info["embed_model"], info.get("requested_dimensions"))
+    index = _index_cache.get(agent_id)
+    if index is not None and v.shape[1] != index.d:
+        raise ValueError(
+            f"Embedding da consulta tem {v.shape[1]} dims, mas o índice de '{agent_id}' tem {index.d}; "
+            "refaça a ingestão ou confira o index_info.json."
+        )
     return v
 
 
-def search_chunks(query: str, k: int = 6, agent_id: str = "tutor", filters: Optional[Dict] = None):
-    """Busca chunks com configurações específicas por agente."""
-    if not query or not query.strip():
-        return []
+def embed_texts(texts: List[str], model: str, dimensions: Optional[int] = None) -> np.ndarray:
+    """Embeddings normalizados de textos curtos (consultas, exemplos), com cache LRU.
+
+    Textos vistos há pouco saem do cache; só os novos vão à API, numa única chamada.
+    """
+    import faiss
+    import numpy as np
 
+    with _query_lock:
+        cached = [_query_cache.get((model, dimensions, t)) for t in texts]
+        for t, vector in zip(texts, cached):
+            if vector is not None:
+                _query_cache.move_to_end((model, dimensions, t))
+    missing = list(dict.fromkeys(t for t, vector in zip(texts, cached) if vector is None))
+    if not missing:
+        return np.stack(cached)
+
+    # Pelo gateway: limites do modelo e coalescência de consultas idênticas simultâneas
+    resp = get_gateway().create_embeddings(model, missing, dimensions)
+    v = np.array([d.embedding for d in resp.data], dtype="float32")
+    faiss.normalize_L2(v)
+    fresh = dict(zip(missing, v))
+    if QUERY_CACHE_SIZE > 0:
+        with _query_lock:
+            for t, vector in fresh.items():
+                _query_cache[(model, dimensions, t)] = vector
+            while len(_query_cache) > QUERY_CACHE_SIZE:
+                _query_cache.popitem(last=False)
+    return np.stack([vector if vector is not None else fresh[t] for t, vector in zip(texts, cached)])
+
+
+def embed_queries(queries: List[str], agent_id: str = "tutor") -> Optional[np.ndarray]:
+    """Embeddings normalizados no espaço do índice do agente (None se ele não tem índice)."""
     index, meta = _load_agent_index(agent_id)
     if index is None or meta is None:
-        return []
+        return None
+    return _embed_queries(queries, agent_id)
 
-    vec = _embed_query(query)
-    D, I = index.search(vec, k)
+
+def _format_hits(
+    agent_id: str,
+    meta: List[Dict],
+    ids: np.ndarray,
+    scores: np.ndarray,
+    filters: Optional[Dict] = None,
+    with_text: bool = False,
+) -> List[Dict]:
     hits = []
     
-    for idx, score in zip(I[0], D[0]):
+    for idx, score in zip(ids, scores):
         if idx < 0:
             continue
         doc = meta[idx]
@@ -89,12 +250,169 @@ def search_chunks(query: str, k: int = 6, agent_id: str = "tutor", filters: Opti
             if "subject" in filters and filters["subject"] not in doc.get("subject", ""):
                 continue
         
-        hits.append({
+        hit = {
             "id": doc["id"],
             "source": doc["source"],
             "score": float(score),
             "snippet": doc["text"][:1200],
             "agent_id": agent_id,
-        })
+        }
+        if with_text:
+            # Candidato do re-ranking: guarda a posição no índice e o texto completo
+            hit.update({"index_id": int(idx), "text": doc["text"]})
+        hits.append(hit)
     
-    return hits
\ No newline at end of file
+    return hits
+
+
+def _rerank_hits(
+    agent_id: str,
+    index,
+    meta: List[Dict],
+    query: str,
+    ids: np.ndarray,
+    scores: np.ndarray,
+    k: int,
+    filters: Optional[Dict],
+    config: AgentConfig,
+) -> List[Dict]:
+    candidates = _format_hits(agent_id, meta, ids, scores, filters, with_text=True)
+    if not candidates:
+        return []
+    import numpy as np
+
+    from .rerank import rerank as rerank_candidates
+
+    with span("retriever.rerank"):
+        vectors = index.reconstruct_batch(np.array([c["index_id"] for c in candidates], dtype="int64"))
+        hits = rerank_candidates(
+            query,
+            candidates,
+            vectors,
+            k,
+            diversity_lambda=config.rag_mmr_lambda,
+            snippet_chars=config.rag_snippet_chars,
+        )
+    for hit in hits:
+        hit.pop("index_id", None)
+    return hits
+
+
+def _fetch_k(k: int, use_rerank: bool, config: AgentConfig) -> int:
+    return k * max(1, config.rag_rerank_fetch) if use_rerank else k
+
+
+def search_chunks(
+    query: str,
+    k: int = 6,
+    agent_id: str = "tutor",
+    filters: Optional[Dict] = None,
+    rerank: Optional[bool] = None,
+    shards: Optional[Sequence[str]] = None,
+):
+    """Busca chunks com configurações específicas por agente.
+
+    `rerank=None` segue `AgentConfig.rag_rerank`; com re-ranking, busca mais candidatos,
+    aplica MMR + sobreposição lexical e recorta o snippet em volta dos termos da consulta.
+    Com `shards` (ou dentro de `shard_scope`), busca nos índices da escola em vez do
+    índice do agente.
+    """
+    if not query or not query.strip():
+        return []
+    shards = shards or current_scope()
+    if shards:
+        return search_shards([query], shards, k, agent_id, filters, rerank)[0]
+
+    index, meta = _load_agent_index(agent_id)
+    if index is None or meta is None:
+        return []
+
+    config = get_agent_config(agent_id)
+    use_rerank = config.rag_rerank if rerank is None else rerank
+    vec = _embed_query(query, agent_id)
+    with span("retriever.faiss_search"):
+        D, I = index.search(vec, _fetch_k(k, use_rerank, config))
+    if use_rerank:
+        return _rerank_hits(agent_id, index, meta, query, I[0], D[0], k, filters, config)
+    return _format_hits(agent_id, meta, I[0], D[0], filters)
+
+
+@traced("retriever.search_batch")
+def search_chunks_batch(
+    queries: List[str],
+    k: int = 6,
+    agent_id: str = "tutor",
+    filters: Optional[Dict] = None,
+    rerank: Optional[bool] = None,
+) -> List[List[Dict]]:
+    """Mesma busca de `search_chunks` para várias consultas: 1 chamada de embeddings + 1 busca FAISS."""
+    results: List[List[Dict]] = [[] for _ in queries]
+    shards = current_scope()
+    if shards:
+        positions = [i for i, q in enumerate(queries) if q and q.strip()]
+        found = search_shards([queries[i] for i in positions], shards, k, agent_id, filters, rerank) if positions else []
+        for i, hits in zip(positions, found):
+            results[i] = hits
+        return results
+    index, meta = _load_agent_index(agent_id)
+    if index is None or meta is None:
+        return results
+
+    positions = [i for i, q in enumerate(queries) if q and q.strip()]
+    if not positions:
+        return results
+
+    config = get_agent_config(agent_id)
+    use_rerank = config.rag_rerank if rerank is None else rerank
+    vecs = _embed_queries([queries[i] for i in positions], agent_id)
+    with span("retriever.faiss_search"):
+        D, I = index.search(vecs, _fetch_k(k, use_rerank, config))
+    for row, i in enumerate(positions):
+        if use_rerank:
+            results[i] = _rerank_hits(agent_id, index, meta, queries[i], I[row], D[row], k, filters, config)
+        else:
+            results[i] = _format_hits(agent_id, meta, I[row], D[row], filters)
+    return results
+
+
+@traced("retriever.search_shards")
+def search_shards(
+    queries: List[str],
+    shards: Sequence[str],
+    k: int = 6,
+    agent_id: str = "tutor",
+    filters: Optional[Dict] = None,
+    rerank: Optional[bool] = None,
+) -> List[List[Dict]]:
+    """Busca em leque nos shards permitidos e junta o top-k de cada consulta (`hit["shard"]`)."""
+    import numpy as np
+
+    config = get_agent_config(agent_id)
+    use_rerank = config.rag_rerank if rerank is None else rerank
+    results: List[List[Dict]] = []
+    for query, candidates in zip(queries, fan_out(shards, queries, _fetch_k(k, use_rerank, config), agent_id)):
+        hits, vectors = [], []
+        for entry, idx, score in candidates:
+            for hit in _format_hits(agent_id, entry.meta, [idx], [score], filters, with_text=use_rerank):
+                hit["shard"] = entry.shard
+                hits.append(hit)
+                if use_rerank:
+                    vectors.append(entry.index.reconstruct_batch(np.array([idx], dtype="int64"))[0])
+        if not use_rerank or not hits:
+            results.append(hits[:k])
+            continue
+        from .rerank import rerank as rerank_candidates
+
+        with span("retriever.rerank"):
+            ranked = rerank_candidates(
+                query,
+                hits,
+                np.vstack(vectors).astype("float32"),
+                k,
+                diversity_lambda=config.rag_mmr_lambda,
+                snippet_chars=config.rag_snippet_chars,
+            )
+        for hit in ranked:
+            hit.pop("index_id", None)
+        results.append(ranked)
+    return results
@@ -0,0 +1,394 @@
+"""Índices por escola (tenant) e disciplina: shards com LRU limitado por memória e busca em leque.
+
+Cada shard é um índice comum (faiss.index + meta.json + index_info.json) em
+`index/shards/<tenant>/<disciplina>/`, gerado por
+
+    python -m src.backend.rag.ingest --agent tutor --tenant escola-a --subject matematica --data-dir materiais/
+
+e listado em `registry.json` (`"shards"`). O processo mantém carregados só os shards
+mais usados até `RAG_SHARD_MEMORY_MB`; o menos usado recentemente sai quando um novo
+não cabe. Uma requisição com `tenant` (e opcionalmente `subjects`) busca em todos os
+shards permitidos em paralelo e junta o top-k pelo cosseno, que é comparável entre
+shards do mesmo modelo de embeddings.
+
+Tamanho residente, acertos, faltas e despejos por shard saem em `/api/rag/shards` e no
+`/metrics`.
+"""
+from __future__ import annotations
+
+import contextvars
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .. import telemetry
+from ..agents.config import get_agent_config
+from . import registry
+from .registry import INDEX_FILE, META_FILE, effective_info, read_index_info
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SHARDS_DIR = "shards"
+# Orçamento de memória dos shards carregados (índice + metadados), por processo
+RAG_SHARD_MEMORY_MB = float(os.getenv("RAG_SHARD_MEMORY_MB", "1024"))
+# Shards buscados em paralelo numa mesma consulta (o FAISS solta o GIL)
+RAG_SHARD_FANOUT_WORKERS = int(os.getenv("RAG_SHARD_FANOUT_WORKERS", "4"))
+
+_SLUG = re.compile(r"^[a-z0-9][a-z0-9_-]*$")
+
+
+class ShardNotFoundError(LookupError):
+    """Nenhum shard registrado para o tenant/disciplinas pedidos."""
+
+
+def shard_id(tenant: str, subject: str) -> str:
+    for part, label in ((tenant, "tenant"), (subject, "disciplina")):
+        if not _SLUG.match(part or ""):
+            raise ValueError(f"Nome de {label} inválido: {part!r} (use letras minúsculas, números, '-' e '_')")
+    return f"{tenant}/{subject}"
+
+
+def shard_dir(shard: str, root: Optional[Path] = None) -> Path:
+    tenant, subject = shard.split("/", 1)
+    return Path(root or registry.INDEX_ROOT) / SHARDS_DIR / tenant / subject
+
+
+def register_shard(shard: str, info: Dict[str, Any], root: Optional[Path] = None) -> Dict[str, Any]:
+    """Grava/atualiza o shard no registry.json (mesma escrita atômica dos índices)."""
+
+    def mutate(data: Dict[str, Any]) -> None:
+        data.setdefault("shards", {})[shard] = {**info, "registered_at": registry._now()}
+
+    return registry.update_registry(mutate, root)
+
+
+def list_shards(tenant: Optional[str] = None, root: Optional[Path] = None) -> Dict[str, Dict[str, Any]]:
+    shards = registry.load_registry(root).get("shards", {})
+    if tenant is None:
+        return dict(shards)
+    return {sid: info for sid, info in shards.items() if sid.split("/", 1)[0] == tenant}
+
+
+def resolve_shards(tenant: str, subjects: Optional[Sequence[str]] = None, root: Optional[Path] = None) -> List[str]:
+    """Shards que a requisição pode consultar: todas as disciplinas do tenant ou só as pedidas."""
+    available = list_shards(tenant, root)
+    if subjects:
+        wanted = {shard_id(tenant, subject) for subject in subjects}
+        available = {sid: info for sid, info in available.items() if sid in wanted}
+    if not available:
+        detail = f" ({', '.join(subjects)})" if subjects else ""
+        raise ShardNotFoundError(f"Nenhum índice para a escola '{tenant}'{detail}.")
+    return sorted(available)
+
+
+def shard_status(agent_ids: Sequence[str], root: Optional[Path] = None) -> Dict[str, Dict[str, Any]]:
+    """Estado de cada shard registrado para o /readyz — só lê o registry.
+
+    `mismatch` quando algum dos agentes em `agent_ids` usa outro modelo de embeddings:
+    a busca desse agente no shard levantaria `IndexMismatchError`.
+    """
+    status: Dict[str, Dict[str, Any]] = {}
+    for shard, info in sorted(list_shards(root=root).items()):
+        model = effective_info(info)["embed_model"]
+        agents = sorted(a for a in agent_ids if get_agent_config(a).embed_model not in (None, "", model))
+        status[shard] = {"state": "mismatch" if agents else "ready", "embed_model": model, "vectors": info.get("count")}
+        if agents:
+            status[shard]["agents"] = agents
+    return status
+
+
+# ---- escopo da requisição ----
+
+_scope: contextvars.ContextVar[Optional[Tuple[str, ...]]] = contextvars.ContextVar("mentoria_shard_scope", default=None)
+
+
+@contextmanager
+def shard_scope(shards: Optional[Sequence[str]]) -> Iterator[None]:
+    """Dentro do bloco, `search_chunks` (inclusive a ferramenta do tutor) busca nesses shards."""
+    token = _scope.set(tuple(shards) if shards else None)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> Optional[Tuple[str, ...]]:
+    return _scope.get()
+
+
+# ---- cache ----
+
+@dataclass
+class LoadedShard:
+    shard: str
+    index: Any
+    meta: List[Dict]
+    info: Dict[str, Any]
+    nbytes: int
+    loaded_at: float = field(default_factory=time.time)
+
+
+@dataclass
+class ShardStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    searches: int = 0
+    nbytes: int = 0
+
+
+class _Loading:
+    """Carga em andamento de um shard: quem chega depois espera a mesma leitura."""
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self) -> None:
+        self.event = threading.Event()
+        self.result: Optional[LoadedShard] = None
+        self.error: Optional[BaseException] = None
+
+
+def _footprint(path: Path) -> int:
+    """Bytes residentes estimados: o índice ocupa em memória o mesmo que no disco, mais os metadados.
+
+    No binário, os vetores do re-ranking ficam no mmap e não contam.
+    """
+    return (path / INDEX_FILE).stat().st_size + (path / META_FILE).stat().st_size
+
+
+class ShardCache:
+    """LRU de shards carregados com orçamento em bytes.
+
+    A leitura do disco (FAISS + `meta.json`) roda fora da trava, uma por shard: a carga
+    fria de um shard grande não segura os acertos nem a busca em leque dos outros.
+    """
+
+    def __init__(self, budget_bytes: int = int(RAG_SHARD_MEMORY_MB * 1024 * 1024), root: Optional[Path] = None) -> None:
+        self.budget_bytes = budget_bytes
+        self.root = root
+        self._loaded: "OrderedDict[str, LoadedShard]" = OrderedDict()
+        self._stats: Dict[str, ShardStats] = {}
+        self._loading: Dict[str, _Loading] = {}
+        # Muda a cada `discard`: carga iniciada antes não entra no cache
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._loaded.values())
+
+    def get(self, shard: str) -> LoadedShard:
+        with self._lock:
+            stats = self._stats.setdefault(shard, ShardStats())
+            entry = self._loaded.get(shard)
+            if entry is not None:
+                self._loaded.move_to_end(shard)
+                stats.hits += 1
+                return entry
+            loading = self._loading.get(shard)
+            leader = loading is None
+            if leader:
+                # `misses` conta leituras do disco; quem espera a carga de outro conta como acerto
+                stats.misses += 1
+                loading = self._loading[shard] = _Loading()
+                generation = self._generation
+            else:
+                stats.hits += 1
+        if not leader:
+            loading.event.wait()
+            if loading.error is not None:
+                raise loading.error
+            return loading.result
+
+        try:
+            entry = self._load(shard)
+        except BaseException as exc:
+            loading.error = exc
+            raise
+        else:
+            loading.result = entry
+        finally:
+            with self._lock:
+                self._loading.pop(shard, None)
+                if loading.result is not None and generation == self._generation:
+                    stats.nbytes = entry.nbytes
+                    self._loaded[shard] = entry
+                    self._evict(keep=shard)
+            loading.event.set()
+        return entry
+
+    def _load(self, shard: str) -> LoadedShard:
+        from .quantization import read_index
+
+        path = shard_dir(shard, self.root)
+        if not (path / INDEX_FILE).exists() or not (path / META_FILE).exists():
+            raise ShardNotFoundError(f"Shard '{shard}' não encontrado em {path}.")
+        info = read_index_info(path)
+        with telemetry.span("retriever.load_shard"):
+            index = read_index(path, info)
+            meta = json.loads((path / META_FILE).read_text(encoding="utf-8"))
+        return LoadedShard(shard, index, meta, effective_info(info), _footprint(path))
+
+    def _evict(self, keep: str) -> None:
+        # O shard recém-carregado fica mesmo se sozinho passar do orçamento
+        while self.used_bytes > self.budget_bytes and len(self._loaded) > 1:
+            victim, entry = next(iter(self._loaded.items()))
+            if victim == keep:
+                self._loaded.move_to_end(victim)
+                continue
+            del self._loaded[victim]
+            self._stats[victim].evictions += 1
+            logger.info("Shard %s descarregado (LRU, %d bytes)", victim, entry.nbytes)
+
+    def discard(self, shard: Optional[str] = None) -> None:
+        """Descarta um shard (p.ex. após reingestão) ou todos."""
+        with self._lock:
+            self._generation += 1
+            if shard is None:
+                self._loaded.clear()
+            else:
+                self._loaded.pop(shard, None)
+
+    def record_search(self, shard: str) -> None:
+        with self._lock:
+            self._stats.setdefault(shard, ShardStats()).searches += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            shards = {}
+            for shard, stats in sorted(self._stats.items()):
+                lookups = stats.hits + stats.misses
+                shards[shard] = {
+                    "loaded": shard in self._loaded,
+                    "bytes": stats.nbytes,
+                    "hits": stats.hits,
+                    "misses": stats.misses,
+                    "hitRate": round(stats.hits / lookups, 4) if lookups else None,
+                    "evictions": stats.evictions,
+                    "searches": stats.searches,
+                }
+            return {
+                "budgetBytes": self.budget_bytes,
+                "usedBytes": self.used_bytes,
+                "loaded": len(self._loaded),
+                "shards": shards,
+            }
+
+
+_cache: Optional[ShardCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_shard_cache() -> ShardCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ShardCache()
+    return _cache
+
+
+def set_shard_cache(cache: Optional[ShardCache]) -> None:
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+
+# ---- busca em leque ----
+
+def _search_one(entry: LoadedShard, vectors: "np.ndarray", fetch_k: int) -> Tuple[LoadedShard, Any, Any]:
+    get_shard_cache().record_search(entry.shard)
+    return (entry,) + tuple(entry.index.search(vectors, min(fetch_k, max(1, entry.index.ntotal))))
+
+
+def fan_out(
+    shards: Sequence[str],
+    queries: List[str],
+    fetch_k: int,
+    agent_id: str,
+) -> List[List[Tuple[LoadedShard, int, float]]]:
+    """Para cada consulta, os candidatos de todos os shards: [(shard, posição, cosseno)], melhores primeiro.
+
+    As consultas são embutidas uma vez por (modelo, dimensões) — shards do mesmo
+    modelo reaproveitam o vetor. Um shard gerado com outro modelo que o do agente
+    levanta `IndexMismatchError`.
+    """
+    from .retriever import embed_texts
+
+    entries = [get_shard_cache().get(shard) for shard in shards]
+    for entry in entries:
+        # Ignorar o shard esconderia parte do acervo com cara de busca normal
+        registry.check_compatible(agent_id, entry.info, shard_dir(entry.shard, get_shard_cache().root))
+    groups: Dict[Tuple[str, Optional[int]], List[LoadedShard]] = {}
+    for entry in entries:
+        groups.setdefault((entry.info["embed_model"], entry.info.get("requested_dimensions")), []).append(entry)
+
+    merged: List[List[Tuple[LoadedShard, int, float]]] = [[] for _ in queries]
+    jobs = []
+    for (model, dimensions), group in groups.items():
+        vectors = embed_texts(queries, model, dimensions)
+        jobs.extend((entry, vectors) for entry in group)
+
+    def run(job):
+        entry, vectors = job
+        return _search_one(entry, vectors, fetch_k)
+
+    with telemetry.span("retriever.shard_fanout"):
+        if len(jobs) > 1 and RAG_SHARD_FANOUT_WORKERS > 1:
+            with ThreadPoolExecutor(max_workers=min(RAG_SHARD_FANOUT_WORKERS, len(jobs))) as pool:
+                results = list(pool.map(run, jobs))
+        else:
+            results = [run(job) for job in jobs]
+
+    for entry, scores, ids in results:
+        for row in range(len(queries)):
+            merged[row].extend(
+                (entry, int(idx), float(score)) for idx, score in zip(ids[row], scores[row]) if idx >= 0
+            )
+    return [heapq.nlargest(fetch_k, candidates, key=lambda c: c[2]) for candidates in merged]
+
+
+def _collect(metric_fn):
+    def collect() -> List[Tuple[Dict[str, str], float]]:
+        if _cache is None:
+            return []
+        return metric_fn(_cache.stats())
+    return collect
+
+
+telemetry.register_collector(
+    "mentoria_rag_shard_resident_bytes",
+    "gauge",
+    _collect(lambda s: [({"shard": k}, v["bytes"] if v["loaded"] else 0) for k, v in s["shards"].items()]),
+)
+telemetry.register_collector(
+    "mentoria_rag_shard_budget_bytes", "gauge", _collect(lambda s: [({}, s["budgetBytes"])])
+)
+telemetry.register_collector(
+    "mentoria_rag_shard_hits_total",
+    "counter",
+    _collect(lambda s: [({"shard": k}, v["hits"]) for k, v in s["shards"].items()]),
+)
+telemetry.register_collector(
+    "mentoria_rag_shard_misses_total",
+    "counter",
+    _collect(lambda s: [({"shard": k}, v["misses"]) for k, v in s["shards"].items()]),
+)
+telemetry.register_collector(
+    "mentoria_rag_shard_evictions_total",
+    "counter",
+    _collect(lambda s: [({"shard": k}, v["evictions"]) for k, v in s["shards"].items()]),
+)
@@ -0,0 +1,262 @@
+"""Roteamento automático do chat (`agentId="auto"`) para tutor, planner, helper ou assessment.
+
+Sem handoff do SDK a cada mensagem: a decisão é local sempre que possível.
+
+1. palavras-chave (a mesma regex compilada das intenções), em microssegundos;
+2. similaridade com o centróide de cada agente — embedding do `system_prompt` e de
+   consultas de exemplo, calculado uma vez; o embedding da mensagem usa o cache de
+   consultas do retriever;
+3. só quando os dois melhores centróides empatam (margem < `ROUTER_MARGIN`) ou ninguém
+   passa de `ROUTER_MIN_SCORE`, uma chamada curta ao LLM escolhe o agente;
+4. sem decisão, `ROUTER_DEFAULT_AGENT`.
+
+Cada decisão registra a origem e a latência (log, `/metrics` e o campo `routing` do chat).
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents import Agent, ModelSettings
+
+from . import telemetry
+from .agents.config import get_agent_config
+from .intents import KeywordMatcher, normalize
+from .openai_gateway import get_gateway
+
+logger = logging.getLogger(__name__)
+
+AUTO_AGENT = "auto"
+ROUTE_AGENTS = ["tutor", "planner", "helper", "assessment"]
+ROUTER_DEFAULT_AGENT = os.getenv("ROUTER_DEFAULT_AGENT", "tutor")
+
+# Embeddings dos centróides (o modelo pequeno basta para separar 4 agentes)
+ROUTER_EMBEDDINGS = os.getenv("ROUTER_EMBEDDINGS", "1") != "0"
+ROUTER_EMBED_MODEL = os.getenv("ROUTER_EMBED_MODEL", "text-embedding-3-small")
+ROUTER_MIN_SCORE = float(os.getenv("ROUTER_MIN_SCORE", "0.25"))
+ROUTER_MARGIN = float(os.getenv("ROUTER_MARGIN", "0.03"))
+# Escalonamento dos casos ambíguos para o LLM
+ROUTER_LLM = os.getenv("ROUTER_LLM", "1") != "0"
+ROUTER_MODEL = os.getenv("ROUTER_MODEL", "gpt-4o-mini")
+
+ROUTER_METRIC = "mentoria_router_seconds"
+
+DEFAULT_ROUTE_KEYWORDS: Dict[str, List[str]] = {
+    "assessment": ["corrig", "avalia minha", "avalie minha", "minha resposta", "esta certo", "esta correto", "confere minha"],
+    "planner": ["plano de estudo", "cronograma", "planej", "rotina de estudo", "organizar meus estudos"],
+    "helper": ["analogia", "nao entendi", "como assim", "o que significa", "explica de um jeito", "explique de forma simples"],
+}
+
+DEFAULT_ROUTE_EXAMPLES: Dict[str, List[str]] = {
+    "tutor": [
+        "Me ensina frações equivalentes com exemplos",
+        "Quero praticar exercícios de HTML",
+        "O que o material diz sobre atendimento ao cliente?",
+    ],
+    "planner": [
+        "Tenho duas horas por dia, como divido meus estudos até a prova?",
+        "Monta metas semanais para eu aprender JavaScript em um mês",
+    ],
+    "helper": [
+        "Explica recursão como se eu tivesse dez anos",
+        "Qual a diferença entre vírus e bactéria, de um jeito simples?",
+    ],
+    "assessment": [
+        "Minha resposta foi: a soma dos ângulos é 180 graus. Está certo?",
+        "Dá uma nota para a minha redação",
+    ],
+}
+
+ROUTER_PROMPT = """Você escolhe qual mentor atende a mensagem do aluno.
+- tutor: ensina conteúdo do acervo, faz perguntas diagnósticas e propõe exercícios.
+- planner: monta planos e cronogramas de estudo.
+- helper: explica um conceito de forma simples, com analogias.
+- assessment: corrige ou dá nota a uma resposta do aluno.
+Responda apenas com um destes ids: tutor, planner, helper, assessment."""
+
+
+@dataclass
+class RouteDecision:
+    agent_id: str
+    # keywords | embeddings | llm | default
+    source: str
+    seconds: float = 0.0
+    score: Optional[float] = None
+    scores: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"agent": self.agent_id, "source": self.source, "ms": round(self.seconds * 1000, 3)}
+        if self.score is not None:
+            data["score"] = round(self.score, 4)
+        return data
+
+
+class AgentRouter:
+    def __init__(
+        self,
+        agents: Optional[List[str]] = None,
+        keywords: Optional[Dict[str, List[str]]] = None,
+        examples: Optional[Dict[str, List[str]]] = None,
+        use_embeddings: bool = ROUTER_EMBEDDINGS,
+        use_llm: bool = ROUTER_LLM,
+        embed_model: str = ROUTER_EMBED_MODEL,
+        min_score: float = ROUTER_MIN_SCORE,
+        margin: float = ROUTER_MARGIN,
+        default_agent: str = ROUTER_DEFAULT_AGENT,
+    ) -> None:
+        self.agents = list(agents or ROUTE_AGENTS)
+        keywords = keywords if keywords is not None else DEFAULT_ROUTE_KEYWORDS
+        self.keywords = KeywordMatcher({a: keywords[a] for a in keywords if a in self.agents})
+        self.examples = examples if examples is not None else DEFAULT_ROUTE_EXAMPLES
+        self.use_embeddings = use_embeddings
+        self.use_llm = use_llm
+        self.embed_model = embed_model
+        self.min_score = min_score
+        self.margin = margin
+        self.default_agent = default_agent
+        self._centroids = None
+        self._lock = threading.Lock()
+        # {(agente, origem): decisões}
+        self.decisions: Dict[Tuple[str, str], int] = {}
+
+    # ---- etapas locais ----
+
+    def _centroid_matrix(self):
+        """Uma linha normalizada por agente: média do system_prompt e dos exemplos."""
+        import numpy as np
+
+        from .rag.retriever import embed_texts
+
+        with self._lock:
+            if self._centroids is None:
+                texts, owners = [], []
+                for agent_id in self.agents:
+                    prompt = get_agent_config(agent_id).system_prompt
+                    for text in ([prompt] if prompt else []) + list(self.examples.get(agent_id, [])):
+                        texts.append(text)
+                        owners.append(agent_id)
+                vectors = embed_texts(texts, self.embed_model)
+                owners_arr = np.array(owners)
+                rows = []
+                for agent_id in self.agents:
+                    mask = owners_arr == agent_id
+                    centroid = vectors[mask].mean(axis=0) if mask.any() else np.zeros(vectors.shape[1], dtype="float32")
+                    norm = float(np.linalg.norm(centroid))
+                    rows.append(centroid / norm if norm else centroid)
+                self._centroids = np.stack(rows)
+            return self._centroids
+
+    def score(self, message: str) -> Dict[str, float]:
+        """Similaridade (cosseno) da mensagem com o centróide de cada agente."""
+        from .rag.retriever import embed_texts
+
+        centroids = self._centroid_matrix()
+        query = embed_texts([message], self.embed_model)[0]
+        return {agent_id: float(value) for agent_id, value in zip(self.agents, centroids @ query)}
+
+    def route_embeddings(self, message: str) -> Tuple[Optional[RouteDecision], Optional[RouteDecision]]:
+        """(decisão confiante, melhor palpite quando os centróides não decidem)."""
+        if not normalize(message):
+            return None, None
+        scores = self.score(message)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best, best_score = ranked[0]
+        runner_up = ranked[1][1] if len(ranked) > 1 else -1.0
+        guess = RouteDecision(best, "embeddings", score=best_score, scores=scores)
+        if best_score < self.min_score or best_score - runner_up < self.margin:
+            return None, guess
+        return guess, None
+
+    # ---- escalonamento ----
+
+    def build_agent(self) -> Agent:
+        return Agent(
+            name="Roteador",
+            instructions=ROUTER_PROMPT,
+            model=ROUTER_MODEL,
+            model_settings=ModelSettings(temperature=0, max_tokens=5),
+        )
+
+    def parse_choice(self, output: Any) -> Optional[str]:
+        text = normalize(str(output or ""))
+        for agent_id in self.agents:
+            if agent_id in text:
+                return agent_id
+        return None
+
+    async def route(self, message: str, runner: Any) -> RouteDecision:
+        """Escolhe o agente; `runner` é o `Runner` do SDK (usado só nos casos ambíguos)."""
+        started = time.perf_counter()
+        decision: Optional[RouteDecision] = None
+        guess: Optional[RouteDecision] = None
+        agent_id = self.keywords.match(message)
+        if agent_id is not None:
+            decision = RouteDecision(agent_id, "keywords")
+        elif self.use_embeddings:
+            try:
+                decision, guess = await asyncio.to_thread(self.route_embeddings, message)
+            except Exception:
+                logger.warning("Roteamento por embeddings falhou", exc_info=True)
+        if decision is None and self.use_llm:
+            try:
+                result = await get_gateway().run_agent(runner, self.build_agent(), message, max_tokens=5)
+                choice = self.parse_choice(result.final_output)
+                if choice is not None:
+                    decision = RouteDecision(choice, "llm", scores=guess.scores if guess else {})
+            except Exception:
+                logger.warning("Roteamento por LLM falhou; usando o melhor palpite local", exc_info=True)
+        if decision is None:
+            decision = RouteDecision(guess.agent_id if guess else self.default_agent, "default")
+            if guess is not None:
+                decision.score, decision.scores = guess.score, guess.scores
+        decision.seconds = time.perf_counter() - started
+        self.record(decision)
+        return decision
+
+    # ---- registro ----
+
+    def record(self, decision: RouteDecision) -> None:
+        key = (decision.agent_id, decision.source)
+        with self._lock:
+            self.decisions[key] = self.decisions.get(key, 0) + 1
+        if telemetry.is_enabled():
+            telemetry.observe(ROUTER_METRIC, decision.seconds, source=decision.source)
+        logger.info("Roteamento: %s", decision.to_dict())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"decisions": [
+                {"agent": agent_id, "source": source, "count": count}
+                for (agent_id, source), count in sorted(self.decisions.items())
+            ]}
+
+
+_router: Optional[AgentRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> AgentRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = AgentRouter()
+    return _router
+
+
+def set_router(router: Optional[AgentRouter]) -> None:
+    global _router
+    with _router_lock:
+        _router = router
+
+
+def _collect_decisions() -> List[Tuple[Dict[str, str], float]]:
+    if _router is None:
+        return []
+    return [({"agent": d["agent"], "source": d["source"]}, d["count"]) for d in _router.stats()["decisions"]]
+
+
+telemetry.register_collector("mentoria_router_decisions_total", "counter", _collect_decisions)
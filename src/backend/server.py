@@ -1,17 +1,32 @@
 import os
+import sys
 import json
 import asyncio
+import shutil
+import threading
 import urllib.parse
-from http.server import SimpleHTTPRequestHandler, HTTPServer
-from typing import Optional
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import SimpleHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from typing import Any, Coroutine, Optional
 
-from agents import Agent, Runner, SQLiteSession
+from agents import Agent, Runner
+from agents.memory import SessionABC
 from backend.agents.study_planner import build_agent as build_planner
 from backend.agents.concepts_helper import build_agent as build_helper
+from backend.openai_gateway import get_gateway
+from backend.session_store import get_session_store
+from backend.static_assets import StaticAssetRegistry
+from backend import telemetry
 
 
 PUBLIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "public")
 
+# Tempo máximo de uma resposta do agente antes de devolver 504
+CHAT_TIMEOUT = float(os.getenv("SERVER_CHAT_TIMEOUT", "120"))
+STATIC_CHUNK_SIZE = 64 * 1024
+
+static_assets = StaticAssetRegistry(PUBLIC_DIR)
+
 
 def get_agent_by_id(agent_id: str) -> Agent:
     if agent_id == "helper":
@@ -20,21 +35,65 @@ def get_agent_by_id(agent_id: str) -> Agent:
     return build_planner()
 
 
-async def run_agent(session: SQLiteSession, user_input: str, agent_id: str) -> str:
+async def run_agent(session: SessionABC, user_input: str, agent_id: str) -> str:
     agent = get_agent_by_id(agent_id)
-    result = await Runner.run(agent, user_input, session=session)
+    with telemetry.span("agent.run"):
+        result = await get_gateway().run_agent(Runner, agent, user_input, session=session)
     return result.final_output
 
 
+class EventLoopThread:
+    """Um único event loop de longa duração, em thread própria, compartilhado pelas requisições."""
+
+    def __init__(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="mentoria-event-loop", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Coroutine[Any, Any, Any], timeout: Optional[float] = None) -> Any:
+        """Executa `coro` no loop compartilhado e bloqueia a thread da requisição até o resultado."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+_event_loop: Optional[EventLoopThread] = None
+_event_loop_lock = threading.Lock()
+
+
+def get_event_loop_thread() -> EventLoopThread:
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = EventLoopThread()
+        return _event_loop
+
+
 class ChatHandler(SimpleHTTPRequestHandler):
     def do_GET(self) -> None:  # type: ignore[override]
-        if self.path == "/" or self.path.startswith("/index.html"):
-            self._serve_public("index.html")
+        if self.path == "/metrics":
+            body = telemetry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
             return
+        self._handle_static(send_body=True)
 
-        # Serve arquivos estáticos de /public
-        safe_path = self.path.lstrip("/")
-        self._serve_public(safe_path)
+    def do_HEAD(self) -> None:  # type: ignore[override]
+        self._handle_static(send_body=False)
 
     def do_POST(self) -> None:  # type: ignore[override]
         if self.path.startswith("/api/chat"):
@@ -44,30 +103,36 @@ class ChatHandler(SimpleHTTPRequestHandler):
         self.send_response(404)
         self.end_headers()
 
-    def _serve_public(self, filename: str) -> None:
-        target = os.path.join(PUBLIC_DIR, filename)
-        if not os.path.abspath(target).startswith(os.path.abspath(PUBLIC_DIR)):
-            self.send_response(403)
-            self.end_headers()
-            return
-
-        if not os.path.exists(target) or not os.path.isfile(target):
-            self.send_response(404)
-            self.end_headers()
+    def _handle_static(self, send_body: bool) -> None:
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        resolved = static_assets.resolve(
+            path,
+            accept_encoding=self.headers.get("Accept-Encoding"),
+            if_none_match=self.headers.get("If-None-Match"),
+            if_modified_since=self.headers.get("If-Modified-Since"),
+        )
+
+        self.send_response(resolved.status)
+        if resolved.content_type:
+            self.send_header("Content-Type", resolved.content_type)
+        for name, value in resolved.headers.items():
+            self.send_header(name, value)
+        if resolved.file_path is None:
+            self.send_header("Content-Length", "0")
+        self.end_headers()
+        if not send_body or resolved.file_path is None:
             return
+        # Envia em blocos: não carrega o arquivo inteiro na memória
+        with open(resolved.file_path, "rb") as f:
+            shutil.copyfileobj(f, self.wfile, STATIC_CHUNK_SIZE)
 
-        self.send_response(200)
-        if target.endswith(".html"):
-            self.send_header("Content-Type", "text/html; charset=utf-8")
-        elif target.endswith(".js"):
-            self.send_header("Content-Type", "application/javascript; charset=utf-8")
-        elif target.endswith(".css"):
-            self.send_header("Content-Type", "text/css; charset=utf-8")
-        else:
-            self.send_header("Content-Type", "application/octet-stream")
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
         self.end_headers()
-        with open(target, "rb") as f:
-            self.wfile.write(f.read())
+        self.wfile.write(body)
 
     def _handle_chat(self) -> None:
         content_length = int(self.headers.get("Content-Length", "0"))
@@ -82,48 +147,51 @@ class ChatHandler(SimpleHTTPRequestHandler):
         agent_id: str = payload.get("agentId") or "planner"
 
         if not user_message:
-            self.send_response(400)
-            self.send_header("Content-Type", "application/json")
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": "message é obrigatório"}).encode("utf-8"))
+            self._send_json(400, {"error": "message é obrigatório"})
             return
 
         if not os.getenv("OPENAI_API_KEY"):
-            self.send_response(500)
-            self.send_header("Content-Type", "application/json")
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": "OPENAI_API_KEY não definido"}).encode("utf-8"))
+            self._send_json(500, {"error": "OPENAI_API_KEY não definido"})
             return
 
-        session = SQLiteSession(f"mentor_session_{session_id}")
+        session = get_session_store().open(f"mentor_session_{session_id}")
 
         try:
-            reply = asyncio.run(run_agent(session, user_message, agent_id))
+            reply = get_event_loop_thread().run(run_agent(session, user_message, agent_id), timeout=CHAT_TIMEOUT)
+        except FutureTimeoutError:
+            self._send_json(504, {"error": f"Tempo limite de {CHAT_TIMEOUT:g}s excedido"})
+            return
         except Exception as e:
-            self.send_response(500)
-            self.send_header("Content-Type", "application/json")
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": str(e)}).encode("utf-8"))
+            self._send_json(500, {"error": str(e)})
             return
 
-        self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
-        self.wfile.write(json.dumps({"reply": reply}).encode("utf-8"))
+        self._send_json(200, {"reply": reply})
 
 
-def run(host: str = "127.0.0.1", port: int = 8000) -> None:
+def run(host: str = "127.0.0.1", port: int = 8000, concurrent: bool = True) -> None:
+    """Sobe o servidor leve.
+
+    Com `concurrent=True` (padrão) cada requisição roda na sua thread e todas compartilham
+    um único event loop para o agente; uma resposta lenta não bloqueia as demais.
+    `concurrent=False` mantém o atendimento de uma requisição por vez.
+    """
     if not os.path.isdir(PUBLIC_DIR):
         os.makedirs(PUBLIC_DIR, exist_ok=True)
 
-    httpd = HTTPServer((host, port), ChatHandler)
-    print(f"Servidor rodando em http://{host}:{port}")
-    httpd.serve_forever()
+    static_assets.precompress()
+    server_class = ThreadingHTTPServer if concurrent else HTTPServer
+    httpd = server_class((host, port), ChatHandler)
+    httpd.daemon_threads = True
+    get_event_loop_thread()
+    mode = "concorrente" if concurrent else "sequencial"
+    print(f"Servidor rodando em http://{host}:{port} (modo {mode})")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
 
 
 if __name__ == "__main__":
     if not os.getenv("OPENAI_API_KEY"):
         raise RuntimeError("Defina OPENAI_API_KEY antes de iniciar o servidor.")
-    run()
-
-
+    run(concurrent="--single-thread" not in sys.argv[1:])
@@ -1,27 +1,185 @@
 import os
 import json
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set, Tuple
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
-from agents import Agent, Runner, SQLiteSession
+from agents import Agent, ModelBehaviorError, Runner
+from agents.memory import SessionABC
 from .agents.study_planner import build_agent as build_planner
 from .agents.concepts_helper import build_agent as build_helper
 from .agents.tutor_agent import create_tutor_agent
-from .agents.assessment_agent import build_assessment_agent
+from .agents.assessment_agent import (
+    ASSESSMENT_PROMPT_VERSION,
+    AssessmentParseError,
+    RawOutputHooks,
+    build_assessment_agent,
+    build_assessment_chat_agent,
+    build_assessment_repair_agent,
+    build_repair_input,
+    parse_assessment_output,
+)
 from .agents.config import get_agent_config, update_agent_config, AGENT_CONFIGS
-from .rag.retriever import search_chunks
-from .progress_tracker import ProgressTracker
+from .rag import retriever
+from .rag.retriever import IndexMismatchError, get_index_info, search_chunks
+from .rag.shards import ShardNotFoundError, get_shard_cache, list_shards, resolve_shards, shard_scope, shard_status
+from .openai_client import reset_openai_client
+from .openai_gateway import BATCH, GatewayBusyError, get_gateway, priority
+from .progress_broker import RESYNC, Subscription, get_progress_broker
+from .progress_tracker import USAGE_GROUPS, ProgressSummary, ProgressTracker, XpAward
+from .router import AUTO_AGENT, get_router
+from .exercise_bank import get_exercise_bank, remedial_hint
+from .grade_cache import GradeCache, grade_cache_key
+from .intents import detect_intent_async
+from . import jobs
+from .session_store import get_session_store
+from .session_window import open_chat_session
+from .static_assets import StaticAssetRegistry
+from . import telemetry
+from .telemetry import span
+from .usage import USAGE_FLUSH_SECONDS, get_usage_recorder, usage_scope
 
 
 load_dotenv()
+logger = logging.getLogger(__name__)
+
+
+# Agentes cujos índices são carregados em segundo plano após a subida ("all" = todos)
+PREWARM_AGENTS = os.getenv("MENTORIA_PREWARM", "")
+
+
+def _prewarm_agents() -> List[str]:
+    value = PREWARM_AGENTS.strip()
+    if not value or value == "0":
+        return []
+    if value.lower() in ("1", "all"):
+        return [agent_id for agent_id, config in AGENT_CONFIGS.items() if config.tools_enabled] or ["tutor"]
+    return [agent_id.strip() for agent_id in value.split(",") if agent_id.strip()]
+
+
+def _retrieving_agents() -> Set[str]:
+    """Agentes cujo índice é usado no chat: ferramentas de busca ligadas ou aquecidos no início."""
+    return {agent_id for agent_id, config in AGENT_CONFIGS.items() if config.tools_enabled} | set(_prewarm_agents())
+
+
+# Estado do aquecimento exibido no /readyz: off | running | done
+prewarm_state: Dict[str, Any] = {"state": "off", "agents": {}}
+
+
+async def _prewarm(agent_ids: List[str]) -> None:
+    prewarm_state["state"] = "running"
+    # Cede o loop antes: o servidor já aceita requisições enquanto os índices carregam
+    await asyncio.sleep(0)
+    status = await asyncio.to_thread(retriever.prewarm, agent_ids)
+    prewarm_state.update({"state": "done", "agents": status})
+    logger.info("Prewarm dos índices: %s", status)
+
+
+# Intervalo (s) da manutenção do progress.db (retenção de transcrições, VACUUM); 0 = desliga
+PROGRESS_VACUUM_INTERVAL = float(os.getenv("PROGRESS_VACUUM_INTERVAL", "3600"))
+
+
+async def _vacuum_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            stats = await asyncio.to_thread(progress_tracker.vacuum)
+            logger.info("Manutenção do progress.db: %s", stats)
+        except Exception:
+            logger.exception("Falha na manutenção do progress.db")
+
+
+# Processos worker da fila de jobs subidos junto com a API (0 = rode `python -m src.backend.jobs worker` à parte)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+
+
+def apply_job_results(finished: List[jobs.Job]) -> None:
+    """Descarta da memória os índices que um job de ingestão acabou de regravar."""
+    for job in finished:
+        result = job.result or {}
+        if result.get("shard"):
+            get_shard_cache().discard(result["shard"])
+        elif result.get("agents"):
+            for agent_id in result["agents"]:
+                retriever.clear_cache(agent_id)
+        else:
+            retriever.clear_cache()
+        logger.info("Job %s concluído; índices recarregados na próxima busca: %s", job.id, result)
+
+
+async def _job_results_loop(interval: float) -> None:
+    since = time.time()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            finished = await asyncio.to_thread(jobs.get_job_queue().finished_after, since)
+            if finished:
+                since = max(job.finished_at or since for job in finished)
+                apply_job_results(finished)
+        except Exception:
+            logger.exception("Falha ao consultar a fila de jobs")
+
+
+async def _usage_flush_loop(interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(get_usage_recorder().flush)
+        except Exception:
+            logger.exception("Falha ao gravar o uso de tokens")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    static_assets.precompress()
+    agent_ids = _prewarm_agents()
+    tasks = []
+    if agent_ids:
+        tasks.append(asyncio.create_task(_prewarm(agent_ids)))
+    if PROGRESS_VACUUM_INTERVAL > 0:
+        tasks.append(asyncio.create_task(_vacuum_loop(PROGRESS_VACUUM_INTERVAL)))
+    tasks.append(asyncio.create_task(_job_results_loop(jobs.JOB_POLL_SECONDS)))
+    if USAGE_FLUSH_SECONDS > 0:
+        tasks.append(asyncio.create_task(_usage_flush_loop(USAGE_FLUSH_SECONDS)))
+    workers = jobs.spawn_workers(JOB_WORKERS) if JOB_WORKERS > 0 else []
+    yield
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+    if workers:
+        await asyncio.to_thread(jobs.stop_workers, workers)
+    try:
+        await asyncio.to_thread(get_usage_recorder().flush)
+    except Exception:
+        logger.exception("Falha ao gravar o uso de tokens")
+
+
+app = FastAPI(title="MentorIA API", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def request_timing(request: Request, call_next):
+    if not telemetry.is_enabled():
+        return await call_next(request)
+    token = telemetry.start_request()
+    with span("http.request"):
+        response = await call_next(request)
+    header = telemetry.finish_request(token)
+    if header:
+        response.headers["Server-Timing"] = header
+    return response
+
 
-app = FastAPI(title="MentorIA API")
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -33,19 +191,23 @@ app.add_middleware(
 REPO_ROOT = Path(__file__).resolve().parents[2]
 PUBLIC_DIR = REPO_ROOT / "public"
 PUBLIC_DIR.mkdir(exist_ok=True)
-app.mount("/", StaticFiles(directory=str(PUBLIC_DIR), html=True), name="public")
+static_assets = StaticAssetRegistry(PUBLIC_DIR)
 
 
 progress_tracker = ProgressTracker()
 
-
-def detect_intent(message: str) -> str:
-    text = (message or "").lower()
-    if any(keyword in text for keyword in ("pratic", "teste", "quiz", "desafio")):
-        return "practice"
-    if "revis" in text or "review" in text:
-        return "review"
-    return "chat"
+# Limites da correção em lote (/api/grade/batch)
+GRADE_BATCH_MAX_CONCURRENCY = int(os.getenv("GRADE_BATCH_MAX_CONCURRENCY", "8"))
+GRADE_BATCH_ITEM_TIMEOUT = float(os.getenv("GRADE_BATCH_ITEM_TIMEOUT", "60"))
+GRADE_BATCH_MAX_ITEMS = int(os.getenv("GRADE_BATCH_MAX_ITEMS", "200"))
+
+# Correção sem histórico: cada avaliação depende só da pergunta/gabarito/rubrica/resposta,
+# então respostas idênticas da turma são avaliadas uma vez só.
+GRADE_STATELESS = os.getenv("GRADE_STATELESS", "1") != "0"
+grade_cache = GradeCache(
+    max_entries=int(os.getenv("GRADE_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("GRADE_CACHE_TTL", "86400")),
+)
 
 
 def build_next_task(intent: str, path_label: str) -> str:
@@ -71,6 +233,8 @@ def get_agent(agent_id: Optional[str]) -> Agent:
         return build_planner() if build_planner else Agent(name="Planner", instructions="Crie planos de estudo.")
     elif agent in ("helper", "concepts_helper"):
         return build_helper() if build_helper else Agent(name="Helper", instructions="Explique conceitos.")
+    elif agent == "assessment":
+        return build_assessment_chat_agent()
     else:
         return build_planner() if build_planner else Agent(name="Mentor", instructions="Seja útil e claro.")
 
@@ -78,7 +242,13 @@ def get_agent(agent_id: Optional[str]) -> Agent:
 class ChatRequest(BaseModel):
     message: str
     sessionId: Optional[str] = "default"
+    # "auto" = o roteador escolhe o agente a cada mensagem
     agentId: Optional[str] = "planner"
+    # Versão do progresso que o cliente já tem: a resposta traz só o que mudou desde ela
+    progressSince: Optional[int] = None
+    # Escola e disciplinas: a busca do turno fica restrita aos shards delas
+    tenant: Optional[str] = None
+    subjects: Optional[List[str]] = None
 
 
 class GradeRequest(BaseModel):
@@ -88,6 +258,30 @@ class GradeRequest(BaseModel):
     question: Optional[str] = None
     expected: Optional[str] = None
     rubric: Optional[str] = None
+    stateless: Optional[bool] = None
+    progressSince: Optional[int] = None
+
+
+class GradeBatchRequest(BaseModel):
+    items: List[GradeRequest]
+    maxConcurrency: Optional[int] = None
+    timeoutSeconds: Optional[float] = None
+
+
+def _response_progress(progress: ProgressSummary) -> Dict[str, Any]:
+    """Bloco `progress` do chat/grade: completo, ou delta quando o cliente mandou `progressSince`."""
+    fields = {
+        "version": progress.version,
+        "goal": progress.goal,
+        "pathPosition": progress.path_position,
+        "gaps": progress.gaps,
+    }
+    if progress.since is None:
+        fields["recentEvents"] = progress.recent_events
+    else:
+        # Eventos novos em ordem cronológica; XP/badges/trilha/lacunas são pequenos e vão sempre
+        fields.update({"delta": True, "since": progress.since, "events": progress.recent_events[::-1]})
+    return fields
 
 
 def _format_sources(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -99,10 +293,25 @@ def _format_sources(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         }
         if hit.get("score") is not None:
             source["score"] = hit["score"]
+        if hit.get("shard"):
+            source["shard"] = hit["shard"]
         sources.append(source)
     return sources
 
 
+def _resolve_request_shards(tenant: Optional[str], subjects: Optional[List[str]]) -> Optional[List[str]]:
+    if not tenant:
+        if subjects:
+            raise HTTPException(status_code=400, detail="Campo 'subjects' exige 'tenant'.")
+        return None
+    try:
+        return resolve_shards(tenant, subjects)
+    except ShardNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/api/chat")
 async def chat(req: ChatRequest):
     if not req.message:
@@ -110,54 +319,74 @@ async def chat(req: ChatRequest):
     if not os.getenv("OPENAI_API_KEY"):
         raise HTTPException(status_code=500, detail="OPENAI_API_KEY não definido no ambiente.")
 
-    agent = get_agent(req.agentId)
-    # Sessão namespaced por agente e usuário
-    session = SQLiteSession(f"{req.agentId or 'planner'}_session_{req.sessionId}")
-
-    intent = detect_intent(req.message)
-    xp_amount = 5 if intent == "practice" else 2
+    agent_id = req.agentId or "planner"
+    shards = _resolve_request_shards(req.tenant, req.subjects)
+    routing = None
+    answering = agent_id
+    # Tokens e custo de todas as chamadas do turno (roteador, intenção, agente, fontes, resumo)
+    with usage_scope(agent_id, req.sessionId) as request_usage:
+        if agent_id == AUTO_AGENT:
+            # Histórico e progresso continuam em "auto"; o roteador só escolhe quem responde
+            with span("chat.route"), usage_scope("router"):
+                routing = await get_router().route(req.message, Runner)
+            answering = routing.agent_id
+
+        agent = get_agent(answering)
+        # Sessão namespaced por agente e usuário; o modelo recebe resumo + janela recente
+        session = open_chat_session(f"{agent_id}_session_{req.sessionId}")
+
+        intent = await detect_intent_async(req.message, answering)
+        xp_amount = 5 if intent == "practice" else 2
+        max_tokens = get_agent_config(answering).max_tokens
+
+        try:
+            # A ferramenta de busca do tutor herda o escopo (contextvar) da requisição
+            with span("agent.run"), shard_scope(shards), usage_scope(answering):
+                result = await get_gateway().run_agent(Runner, agent, req.message, max_tokens=max_tokens, session=session)
+        except GatewayBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            session.close()
 
-    try:
-        result = await Runner.run(agent, req.message, session=session)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-    hits = []
-    try:
-        hits = search_chunks(req.message, k=6, agent_id=req.agentId or "tutor")
-    except Exception:
         hits = []
+        try:
+            with span("chat.sources"):
+                # Em thread: a espera na fila do gateway não pode travar o event loop
+                sources_agent = answering if routing else (req.agentId or "tutor")
+                hits = await asyncio.to_thread(search_chunks, req.message, k=6, agent_id=sources_agent, shards=shards)
+        except Exception:
+            hits = []
 
     progress = progress_tracker.award_xp(
         req.sessionId,
-        req.agentId or "planner",
+        agent_id,
         xp_amount,
         reason="chat",
         payload={"intent": intent, "message": req.message},
+        since=req.progressSince,
     )
-    progress_tracker.log_event(
-        req.sessionId,
-        req.agentId or "planner",
-        "chat",
-        {"message": req.message, "reply": result.final_output},
-    )
+    chat_event = {"message": req.message, "reply": result.final_output}
+    if routing is not None:
+        chat_event["routing"] = routing.to_dict()
+    progress_tracker.log_event(req.sessionId, agent_id, "chat", chat_event)
 
-    return {
+    response = {
         "reply": result.final_output,
-        "agent": req.agentId or "planner",
+        "agent": agent_id,
         "state": req.sessionId,
         "sources": _format_sources(hits),
         "xpAwarded": progress.awarded,
         "totalXp": progress.xp,
         "badges": progress.badges,
         "nextTask": build_next_task(intent, progress.path_position.get("label", "")),
-        "progress": {
-            "goal": progress.goal,
-            "pathPosition": progress.path_position,
-            "gaps": progress.gaps,
-            "recentEvents": progress.recent_events,
-        },
+        "progress": _response_progress(progress),
     }
+    if routing is not None:
+        response["routing"] = routing.to_dict()
+    response["usage"] = request_usage.to_dict()
+    return response
 
 
 @app.get("/health")
@@ -165,15 +394,76 @@ def health():
     return {"ok": True}
 
 
+@app.get("/livez")
+def livez():
+    """Liveness: o processo responde. Não toca em disco, índice nem OpenAI."""
+    return {"ok": True}
+
+
+@app.get("/readyz")
+def readyz(response: Response, agentId: Optional[str] = None):
+    """Readiness por agente: estado do índice, vetores, dimensão, modelo e aquecimento.
+
+    Só lê o cache e os arquivos do índice (nada de embeddings). Responde 503 enquanto o
+    prewarm roda ou se o índice de um agente que busca no acervo (ferramentas ligadas ou
+    em `PREWARM_AGENTS`) ou um shard de escola foi gerado com outro modelo; nos demais
+    agentes o `mismatch` só é informado.
+    """
+    agent_ids = [agentId] if agentId else list(AGENT_CONFIGS)
+    agents = {agent_id: retriever.index_status(agent_id) for agent_id in agent_ids}
+    retrieving = _retrieving_agents()
+    for agent_id, status in agents.items():
+        status["retrieves"] = agent_id in retrieving
+    shard_states = shard_status(sorted(retrieving & set(agent_ids)))
+    ready = prewarm_state["state"] != "running" and not any(
+        status["state"] == "mismatch" and status["retrieves"] for status in agents.values()
+    ) and not any(status["state"] == "mismatch" for status in shard_states.values())
+    if not ready:
+        response.status_code = 503
+    return {
+        "ready": ready,
+        "openaiKey": bool(os.getenv("OPENAI_API_KEY")),
+        "prewarm": prewarm_state["state"],
+        "agents": agents,
+        "shards": shard_states,
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Contadores e gauges no formato do Prometheus; histogramas por span com MENTORIA_TRACING=1."""
+    return PlainTextResponse(telemetry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/debug/retriever")
-def debug_retriever(q: str, k: int = 5, agent_id: str = "tutor"):
+def debug_retriever(q: str, k: int = 5, agent_id: str = "tutor", tenant: Optional[str] = None, subject: Optional[str] = None):
+    shards = _resolve_request_shards(tenant, [subject] if subject else None)
     try:
-        hits = search_chunks(q, k=k, agent_id=agent_id)
-        return {"query": q, "k": k, "agent_id": agent_id, "hits": hits}
+        hits = search_chunks(q, k=k, agent_id=agent_id, shards=shards)
+        return {"query": q, "k": k, "agent_id": agent_id, "index": get_index_info(agent_id), "shards": shards, "hits": hits}
+    except IndexMismatchError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/rag/shards")
+def rag_shards(tenant: Optional[str] = None):
+    """Shards registrados e o estado do cache: bytes residentes, acertos, faltas e despejos."""
+    cache = get_shard_cache().stats()
+    registered = list_shards(tenant)
+    shards = {}
+    for shard, info in registered.items():
+        stats = cache["shards"].get(shard, {"loaded": False, "bytes": 0, "hits": 0, "misses": 0, "hitRate": None, "evictions": 0, "searches": 0})
+        shards[shard] = {
+            **stats,
+            "embedModel": info.get("embed_model"),
+            "vectors": info.get("count"),
+            "version": info.get("version"),
+        }
+    return {"budgetBytes": cache["budgetBytes"], "usedBytes": cache["usedBytes"], "loaded": cache["loaded"], "shards": shards}
+
+
 class ApiKeyRequest(BaseModel):
     apiKey: str
     persist: Optional[bool] = False
@@ -184,8 +474,9 @@ def set_api_key(req: ApiKeyRequest):
     if not req.apiKey:
         raise HTTPException(status_code=400, detail="apiKey é obrigatório")
 
-    # Define para o processo atual
+    # Define para o processo atual; o cliente compartilhado é recriado com a nova chave
     os.environ["OPENAI_API_KEY"] = req.apiKey
+    reset_openai_client()
 
     # Persiste no .env se solicitado
     if req.persist:
@@ -214,6 +505,10 @@ def list_agents():
                 "rag_k": config.rag_k,
                 "rag_chunk_size": config.rag_chunk_size,
                 "rag_overlap": config.rag_overlap,
+                "rag_rerank": config.rag_rerank,
+                "rag_rerank_fetch": config.rag_rerank_fetch,
+                "rag_mmr_lambda": config.rag_mmr_lambda,
+                "rag_snippet_chars": config.rag_snippet_chars,
                 "tools_enabled": config.tools_enabled,
                 "filters": config.filters,
             }
@@ -231,9 +526,15 @@ class AgentConfigRequest(BaseModel):
     rag_k: Optional[int] = None
     rag_chunk_size: Optional[int] = None
     rag_overlap: Optional[int] = None
+    rag_rerank: Optional[bool] = None
+    rag_rerank_fetch: Optional[int] = None
+    rag_mmr_lambda: Optional[float] = None
+    rag_snippet_chars: Optional[int] = None
     system_prompt: Optional[str] = None
     tools_enabled: Optional[bool] = None
     filters: Optional[Dict[str, Any]] = None
+    intents: Optional[Dict[str, List[str]]] = None
+    intent_examples: Optional[Dict[str, List[str]]] = None
 
 
 @app.post("/api/agents/config")
@@ -249,23 +550,22 @@ def update_agent_config_endpoint(req: AgentConfigRequest):
             rag_k=req.rag_k,
             rag_chunk_size=req.rag_chunk_size,
             rag_overlap=req.rag_overlap,
+            rag_rerank=req.rag_rerank,
+            rag_rerank_fetch=req.rag_rerank_fetch,
+            rag_mmr_lambda=req.rag_mmr_lambda,
+            rag_snippet_chars=req.rag_snippet_chars,
             system_prompt=req.system_prompt,
             tools_enabled=req.tools_enabled,
             filters=req.filters,
+            intents=req.intents,
+            intent_examples=req.intent_examples,
         )
         return {"ok": True, "config": config}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/grade")
-async def grade(req: GradeRequest):
-    if not req.answer:
-        raise HTTPException(status_code=400, detail="Campo 'answer' é obrigatório.")
-
-    agent = build_assessment_agent()
-    session = SQLiteSession(f"assessment_{req.sessionId}")
-
+def _build_grade_prompt(req: GradeRequest) -> str:
     prompt_parts = ["Avalie a resposta do aluno seguindo a rubrica."]
     if req.question:
         prompt_parts.append(f"Pergunta: {req.question}")
@@ -273,74 +573,413 @@ async def grade(req: GradeRequest):
         prompt_parts.append(f"Gabarito ou pontos esperados: {req.expected}")
     if req.rubric:
         prompt_parts.append(f"Rubrica adicional: {req.rubric}")
+    # Tarefas de reforço prontas para os tópicos da questão: o avaliador só cita o id
+    hint = remedial_hint(req.question)
+    if hint:
+        prompt_parts.append(hint)
     prompt_parts.append(f"Resposta do aluno: {req.answer}")
+    return "\n\n".join(prompt_parts)
 
-    try:
-        result = await Runner.run(agent, "\n\n".join(prompt_parts), session=session)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
 
-    raw_output = result.final_output.strip()
-    if raw_output.startswith("```"):
-        raw_output = raw_output.strip("`").strip()
-        if raw_output.startswith("json"):
-            raw_output = raw_output[4:].strip()
+async def _run_assessment(req: GradeRequest, session: Optional[SessionABC] = None) -> Dict[str, Any]:
+    agent = build_assessment_agent()
+    gateway = get_gateway()
+    raw = RawOutputHooks()
+    try:
+        with span("assessment.run"):
+            result = await gateway.run_agent(
+                Runner,
+                agent,
+                _build_grade_prompt(req),
+                max_tokens=get_agent_config("assessment").max_tokens,
+                session=session,
+                hooks=raw,
+            )
+        output = result.final_output
+    except ModelBehaviorError as exc:
+        # Saída fora do schema: o SDK não devolve o texto, só o hook o guardou
+        if not raw.text:
+            raise AssessmentParseError("o avaliador não devolveu texto") from exc
+        output = raw.text
+    try:
+        return parse_assessment_output(output)
+    except AssessmentParseError:
+        if not isinstance(output, str):
+            raise
 
+    # Uma única passada de reparo: reformata a avaliação já escrita em vez de corrigir de novo.
     try:
-        grade_data = json.loads(raw_output)
-    except Exception as exc:  # noqa: BLE001
-        raise HTTPException(status_code=500, detail=f"Falha ao interpretar avaliação: {exc}")
+        with span("assessment.repair"):
+            repaired = await gateway.run_agent(Runner, build_assessment_repair_agent(), build_repair_input(output))
+    except ModelBehaviorError as exc:
+        # O reparo tem `output_type`: saída fora do schema vira exceção do SDK
+        raise AssessmentParseError("o reparo também saiu fora do formato") from exc
+    return parse_assessment_output(repaired.final_output)
 
-    xp_awarded = int(grade_data.get("xp_awarded", 0) or 0)
-    gaps = grade_data.get("gaps") if isinstance(grade_data.get("gaps"), list) else None
 
-    progress = progress_tracker.award_xp(
-        req.sessionId,
-        req.agentId or "tutor",
-        xp_awarded,
+async def _evaluate_answer(req: GradeRequest) -> Tuple[Dict[str, Any], bool]:
+    """Avalia a resposta; retorna (avaliação, veio_do_cache).
+
+    No modo stateless o avaliador roda sem sessão e o resultado vai para o cache;
+    com `stateless=False` o histórico `assessment_{sessionId}` é usado e nada é cacheado.
+    """
+    stateless = GRADE_STATELESS if req.stateless is None else req.stateless
+    if not stateless:
+        session = get_session_store().open(f"assessment_{req.sessionId}")
+        return await _run_assessment(req, session=session), False
+
+    # Versão do banco na chave: avaliações em cache citam itens por id ("banco:<id>")
+    version = f"{ASSESSMENT_PROMPT_VERSION}:{get_exercise_bank().version()}"
+    key = grade_cache_key(req.question, req.expected, req.rubric, req.answer, version)
+    return await grade_cache.get_or_compute(key, lambda: _run_assessment(req))
+
+
+def _grade_award(req: GradeRequest, grade_data: Dict[str, Any]) -> XpAward:
+    gaps = grade_data.get("gaps") if isinstance(grade_data.get("gaps"), list) else None
+    return XpAward(
+        session_id=req.sessionId,
+        agent_id=req.agentId or "tutor",
+        amount=int(grade_data.get("xp_awarded", 0) or 0),
         reason="grade",
         payload={"question": req.question, "score": grade_data.get("score")},
         gaps=gaps,
-    )
-    progress_tracker.log_event(
-        req.sessionId,
-        req.agentId or "tutor",
-        "grade",
-        {
+        event_type="grade",
+        event_payload={
             "score": grade_data.get("score"),
             "feedback": grade_data.get("feedback"),
         },
     )
 
-    response = {
+
+def _grade_fields(grade_data: Dict[str, Any], xp_awarded: int, question: Optional[str] = None) -> Dict[str, Any]:
+    remedial_task, remedial_id = get_exercise_bank().expand_ref(grade_data.get("remedial_task"), question)
+    fields = {
         "score": grade_data.get("score"),
         "feedback": grade_data.get("feedback"),
         "xpAwarded": xp_awarded,
-        "remedialTask": grade_data.get("remedial_task"),
+        "remedialTask": remedial_task,
+    }
+    if remedial_id is not None:
+        fields["remedialTaskId"] = remedial_id
+    if "strengths" in grade_data:
+        fields["strengths"] = grade_data["strengths"]
+    return fields
+
+
+@app.post("/api/grade")
+async def grade(req: GradeRequest):
+    if not req.answer:
+        raise HTTPException(status_code=400, detail="Campo 'answer' é obrigatório.")
+
+    try:
+        with usage_scope("assessment", req.sessionId) as request_usage:
+            grade_data, cached = await _evaluate_answer(req)
+    except GatewayBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except AssessmentParseError as exc:
+        raise HTTPException(status_code=500, detail=f"Falha ao interpretar avaliação: {exc}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    award = _grade_award(req, grade_data)
+    progress = progress_tracker.award_xp_batch([award], since=req.progressSince)[(award.session_id, award.agent_id)]
+
+    response = _grade_fields(grade_data, award.amount, req.question)
+    response.update({
+        "cached": cached,
         "badges": progress.badges,
         "totalXp": progress.xp,
-        "progress": {
-            "goal": progress.goal,
-            "pathPosition": progress.path_position,
-            "gaps": progress.gaps,
-            "recentEvents": progress.recent_events,
-        },
+        "progress": _response_progress(progress),
+        "usage": request_usage.to_dict(),
+    })
+    return response
+
+
+async def _grade_batch_item(
+    index: int,
+    item: GradeRequest,
+    semaphore: asyncio.Semaphore,
+    timeout: float,
+) -> Dict[str, Any]:
+    if not item.answer:
+        return {"index": index, "ok": False, "error": "Campo 'answer' é obrigatório."}
+
+    async with semaphore:
+        try:
+            # Cada item é cobrado da sessão dele
+            with usage_scope("assessment", item.sessionId):
+                grade_data, cached = await asyncio.wait_for(_evaluate_answer(item), timeout=timeout)
+        except asyncio.TimeoutError:
+            return {"index": index, "ok": False, "error": f"Tempo limite de {timeout:g}s excedido."}
+        except AssessmentParseError as exc:
+            return {"index": index, "ok": False, "error": f"Falha ao interpretar avaliação: {exc}"}
+        except Exception as e:  # noqa: BLE001
+            return {"index": index, "ok": False, "error": str(e)}
+
+    return {"index": index, "ok": True, "grade": grade_data, "cached": cached}
+
+
+@app.post("/api/grade/batch")
+async def grade_batch(req: GradeBatchRequest):
+    """Corrige várias respostas em paralelo e grava todo o XP numa única transação."""
+    if not req.items:
+        raise HTTPException(status_code=400, detail="Campo 'items' é obrigatório.")
+    if len(req.items) > GRADE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo de {GRADE_BATCH_MAX_ITEMS} respostas por lote.",
+        )
+
+    concurrency = max(1, min(req.maxConcurrency or GRADE_BATCH_MAX_CONCURRENCY, GRADE_BATCH_MAX_CONCURRENCY))
+    timeout = req.timeoutSeconds if req.timeoutSeconds and req.timeoutSeconds > 0 else GRADE_BATCH_ITEM_TIMEOUT
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # Lote fica atrás do chat e das correções individuais na fila do gateway
+    with priority(BATCH):
+        outcomes = await asyncio.gather(
+            *(_grade_batch_item(i, item, semaphore, timeout) for i, item in enumerate(req.items))
+        )
+
+    awards: List[XpAward] = []
+    results: List[Dict[str, Any]] = []
+    for outcome in outcomes:
+        if not outcome["ok"]:
+            results.append(outcome)
+            continue
+        item = req.items[outcome["index"]]
+        award = _grade_award(item, outcome["grade"])
+        awards.append(award)
+        result = {"index": outcome["index"], "ok": True, "sessionId": item.sessionId, "cached": outcome["cached"]}
+        result.update(_grade_fields(outcome["grade"], award.amount, item.question))
+        results.append(result)
+
+    try:
+        summaries = progress_tracker.award_xp_batch(awards)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Falha ao gravar progresso: {e}")
+
+    return {
+        "results": results,
+        "succeeded": len(awards),
+        "failed": len(results) - len(awards),
+        "progress": [
+            {
+                "sessionId": session_id,
+                "agentId": agent_id,
+                "totalXp": summary.xp,
+                "xpAwarded": summary.awarded,
+                "badges": summary.badges,
+                "pathPosition": summary.path_position,
+                "gaps": summary.gaps,
+            }
+            for (session_id, agent_id), summary in summaries.items()
+        ],
     }
 
-    if "strengths" in grade_data:
-        response["strengths"] = grade_data["strengths"]
 
-    return response
+# Intervalo dos comentários de keep-alive do SSE (proxies fecham conexões ociosas)
+PROGRESS_STREAM_HEARTBEAT = float(os.getenv("PROGRESS_STREAM_HEARTBEAT", "15"))
+# Intervalo da checagem da versão no banco: o broker é por processo, então gravações feitas
+# em outro worker do uvicorn só chegam ao stream por aqui (0 desliga)
+PROGRESS_STREAM_POLL = float(os.getenv("PROGRESS_STREAM_POLL", "5"))
+
+
+def _progress_payload(progress: ProgressSummary) -> Dict[str, Any]:
+    return {"xp": progress.xp, "badges": progress.badges, **_response_progress(progress)}
 
 
 @app.get("/api/progress")
-def get_progress(sessionId: str = "default", agentId: str = "tutor"):
-    progress = progress_tracker.get_progress(sessionId, agentId)
-    return {
-        "xp": progress.xp,
-        "goal": progress.goal,
-        "badges": progress.badges,
-        "pathPosition": progress.path_position,
-        "gaps": progress.gaps,
-        "recentEvents": progress.recent_events,
-    }
\ No newline at end of file
+def get_progress(sessionId: str = "default", agentId: str = "tutor", since: Optional[int] = None):
+    return _progress_payload(progress_tracker.get_progress(sessionId, agentId, since=since))
+
+
+@app.get("/api/progress/events/{event_id}")
+def get_progress_event(event_id: int, sessionId: str = "default"):
+    """Evento completo (mensagem/resposta inteiras) — os resumos de `recentEvents` vêm cortados."""
+    event = progress_tracker.get_event(sessionId, event_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail="Evento não encontrado.")
+    return event
+
+
+_USAGE_KEYS = {
+    "agent_id": "agent",
+    "session_id": "sessionId",
+    "input_tokens": "inputTokens",
+    "output_tokens": "outputTokens",
+    "total_tokens": "totalTokens",
+    "cost_usd": "costUsd",
+}
+
+
+@app.get("/api/usage")
+def get_usage(days: int = 7, groupBy: str = "agent", sessionId: Optional[str] = None, agentId: Optional[str] = None):
+    """Tokens e custo estimado (USD) desde `days` dias atrás; `groupBy` aceita day, agent, session, model, kind."""
+    group_by = [g.strip() for g in groupBy.split(",") if g.strip()]
+    invalid = [g for g in group_by if g not in USAGE_GROUPS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"groupBy inválido: {', '.join(invalid)}. Use {', '.join(USAGE_GROUPS)}.")
+    if days < 1:
+        raise HTTPException(status_code=400, detail="Campo 'days' deve ser positivo.")
+
+    recorder = get_usage_recorder()
+    # Pendentes entram antes da consulta: o relatório inclui a última requisição
+    recorder.flush()
+    since = (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat()
+    rows = recorder.tracker.usage_summary(since, group_by, session_id=sessionId, agent_id=agentId)
+    rows = [{_USAGE_KEYS.get(k, k): (round(v, 6) if k == "cost_usd" else v) for k, v in row.items()} for row in rows]
+    totals = {
+        key: sum(row[key] for row in rows)
+        for key in ("requests", "inputTokens", "outputTokens", "totalTokens", "costUsd", "seconds")
+    }
+    totals["costUsd"] = round(totals["costUsd"], 6)
+    payload = {
+        "since": since,
+        "groupBy": group_by,
+        "rows": rows,
+        "totals": totals,
+        "budget": {"sessionDailyTokens": recorder.session_budget, "budgetModel": recorder.budget_model},
+    }
+    if sessionId:
+        payload["sessionTokensToday"] = recorder.session_tokens(sessionId)
+    return payload
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def progress_events(session_id: str, agent_id: str, subscription: Subscription):
+    """Snapshot inicial e, depois, um evento `delta` por commit do ProgressTracker.
+
+    Gravações de outros processos não passam pelo broker: quando a versão no banco passa
+    da última enviada, o stream manda um snapshot novo.
+    """
+    broker = get_progress_broker()
+    loop = asyncio.get_running_loop()
+    wait = min(PROGRESS_STREAM_POLL or PROGRESS_STREAM_HEARTBEAT, PROGRESS_STREAM_HEARTBEAT)
+    try:
+        # A assinatura já existe: nada commitado depois do snapshot se perde
+        snapshot = await asyncio.to_thread(progress_tracker.get_progress, session_id, agent_id)
+        version, sent = snapshot.version, loop.time()
+        yield _sse("snapshot", _progress_payload(snapshot))
+        while True:
+            try:
+                delta = await asyncio.wait_for(subscription.get(), wait)
+            except asyncio.TimeoutError:
+                delta = None
+                if PROGRESS_STREAM_POLL and await asyncio.to_thread(progress_tracker.version, session_id, agent_id) > version:
+                    delta = RESYNC
+                elif loop.time() - sent >= PROGRESS_STREAM_HEARTBEAT:
+                    sent = loop.time()
+                    yield ": ping\n\n"
+                if delta is None:
+                    continue
+            if delta is RESYNC:
+                snapshot = await asyncio.to_thread(progress_tracker.get_progress, session_id, agent_id)
+                version = snapshot.version
+                yield _sse("snapshot", _progress_payload(snapshot))
+            else:
+                version = max(version, delta.get("version", 0))
+                yield _sse("delta", delta)
+            sent = loop.time()
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@app.get("/api/progress/stream")
+async def progress_stream(sessionId: str = "default", agentId: str = "tutor"):
+    """SSE com o progresso da sessão: o painel recebe só as mudanças, sem polling."""
+    subscription = get_progress_broker().subscribe(sessionId, agentId)
+    return StreamingResponse(
+        progress_events(sessionId, agentId, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class JobRequest(BaseModel):
+    kind: str
+    params: Optional[Dict[str, Any]] = None
+
+
+def _get_job_or_404(job_id: int) -> jobs.Job:
+    job = jobs.get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return job
+
+
+@app.post("/api/jobs", status_code=202)
+def create_job(req: JobRequest):
+    """Enfileira ingestão/re-embedding; um worker fora da API executa."""
+    try:
+        job = jobs.enqueue(req.kind, req.params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job.to_dict()
+
+
+@app.get("/api/jobs")
+def list_jobs(state: Optional[str] = None, limit: int = 20):
+    return {"jobs": [job.to_dict() for job in jobs.get_job_queue().list(state, min(limit, 200))]}
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: int):
+    return _get_job_or_404(job_id).to_dict()
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: int):
+    """Na fila: cancela na hora. Rodando: o worker para no próximo lote."""
+    _get_job_or_404(job_id)
+    return jobs.get_job_queue().cancel(job_id).to_dict()
+
+
+# Intervalo entre leituras do job no SSE (o worker grava em outro processo)
+JOB_STREAM_POLL = float(os.getenv("JOB_STREAM_POLL", "0.5"))
+
+
+async def job_events(job_id: int):
+    """Um evento `progress` a cada mudança do job e `done` no estado final."""
+    queue = jobs.get_job_queue()
+    version, idle = -1, 0.0
+    while True:
+        job = await asyncio.to_thread(queue.get, job_id)
+        if job is None:
+            return
+        if job.version != version:
+            version, idle = job.version, 0.0
+            yield _sse("done" if job.finished else "progress", job.to_dict())
+            if job.finished:
+                return
+        elif idle >= PROGRESS_STREAM_HEARTBEAT:
+            idle = 0.0
+            yield ": ping\n\n"
+        await asyncio.sleep(JOB_STREAM_POLL)
+        idle += JOB_STREAM_POLL
+
+
+@app.get("/api/jobs/{job_id}/stream")
+def job_stream(job_id: int):
+    _get_job_or_404(job_id)
+    return StreamingResponse(
+        job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Registrada por último: a rota curinga captura qualquer caminho e esconderia as rotas da API.
+@app.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+def public_files(path: str, request: Request):
+    resolved = static_assets.resolve(
+        path,
+        accept_encoding=request.headers.get("accept-encoding"),
+        if_none_match=request.headers.get("if-none-match"),
+        if_modified_since=request.headers.get("if-modified-since"),
+    )
+    if resolved.file_path is None:
+        return Response(status_code=resolved.status, headers=resolved.headers)
+    return FileResponse(resolved.file_path, headers=resolved.headers, media_type=resolved.content_type)
@@ -0,0 +1,468 @@
+"""Armazenamento compartilhado de sessões de conversa.
+
+Todos os servidores/workers abrem sessões por `get_session_store().open(session_id)`:
+
+- `SQLiteSessionStore`: arquivo SQLite em modo WAL com pool de conexões, compartilhado
+  entre processos (mesmo esquema `agent_sessions`/`agent_messages` do `SQLiteSession` do SDK).
+- `ListSessionStore`: qualquer backend com a interface de listas do Redis
+  (`rpush`/`lrange`/`llen`/`ltrim`/`rpop`/`get`/`set`/`delete`); `InMemoryListBackend`
+  é o substituto local e um cliente `redis.Redis` serve diretamente.
+
+Cada sessão guarda no máximo `max_items` itens (retenção limitada); o resumo usado pelo
+`WindowedSession` fica no mesmo armazenamento.
+"""
+import asyncio
+import json
+import os
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Tuple
+
+from agents.memory import SessionABC
+
+from .progress_tracker import DB_DIR
+
+SESSION_DB_PATH = Path(os.getenv("SESSION_DB_PATH", str(DB_DIR / "sessions.db")))
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE", "sqlite")
+SESSION_POOL_SIZE = int(os.getenv("SESSION_POOL_SIZE", "8"))
+# Retenção por sessão: itens além disso são descartados (o resumo já os cobre)
+SESSION_MAX_ITEMS = int(os.getenv("SESSION_MAX_ITEMS", "2000"))
+
+
+def _decode(values) -> List[Dict[str, Any]]:
+    items = []
+    for data in values:
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        try:
+            items.append(json.loads(data))
+        except (json.JSONDecodeError, TypeError):
+            continue
+    return items
+
+
+class StoredSession(SessionABC):
+    """Sessão do SDK com acesso posicional ao histórico e ao resumo (usado pelo janelamento)."""
+
+    session_id: str
+
+    @abstractmethod
+    def read_tail(self, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """Retorna (total de itens, últimos `limit` itens em ordem cronológica)."""
+
+    @abstractmethod
+    def items_range(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        """Itens nas posições [start, stop)."""
+
+    @abstractmethod
+    def load_summary(self) -> Tuple[str, int]:
+        """Retorna (resumo, quantidade de itens iniciais já cobertos)."""
+
+    @abstractmethod
+    def save_summary(self, summary: str, covered: int) -> None:
+        ...
+
+    def close(self) -> None:
+        """Conexões pertencem ao store; nada a liberar por sessão."""
+
+
+class SessionStore(ABC):
+    @abstractmethod
+    def open(self, session_id: str) -> StoredSession:
+        """Abre uma sessão; deve ser barato (sem DDL nem conexões novas)."""
+
+
+# --- SQLite (WAL + pool) ---
+
+
+class SQLitePool:
+    """Pool fixo de conexões SQLite em modo WAL, seguro para threads."""
+
+    def __init__(self, db_path: Path, size: int = SESSION_POOL_SIZE) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._idle.put(self._new_connection())
+
+    def _new_connection(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Empresta uma conexão; commit ao sair sem erro, rollback caso contrário."""
+        conn = self._idle.get()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(
+        self,
+        db_path: Path = SESSION_DB_PATH,
+        pool_size: int = SESSION_POOL_SIZE,
+        max_items: int = SESSION_MAX_ITEMS,
+    ) -> None:
+        self.pool = SQLitePool(db_path, pool_size)
+        self.max_items = max_items
+        with self.pool.connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS agent_sessions (
+                    session_id TEXT PRIMARY KEY,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS agent_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    message_data TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (session_id) REFERENCES agent_sessions (session_id)
+                        ON DELETE CASCADE
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_agent_messages_session_id
+                ON agent_messages (session_id, id)
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS session_summaries (
+                    session_id TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL DEFAULT '',
+                    covered INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+
+    def open(self, session_id: str) -> StoredSession:
+        return SQLiteStoredSession(self, session_id)
+
+
+class SQLiteStoredSession(StoredSession):
+    def __init__(self, store: SQLiteSessionStore, session_id: str) -> None:
+        self.store = store
+        self.session_id = session_id
+        self.session_settings = None
+
+    # Operações síncronas (rodam em threads via asyncio.to_thread)
+
+    def _add_items(self, items: List[Dict[str, Any]]) -> None:
+        with self.store.pool.connection() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO agent_sessions (session_id) VALUES (?)",
+                (self.session_id,),
+            )
+            conn.executemany(
+                "INSERT INTO agent_messages (session_id, message_data) VALUES (?, ?)",
+                [(self.session_id, json.dumps(item)) for item in items],
+            )
+            conn.execute(
+                "UPDATE agent_sessions SET updated_at = CURRENT_TIMESTAMP WHERE session_id = ?",
+                (self.session_id,),
+            )
+            self._enforce_retention(conn)
+
+    def _enforce_retention(self, conn: sqlite3.Connection) -> None:
+        if self.store.max_items <= 0:
+            return
+        total = conn.execute(
+            "SELECT COUNT(*) FROM agent_messages WHERE session_id = ?",
+            (self.session_id,),
+        ).fetchone()[0]
+        excess = total - self.store.max_items
+        if excess <= 0:
+            return
+        conn.execute(
+            """
+            DELETE FROM agent_messages WHERE id IN (
+                SELECT id FROM agent_messages WHERE session_id = ? ORDER BY id ASC LIMIT ?
+            )
+            """,
+            (self.session_id, excess),
+        )
+        # As posições andam junto: o resumo passa a cobrir menos itens remanescentes
+        conn.execute(
+            "UPDATE session_summaries SET covered = MAX(0, covered - ?) WHERE session_id = ?",
+            (excess, self.session_id),
+        )
+
+    def read_tail(self, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        with self.store.pool.connection() as conn:
+            total = conn.execute(
+                "SELECT COUNT(*) FROM agent_messages WHERE session_id = ?",
+                (self.session_id,),
+            ).fetchone()[0]
+            rows = conn.execute(
+                """
+                SELECT message_data FROM agent_messages
+                WHERE session_id = ?
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                (self.session_id, limit),
+            ).fetchall()
+        return total, _decode(row[0] for row in reversed(rows))
+
+    def items_range(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        with self.store.pool.connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT message_data FROM agent_messages
+                WHERE session_id = ?
+                ORDER BY id ASC
+                LIMIT ? OFFSET ?
+                """,
+                (self.session_id, max(0, stop - start), start),
+            ).fetchall()
+        return _decode(row[0] for row in rows)
+
+    def _pop_item(self) -> Optional[Dict[str, Any]]:
+        with self.store.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT id, message_data FROM agent_messages WHERE session_id = ? ORDER BY id DESC LIMIT 1",
+                (self.session_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM agent_messages WHERE id = ?", (row[0],))
+        items = _decode([row[1]])
+        return items[0] if items else None
+
+    def _clear(self) -> None:
+        with self.store.pool.connection() as conn:
+            conn.execute("DELETE FROM agent_messages WHERE session_id = ?", (self.session_id,))
+            conn.execute("DELETE FROM agent_sessions WHERE session_id = ?", (self.session_id,))
+            conn.execute("DELETE FROM session_summaries WHERE session_id = ?", (self.session_id,))
+
+    def load_summary(self) -> Tuple[str, int]:
+        with self.store.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT summary, covered FROM session_summaries WHERE session_id = ?",
+                (self.session_id,),
+            ).fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+
+    def save_summary(self, summary: str, covered: int) -> None:
+        with self.store.pool.connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO session_summaries (session_id, summary, covered)
+                VALUES (?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    covered = excluded.covered,
+                    updated_at = CURRENT_TIMESTAMP
+                """,
+                (self.session_id, summary, covered),
+            )
+
+    # Interface assíncrona do SDK
+
+    async def get_items(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        if limit is None:
+            total, _ = await asyncio.to_thread(self.read_tail, 0)
+            return await asyncio.to_thread(self.items_range, 0, total)
+        _, items = await asyncio.to_thread(self.read_tail, limit)
+        return items
+
+    async def add_items(self, items: List[Dict[str, Any]]) -> None:
+        if items:
+            await asyncio.to_thread(self._add_items, items)
+
+    async def pop_item(self) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._pop_item)
+
+    async def clear_session(self) -> None:
+        await asyncio.to_thread(self._clear)
+
+
+# --- Backend de listas (Redis ou substituto em memória) ---
+
+
+class ListBackend(Protocol):
+    """Subconjunto dos comandos de lista/string do Redis usado pelo `ListSessionStore`."""
+
+    def rpush(self, key: str, *values: str) -> int: ...
+    def lrange(self, key: str, start: int, end: int) -> List[Any]: ...
+    def llen(self, key: str) -> int: ...
+    def ltrim(self, key: str, start: int, end: int) -> Any: ...
+    def rpop(self, key: str) -> Any: ...
+    def get(self, key: str) -> Any: ...
+    def set(self, key: str, value: str) -> Any: ...
+    def delete(self, *keys: str) -> int: ...
+
+
+class InMemoryListBackend:
+    """Substituto local do Redis (mesma semântica de índices inclusivos/negativos)."""
+
+    def __init__(self) -> None:
+        self._lists: Dict[str, List[str]] = {}
+        self._values: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _slice(length: int, start: int, end: int) -> slice:
+        if start < 0:
+            start = max(0, length + start)
+        if end < 0:
+            end = length + end
+        return slice(start, end + 1)
+
+    def rpush(self, key: str, *values: str) -> int:
+        with self._lock:
+            items = self._lists.setdefault(key, [])
+            items.extend(values)
+            return len(items)
+
+    def lrange(self, key: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            items = self._lists.get(key, [])
+            return list(items[self._slice(len(items), start, end)])
+
+    def llen(self, key: str) -> int:
+        with self._lock:
+            return len(self._lists.get(key, []))
+
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        with self._lock:
+            items = self._lists.get(key, [])
+            self._lists[key] = items[self._slice(len(items), start, end)]
+            return True
+
+    def rpop(self, key: str) -> Optional[str]:
+        with self._lock:
+            items = self._lists.get(key)
+            return items.pop() if items else None
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._values.get(key)
+
+    def set(self, key: str, value: str) -> bool:
+        with self._lock:
+            self._values[key] = value
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = 0
+            for key in keys:
+                removed += int(self._lists.pop(key, None) is not None)
+                removed += int(self._values.pop(key, None) is not None)
+            return removed
+
+
+class ListSessionStore(SessionStore):
+    def __init__(self, backend: ListBackend, max_items: int = SESSION_MAX_ITEMS, prefix: str = "mentoria:session") -> None:
+        self.backend = backend
+        self.max_items = max_items
+        self.prefix = prefix
+
+    def open(self, session_id: str) -> StoredSession:
+        return ListStoredSession(self, session_id)
+
+
+class ListStoredSession(StoredSession):
+    def __init__(self, store: ListSessionStore, session_id: str) -> None:
+        self.store = store
+        self.backend = store.backend
+        self.session_id = session_id
+        self.session_settings = None
+        self._items_key = f"{store.prefix}:{session_id}:items"
+        self._summary_key = f"{store.prefix}:{session_id}:summary"
+
+    def read_tail(self, limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+        total = self.backend.llen(self._items_key)
+        if limit <= 0:
+            return total, []
+        return total, _decode(self.backend.lrange(self._items_key, -limit, -1))
+
+    def items_range(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        if stop <= start:
+            return []
+        return _decode(self.backend.lrange(self._items_key, start, stop - 1))
+
+    def load_summary(self) -> Tuple[str, int]:
+        raw = self.backend.get(self._summary_key)
+        if not raw:
+            return "", 0
+        data = json.loads(raw.decode("utf-8") if isinstance(raw, bytes) else raw)
+        return data.get("summary", ""), int(data.get("covered", 0))
+
+    def save_summary(self, summary: str, covered: int) -> None:
+        self.backend.set(self._summary_key, json.dumps({"summary": summary, "covered": covered}, ensure_ascii=False))
+
+    async def get_items(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        if limit is None:
+            return _decode(self.backend.lrange(self._items_key, 0, -1))
+        return self.read_tail(limit)[1]
+
+    async def add_items(self, items: List[Dict[str, Any]]) -> None:
+        if not items:
+            return
+        total = self.backend.rpush(self._items_key, *(json.dumps(item) for item in items))
+        excess = total - self.store.max_items
+        if self.store.max_items > 0 and excess > 0:
+            self.backend.ltrim(self._items_key, excess, -1)
+            summary, covered = self.load_summary()
+            if summary or covered:
+                self.save_summary(summary, max(0, covered - excess))
+
+    async def pop_item(self) -> Optional[Dict[str, Any]]:
+        raw = self.backend.rpop(self._items_key)
+        if raw is None:
+            return None
+        items = _decode([raw])
+        return items[0] if items else None
+
+    async def clear_session(self) -> None:
+        self.backend.delete(self._items_key, self._summary_key)
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Store compartilhado do processo, escolhido por SESSION_STORE (sqlite | memory)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if SESSION_STORE_BACKEND == "memory":
+                    _store = ListSessionStore(InMemoryListBackend())
+                else:
+                    _store = SQLiteSessionStore()
+    return _store
+
+
+def set_session_store(store: Optional[SessionStore]) -> None:
+    """Troca o store do processo (ex.: cliente Redis em produção, banco temporário em testes)."""
+    global _store
+    with _store_lock:
+        _store = store
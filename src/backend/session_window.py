@@ -0,0 +1,180 @@
+"""Janela de histórico com orçamento de tokens + resumo incremental para sessões de chat.
+
+O `WindowedSession` envolve uma sessão do `session_store`: o modelo recebe só os turnos
+recentes que cabem em `token_budget` e, antes deles, um resumo dos turnos antigos.
+O resumo é recalculado em segundo plano depois de cada turno e gravado no mesmo
+armazenamento da sessão, de modo que o custo por turno fica estável independentemente
+do tamanho da conversa.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from agents import Agent, Runner
+from agents.memory import SessionABC
+
+from .openai_gateway import BATCH, get_gateway
+from .session_store import StoredSession, get_session_store
+from .usage import usage_scope
+
+logger = logging.getLogger(__name__)
+
+SESSION_WINDOW_TOKENS = int(os.getenv("SESSION_WINDOW_TOKENS", "3000"))
+# Quantos itens fora da janela acumulam antes de disparar um novo resumo
+SESSION_SUMMARY_MIN_ITEMS = int(os.getenv("SESSION_SUMMARY_MIN_ITEMS", "6"))
+# Teto de itens lidos do fim do histórico a cada turno (mantém a leitura O(1))
+SESSION_TAIL_ITEMS = 200
+# Teto de itens enviados ao resumidor por chamada
+SUMMARY_BATCH_ITEMS = 40
+SUMMARY_MODEL = os.getenv("SESSION_SUMMARY_MODEL", "gpt-4o-mini")
+
+SUMMARY_PROMPT = """Você mantém o resumo de uma sessão de tutoria.
+Recebe o resumo atual (pode estar vazio) e novos trechos da conversa.
+Devolva um resumo atualizado, em PT-BR, com no máximo 200 palavras, preservando:
+objetivo do aluno, nível, tópicos já explicados, exercícios propostos, erros e lacunas recorrentes
+e combinados feitos com o aluno. Não invente nada que não esteja nos trechos."""
+
+Summarizer = Callable[[str, List[Dict[str, Any]]], Awaitable[str]]
+
+# Um resumo em andamento por sessão (evita trabalho duplicado entre requisições)
+_summary_tasks: Dict[Tuple[int, str], "asyncio.Task[None]"] = {}
+
+
+def estimate_tokens(item: Dict[str, Any]) -> int:
+    """Estimativa barata (≈4 caracteres por token), a mesma heurística do chunking da ingestão."""
+    content = item.get("content", item.get("output", item.get("arguments", "")))
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False)
+    return max(1, len(content) // 4)
+
+
+def render_items(items: List[Dict[str, Any]]) -> str:
+    """Converte itens da sessão em texto corrido para o resumidor."""
+    lines = []
+    for item in items:
+        role = item.get("role") or item.get("type", "item")
+        content = item.get("content", item.get("output", ""))
+        if isinstance(content, list):
+            content = " ".join(
+                part.get("text", "") for part in content if isinstance(part, dict)
+            )
+        if content:
+            lines.append(f"{role}: {content}")
+    return "\n".join(lines)
+
+
+async def summarize_with_agent(previous: str, items: List[Dict[str, Any]]) -> str:
+    agent = Agent(name="Resumo de Sessão", instructions=SUMMARY_PROMPT, model=SUMMARY_MODEL)
+    prompt = f"Resumo atual:\n{previous or '(vazio)'}\n\nNovos trechos:\n{render_items(items)}"
+    # Resumo roda em segundo plano: fica atrás das respostas do chat na fila do gateway
+    result = await get_gateway().run_agent(Runner, agent, prompt, max_tokens=500, level=BATCH)
+    return str(result.final_output).strip()
+
+
+class WindowedSession(SessionABC):
+    """Sessão que entrega ao modelo [resumo] + turnos recentes dentro do orçamento de tokens."""
+
+    def __init__(
+        self,
+        inner: StoredSession,
+        token_budget: int = SESSION_WINDOW_TOKENS,
+        summary_min_items: int = SESSION_SUMMARY_MIN_ITEMS,
+        summarizer: Optional[Summarizer] = None,
+    ) -> None:
+        self.inner = inner
+        self.session_id = inner.session_id
+        self.session_settings = inner.session_settings
+        self.token_budget = token_budget
+        self.summary_min_items = summary_min_items
+        self.summarizer = summarizer or summarize_with_agent
+
+    def _window_start(self, tail: List[Dict[str, Any]]) -> int:
+        """Índice (em `tail`) onde começa a janela: sempre num turno do usuário."""
+        used = 0
+        budget_start = len(tail)
+        for i in range(len(tail) - 1, -1, -1):
+            used += estimate_tokens(tail[i])
+            if used > self.token_budget:
+                break
+            budget_start = i
+
+        user_turns = [i for i, item in enumerate(tail) if item.get("role") == "user"]
+        if not user_turns:
+            return budget_start
+        for i in user_turns:
+            if i >= budget_start:
+                return i
+        # Nem o último turno cabe no orçamento: mantém ao menos ele inteiro
+        return user_turns[-1]
+
+    async def _layout(self) -> Tuple[str, List[Dict[str, Any]], int, int]:
+        """Retorna (resumo, itens a enviar, covered, início absoluto da janela)."""
+        total, tail = await asyncio.to_thread(self.inner.read_tail, SESSION_TAIL_ITEMS)
+        tail_offset = total - len(tail)
+        start = tail_offset + self._window_start(tail)
+        summary, covered = await asyncio.to_thread(self.inner.load_summary)
+        covered = min(covered, start)
+        # Itens ainda não resumidos seguem crus até o resumo em segundo plano alcançá-los
+        first = max(covered, tail_offset) - tail_offset
+        return summary, tail[first:], covered, start
+
+    async def get_items(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        summary, items, _, _ = await self._layout()
+        if limit is not None:
+            items = items[-limit:] if limit > 0 else []
+        if summary:
+            items = [{
+                "role": "system",
+                "content": f"Resumo da conversa até aqui (turnos antigos):\n{summary}",
+            }] + items
+        return items
+
+    async def add_items(self, items: List[Dict[str, Any]]) -> None:
+        await self.inner.add_items(items)
+        self.schedule_summary()
+
+    async def pop_item(self) -> Optional[Dict[str, Any]]:
+        return await self.inner.pop_item()
+
+    async def clear_session(self) -> None:
+        await self.inner.clear_session()
+
+    def close(self) -> None:
+        self.inner.close()
+
+    # --- resumo incremental em segundo plano ---
+
+    def schedule_summary(self) -> Optional["asyncio.Task[None]"]:
+        key = (id(self.inner.store), self.session_id)
+        running = _summary_tasks.get(key)
+        if running is not None and not running.done():
+            return running
+        # Contexto vazio: a tarefa não herda do turno que a disparou o `_inside_run` do gateway
+        # (furaria a fila e o limite de concorrência) nem o `usage_scope` da requisição
+        task = contextvars.Context().run(asyncio.get_running_loop().create_task, self.refresh_summary())
+        _summary_tasks[key] = task
+        task.add_done_callback(lambda t, key=key: _summary_tasks.pop(key, None) if _summary_tasks.get(key) is t else None)
+        return task
+
+    async def refresh_summary(self) -> None:
+        """Incorpora ao resumo os itens que saíram da janela (em lotes limitados)."""
+        try:
+            summary, _, covered, start = await self._layout()
+            while start - covered >= self.summary_min_items:
+                stop = min(start, covered + SUMMARY_BATCH_ITEMS)
+                batch = await asyncio.to_thread(self.inner.items_range, covered, stop)
+                with usage_scope("summary"):
+                    summary = await self.summarizer(summary, batch)
+                covered = stop
+                await asyncio.to_thread(self.inner.save_summary, summary, covered)
+        except Exception:  # noqa: BLE001
+            # O resumo é uma otimização: falhas não podem quebrar o chat
+            logger.exception("Falha ao atualizar resumo da sessão %s", self.session_id)
+
+
+def open_chat_session(session_id: str) -> WindowedSession:
+    """Sessão de chat no store compartilhado, com janela + resumo."""
+    return WindowedSession(get_session_store().open(session_id))
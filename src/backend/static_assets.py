@@ -0,0 +1,228 @@
+"""Assets estáticos de /public com pré-compressão, ETag forte e respostas condicionais.
+
+Na subida dos servidores, `precompress()` gera variantes `.gz` (e `.br`, se o pacote
+opcional `brotli` estiver instalado) ao lado dos originais. `resolve()` escolhe a
+variante pelo `Accept-Encoding`, calcula ETag/Cache-Control e responde 304 para
+`If-None-Match`/`If-Modified-Since`; cada servidor só envia o arquivo indicado.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:  # dependência opcional
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+
+COMPRESSIBLE_SUFFIXES = {".html", ".js", ".css", ".svg", ".json", ".txt", ".map"}
+# Abaixo disso a compressão não compensa o custo de negociação
+MIN_COMPRESS_SIZE = 256
+# Preferência do servidor quando o cliente aceita várias codificações com o mesmo peso
+ENCODING_PREFERENCE = ("br", "gzip")
+ENCODING_SUFFIX = {"br": ".br", "gzip": ".gz"}
+ETAG_SUFFIX = {"br": "-br", "gzip": "-gz"}
+
+# HTML sempre revalida (aponta para os assets); JS/CSS podem ficar em cache por 1h
+HTML_CACHE_CONTROL = "no-cache"
+ASSET_CACHE_CONTROL = "public, max-age=3600"
+
+CONTENT_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+}
+
+
+@dataclass
+class StaticAsset:
+    path: Path
+    size: int
+    mtime: float
+    digest: str
+    content_type: str
+    cache_control: str
+    variants: Dict[str, Path] = field(default_factory=dict)
+
+
+@dataclass
+class StaticResponse:
+    """Resultado da resolução: `file_path` é None quando não há corpo (304/403/404)."""
+    status: int
+    headers: Dict[str, str]
+    file_path: Optional[Path] = None
+    content_type: Optional[str] = None
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Converte `Accept-Encoding` em {codificação: q}; `*` vale para as não listadas."""
+    weights: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[token] = q
+    return weights
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # If-None-Match usa comparação fraca (RFC 9110 §13.1.2)
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class StaticAssetRegistry:
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root).resolve()
+        self._assets: Dict[Path, StaticAsset] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def encodings(self) -> Tuple[str, ...]:
+        return tuple(enc for enc in ENCODING_PREFERENCE if enc != "br" or brotli is not None)
+
+    # --- pré-compressão ---
+
+    def _compress(self, source: Path, encoding: str) -> Optional[Path]:
+        target = source.with_name(source.name + ENCODING_SUFFIX[encoding])
+        source_stat = source.stat()
+        if target.exists() and target.stat().st_mtime >= source_stat.st_mtime:
+            return target
+
+        data = source.read_bytes()
+        if encoding == "gzip":
+            # mtime=0 deixa a saída determinística (mesmo arquivo → mesmos bytes)
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        else:
+            compressed = brotli.compress(data, quality=11)
+        if len(compressed) >= len(data):
+            if target.exists():
+                target.unlink()
+            return None
+
+        tmp = target.with_name(target.name + ".tmp")
+        tmp.write_bytes(compressed)
+        os.replace(tmp, target)
+        return target
+
+    def precompress(self) -> List[Path]:
+        """Gera/atualiza as variantes comprimidas de todos os assets compressíveis."""
+        written: List[Path] = []
+        for source in sorted(self.root.rglob("*")):
+            if not source.is_file() or source.suffix.lower() not in COMPRESSIBLE_SUFFIXES:
+                continue
+            if source.stat().st_size < MIN_COMPRESS_SIZE:
+                continue
+            for encoding in self.encodings:
+                target = self._compress(source, encoding)
+                if target is not None:
+                    written.append(target)
+            self._assets.pop(source, None)
+        return written
+
+    # --- resolução ---
+
+    def _load(self, path: Path) -> StaticAsset:
+        stat = path.stat()
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset and asset.mtime == stat.st_mtime and asset.size == stat.st_size:
+                return asset
+
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()[:32]
+        suffix = path.suffix.lower()
+        variants = {}
+        for encoding in self.encodings:
+            variant = path.with_name(path.name + ENCODING_SUFFIX[encoding])
+            # Variante desatualizada (arquivo editado após a subida) é ignorada
+            if variant.exists() and variant.stat().st_mtime >= stat.st_mtime:
+                variants[encoding] = variant
+        asset = StaticAsset(
+            path=path,
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            digest=digest,
+            content_type=CONTENT_TYPES.get(suffix) or mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+            cache_control=HTML_CACHE_CONTROL if suffix == ".html" else ASSET_CACHE_CONTROL,
+            variants=variants,
+        )
+        with self._lock:
+            self._assets[path] = asset
+        return asset
+
+    def _target(self, url_path: str) -> Optional[Path]:
+        relative = url_path.lstrip("/") or "index.html"
+        target = (self.root / relative).resolve()
+        if target != self.root and self.root not in target.parents:
+            return None
+        if target.is_dir():
+            target = target / "index.html"
+        return target
+
+    def _negotiate(self, asset: StaticAsset, accept_encoding: Optional[str]) -> Optional[str]:
+        weights = parse_accept_encoding(accept_encoding)
+        default = weights.get("*", 0.0)
+        best, best_q = None, 0.0
+        for encoding in ENCODING_PREFERENCE:
+            if encoding not in asset.variants:
+                continue
+            q = weights.get(encoding, default)
+            if q > best_q:
+                best, best_q = encoding, q
+        return best
+
+    def resolve(
+        self,
+        url_path: str,
+        accept_encoding: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+        if_modified_since: Optional[str] = None,
+    ) -> StaticResponse:
+        target = self._target(url_path)
+        if target is None:
+            return StaticResponse(403, {})
+        if not target.is_file():
+            return StaticResponse(404, {})
+
+        asset = self._load(target)
+        encoding = self._negotiate(asset, accept_encoding)
+        etag = f'"{asset.digest}{ETAG_SUFFIX.get(encoding, "")}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": asset.cache_control,
+            "Last-Modified": formatdate(asset.mtime, usegmt=True),
+            "Vary": "Accept-Encoding",
+        }
+
+        if if_none_match is not None:
+            not_modified = _etag_matches(if_none_match, etag)
+        elif if_modified_since:
+            try:
+                not_modified = int(asset.mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                not_modified = False
+        else:
+            not_modified = False
+        if not_modified:
+            return StaticResponse(304, headers)
+
+        file_path = asset.variants[encoding] if encoding else asset.path
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        headers["Content-Length"] = str(file_path.stat().st_size)
+        return StaticResponse(200, headers, file_path=file_path, content_type=asset.content_type)
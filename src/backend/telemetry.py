@@ -0,0 +1,215 @@
+"""Tracing leve de latência: spans → histogramas Prometheus (/metrics) e `Server-Timing`.
+
+Desligado por padrão (`MENTORIA_TRACING=1` liga). Desligado, `span()` devolve um
+context manager vazio compartilhado e `@traced` chama a função direto, então o custo
+fica em uma checagem de booleano por chamada. Os coletores (`register_collector`) são
+exportados em `/metrics` mesmo com o tracing desligado.
+
+    with span("agent.run"):
+        result = await Runner.run(...)
+
+    @traced("retriever.embed_query")
+    def _embed_query(q): ...
+"""
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_enabled = os.getenv("MENTORIA_TRACING", "0") == "1"
+# Cabeçalho Server-Timing por requisição (só vale com o tracing ligado)
+SERVER_TIMING_ENABLED = os.getenv("MENTORIA_SERVER_TIMING", "0") == "1"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SPAN_METRIC = "mentoria_span_duration_seconds"
+
+_NOOP = nullcontext()
+# Spans concluídos na requisição atual: lista de (nome, segundos)
+_request_spans: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "mentoria_request_spans", default=None
+)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(enabled: bool) -> None:
+    global _enabled
+    _enabled = enabled
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.total += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """Retorna (contagens cumulativas por bucket, soma, total)."""
+        with self._lock:
+            cumulative, running = [], 0
+            for c in self.counts:
+                running += c
+                cumulative.append(running)
+            return cumulative, self.total, self.count
+
+
+_histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+_registry_lock = threading.Lock()
+# Métricas lidas na exportação (gauges/counters): {métrica: (tipo, função de coleta)}
+_collectors: Dict[str, Tuple[str, Callable[[], List[Tuple[Dict[str, str], float]]]]] = {}
+
+
+def observe(metric: str, value: float, **labels: str) -> None:
+    key = (metric, tuple(sorted(labels.items())))
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    histogram.observe(value)
+
+
+def register_collector(
+    metric: str,
+    kind: str,
+    collect: Callable[[], List[Tuple[Dict[str, str], float]]],
+) -> None:
+    """Registra uma métrica calculada só no `/metrics` (p.ex. profundidade de fila).
+
+    `kind` é "gauge" ou "counter"; `collect` devolve [(labels, valor), ...].
+    """
+    with _registry_lock:
+        _collectors[metric] = (kind, collect)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        elapsed = time.perf_counter() - self.start
+        observe(SPAN_METRIC, elapsed, span=self.name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((self.name, elapsed))
+
+
+def span(name: str):
+    """Mede o bloco como um span `name` (no-op com o tracing desligado)."""
+    if not _enabled:
+        return _NOOP
+    return _Span(name)
+
+
+def traced(name: str) -> Callable:
+    """Decorador equivalente a `span(name)` ao redor da função (sync ou async)."""
+
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not _enabled:
+                    return await func(*args, **kwargs)
+                with _Span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def start_request() -> Optional[contextvars.Token]:
+    """Começa a coletar os spans da requisição atual (para o Server-Timing)."""
+    if not (_enabled and SERVER_TIMING_ENABLED):
+        return None
+    return _request_spans.set([])
+
+
+def finish_request(token: Optional[contextvars.Token]) -> Optional[str]:
+    """Encerra a coleta e devolve o valor do cabeçalho `Server-Timing` (ou None)."""
+    if token is None:
+        return None
+    spans = _request_spans.get() or []
+    _request_spans.reset(token)
+    totals: Dict[str, Tuple[float, int]] = {}
+    for name, elapsed in spans:
+        total, count = totals.get(name, (0.0, 0))
+        totals[name] = (total + elapsed, count + 1)
+    # Nomes do Server-Timing são tokens HTTP: troca "." por "_"
+    return ", ".join(
+        f'{name.replace(".", "_")};dur={total * 1000:.1f};desc="{count}x"'
+        for name, (total, count) in totals.items()
+    ) or None
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(pairs: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(pairs) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    """Exporta os histogramas e os coletores registrados no formato texto do Prometheus."""
+    with _registry_lock:
+        entries = sorted(_histograms.items())
+    lines: List[str] = []
+    seen = set()
+    for (metric, labels), histogram in entries:
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} histogram")
+        cumulative, total, count = histogram.snapshot()
+        for bound, value in zip(histogram.buckets, cumulative):
+            lines.append(f"{metric}_bucket{_labels(labels, ('le', repr(bound)))} {value}")
+        lines.append(f"{metric}_bucket{_labels(labels, ('le', '+Inf'))} {count}")
+        lines.append(f"{metric}_sum{_labels(labels)} {total}")
+        lines.append(f"{metric}_count{_labels(labels)} {count}")
+    # Contadores e gauges saem sempre (custam só uma leitura); o tracing liga apenas os spans
+    with _registry_lock:
+        collectors = sorted(_collectors.items())
+    for metric, (kind, collect) in collectors:
+        lines.append(f"# TYPE {metric} {kind}")
+        for labels, value in collect():
+            lines.append(f"{metric}{_labels(tuple(sorted(labels.items())))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _registry_lock:
+        _histograms.clear()
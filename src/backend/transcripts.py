@@ -0,0 +1,85 @@
+"""Transcrições do chat guardadas uma vez, comprimidas e endereçadas pelo conteúdo.
+
+O evento `chat` do `progress.db` guarda só prévias curtas de pergunta/resposta; o texto
+completo vai para a tabela `transcripts` (chave = sha256 do JSON canônico), comprimido
+com zstd se o pacote opcional `zstandard` estiver instalado, senão zlib. O codec fica
+na linha, então bancos com os dois formatos continuam legíveis.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+try:  # dependência opcional
+    import zstandard
+except ImportError:  # pragma: no cover - depende do ambiente
+    zstandard = None
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+# Força um codec ("zlib" | "zstd"); vazio = zstd quando disponível
+TRANSCRIPT_CODEC = os.getenv("PROGRESS_TRANSCRIPT_CODEC", "")
+
+
+def default_codec() -> str:
+    if TRANSCRIPT_CODEC:
+        return TRANSCRIPT_CODEC
+    return "zstd" if zstandard is not None else "zlib"
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, ZLIB_LEVEL)
+    raise ValueError(f"Codec de transcrição desconhecido: {codec}")
+
+
+def decompress(blob: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Transcrição gravada com zstd: instale o pacote `zstandard` para lê-la.")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    if codec == "zlib":
+        return zlib.decompress(blob)
+    raise ValueError(f"Codec de transcrição desconhecido: {codec}")
+
+
+def create_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS transcripts (
+            hash TEXT PRIMARY KEY,
+            codec TEXT NOT NULL,
+            body BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def encode(content: Dict[str, Any], codec: Optional[str] = None) -> Tuple[str, str, bytes, int]:
+    """(hash, codec, corpo comprimido, tamanho original) do conteúdo."""
+    raw = json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    codec = codec or default_codec()
+    return hashlib.sha256(raw).hexdigest(), codec, compress(raw, codec), len(raw)
+
+
+def store(conn: sqlite3.Connection, content: Dict[str, Any]) -> str:
+    """Grava (se ainda não existir) e devolve o hash; conteúdo repetido não ocupa espaço de novo."""
+    digest, codec, body, size = encode(content)
+    conn.execute(
+        "INSERT OR IGNORE INTO transcripts (hash, codec, body, size) VALUES (?, ?, ?, ?)",
+        (digest, codec, body, size),
+    )
+    return digest
+
+
+def load(conn: sqlite3.Connection, digest: str) -> Optional[Dict[str, Any]]:
+    row = conn.execute("SELECT codec, body FROM transcripts WHERE hash = ?", (digest,)).fetchone()
+    if row is None:
+        return None
+    return json.loads(decompress(row[1], row[0]).decode("utf-8"))
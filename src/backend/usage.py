@@ -0,0 +1,311 @@
+"""Contabilidade de tokens e custo por requisição, agente, sessão e dia.
+
+O gateway registra aqui cada `Runner.run` e cada chamada de embeddings, com o `usage`
+devolvido pela API. Agente e sessão vêm do contexto (`with usage_scope(...)`), como a
+prioridade do gateway, então atravessam `asyncio.to_thread` e as ferramentas do agente
+sem mudar assinaturas:
+
+    with usage_scope("tutor", session_id) as request_usage:
+        ...                       # chat, busca de fontes, resumo da sessão
+    request_usage.to_dict()       # o que a requisição inteira gastou
+
+Os agregados ficam em memória e vão para `usage_daily` (progress.db) em lote a cada
+`USAGE_FLUSH_SECONDS`; `/api/usage` e `/metrics` leem daí.
+
+Orçamento opcional: com `USAGE_SESSION_DAILY_TOKENS` > 0, a sessão que passou do
+limite no dia continua sendo atendida, mas pelo `USAGE_BUDGET_MODEL`.
+"""
+import contextvars
+import fnmatch
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from . import telemetry
+from .progress_tracker import USAGE_COUNTERS, ProgressTracker
+
+logger = logging.getLogger(__name__)
+
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "5"))
+# Tokens por sessão por dia antes de trocar para o modelo barato (0 = sem orçamento)
+USAGE_SESSION_DAILY_TOKENS = int(os.getenv("USAGE_SESSION_DAILY_TOKENS", "0"))
+USAGE_BUDGET_MODEL = os.getenv("USAGE_BUDGET_MODEL", "gpt-4.1-nano")
+
+# USD por 1M tokens (entrada, saída); OPENAI_MODEL_PRICES='{"gpt-4o-mini": [0.15, 0.6]}'
+# sobrescreve por modelo ou padrão fnmatch. Padrões mais específicos primeiro.
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini*": (0.15, 0.60),
+    "gpt-4o*": (2.50, 10.00),
+    "gpt-4.1-nano*": (0.10, 0.40),
+    "gpt-4.1-mini*": (0.40, 1.60),
+    "gpt-4.1*": (2.00, 8.00),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+    "text-embedding-ada-002": (0.10, 0.0),
+}
+OPENAI_MODEL_PRICES = os.getenv("OPENAI_MODEL_PRICES", "")
+
+NO_AGENT = "-"
+NO_SESSION = "-"
+
+
+def load_prices(raw: str = "") -> Dict[str, Tuple[float, float]]:
+    prices = dict(DEFAULT_PRICES)
+    if raw.strip():
+        overrides = {pattern: (float(values[0]), float(values[1])) for pattern, values in json.loads(raw).items()}
+        # Sobrescritas valem antes dos padrões
+        prices = {**overrides, **{k: v for k, v in prices.items() if k not in overrides}}
+    return prices
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+@dataclass
+class RequestUsage:
+    """Soma das chamadas feitas dentro de um `usage_scope` (uma requisição)."""
+
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    cost_usd: float = 0.0
+    models: Set[str] = field(default_factory=set)
+    # Modelo usado no lugar do configurado quando a sessão estourou o orçamento
+    degraded_to: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "requests": self.requests,
+            "inputTokens": self.input_tokens,
+            "outputTokens": self.output_tokens,
+            "totalTokens": self.total_tokens,
+            "costUsd": round(self.cost_usd, 6),
+            "models": sorted(self.models),
+        }
+        if self.degraded_to:
+            data["degradedTo"] = self.degraded_to
+        return data
+
+
+@dataclass(frozen=True)
+class UsageScope:
+    agent_id: str = NO_AGENT
+    session_id: str = NO_SESSION
+    request: Optional[RequestUsage] = None
+
+
+_scope: contextvars.ContextVar[UsageScope] = contextvars.ContextVar("mentoria_usage_scope", default=UsageScope())
+
+
+@contextmanager
+def usage_scope(agent_id: Optional[str] = None, session_id: Optional[str] = None) -> Iterator[RequestUsage]:
+    """Atribui as chamadas do bloco ao agente/sessão; escopos aninhados somam na mesma requisição."""
+    current = _scope.get()
+    request = current.request if current.request is not None else RequestUsage()
+    token = _scope.set(UsageScope(agent_id or current.agent_id, session_id or current.session_id, request))
+    try:
+        yield request
+    finally:
+        _scope.reset(token)
+
+
+def current_scope() -> UsageScope:
+    return _scope.get()
+
+
+class UsageRecorder:
+    def __init__(
+        self,
+        tracker: Optional[ProgressTracker] = None,
+        session_budget: int = USAGE_SESSION_DAILY_TOKENS,
+        budget_model: str = USAGE_BUDGET_MODEL,
+        prices: Optional[Dict[str, Tuple[float, float]]] = None,
+    ) -> None:
+        self.tracker = tracker or ProgressTracker()
+        self.session_budget = session_budget
+        self.budget_model = budget_model
+        self.prices = prices if prices is not None else load_prices(OPENAI_MODEL_PRICES)
+        self._lock = threading.Lock()
+        # {(dia, agente, sessão, modelo, tipo): [requests, entrada, saída, total, custo, segundos]}
+        self._pending: Dict[Tuple[str, str, str, str, str], List[float]] = {}
+        # Totais do processo para o /metrics: {(agente, modelo, tipo): [requests, entrada, saída, custo]}
+        self._totals: Dict[Tuple[str, str, str], List[float]] = {}
+        # Tokens do dia por sessão (banco + pendentes), carregados na primeira consulta
+        self._session_tokens: Dict[Tuple[str, str], int] = {}
+        self.degraded: Dict[str, int] = {}
+
+    def price(self, model: str) -> Tuple[float, float]:
+        if model in self.prices:
+            return self.prices[model]
+        for pattern, values in self.prices.items():
+            if fnmatch.fnmatchcase(model, pattern):
+                return values
+        return (0.0, 0.0)
+
+    def cost(self, model: str, input_tokens: int, output_tokens: int) -> float:
+        price_in, price_out = self.price(model)
+        return (input_tokens * price_in + output_tokens * price_out) / 1_000_000
+
+    def record(
+        self,
+        model: str,
+        kind: str,
+        input_tokens: int,
+        output_tokens: int = 0,
+        total_tokens: Optional[int] = None,
+        seconds: float = 0.0,
+        requests: int = 1,
+    ) -> float:
+        """Soma uma chamada (`kind`: llm | embedding) ao escopo atual; devolve o custo em USD."""
+        scope = _scope.get()
+        total = total_tokens if total_tokens is not None else input_tokens + output_tokens
+        cost = self.cost(model, input_tokens, output_tokens)
+        day = _today()
+        with self._lock:
+            row = self._pending.setdefault((day, scope.agent_id, scope.session_id, model, kind), [0, 0, 0, 0, 0.0, 0.0])
+            for i, value in enumerate((requests, input_tokens, output_tokens, total, cost, seconds)):
+                row[i] += value
+            totals = self._totals.setdefault((scope.agent_id, model, kind), [0, 0, 0, 0.0])
+            for i, value in enumerate((requests, input_tokens, output_tokens, cost)):
+                totals[i] += value
+            if (day, scope.session_id) in self._session_tokens:
+                self._session_tokens[(day, scope.session_id)] += total
+            if scope.request is not None:
+                request = scope.request
+                request.requests += requests
+                request.input_tokens += input_tokens
+                request.output_tokens += output_tokens
+                request.total_tokens += total
+                request.cost_usd += cost
+                request.models.add(model)
+        return cost
+
+    # ---- orçamento ----
+
+    def session_tokens(self, session_id: str, day: Optional[str] = None) -> int:
+        day = day or _today()
+        key = (day, session_id)
+        with self._lock:
+            if key in self._session_tokens:
+                return self._session_tokens[key]
+        stored = self.tracker.session_tokens(session_id, day)
+        with self._lock:
+            if key not in self._session_tokens:
+                pending = sum(row[3] for k, row in self._pending.items() if k[0] == day and k[2] == session_id)
+                self._session_tokens[key] = stored + int(pending)
+            return self._session_tokens[key]
+
+    def budget_fallback(self, model: str) -> Optional[str]:
+        """Modelo barato para a sessão do escopo atual, se ela passou do orçamento do dia."""
+        scope = _scope.get()
+        if self.session_budget <= 0 or scope.session_id == NO_SESSION or model == self.budget_model:
+            return None
+        if self.session_tokens(scope.session_id) < self.session_budget:
+            return None
+        with self._lock:
+            self.degraded[scope.agent_id] = self.degraded.get(scope.agent_id, 0) + 1
+            if scope.request is not None:
+                scope.request.degraded_to = self.budget_model
+        logger.info("Sessão %s passou de %d tokens hoje: %s → %s", scope.session_id, self.session_budget, model, self.budget_model)
+        return self.budget_model
+
+    # ---- gravação ----
+
+    def flush(self) -> int:
+        """Grava os agregados pendentes numa transação; devolve quantas linhas foram somadas."""
+        today = _today()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            for key in [k for k in self._session_tokens if k[0] != today]:
+                del self._session_tokens[key]
+        if not pending:
+            return 0
+        rows = [
+            dict(zip(("day", "agent_id", "session_id", "model", "kind") + USAGE_COUNTERS, key + tuple(values)))
+            for key, values in pending.items()
+        ]
+        try:
+            self.tracker.add_usage(rows)
+        except Exception:
+            # Devolve para a próxima tentativa
+            with self._lock:
+                for key, values in pending.items():
+                    row = self._pending.setdefault(key, [0, 0, 0, 0, 0.0, 0.0])
+                    for i, value in enumerate(values):
+                        row[i] += value
+            raise
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "totals": [
+                    {
+                        "agent": agent_id,
+                        "model": model,
+                        "kind": kind,
+                        "requests": values[0],
+                        "inputTokens": values[1],
+                        "outputTokens": values[2],
+                        "costUsd": values[3],
+                    }
+                    for (agent_id, model, kind), values in sorted(self._totals.items())
+                ],
+                "degraded": dict(self.degraded),
+                "pending": len(self._pending),
+            }
+
+
+_recorder: Optional[UsageRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_usage_recorder() -> UsageRecorder:
+    global _recorder
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = UsageRecorder()
+    return _recorder
+
+
+def set_usage_recorder(recorder: Optional[UsageRecorder]) -> None:
+    global _recorder
+    with _recorder_lock:
+        _recorder = recorder
+
+
+def _collect_totals(fields: List[Tuple[str, int]]):
+    def collect() -> List[Tuple[Dict[str, str], float]]:
+        if _recorder is None:
+            return []
+        samples = []
+        for total in _recorder.stats()["totals"]:
+            labels = {"agent": total["agent"], "model": total["model"], "kind": total["kind"]}
+            for direction, key in fields:
+                samples.append(({**labels, "direction": direction} if direction else labels, total[key]))
+        return samples
+    return collect
+
+
+def _collect_degraded() -> List[Tuple[Dict[str, str], float]]:
+    if _recorder is None:
+        return []
+    return [({"agent": agent_id}, count) for agent_id, count in sorted(_recorder.stats()["degraded"].items())]
+
+
+telemetry.register_collector("mentoria_usage_requests_total", "counter", _collect_totals([("", "requests")]))
+telemetry.register_collector(
+    "mentoria_usage_tokens_total",
+    "counter",
+    _collect_totals([("input", "inputTokens"), ("output", "outputTokens")]),
+)
+telemetry.register_collector("mentoria_usage_cost_usd_total", "counter", _collect_totals([("", "costUsd")]))
+telemetry.register_collector("mentoria_usage_budget_degraded_total", "counter", _collect_degraded)
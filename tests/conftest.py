@@ -0,0 +1,88 @@
+import pytest
+
+
+@pytest.fixture
+def progress_db(tmp_path, monkeypatch):
+    """Aponta o ProgressTracker para um progress.db temporário."""
+    from src.backend import progress_tracker
+
+    monkeypatch.setattr(progress_tracker, "DB_PATH", tmp_path / "progress.db")
+    progress_tracker._init_db()
+    return progress_tracker
+
+
+@pytest.fixture
+def session_store(tmp_path, monkeypatch):
+    """Store de sessões do processo apontando para um sessions.db temporário."""
+    from src.backend import session_store as module
+
+    store = module.SQLiteSessionStore(tmp_path / "sessions.db", pool_size=2)
+    monkeypatch.setattr(module, "_store", store)
+    return store
+
+
+@pytest.fixture
+def job_queue(tmp_path, monkeypatch):
+    """Fila de jobs num jobs.db temporário (pastas de trabalho também)."""
+    from src.backend import jobs
+
+    queue = jobs.JobQueue(tmp_path / "jobs.db")
+    monkeypatch.setattr(jobs, "_queue", queue)
+    monkeypatch.setattr(jobs, "JOBS_WORK_DIR", tmp_path / "jobs")
+    return queue
+
+
+@pytest.fixture
+def api(progress_db, session_store, job_queue, monkeypatch):
+    """Módulo `server_fastapi` com bancos isolados (o Runner deve ser trocado pelo teste)."""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    from src.backend import server_fastapi
+
+    # Sem processos worker: os testes executam os jobs com `Worker.run_once`
+    monkeypatch.setattr(server_fastapi, "JOB_WORKERS", 0)
+    server_fastapi.grade_cache.clear()
+    return server_fastapi
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """Cliente OpenAI compartilhado trocado pelo backend falso dos benchmarks."""
+    from benchmarks.fake_openai import FakeOpenAI
+    from src.backend import openai_client
+
+    client = FakeOpenAI()
+    monkeypatch.setattr(openai_client, "_client", client)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def openai_gateway(monkeypatch):
+    """Gateway novo por teste (filas e buckets não vazam entre testes)."""
+    from src.backend import openai_gateway as module
+
+    gateway = module.OpenAIGateway()
+    monkeypatch.setattr(module, "_gateway", gateway)
+    return gateway
+
+
+@pytest.fixture(autouse=True)
+def usage_recorder(tmp_path, monkeypatch):
+    """Recorder de uso novo por teste; os flushes vão para um progress.db temporário."""
+    from src.backend import progress_tracker, usage
+
+    monkeypatch.setattr(progress_tracker, "DB_PATH", tmp_path / "progress.db")
+    recorder = usage.UsageRecorder(session_budget=0)
+    monkeypatch.setattr(usage, "_recorder", recorder)
+    return recorder
+
+
+@pytest.fixture(autouse=True)
+def query_cache(monkeypatch):
+    """Cache de embeddings de consultas vazio por teste (contagens de chamadas à API)."""
+    from collections import OrderedDict
+
+    from src.backend.rag import retriever
+
+    cache = OrderedDict()
+    monkeypatch.setattr(retriever, "_query_cache", cache)
+    return cache
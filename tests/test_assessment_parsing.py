@@ -0,0 +1,39 @@
+import pytest
+
+from src.backend.agents.assessment_agent import (
+    AssessmentParseError,
+    AssessmentResult,
+    parse_assessment_output,
+)
+
+
+def test_structured_output_is_used_directly():
+    result = AssessmentResult(
+        score=120, feedback="Ótimo", xp_awarded=10, remedial_task="", gaps=[], strengths=["Clareza"],
+    )
+    data = parse_assessment_output(result)
+    assert data["score"] == 100
+    assert data["strengths"] == ["Clareza"]
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        '{"score": 75, "xp_awarded": 5, "gaps": ["Frações"]}',
+        '```json\n{"score": 75, "xp_awarded": 5, "gaps": ["Frações"]}\n```',
+        'Aqui está a avaliação:\n{"score": 75, "xp_awarded": 5, "gaps": ["Frações",],}\nBons estudos!',
+        "{'score': '75/100', 'xp_awarded': 5, 'gaps': 'Frações', 'ok': true}",
+        '{“score”: 75, “xp_awarded”: 5, “gaps”: [“Frações”]}',
+    ],
+)
+def test_near_json_is_recovered(raw):
+    data = parse_assessment_output(raw)
+    assert data["score"] == 75
+    assert data["xp_awarded"] == 5
+    assert data["gaps"] == ["Frações"]
+
+
+@pytest.mark.parametrize("raw", ["Muito bem!", "[1, 2]", '{"feedback": "sem nota"}'])
+def test_unusable_output_raises(raw):
+    with pytest.raises(AssessmentParseError):
+        parse_assessment_output(raw)
@@ -0,0 +1,27 @@
+import numpy as np
+
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.fake_openai import FakeOpenAI
+from benchmarks.run import compare, percentiles
+
+
+def test_fake_embeddings_are_deterministic_and_match_corpus_vectors(tmp_path):
+    corpus = SyntheticCorpus(dim=32, vocab_size=200)
+    text = corpus.chunk_text(np.array([1, 2, 3]))
+    first = FakeOpenAI(dim=32).embeddings.create(model="m", input=[text]).data[0].embedding
+    second = FakeOpenAI(dim=32).embeddings.create(model="m", input=[text]).data[0].embedding
+    assert first == second
+
+    expected = corpus.word_vectors[[1, 2, 3]].sum(axis=0)
+    expected /= np.linalg.norm(expected)
+    assert np.allclose(first, expected, atol=1e-5)
+
+
+def test_compare_flags_slower_latency_and_lower_throughput():
+    baseline = {"scenarios": {"search": {"1k": {"p99_ms": 10.0, "qps_per_s": 100.0, "chunks": 1000}}}}
+    current = {"scenarios": {"search": {"1k": {"p99_ms": 12.0, "qps_per_s": 95.0, "chunks": 5}}}}
+
+    regressions = compare(current, baseline, threshold=0.10)
+
+    assert len(regressions) == 1 and regressions[0].startswith("search.1k.p99_ms")
+    assert percentiles([0.001, 0.002, 0.003])["p50_ms"] == 2.0
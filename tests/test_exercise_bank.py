@@ -0,0 +1,110 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend import exercise_bank
+from src.backend.exercise_bank import ExerciseBank, ExerciseSet
+
+
+@pytest.fixture
+def bank(tmp_path, monkeypatch):
+    bank = ExerciseBank(tmp_path / "exercise_bank.db")
+    monkeypatch.setattr(exercise_bank, "_bank", bank)
+    return bank
+
+
+class GeneratorRunner:
+    def __init__(self):
+        self.prompts = []
+
+    async def run(self, agent, prompt, **kwargs):
+        self.prompts.append(prompt)
+        topic = prompt.splitlines()[0].split(": ", 1)[1]
+        return SimpleNamespace(final_output=ExerciseSet(
+            exercises=[f"{topic}: exercício {i}" for i in range(6)],
+            remedial_tasks=[f"{topic}: reforço {i}" for i in range(4)],
+        ))
+
+
+def test_lookup_normalizes_and_matches_gap_strings(bank):
+    assert bank.lookup("frações") == []
+    bank.add("Frações equivalentes", "exercise", ["Simplifique 4/8.", "Ache uma fração igual a 2/3.", "Simplifique 4/8."])
+    bank.add("Frações equivalentes", "remedial", ["Desenhe 1/2 e 2/4 e compare."])
+
+    assert len(bank.lookup("fracoes EQUIVALENTES")) == 2  # repetido não entra
+    assert bank.lookup("Não entendeu frações equivalentes com denominadores")[0]["topic"] == "Frações equivalentes"
+    assert bank.resolve_topic("equivalentes frações") == "fracoes equivalentes"  # palavras em comum
+    assert bank.lookup("geometria plana") == []
+    assert bank.stats() == {"topics": 1, "items": 3, "hits": 2, "misses": 2}
+
+    payload = json.loads(exercise_bank.exercise_bank_payload("Frações equivalentes", "remedial"))
+    assert payload["items"][0]["text"] == "Desenhe 1/2 e 2/4 e compare."
+    assert exercise_bank.create_exercise_bank_tool().name == "exercise_bank"
+
+
+def test_offline_job_generates_from_progress_gaps_and_skips_ready_topics(bank, progress_db):
+    tracker = progress_db.ProgressTracker()
+    tracker.update_gaps("aluno-1", "tutor", ["Frações", "Porcentagem"])
+    tracker.update_gaps("aluno-2", "tutor", ["frações"])
+    tracker.update_gaps("aluno-3", "helper", ["Porcentagem", "Regra de três"])
+    runner = GeneratorRunner()
+
+    results = exercise_bank.main(["--from-progress", "--min-students", "2", "--exercises", "5", "--remedial", "3"], runner=runner)
+    assert sorted(results) == ["Frações", "Porcentagem"] and set(results.values()) == {8}
+    assert bank.counts()["fracoes"] == {"exercise": 5, "remedial": 3}
+
+    assert exercise_bank.main(["--from-progress", "--topic", "Regra de três"], runner=runner) == {"Regra de três": 8}
+    assert len(runner.prompts) == 3
+
+
+def test_grade_cites_bank_remedial_task_by_id(api, bank, monkeypatch):
+    bank.add("Frações equivalentes", "remedial", ["Desenhe 1/2 e 2/4 e compare."])
+    item_id = bank.lookup("frações equivalentes", "remedial")[0]["id"]
+    prompts = []
+
+    class AssessmentRunner:
+        async def run(self, agent, prompt, **kwargs):
+            prompts.append(prompt)
+            return SimpleNamespace(final_output=json.dumps({
+                "score": 50, "feedback": "Parcial", "xp_awarded": 2,
+                "remedial_task": f"banco:{item_id}", "gaps": ["Frações equivalentes"],
+            }))
+
+    monkeypatch.setattr(api, "Runner", AssessmentRunner())
+    body = {"answer": "2/4", "question": "Dê uma fração equivalente a 1/2.", "sessionId": "aluno-1"}
+    # Sem o tópico no enunciado, nada do banco vai para o prompt
+    data = TestClient(api.app).post("/api/grade", json={**body, "question": "Dê uma fração equivalente a 1/2."}).json()
+    assert "banco:" not in prompts[0] and data["remedialTask"] == "Desenhe 1/2 e 2/4 e compare."
+
+    data = TestClient(api.app).post("/api/grade", json={**body, "question": "Frações equivalentes: dê uma igual a 1/2."}).json()
+    assert f"banco:{item_id} (Frações equivalentes)" in prompts[1]
+    assert data["remedialTask"] == "Desenhe 1/2 e 2/4 e compare." and data["remedialTaskId"] == item_id
+
+
+def test_stale_or_invented_ids_fall_back_to_the_bank(api, bank, monkeypatch):
+    bank.add("Frações equivalentes", "remedial", ["Desenhe 1/2 e 2/4 e compare."])
+    old_id = bank.lookup("frações equivalentes", "remedial")[0]["id"]
+    calls = []
+
+    class AssessmentRunner:
+        async def run(self, agent, prompt, **kwargs):
+            calls.append(prompt)
+            item = bank.lookup("frações equivalentes", "remedial")[0]["id"]
+            return SimpleNamespace(final_output=json.dumps({"score": 50, "xp_awarded": 2, "remedial_task": f"banco:{item}"}))
+
+    monkeypatch.setattr(api, "Runner", AssessmentRunner())
+    client = TestClient(api.app)
+    body = {"answer": "2/4", "question": "Frações equivalentes: dê uma igual a 1/2.", "sessionId": "aluno-1"}
+    assert client.post("/api/grade", json=body).json()["remedialTaskId"] == old_id
+
+    # --refresh recria os itens com ids novos: a avaliação em cache (com o id velho) não é reaproveitada
+    bank.add("Frações equivalentes", "remedial", ["Dobre uma folha ao meio e depois em quatro."], replace=True)
+    data = client.post("/api/grade", json=body).json()
+    assert len(calls) == 2 and data["cached"] is False
+    assert data["remedialTask"] == "Dobre uma folha ao meio e depois em quatro." and data["remedialTaskId"] != old_id
+
+    # Id inventado: tarefa do banco para o tópico da questão; sem tópico, o texto original
+    assert bank.expand_ref("banco:9999", body["question"])[0] == "Dobre uma folha ao meio e depois em quatro."
+    assert bank.expand_ref("banco:9999", "Qual a capital do Peru?") == ("banco:9999", None)
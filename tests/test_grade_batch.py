@@ -0,0 +1,164 @@
+import asyncio
+import json
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from agents import RunConfig, Runner
+from fastapi.testclient import TestClient
+
+from benchmarks.fake_openai import FakeModel
+from src.backend.agents.assessment_agent import AssessmentResult
+
+
+GRADE = {
+    "score": 95,
+    "feedback": "Ótimo",
+    "xp_awarded": 10,
+    "remedial_task": "Pratique mais",
+    "gaps": ["Frações"],
+    "strengths": ["Clareza"],
+}
+
+
+class StubRunner:
+    """Roda o `Runner` real com um modelo falso cuja resposta depende da resposta do aluno.
+
+    Texto fora do schema do avaliador ou do reparo faz o SDK levantar `ModelBehaviorError`,
+    como em produção.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.calls = []
+        self.repairs = 0
+        self.models = []
+
+    async def _run(self, agent, prompt, text, **kwargs):
+        model = FakeModel(agent.name, reply=lambda _input: text)
+        return await Runner.run(agent.clone(model=model), prompt, run_config=RunConfig(tracing_disabled=True), **kwargs)
+
+    async def run(self, agent, prompt, session=None, **kwargs):
+        self.models.append((agent.name, agent.model))
+        if agent.name == "Reparo de Avaliação":
+            self.repairs += 1
+            if "Nota 50" in prompt:
+                text = json.dumps({**GRADE, "score": 50, "feedback": "Parcial", "xp_awarded": 2})
+            else:
+                text = "continua sem JSON"
+            return await self._run(agent, prompt, text, session=session, **kwargs)
+
+        self.calls.append(session)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            answer = prompt.rsplit("Resposta do aluno: ", 1)[-1]
+            if answer == "lenta":
+                await asyncio.sleep(5)
+            if answer == "erro":
+                raise RuntimeError("modelo indisponível")
+            text = {
+                "prosa": "Nota 50, resposta parcial.",
+                "lixo": "Não consegui avaliar.",
+                "quase": 'Segue: ```json\n{"score": "80", "xp_awarded": 5, "gaps": ["Soma",],}\n```',
+            }.get(answer, json.dumps(GRADE))
+            return await self._run(agent, prompt, text, session=session, **kwargs)
+        finally:
+            self.active -= 1
+
+
+def test_grade_batch_reports_partial_failures(api, monkeypatch, usage_recorder):
+    stub = StubRunner(delay=0.05)
+    monkeypatch.setattr(api, "Runner", stub)
+    client = TestClient(api.app)
+
+    items = [{"answer": "certa", "sessionId": f"aluno-{i}"} for i in range(6)]
+    items += [
+        {"answer": "lixo", "sessionId": "aluno-x"},
+        {"answer": "erro", "sessionId": "aluno-y"},
+        {"answer": "lenta", "sessionId": "aluno-z"},
+        {"answer": "", "sessionId": "aluno-w"},
+        {"answer": "prosa", "sessionId": "aluno-p"},
+        {"answer": "quase", "sessionId": "aluno-q"},
+    ]
+    res = client.post("/api/grade/batch", json={"items": items, "maxConcurrency": 3, "timeoutSeconds": 0.5})
+
+    assert res.status_code == 200
+    data = res.json()
+    assert data["succeeded"] == 8
+    assert data["failed"] == 4
+    assert [r["index"] for r in data["results"]] == list(range(12))
+    assert all(r["ok"] and r["xpAwarded"] == 10 for r in data["results"][:6])
+    assert "interpretar" in data["results"][6]["error"]
+    assert data["results"][7]["error"] == "modelo indisponível"
+    assert "Tempo limite" in data["results"][8]["error"]
+    assert data["results"][10]["score"] == 50
+    assert data["results"][11]["score"] == 80
+    assert stub.repairs == 2  # "lixo" e "prosa"; "quase" é recuperado sem modelo
+    assert ("Reparo de Avaliação", "gpt-4.1-nano") in stub.models
+    assert stub.peak <= 3
+
+    progress = {p["sessionId"]: p for p in data["progress"]}
+    assert set(progress) == {f"aluno-{i}" for i in range(6)} | {"aluno-p", "aluno-q"}
+    assert progress["aluno-0"]["totalXp"] == 10
+    assert progress["aluno-0"]["gaps"] == ["Frações"]
+    # Cada item é cobrado da própria sessão, inclusive o que falhou no reparo
+    assert usage_recorder.session_tokens("aluno-0") > 0 and usage_recorder.session_tokens("aluno-x") > 0
+
+
+def test_identical_answers_are_graded_once(api, monkeypatch):
+    stub = StubRunner(delay=0.05)
+    monkeypatch.setattr(api, "Runner", stub)
+    client = TestClient(api.app)
+
+    question = {"question": "O que é 1/2?", "expected": "metade"}
+    items = [dict(question, answer=answer, sessionId=f"aluno-{i}") for i, answer in enumerate(["Metade", " metade ", "METADE"])]
+    res = client.post("/api/grade/batch", json={"items": items})
+    assert res.json()["succeeded"] == 3
+    assert len(stub.calls) == 1
+    assert stub.calls[0] is None  # sem histórico de sessão
+    assert sorted(r["cached"] for r in res.json()["results"]) == [False, True, True]
+
+    single = client.post("/api/grade", json=dict(question, answer="metade", sessionId="aluno-9"))
+    assert single.json()["cached"] is True
+    assert len(stub.calls) == 1
+
+    client.post("/api/grade", json=dict(question, answer="metade", sessionId="aluno-9", stateless=False))
+    assert len(stub.calls) == 2
+    assert stub.calls[1] is not None
+
+
+def test_grader_structured_output_is_used_directly(api, monkeypatch):
+    stub = StubRunner()
+    monkeypatch.setattr(api, "Runner", stub)
+    parsed = []
+    parse = api.parse_assessment_output
+    monkeypatch.setattr(api, "parse_assessment_output", lambda output: parsed.append(output) or parse(output))
+
+    res = TestClient(api.app).post("/api/grade", json={"answer": "certa", "sessionId": "aluno-1"})
+
+    assert res.status_code == 200 and res.json()["score"] == 95 and res.json()["strengths"] == ["Clareza"]
+    # O SDK validou o schema: o parser recebe o AssessmentResult, sem texto nem reparo
+    assert len(parsed) == 1 and isinstance(parsed[0], AssessmentResult)
+    assert stub.repairs == 0
+
+
+def test_award_xp_batch_is_atomic(progress_db):
+    tracker = progress_db.ProgressTracker()
+    awards = [
+        progress_db.XpAward("aluno-1", "tutor", 10, "grade"),
+        progress_db.XpAward("aluno-1", "tutor", 5, "grade", event_type="grade", event_payload={"score": 80}),
+        progress_db.XpAward(None, "tutor", 5, "grade"),  # viola NOT NULL → rollback
+    ]
+    with pytest.raises(sqlite3.IntegrityError):
+        tracker.award_xp_batch(awards)
+    assert tracker.get_progress("aluno-1", "tutor").xp == 0
+
+    summaries = tracker.award_xp_batch(awards[:2])
+    summary = summaries[("aluno-1", "tutor")]
+    assert summary.xp == 15
+    assert summary.awarded == 15
+    assert [e["type"] for e in summary.recent_events].count("grade") == 1
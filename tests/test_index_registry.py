@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from benchmarks.corpus import SyntheticCorpus
+from src.backend.rag import ingest, registry, retriever
+from src.backend.rag.quantization import write_index_files
+
+
+@pytest.fixture
+def index_root(tmp_path, monkeypatch, fake_openai):
+    root = tmp_path / "index"
+    data_dir = tmp_path / "data"
+    SyntheticCorpus(dim=16, vocab_size=100).write_documents(data_dir, 2)
+    monkeypatch.setattr(registry, "INDEX_ROOT", root)
+    monkeypatch.setattr(ingest, "INDEX_DIR", root)
+    monkeypatch.setattr(ingest, "DATA_DIR", data_dir)
+    for cache in ("_index_cache", "_meta_cache", "_info_cache", "_shared_cache"):
+        monkeypatch.setattr(retriever, cache, {})
+    return root
+
+
+def test_agents_sharing_an_index_share_memory_and_model(index_root, monkeypatch, fake_openai):
+    ingest.main(["--agent", "planner", "--agent", "helper", "--name", "small", "--dimensions", "64"])
+    ingest.main(["--agent", "planner", "--agent", "helper", "--name", "small", "--dimensions", "64"])
+
+    data = registry.load_registry(index_root)
+    assert data["agents"] == {"planner": "small", "helper": "small"}
+    entry = data["indexes"]["small"]
+    assert (entry["embed_model"], entry["version"], entry["chunk_size"]) == ("text-embedding-3-small", 2, 600)
+
+    calls = []
+    create = fake_openai.embeddings.create
+    monkeypatch.setattr(fake_openai.embeddings, "create", lambda **kw: calls.append(kw) or create(**kw))
+    assert retriever.search_chunks("bababa", k=2, agent_id="planner")
+    assert calls[0]["model"] == "text-embedding-3-small"
+
+    planner_index, planner_meta = retriever._load_agent_index("planner")
+    helper_index, helper_meta = retriever._load_agent_index("helper")
+    assert planner_index is helper_index and planner_meta is helper_meta
+
+
+def test_reingesting_one_agent_reloads_everyone_sharing_the_index(index_root):
+    ingest.main(["--agent", "planner", "--agent", "helper", "--name", "small", "--dimensions", "64"])
+    old_index, _ = retriever._load_agent_index("planner")
+    retriever._load_agent_index("helper")
+
+    ingest.main(["--agent", "planner", "--name", "small", "--dimensions", "64"])
+    retriever.clear_cache("planner")
+
+    planner_index, _ = retriever._load_agent_index("planner")
+    helper_index, _ = retriever._load_agent_index("helper")
+    assert planner_index is not old_index and planner_index is helper_index
+    assert retriever._info_cache["planner"]["version"] == retriever._info_cache["helper"]["version"] == 2
+
+
+def test_mismatched_model_is_rejected_at_load(index_root):
+    # Índice global antigo (sem index_info.json) = text-embedding-3-large
+    write_index_files(index_root, np.ones((2, 8), dtype="float32"), [{"id": "x", "source": "s", "text": "t"}] * 2, "m")
+    (index_root / "index_info.json").unlink()
+
+    assert retriever._load_agent_index("tutor")[0] is not None
+    with pytest.raises(registry.IndexMismatchError):
+        retriever._load_agent_index("planner")
+
+
+def test_agents_with_different_models_cannot_share(index_root):
+    with pytest.raises(SystemExit):
+        ingest.main(["--agent", "tutor", "--agent", "planner"])
@@ -0,0 +1,64 @@
+import pytest
+
+from src.backend import intents
+from src.backend.agents.config import AGENT_CONFIGS, AgentConfig
+from src.backend.rag import ingest, registry, retriever
+
+
+@pytest.mark.parametrize(
+    "message, expected",
+    [
+        ("Praticar agora", "practice"),
+        ("Quero fazer um EXERCÍCIO de frações", "practice"),
+        ("me testa nesse conteúdo", "practice"),
+        ("Pode fazer uma revisão?", "review"),
+        ("um resumo e depois um quiz", "practice"),  # practice tem prioridade
+        ("O que é fotossíntese?", "chat"),
+        ("contexto histórico", "chat"),  # só prefixos de palavra
+        ("", "chat"),
+    ],
+)
+def test_keywords_are_accent_and_case_insensitive(message, expected):
+    assert intents.detect_intent(message, "tutor") == expected
+
+
+def test_intents_are_configurable_per_agent(monkeypatch):
+    monkeypatch.setitem(AGENT_CONFIGS, "lab", AgentConfig(name="Lab", intents={"experiment": ["experimen"], "review": ["revis"]}))
+    assert intents.detect_intent("Vamos experimentar?", "lab") == "experiment"
+    assert intents.detect_intent("Praticar agora", "lab") == "chat"
+
+    AGENT_CONFIGS["lab"].intents = {"practice": ["bora"]}
+    assert intents.detect_intent("Bora!", "lab") == "practice"
+
+
+def test_embedding_fallback_reuses_cached_query_embedding(tmp_path, monkeypatch, fake_openai):
+    root = tmp_path / "index"
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "aula.md").write_text("Frações representam partes de um todo.", encoding="utf-8")
+    monkeypatch.setattr(registry, "INDEX_ROOT", root)
+    monkeypatch.setattr(ingest, "INDEX_DIR", root)
+    monkeypatch.setattr(ingest, "DATA_DIR", data_dir)
+    for cache in ("_index_cache", "_meta_cache", "_info_cache", "_shared_cache"):
+        monkeypatch.setattr(retriever, cache, {})
+    ingest.main(["--agent", "tutor", "--dimensions", "64"])
+
+    monkeypatch.setattr(intents, "INTENT_EMBEDDINGS", True)
+    monkeypatch.setitem(
+        AGENT_CONFIGS, "tutor",
+        AgentConfig(name="Tutor", embed_model="text-embedding-3-large", intent_examples={
+            "practice": ["me passa um problema de frações para resolver"],
+            "chat": ["oi tudo bem"],
+        }),
+    )
+    calls = []
+    create = fake_openai.embeddings.create
+    monkeypatch.setattr(fake_openai.embeddings, "create", lambda **kw: calls.append(kw["input"]) or create(**kw))
+
+    message = "um problema de frações para resolver"
+    assert intents.detect_intent(message, "tutor") == "practice"
+    assert intents.detect_intent("xyz", "tutor") == "chat"  # abaixo do limiar
+    retriever.search_chunks(message, k=1, agent_id="tutor")
+    # Exemplos embutidos uma vez; a busca reaproveita o embedding da mensagem
+    assert sum(message in batch for batch in calls) == 1
+    assert len(calls) == 3
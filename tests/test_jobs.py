@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend import jobs
+from src.backend.rag import ingest, registry, retriever
+
+TOPICS = ["frações", "decimais", "porcentagem", "geometria", "ângulos", "equações"]
+
+
+class WorkerCrash(BaseException):
+    """Simula o processo morrendo no meio do job (não passa pelos `except Exception`)."""
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch, fake_openai):
+    root = tmp_path / "index"
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for topic in TOPICS:
+        (data_dir / f"{topic}.md").write_text(f"Aula sobre {topic} com exemplos\n", encoding="utf-8")
+    monkeypatch.setattr(registry, "INDEX_ROOT", root)
+    monkeypatch.setattr(ingest, "INDEX_DIR", root)
+    monkeypatch.setattr(ingest, "DATA_DIR", data_dir)
+    monkeypatch.setattr(ingest, "EMBED_BATCH_SIZE", 2)
+    for cache in ("_index_cache", "_meta_cache", "_info_cache", "_shared_cache"):
+        monkeypatch.setattr(retriever, cache, {})
+    return data_dir
+
+
+def _count_calls(monkeypatch, fake_openai, fail_on=None):
+    calls = []
+    create = fake_openai.embeddings.create
+
+    def counted(**kwargs):
+        calls.append(len(kwargs["input"]))
+        if fail_on is not None and len(calls) == fail_on:
+            raise WorkerCrash()
+        return create(**kwargs)
+
+    monkeypatch.setattr(fake_openai.embeddings, "create", counted)
+    return calls
+
+
+def test_ingest_job_runs_in_worker_and_streams_progress(corpus, api, job_queue):
+    client = TestClient(api.app)
+    res = client.post("/api/jobs", json={"kind": "ingest", "params": {"agents": ["planner"], "name": "small"}})
+    assert res.status_code == 202
+    job = res.json()
+    assert job["state"] == "queued" and job["params"]["embedModel"] == "text-embedding-3-small"
+
+    done = jobs.Worker(job_queue, "w1").run_once()
+    assert (done.state, done.progress, done.attempts) == ("done", 1.0, 1)
+    assert done.result["vectors"] == len(TOPICS) and done.result["agents"] == ["planner"]
+    assert registry.load_registry()["agents"]["planner"] == "small"
+    assert not (jobs.JOBS_WORK_DIR / str(done.id)).exists()
+
+    body = client.get(f"/api/jobs/{done.id}/stream").text
+    assert body.startswith("event: done") and '"state": "done"' in body
+    assert client.get("/api/jobs").json()["jobs"][0]["id"] == done.id
+
+    retriever._index_cache["planner"] = object()
+    api.apply_job_results(job_queue.finished_after(0))
+    assert "planner" not in retriever._index_cache
+
+
+def test_data_dir_is_confined_to_rag_data(corpus, api, job_queue, tmp_path):
+    client = TestClient(api.app)
+    (tmp_path / "segredo").mkdir()
+    for data_dir in ("/etc", "../segredo", str(tmp_path / "segredo")):
+        res = client.post("/api/jobs", json={"kind": "ingest", "params": {"agents": ["tutor"], "dataDir": data_dir}})
+        assert res.status_code == 400 and "dataDir" in res.json()["detail"]
+
+    (corpus / "frações").mkdir()
+    res = client.post("/api/jobs", json={"kind": "ingest", "params": {"agents": ["tutor"], "dataDir": "frações"}})
+    assert res.status_code == 202 and res.json()["params"]["dataDir"] == str((corpus / "frações").resolve())
+
+    # Job gravado sem passar pela API: o worker também recusa
+    job = job_queue.enqueue("ingest", {"agents": ["tutor"], "dataDir": "/etc"})
+    worker = jobs.Worker(job_queue, "w1")
+    worker.run_once()
+    failed = worker.run_once()
+    assert failed.id == job.id and failed.state == "failed" and "dataDir" in failed.error
+
+
+def test_crashed_job_resumes_from_last_checkpoint(corpus, job_queue, monkeypatch, fake_openai):
+    job = jobs.enqueue("ingest", {"agents": ["tutor"]})
+    calls = _count_calls(monkeypatch, fake_openai, fail_on=3)
+    with pytest.raises(WorkerCrash):
+        jobs.Worker(job_queue, "w1").run_once()
+    crashed = job_queue.get(job.id)
+    assert crashed.state == "running" and crashed.checkpoint["embeddings"]["done"] == 4
+
+    # Heartbeat velho: outro worker assume e só pede o último lote
+    calls = _count_calls(monkeypatch, fake_openai)
+    job_queue.stale_seconds = 0
+    done = jobs.Worker(job_queue, "w2").run_once()
+    assert (done.state, done.attempts, calls) == ("done", 2, [2])
+    assert retriever.search_chunks("Aula sobre porcentagem", k=1, agent_id="tutor")[0]["source"] == "porcentagem.md"
+
+
+def test_cancel_and_shutdown(corpus, api, job_queue, monkeypatch, fake_openai):
+    client = TestClient(api.app)
+    assert client.post("/api/jobs", json={"kind": "backup"}).status_code == 400
+    assert client.post("/api/jobs", json={"kind": "ingest", "params": {"tenant": "escola-a"}}).status_code == 400
+    assert client.post("/api/jobs/999/cancel").status_code == 404
+
+    queued = jobs.enqueue("ingest", {"agents": ["tutor"]})
+    assert client.post(f"/api/jobs/{queued.id}/cancel").json()["state"] == "cancelled"
+    assert jobs.Worker(job_queue).run_once() is None
+
+    # Cancelamento durante a execução: para no próximo lote
+    ingest.main(["--agent", "tutor"])
+    running = jobs.enqueue("reembed", {"agents": ["tutor"]})
+    create = fake_openai.embeddings.create
+    monkeypatch.setattr(
+        fake_openai.embeddings, "create", lambda **kw: job_queue.cancel(running.id) and create(**kw)
+    )
+    assert jobs.Worker(job_queue).run_once().state == "cancelled"
+
+    # Desligamento do worker: o job volta para a fila sem gastar tentativa
+    monkeypatch.setattr(fake_openai.embeddings, "create", create)
+    job = jobs.enqueue("ingest", {"agents": ["tutor"]})
+    worker = jobs.Worker(job_queue)
+    monkeypatch.setattr(fake_openai.embeddings, "create", lambda **kw: worker.stop() or create(**kw))
+    released = worker.run_once()
+    assert (released.state, released.attempts) == ("queued", 0)
+    assert released.checkpoint["embeddings"]["done"] == 2
+    assert np.load(jobs.JOBS_WORK_DIR / str(job.id) / "embeddings" / "000000000.npy").shape[0] == 2
+
+
+def test_only_one_api_process_spawns_workers(job_queue, monkeypatch):
+    fcntl = pytest.importorskip("fcntl")
+    spawned = []
+    monkeypatch.setattr(jobs.subprocess, "Popen", lambda *args, **kwargs: spawned.append(args) or object())
+    monkeypatch.setattr(jobs, "_spawn_lock", None)
+
+    # Outro processo da API já segura a trava
+    job_queue.path.parent.mkdir(parents=True, exist_ok=True)
+    with open(job_queue.path.with_name(job_queue.path.name + ".spawn.lock"), "a") as other:
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert jobs.spawn_workers(2) == [] and spawned == []
+
+    workers = jobs.spawn_workers(2)
+    assert len(workers) == 2 and len(spawned) == 2
+    jobs._release_spawn_lock()
@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.backend import openai_gateway, telemetry
+from src.backend.openai_gateway import BATCH, INTERACTIVE, GatewayBusyError, OpenAIGateway, TokenBucket
+
+UNLIMITED = {"*": {"rpm": 0, "tpm": 0}}
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(per_minute=60, burst_seconds=2)
+    now = time.monotonic()
+    assert bucket.capacity == 2
+    bucket.take(2, now)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0, abs=0.01)
+    assert bucket.wait_time(1, now + 1.0) == pytest.approx(0.0, abs=0.01)
+    # Pedido maior que o bucket cobra só a capacidade (senão nunca passaria)
+    assert bucket.wait_time(50, now + 2.0) == pytest.approx(0.0, abs=0.01)
+    assert TokenBucket(per_minute=0).wait_time(10**9, now) == 0
+
+
+def test_rpm_limit_spaces_out_requests():
+    gateway = OpenAIGateway({"*": {"rpm": 600, "tpm": 0}}, max_concurrency=8)
+    lane = gateway._lane("gpt-4o-mini")
+    lane.requests = TokenBucket(per_minute=600, burst_seconds=0.1)  # 1 de rajada, 10/s
+
+    start = time.monotonic()
+    for _ in range(3):
+        with gateway.slot("gpt-4o-mini"):
+            pass
+    assert time.monotonic() - start >= 0.18
+
+
+def test_interactive_calls_jump_ahead_of_batch():
+    gateway = OpenAIGateway(UNLIMITED, max_concurrency=1)
+    order = []
+
+    async def call(name, level):
+        async with gateway.aslot("gpt-4o-mini", 10, level):
+            order.append(name)
+
+    async def scenario():
+        holder = await gateway.acquire_async("gpt-4o-mini")
+        tasks = [asyncio.create_task(call(f"batch{i}", BATCH)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(call("chat", INTERACTIVE)))
+        await asyncio.sleep(0.01)
+        assert gateway.stats()["models"]["gpt-4o-mini"]["queued_by_priority"] == {"interactive": 1, "batch": 3}
+        gateway.release(holder)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == ["chat", "batch0", "batch1", "batch2"]
+    assert gateway.stats()["in_flight"] == 0
+
+
+def test_queue_timeout_raises_busy_and_leaves_queue():
+    gateway = OpenAIGateway(UNLIMITED, max_concurrency=1, queue_timeout=0.05)
+    holder = gateway.acquire("gpt-4o-mini")
+    with pytest.raises(GatewayBusyError):
+        gateway.acquire("gpt-4o-mini")
+    assert gateway.stats()["models"]["gpt-4o-mini"]["queued"] == 0
+    gateway.release(holder)
+    gateway.release(gateway.acquire("gpt-4o-mini"))
+
+
+def test_identical_embeddings_in_flight_are_coalesced(fake_openai, monkeypatch):
+    gateway = OpenAIGateway(UNLIMITED)
+    calls = []
+    create = fake_openai.embeddings.create
+
+    def slow_create(**kwargs):
+        calls.append(kwargs)
+        time.sleep(0.1)
+        return create(**kwargs)
+
+    monkeypatch.setattr(fake_openai.embeddings, "create", slow_create)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(gateway.create_embeddings("text-embedding-3-small", ["fração"], 64)))
+        for _ in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1 and calls[0]["dimensions"] == 64
+    assert len(results) == 6 and all(r is results[0] for r in results)
+    assert gateway.coalesced == 5
+    # Terminada a chamada, um pedido novo vai de novo à API
+    gateway.create_embeddings("text-embedding-3-small", ["fração"], 64)
+    assert len(calls) == 2
+
+
+def test_run_agent_corrects_token_bucket_with_usage():
+    gateway = OpenAIGateway({"*": {"rpm": 0, "tpm": 60_000}})
+
+    class Runner:
+        @staticmethod
+        async def run(agent, prompt, **kwargs):
+            usage = SimpleNamespace(total_tokens=100)
+            return SimpleNamespace(final_output="ok", context_wrapper=SimpleNamespace(usage=usage))
+
+    agent = SimpleNamespace(name="Tutor", model="gpt-4o-mini")
+    result = asyncio.run(gateway.run_agent(Runner, agent, "oi", max_tokens=2000))
+    assert result.final_output == "ok"
+    bucket = gateway._lanes["gpt-4o-mini"].tokens
+    # Reservou ~2001 tokens e devolveu o que não foi usado
+    assert bucket.capacity - bucket.level == pytest.approx(100, abs=5)
+
+
+def test_tool_calls_inside_runs_do_not_wait_for_another_slot(fake_openai):
+    runs = 3
+    gateway = OpenAIGateway(UNLIMITED, max_concurrency=runs, queue_timeout=2)
+    started = threading.Barrier(runs, timeout=2)
+
+    class ToolRunner:
+        @staticmethod
+        async def run(agent, prompt, **kwargs):
+            # Todas as execuções ocupam as vagas antes de a ferramenta buscar no índice
+            await asyncio.to_thread(started.wait)
+            await asyncio.to_thread(gateway.create_embeddings, "text-embedding-3-small", [prompt])
+            return SimpleNamespace(final_output=prompt)
+
+    async def scenario():
+        agent = SimpleNamespace(name="Tutor", model="gpt-4o-mini")
+        return await asyncio.gather(*(gateway.run_agent(ToolRunner, agent, f"pergunta {i}") for i in range(runs)))
+
+    results = asyncio.run(scenario())
+    assert [r.final_output for r in results] == [f"pergunta {i}" for i in range(runs)]
+    assert gateway.stats()["in_flight"] == 0
+
+
+def test_gateway_metrics_are_exported(monkeypatch):
+    gateway = OpenAIGateway(UNLIMITED)
+    monkeypatch.setattr(openai_gateway, "_gateway", gateway)
+    telemetry.reset()
+    telemetry.set_enabled(True)
+    try:
+        with gateway.slot("text-embedding-3-large", 5, BATCH):
+            pass
+        text = telemetry.render_prometheus()
+    finally:
+        telemetry.set_enabled(False)
+        telemetry.reset()
+
+    assert 'mentoria_openai_queue_wait_seconds_count{model="text-embedding-3-large",priority="batch"} 1' in text
+    assert "# TYPE mentoria_openai_queue_depth gauge" in text
+    assert 'mentoria_openai_queue_depth{model="text-embedding-3-large",priority="interactive"} 0' in text
+    assert 'mentoria_openai_requests_total{model="text-embedding-3-large"} 1' in text
+    assert "mentoria_openai_in_flight 0" in text
@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+LONG_REPLY = "Frações equivalentes representam a mesma parte do todo. " * 20
+
+
+class EchoRunner:
+    async def run(self, agent, prompt, **kwargs):
+        return SimpleNamespace(final_output=LONG_REPLY)
+
+
+def test_chat_returns_compact_events_and_deltas_since_version(api, monkeypatch):
+    monkeypatch.setattr(api, "Runner", EchoRunner())
+    monkeypatch.setattr(api, "search_chunks", lambda *args, **kwargs: [])
+    client = TestClient(api.app)
+    body = {"message": "Praticar agora", "sessionId": "aluno-1", "agentId": "tutor"}
+
+    first = client.post("/api/chat", json=body).json()["progress"]
+    assert "delta" not in first and first["version"] == first["recentEvents"][0]["id"]
+
+    second = client.post("/api/chat", json={**body, "progressSince": first["version"]}).json()["progress"]
+    assert second["delta"] is True and second["since"] == first["version"] and "recentEvents" not in second
+    # Só o que foi gravado depois da versão do cliente, em ordem cronológica
+    assert [e["type"] for e in second["events"]] == ["chat", "xp"]
+    assert second["version"] == second["events"][-1]["id"]
+
+    chat_event = second["events"][0]
+    assert chat_event["truncated"] is True
+    assert len(chat_event["payload"]["reply"]) <= 161 and chat_event["payload"]["message"] == "Praticar agora"
+
+    full = client.get(f"/api/progress/events/{chat_event['id']}", params={"sessionId": "aluno-1"}).json()
+    assert full["payload"]["reply"] == LONG_REPLY and full["agentId"] == "tutor"
+    assert client.get(f"/api/progress/events/{chat_event['id']}", params={"sessionId": "outro"}).status_code == 404
+
+
+def test_progress_since_falls_back_to_full_payload_when_out_of_sync(api):
+    client = TestClient(api.app)
+    api.progress_tracker.award_xp("aluno-2", "tutor", 5, "chat")
+
+    full = client.get("/api/progress", params={"sessionId": "aluno-2", "since": 10**6}).json()
+    assert "delta" not in full and len(full["recentEvents"]) == 1
+
+    unchanged = client.get("/api/progress", params={"sessionId": "aluno-2", "since": full["version"]}).json()
+    assert unchanged["delta"] is True and unchanged["events"] == [] and unchanged["xp"] == 5
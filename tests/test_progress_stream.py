@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+from src.backend.progress_broker import RESYNC, ProgressBroker
+from src.backend import progress_broker
+
+
+def _parse_sse(chunk):
+    lines = dict(line.split(": ", 1) for line in chunk.strip().splitlines())
+    return lines["event"], json.loads(lines["data"])
+
+
+def test_committed_changes_are_published_as_deltas(progress_db, monkeypatch):
+    broker = ProgressBroker()
+    monkeypatch.setattr(progress_broker, "_broker", broker)
+    tracker = progress_db.ProgressTracker()
+
+    async def scenario():
+        subscription = broker.subscribe("s1", "tutor")
+        # Gravações de outra thread (como nas rotas síncronas) chegam ao loop da assinatura
+        await asyncio.to_thread(tracker.award_xp, "s1", "tutor", 60, "quiz", gaps=["Frações"])
+        await asyncio.to_thread(tracker.log_event, "s1", "tutor", "chat", {"message": "oi"})
+        await asyncio.to_thread(tracker.award_xp, "outra", "tutor", 5, "chat")
+        first = await asyncio.wait_for(subscription.get(), 1)
+        second = await asyncio.wait_for(subscription.get(), 1)
+        assert subscription.queue.empty()
+        broker.unsubscribe(subscription)
+        return first, second
+
+    award, event = asyncio.run(scenario())
+    assert award["agentId"] == "tutor" and award["xp"] == 60 and award["awarded"] == 60
+    assert award["badges"] == ["Bronze"] and award["gaps"] == ["Frações"]
+    assert award["pathPosition"]["level"] == 1
+    assert [e["type"] for e in award["events"]] == ["xp"]
+    assert event == {"agentId": "tutor", "events": [event["events"][0]], "version": event["events"][0]["id"]}
+    assert event["events"][0]["payload"] == {"message": "oi"}
+
+    # Os ids publicados são os mesmos do recentEvents (o cliente deduplica por id)
+    recent = tracker.get_progress("s1", "tutor").recent_events
+    assert [e["id"] for e in recent] == [event["events"][0]["id"], award["events"][0]["id"]]
+    assert broker.stats() == {"sessions": 0, "subscribers": 0, "published": 2}
+
+
+def test_slow_subscriber_gets_resync_instead_of_unbounded_queue():
+    broker = ProgressBroker(max_queue=3)
+
+    async def scenario():
+        subscription = broker.subscribe("s1", "tutor")
+        for xp in range(5):
+            broker.publish("s1", "tutor", {"xp": xp})
+        await asyncio.sleep(0)
+        items = [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+        return items
+
+    items = asyncio.run(scenario())
+    assert items[0] is RESYNC and items[1:] == [{"xp": 4}]
+
+
+def test_stream_sends_snapshot_then_deltas(api, monkeypatch):
+    broker = ProgressBroker()
+    monkeypatch.setattr(progress_broker, "_broker", broker)
+
+    async def scenario():
+        subscription = broker.subscribe("s1", "tutor")
+        events = api.progress_events("s1", "tutor", subscription)
+        snapshot = await events.__anext__()
+        api.progress_tracker.award_xp("s1", "tutor", 5, "chat")
+        delta = await asyncio.wait_for(events.__anext__(), 1)
+        await events.aclose()
+        return snapshot, delta
+
+    snapshot, delta = asyncio.run(scenario())
+    assert _parse_sse(snapshot) == ("snapshot", {
+        "xp": 0, "goal": 300, "badges": [], "pathPosition": {"level": 0, "label": "Diagnóstico", "xpToNext": 50},
+        "gaps": [], "recentEvents": [], "version": 0,
+    })
+    name, data = _parse_sse(delta)
+    assert name == "delta" and data["xp"] == 5
+    # Fechar o stream remove a assinatura
+    assert not broker.has_subscribers("s1", "tutor")
+
+
+def test_stream_picks_up_writes_from_other_processes(api, monkeypatch):
+    # O broker do stream não é o global: a gravação não chega por ele, como em outro worker
+    broker = ProgressBroker()
+    monkeypatch.setattr(api, "PROGRESS_STREAM_POLL", 0.05)
+
+    async def scenario():
+        subscription = broker.subscribe("s1", "tutor")
+        events = api.progress_events("s1", "tutor", subscription)
+        await events.__anext__()
+        await asyncio.to_thread(api.progress_tracker.award_xp, "s1", "tutor", 5, "chat")
+        chunk = await asyncio.wait_for(events.__anext__(), 1)
+        await events.aclose()
+        return chunk
+
+    name, data = _parse_sse(asyncio.run(scenario()))
+    assert name == "snapshot" and data["xp"] == 5 and data["version"] == data["recentEvents"][0]["id"]
+    assert broker.stats()["published"] == 0
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from benchmarks.corpus import SyntheticCorpus
+from src.backend.rag import evaluate, ingest, retriever
+from src.backend.rag.evaluate import LabeledQuery
+from src.backend.rag.quantization import build_index, read_index, write_index_files
+from src.backend.rag.registry import read_index_info
+
+
+@pytest.fixture
+def agent_index(tmp_path, monkeypatch, fake_openai):
+    """Constrói o índice sintético do 'tutor' na quantização pedida."""
+    client = fake_openai
+    monkeypatch.setattr(retriever, "_index_cache", {})
+    monkeypatch.setattr(retriever, "_meta_cache", {})
+    monkeypatch.setattr(retriever, "_info_cache", {})
+    monkeypatch.setattr(retriever, "_shared_cache", {})
+
+    def build(quantization):
+        index_dir, _ = SyntheticCorpus(dim=64, vocab_size=400).build_index(
+            300, tmp_path / quantization, quantization=quantization
+        )
+        monkeypatch.setattr(retriever, "_get_agent_index_dir", lambda agent_id: index_dir)
+        retriever.clear_cache()
+        return index_dir, client
+
+    return build
+
+
+@pytest.mark.parametrize("quantization", ["none", "fp16", "sq8", "binary"])
+def test_quantized_index_keeps_recall(agent_index, quantization):
+    index_dir, client = agent_index(quantization)
+    meta = json.loads((index_dir / "meta.json").read_text(encoding="utf-8"))
+    qrels = [LabeledQuery(doc["text"], relevant=[doc["id"]]) for doc in meta[:40]]
+
+    report = evaluate.evaluate_agent("tutor", qrels, cutoffs=[1, 5], batch_size=16)
+
+    assert report["quality"]["recall@5"] == 1.0
+    assert report["quality"]["recall@1"] >= 0.95
+    assert report["index_info"]["quantization"] == quantization
+    assert report["batch_mismatches"] == 0
+
+
+def test_query_embedding_uses_index_dimensions(agent_index, monkeypatch):
+    _, client = agent_index("sq8")
+    calls = []
+    create = client.embeddings.create
+    monkeypatch.setattr(
+        client.embeddings,
+        "create",
+        lambda **kw: calls.append(kw) or create(**kw),
+    )
+
+    retriever.search_chunks("bababa cebaba", k=3)
+
+    assert calls[0]["model"] == "text-embedding-3-large"
+    assert calls[0]["dimensions"] == 64
+
+
+def test_ingest_records_dimensions_and_quantization(tmp_path, monkeypatch, fake_openai):
+    data_dir = tmp_path / "data"
+    SyntheticCorpus(dim=16, vocab_size=100).write_documents(data_dir, 2)
+    monkeypatch.setattr(ingest, "DATA_DIR", data_dir)
+    monkeypatch.setattr(ingest, "INDEX_DIR", tmp_path / "index")
+
+    ingest.main(["--dimensions", "256", "--quantization", "binary"])
+
+    info = read_index_info(tmp_path / "index")
+    assert info["embed_model"] == ingest.EMBED_MODEL
+    assert (info["dimensions"], info["requested_dimensions"], info["quantization"]) == (256, 256, "binary")
+    assert (tmp_path / "index" / "vectors.f16.npy").exists()
+
+
+def test_binary_requires_byte_aligned_dimensions():
+    import numpy as np
+
+    with pytest.raises(ValueError):
+        build_index(np.ones((2, 12), dtype="float32"), "binary")
+
+
+def test_rewrite_keeps_mapped_vectors_intact(tmp_path):
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    docs = [{"id": i, "text": f"doc {i}"} for i in range(8)]
+    info = write_index_files(tmp_path, rng.normal(size=(8, 16)), docs, "modelo", quantization="binary")
+    live = read_index(tmp_path, info)
+    before = np.array(live.vectors)
+
+    # Reingestão com o servidor segurando o mmap: o arquivo antigo não é truncado
+    write_index_files(tmp_path, rng.normal(size=(4, 16)), docs[:4], "modelo", quantization="binary")
+    assert np.array_equal(np.array(live.vectors), before)
+    assert read_index(tmp_path, info).ntotal == 4
+    assert not list(tmp_path.glob("*.tmp"))
+
+    write_index_files(tmp_path, rng.normal(size=(4, 16)), docs[:4], "modelo")
+    assert not (tmp_path / "vectors.f16.npy").exists() and read_index_info(tmp_path)["quantization"] == "none"
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from benchmarks.fake_openai import FakeOpenAI
+from src.backend import openai_client
+from src.backend.rag import retriever
+from src.backend.rag.quantization import write_index_files
+from src.backend.rag.rerank import extract_snippet, mmr, terms
+
+
+def test_mmr_skips_near_duplicates():
+    vectors = np.array([[1.0, 0.0], [1.0, 0.0], [0.0, 1.0]], dtype="float32")
+    relevance = np.array([0.9, 0.89, 0.6], dtype="float32")
+
+    assert mmr(relevance, vectors, 2) == [0, 2]
+    assert mmr(relevance, vectors, 3) == [0, 2, 1]
+    assert mmr(relevance, vectors, 2, diversity_lambda=1.0, duplicate_threshold=1.1) == [0, 1]
+
+
+def test_snippet_is_centered_on_query_terms():
+    text = "Introdução geral sobre o tema. " * 40 + "A fração equivalente representa a mesma parte do todo. " + "Fim. " * 40
+
+    snippet = extract_snippet(text, terms("o que é fração equivalente?"), max_chars=200)
+
+    assert "fração equivalente" in snippet
+    assert snippet.startswith("…") and len(snippet) <= 202
+    assert extract_snippet("curto", {"x"}, 200) == "curto"
+
+
+def test_search_chunks_rerank_diversifies_and_trims(tmp_path, monkeypatch):
+    client = FakeOpenAI(dim=64)
+    monkeypatch.setattr(openai_client, "_client", client)
+    docs = [
+        {"id": "a", "source": "a.txt", "text": "frações equivalentes com pizza " * 3},
+        {"id": "a2", "source": "a.txt", "text": "frações equivalentes com pizza " * 3},
+        {"id": "b", "source": "b.txt", "text": "frações equivalentes na reta numérica"},
+        {"id": "c", "source": "c.txt", "text": "fotossíntese nas plantas"},
+    ]
+    vectors = np.array(
+        [d.embedding for d in client.embeddings.create(model="m", input=[d["text"] for d in docs]).data],
+        dtype="float32",
+    )
+    write_index_files(tmp_path, vectors, docs, embed_model="text-embedding-3-large", quantization="fp16")
+    monkeypatch.setattr(retriever, "_get_agent_index_dir", lambda agent_id: tmp_path)
+    for cache in ("_index_cache", "_meta_cache", "_info_cache", "_shared_cache"):
+        monkeypatch.setattr(retriever, cache, {})
+
+    plain = retriever.search_chunks("frações equivalentes pizza", k=2, rerank=False)
+    reranked = retriever.search_chunks("frações equivalentes pizza", k=2, rerank=True)
+    batch = retriever.search_chunks_batch(["frações equivalentes pizza"], k=2, rerank=True)
+
+    assert {h["id"] for h in plain} == {"a", "a2"}
+    assert [h["id"] for h in reranked][1] == "b"
+    assert reranked[0]["lexical"] == pytest.approx(1.0)
+    assert "text" not in reranked[0] and "index_id" not in reranked[0]
+    assert [h["id"] for h in batch[0]] == [h["id"] for h in reranked]
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+from benchmarks.corpus import SyntheticCorpus
+from benchmarks.fake_openai import FakeOpenAI
+from src.backend import openai_client
+from src.backend.rag import evaluate, retriever
+from src.backend.rag.evaluate import LabeledQuery, score_ranking
+
+
+def test_score_ranking_metrics():
+    item = LabeledQuery("q", relevant=["a", "c"])
+    hits = [{"id": "x"}, {"id": "a"}, {"id": "y"}, {"id": "c"}]
+
+    scores = score_ranking(hits, item, [1, 2, 4])
+
+    assert scores["rr"] == 0.5
+    assert scores["recall@1"] == 0.0
+    assert scores["recall@2"] == 0.5
+    assert scores["recall@4"] == 1.0
+    ideal = 1 + 1 / 1.5849625007211563
+    assert scores["ndcg@4"] == pytest.approx((1 / 1.5849625007211563 + 1 / 2.321928094887362) / ideal)
+
+
+def test_answers_match_snippet_once():
+    item = LabeledQuery("q", answers=["Fração Equivalente"])
+    hits = [{"id": "1", "snippet": "uma fração equivalente é..."}, {"id": "2", "snippet": "fração equivalente de novo"}]
+
+    scores = score_ranking(hits, item, [2])
+
+    assert scores["recall@2"] == 1.0 and scores["ndcg@2"] == 1.0
+
+
+@pytest.fixture
+def synthetic_index(tmp_path, monkeypatch):
+    corpus = SyntheticCorpus(dim=32, vocab_size=300)
+    index_dir, _ = corpus.build_index(200, tmp_path / "tutor")
+    monkeypatch.setattr(openai_client, "_client", FakeOpenAI(dim=32))
+    monkeypatch.setattr(retriever, "_get_agent_index_dir", lambda agent_id: index_dir)
+    monkeypatch.setattr(retriever, "_index_cache", {})
+    monkeypatch.setattr(retriever, "_meta_cache", {})
+    monkeypatch.setattr(retriever, "_info_cache", {})
+    monkeypatch.setattr(retriever, "_shared_cache", {})
+    return json.loads((index_dir / "meta.json").read_text(encoding="utf-8"))
+
+
+def test_evaluate_agent_finds_chunks_by_their_own_text(synthetic_index):
+    qrels = [LabeledQuery(doc["text"], relevant=[doc["id"]]) for doc in synthetic_index[:20]]
+
+    report = evaluate.evaluate_agent("tutor", qrels, cutoffs=[1, 5], batch_size=8)
+
+    assert report["quality"]["recall@1"] == 1.0
+    assert report["quality"]["mrr"] == 1.0
+    assert report["batch_mismatches"] == 0
+    assert report["memory"]["vectors"] == 200 and report["memory"]["dim"] == 32
+    assert "recall@6" in report["quality"]  # rag_k do tutor entra nos cortes
@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from src.backend import router as router_module
+from src.backend.router import AgentRouter
+
+
+class ChoiceRunner:
+    def __init__(self, output):
+        self.output = output
+        self.calls = 0
+
+    async def run(self, agent, prompt, **kwargs):
+        self.calls += 1
+        return SimpleNamespace(final_output=self.output)
+
+
+def _route(router, message, runner=None):
+    return asyncio.run(router.route(message, runner or ChoiceRunner("tutor")))
+
+
+def test_keywords_route_without_model_calls():
+    router = AgentRouter(use_embeddings=False, use_llm=False)
+    runner = ChoiceRunner("planner")
+
+    decision = _route(router, "Pode corrigir minha resposta?", runner)
+    assert (decision.agent_id, decision.source) == ("assessment", "keywords")
+    assert _route(router, "Monta um cronograma pra mim", runner).agent_id == "planner"
+    assert (_route(router, "Bom dia", runner).agent_id, runner.calls) == ("tutor", 0)
+    assert {"agent": "assessment", "source": "keywords", "count": 1} in router.stats()["decisions"]
+
+
+def test_centroids_are_embedded_once_and_reuse_query_cache(fake_openai, monkeypatch):
+    calls = []
+    create = fake_openai.embeddings.create
+    monkeypatch.setattr(fake_openai.embeddings, "create", lambda **kw: calls.append(len(kw["input"])) or create(**kw))
+    examples = {
+        "tutor": ["frações equivalentes exercícios"],
+        "planner": ["metas semanais horas divido estudos"],
+        "helper": ["analogias simples recursão"],
+        "assessment": ["nota redação"],
+    }
+    router = AgentRouter(examples=examples, use_llm=False, margin=0.0, min_score=0.0)
+    runner = ChoiceRunner("tutor")
+
+    decision = _route(router, "quantas horas semanais divido entre meus estudos", runner)
+    assert (decision.agent_id, decision.source) == ("planner", "embeddings")
+    assert decision.scores["planner"] == max(decision.scores.values())
+    _route(router, "quantas horas semanais divido entre meus estudos", runner)
+    # 1 lote com prompts + exemplos, 1 com a mensagem; a repetição sai do cache
+    assert len(calls) == 2 and runner.calls == 0
+
+
+def test_ambiguous_messages_escalate_to_llm(fake_openai):
+    router = AgentRouter(min_score=2.0)
+    runner = ChoiceRunner(" Planner.")
+
+    decision = _route(router, "preciso de ajuda", runner)
+    assert (decision.agent_id, decision.source, runner.calls) == ("planner", "llm", 1)
+    # Resposta inválida do LLM: fica o melhor palpite dos centróides
+    decision = _route(router, "preciso de ajuda", ChoiceRunner("não sei"))
+    assert decision.source == "default" and decision.agent_id == max(decision.scores, key=decision.scores.get)
+
+
+def test_chat_auto_mode_keeps_progress_under_auto(api, monkeypatch):
+    monkeypatch.setattr(router_module, "_router", AgentRouter(use_embeddings=False, use_llm=False))
+    runner = ChoiceRunner("Plano pronto.")
+    monkeypatch.setattr(api, "Runner", runner)
+    monkeypatch.setattr(api, "search_chunks", lambda *args, **kwargs: [])
+    client = TestClient(api.app)
+
+    data = client.post("/api/chat", json={"message": "Quero um plano de estudos", "sessionId": "aluno-1", "agentId": "auto"}).json()
+    assert data["agent"] == "auto" and data["routing"]["agent"] == "planner"
+    assert data["routing"]["source"] == "keywords" and data["routing"]["ms"] >= 0
+    assert data["totalXp"] == api.progress_tracker.get_progress("aluno-1", "auto").xp > 0
+
+
+def test_chat_auto_assessment_replies_in_prose(api, monkeypatch):
+    monkeypatch.setattr(router_module, "_router", AgentRouter(use_embeddings=False, use_llm=False))
+    seen = []
+
+    class GraderRunner:
+        async def run(self, agent, prompt, **kwargs):
+            seen.append(agent)
+            # Como o modelo: segue o contrato JSON se as instruções pedirem
+            if "JSON SEMPRE" in agent.instructions:
+                return SimpleNamespace(final_output='{"score": 80, "xp_awarded": 5}')
+            return SimpleNamespace(final_output="Quase lá! 3/4 está certo, mas simplifique 6/8.")
+
+    monkeypatch.setattr(api, "Runner", GraderRunner())
+    monkeypatch.setattr(api, "search_chunks", lambda *args, **kwargs: [])
+    client = TestClient(api.app)
+
+    payload = {"message": "Corrige minha resposta: 6/8 = 3/4", "sessionId": "aluno-1", "agentId": "auto"}
+    data = client.post("/api/chat", json=payload).json()
+    assert data["routing"]["agent"] == "assessment"
+    assert data["reply"] == "Quase lá! 3/4 está certo, mas simplifique 6/8."
+    assert seen[0].output_type is None
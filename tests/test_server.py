@@ -0,0 +1,102 @@
+import asyncio
+import json
+import shutil
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parents[1] / "src"
+
+
+@pytest.fixture
+def light_server(tmp_path, monkeypatch):
+    """Servidor leve (`server.py`) numa porta livre, com public/ copiado e sessões em memória."""
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    # Como no README: o servidor leve roda com PYTHONPATH=src
+    monkeypatch.syspath_prepend(str(SRC_DIR))
+    from backend import server as module
+    from backend.session_store import InMemoryListBackend, ListSessionStore
+    from backend.static_assets import StaticAssetRegistry
+
+    public = tmp_path / "public"
+    shutil.copytree(module.PUBLIC_DIR, public, ignore=shutil.ignore_patterns("*.gz", "*.br"))
+    monkeypatch.setattr(module, "static_assets", StaticAssetRegistry(public))
+    store = ListSessionStore(InMemoryListBackend())
+    monkeypatch.setattr(module, "get_session_store", lambda: store)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), module.ChatHandler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield module, f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _request(url, data=None, method=None, headers=None):
+    body = json.dumps(data).encode("utf-8") if data is not None else None
+    request = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(request, timeout=5) as res:
+            return res.status, dict(res.headers), res.read()
+    except urllib.error.HTTPError as err:
+        return err.code, dict(err.headers), err.read()
+
+
+def test_slow_agent_returns_504(light_server, monkeypatch):
+    server, url = light_server
+
+    async def slow_agent(session, message, agent_id):
+        await asyncio.sleep(2)
+        return "tarde demais"
+
+    monkeypatch.setattr(server, "run_agent", slow_agent)
+    monkeypatch.setattr(server, "CHAT_TIMEOUT", 0.1)
+    status, _, body = _request(f"{url}/api/chat", {"message": "oi"})
+    assert status == 504 and json.loads(body) == {"error": "Tempo limite de 0.1s excedido"}
+
+
+def test_overlapping_chats_are_served_concurrently(light_server, monkeypatch):
+    server, url = light_server
+    running, peak = 0, 0
+
+    async def agent(session, message, agent_id):
+        nonlocal running, peak
+        # Todas as corrotinas rodam no mesmo event loop compartilhado
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.3)
+        running -= 1
+        return f"{agent_id}: {message}"
+
+    monkeypatch.setattr(server, "run_agent", agent)
+    payloads = [{"message": "um", "agentId": "planner"}, {"message": "dois", "agentId": "helper"}]
+    with ThreadPoolExecutor(2) as pool:
+        results = list(pool.map(lambda p: _request(f"{url}/api/chat", p), payloads))
+
+    assert [(status, json.loads(body)["reply"]) for status, _, body in results] == [
+        (200, "planner: um"),
+        (200, "helper: dois"),
+    ]
+    assert peak == 2
+
+
+def test_static_head_and_conditional_get(light_server):
+    _, url = light_server
+    status, headers, body = _request(f"{url}/main.js")
+    assert status == 200 and body and headers["Content-Length"] == str(len(body))
+
+    status, head_headers, head_body = _request(f"{url}/main.js", method="HEAD")
+    assert status == 200 and head_body == b""
+    assert head_headers["ETag"] == headers["ETag"] and head_headers["Content-Length"] == headers["Content-Length"]
+
+    status, _, body = _request(f"{url}/main.js", headers={"If-Modified-Since": headers["Last-Modified"]})
+    assert status == 304 and body == b""
+    status, _, _ = _request(f"{url}/main.js", headers={"If-None-Match": headers["ETag"]})
+    assert status == 304
+    assert _request(f"{url}/nada.js")[0] == 404
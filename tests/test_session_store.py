@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.backend.session_store import InMemoryListBackend, ListSessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteSessionStore(tmp_path / "sessions.db", pool_size=4, max_items=10)
+    return ListSessionStore(InMemoryListBackend(), max_items=10)
+
+
+def _msg(i):
+    return {"role": "user", "content": f"m{i}"}
+
+
+def test_roundtrip_and_bounded_retention(store):
+    async def scenario():
+        session = store.open("aluno")
+        await session.add_items([_msg(i) for i in range(4)])
+        session.save_summary("resumo", 4)
+        await session.add_items([_msg(i) for i in range(4, 14)])
+        return session, await session.get_items(), await session.get_items(limit=2)
+
+    session, items, last_two = asyncio.run(scenario())
+    assert [item["content"] for item in items] == [f"m{i}" for i in range(4, 14)]
+    assert [item["content"] for item in last_two] == ["m12", "m13"]
+    # 4 itens antigos saíram: o resumo deixa de cobrir posições que não existem mais
+    assert session.load_summary() == ("resumo", 0)
+    assert session.read_tail(3) == (10, [_msg(11), _msg(12), _msg(13)])
+    assert session.items_range(1, 3) == [_msg(5), _msg(6)]
+
+
+def test_pop_and_clear(store):
+    async def scenario():
+        session = store.open("aluno")
+        await session.add_items([_msg(1), _msg(2)])
+        popped = await session.pop_item()
+        remaining = await session.get_items()
+        await session.clear_session()
+        return popped, remaining, await session.get_items(), session.load_summary()
+
+    popped, remaining, cleared, summary = asyncio.run(scenario())
+    assert popped == _msg(2)
+    assert remaining == [_msg(1)]
+    assert cleared == []
+    assert summary == ("", 0)
+
+
+def test_sqlite_store_is_shared_across_instances_and_threads(tmp_path):
+    path = tmp_path / "sessions.db"
+    first = SQLiteSessionStore(path, pool_size=2)
+    second = SQLiteSessionStore(path, pool_size=2)
+
+    def write(i):
+        asyncio.run(first.open(f"aluno-{i % 3}").add_items([_msg(i)]))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, range(30)))
+
+    totals = [second.open(f"aluno-{i}").read_tail(0)[0] for i in range(3)]
+    assert totals == [10, 10, 10]
@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+
+from agents.usage import Usage
+
+from src.backend import openai_gateway, usage
+from src.backend.openai_gateway import BATCH, OpenAIGateway
+from src.backend.session_store import SQLiteSessionStore
+from src.backend.session_window import WindowedSession, estimate_tokens
+
+UNLIMITED = {"*": {"rpm": 0, "tpm": 0}}
+
+
+def _turn(i):
+    return [
+        {"role": "user", "content": f"pergunta {i} " + "x" * 200},
+        {"role": "assistant", "content": f"resposta {i} " + "y" * 400},
+    ]
+
+
+def test_window_stays_bounded_and_summary_is_incremental(tmp_path):
+    calls = []
+
+    async def fake_summarizer(previous, items):
+        calls.append(len(items))
+        return (previous + " | " if previous else "") + f"{len(items)} itens"
+
+    async def scenario():
+        session = WindowedSession(
+            SQLiteSessionStore(tmp_path / "sessions.db").open("aluno"),
+            token_budget=600,
+            summary_min_items=4,
+            summarizer=fake_summarizer,
+        )
+        sizes = []
+        for i in range(30):
+            await session.add_items(_turn(i))
+            await session.schedule_summary()
+            items = await session.get_items()
+            sizes.append(sum(estimate_tokens(item) for item in items))
+        return session, items, sizes
+
+    session, items, sizes = asyncio.run(scenario())
+
+    assert items[0]["role"] == "system"
+    assert "Resumo" in items[0]["content"]
+    assert items[1]["role"] == "user"
+    assert items[-1]["content"].startswith("resposta 29")
+    # custo por turno não cresce com o tamanho da sessão
+    assert max(sizes[10:]) <= max(sizes[:10]) + 60
+    # cada lote resumido só contém itens novos
+    assert sum(calls) == session.inner.load_summary()[1]
+    assert sum(calls) < 60
+
+
+def test_summarizer_failure_keeps_raw_history(tmp_path):
+    async def broken(previous, items):
+        raise RuntimeError("sem modelo")
+
+    async def scenario():
+        session = WindowedSession(
+            SQLiteSessionStore(tmp_path / "sessions.db").open("aluno"),
+            token_budget=10_000,
+            summary_min_items=1,
+            summarizer=broken,
+        )
+        await session.add_items(_turn(0))
+        await session.schedule_summary()
+        return await session.get_items()
+
+    items = asyncio.run(scenario())
+    assert [item["role"] for item in items] == ["user", "assistant"]
+
+
+def test_summary_started_inside_a_run_waits_for_its_own_slot(tmp_path, monkeypatch, usage_recorder):
+    # Uma vaga só: o resumo disparado no meio do turno espera o turno liberar
+    gateway = OpenAIGateway(UNLIMITED, max_concurrency=1, queue_timeout=2)
+    monkeypatch.setattr(openai_gateway, "_gateway", gateway)
+    order = []
+    agent = SimpleNamespace(name="Tutor", model="gpt-4o-mini")
+
+    def result(text):
+        usage = Usage(requests=1, input_tokens=10, output_tokens=5, total_tokens=15)
+        return SimpleNamespace(final_output=text, context_wrapper=SimpleNamespace(usage=usage))
+
+    class SummaryRunner:
+        @staticmethod
+        async def run(agent, prompt, **kwargs):
+            order.append("resumo")
+            return result("resumo")
+
+    async def summarizer(previous, items):
+        return (await gateway.run_agent(SummaryRunner, agent, "resuma", level=BATCH)).final_output
+
+    session = WindowedSession(
+        SQLiteSessionStore(tmp_path / "sessions.db").open("aluno"),
+        token_budget=100,
+        summary_min_items=1,
+        summarizer=summarizer,
+    )
+
+    class TurnRunner:
+        @staticmethod
+        async def run(agent, prompt, **kwargs):
+            await session.add_items(_turn(0) + _turn(1))
+            await asyncio.sleep(0.1)
+            order.append("turno")
+            return result("ok")
+
+    async def scenario():
+        with usage.usage_scope("tutor", "aluno") as request_usage:
+            await gateway.run_agent(TurnRunner, agent, "oi")
+        await asyncio.wait_for(session.schedule_summary(), 2)
+        return request_usage
+
+    request_usage = asyncio.run(scenario())
+    assert order == ["turno", "resumo"]
+    # O resumo não é cobrado da requisição que o disparou
+    assert request_usage.requests == 1
+    assert {t["agent"] for t in usage_recorder.stats()["totals"]} == {"tutor", "summary"}
@@ -0,0 +1,144 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend.rag import ingest, registry, retriever, shards
+
+SUBJECTS = {
+    "matematica": "frações equivalentes numerador denominador",
+    "historia": "independência império colônia revolução",
+    "ciencias": "fotossíntese clorofila planta energia",
+}
+
+
+@pytest.fixture
+def shard_root(tmp_path, monkeypatch, fake_openai):
+    root = tmp_path / "index"
+    monkeypatch.setattr(registry, "INDEX_ROOT", root)
+    monkeypatch.setattr(ingest, "INDEX_DIR", root)
+    monkeypatch.setattr(shards, "_cache", shards.ShardCache())
+    for subject, text in SUBJECTS.items():
+        data_dir = tmp_path / "data" / subject
+        data_dir.mkdir(parents=True)
+        for i in range(3):
+            (data_dir / f"{subject}-{i}.md").write_text(f"{text} aula {i}\n", encoding="utf-8")
+        ingest.main(["--agent", "tutor", "--tenant", "escola-a", "--subject", subject, "--data-dir", str(data_dir)])
+    return root
+
+
+def test_ingest_registers_shards_per_tenant_and_subject(shard_root):
+    registered = shards.list_shards("escola-a")
+    assert sorted(registered) == ["escola-a/ciencias", "escola-a/historia", "escola-a/matematica"]
+    assert registered["escola-a/matematica"]["count"] == 3
+    assert (shard_root / "shards" / "escola-a" / "matematica" / "faiss.index").exists()
+    assert shards.list_shards("escola-b") == {}
+
+    assert shards.resolve_shards("escola-a", ["historia"]) == ["escola-a/historia"]
+    with pytest.raises(shards.ShardNotFoundError):
+        shards.resolve_shards("escola-b")
+    with pytest.raises(ValueError):
+        shards.resolve_shards("escola-a", ["../tutor"])
+    with pytest.raises(SystemExit):
+        ingest.main(["--tenant", "escola-a"])
+
+
+def test_fan_out_merges_top_k_across_shards(shard_root):
+    hits = retriever.search_chunks("fotossíntese clorofila", k=4, shards=shards.resolve_shards("escola-a"))
+    assert len(hits) == 4
+    assert hits[0]["shard"] == "escola-a/ciencias" and hits[0]["source"].startswith("ciencias")
+    assert [h["score"] for h in hits] == sorted((h["score"] for h in hits), reverse=True)
+    assert {h["shard"] for h in hits} > {"escola-a/ciencias"}
+
+    # Escopo da requisição: a busca (inclusive a do tutor) só vê as disciplinas pedidas
+    with shards.shard_scope(["escola-a/historia"]):
+        scoped = retriever.search_chunks_batch(["fotossíntese", ""], k=2)
+        assert retriever.search_chunks("fotossíntese", k=5, rerank=True)
+    assert {h["shard"] for h in scoped[0]} == {"escola-a/historia"} and scoped[1] == []
+    assert "shard" not in (retriever.search_chunks("fotossíntese", k=1) or [{}])[0]
+
+
+def test_lru_evicts_least_recently_used_shard_within_budget(shard_root):
+    one = shards._footprint(shards.shard_dir("escola-a/historia"))
+    cache = shards.ShardCache(budget_bytes=int(one * 2.5))
+    shards.set_shard_cache(cache)
+
+    for shard in ("escola-a/matematica", "escola-a/historia", "escola-a/matematica", "escola-a/ciencias"):
+        retriever.search_chunks("aula", k=1, shards=[shard])
+
+    stats = cache.stats()
+    assert stats["loaded"] == 2 and stats["usedBytes"] <= stats["budgetBytes"]
+    assert stats["shards"]["escola-a/historia"] == {
+        "loaded": False, "bytes": one, "hits": 0, "misses": 1, "hitRate": 0.0, "evictions": 1, "searches": 1,
+    }
+    assert stats["shards"]["escola-a/matematica"]["hits"] == 1
+    assert stats["shards"]["escola-a/matematica"]["hitRate"] == 0.5
+
+
+def test_cold_load_does_not_block_other_shards_and_runs_once(shard_root, monkeypatch):
+    cache = shards.ShardCache()
+    cache.get("escola-a/historia")
+    release, loads = threading.Event(), []
+    load = cache._load
+
+    def slow_load(shard):
+        loads.append(shard)
+        assert release.wait(5)
+        return load(shard)
+
+    monkeypatch.setattr(cache, "_load", slow_load)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        cold = [pool.submit(cache.get, "escola-a/ciencias") for _ in range(2)]
+        # Enquanto "ciencias" lê do disco, o shard já carregado responde na hora
+        assert cache.get("escola-a/historia").shard == "escola-a/historia"
+        release.set()
+        assert cold[0].result(5) is cold[1].result(5)
+    assert loads == ["escola-a/ciencias"]
+    assert cache.stats()["shards"]["escola-a/ciencias"]["misses"] == 1
+
+
+def test_chat_scopes_search_to_tenant_and_reports_cache(shard_root, api, monkeypatch):
+    seen = []
+
+    class ScopeRunner:
+        async def run(self, agent, prompt, **kwargs):
+            seen.append(shards.current_scope())
+            return SimpleNamespace(final_output="Resposta.")
+
+    monkeypatch.setattr(api, "Runner", ScopeRunner())
+    client = TestClient(api.app)
+
+    payload = {"message": "fotossíntese", "sessionId": "aluno-1", "agentId": "tutor", "tenant": "escola-a", "subjects": ["ciencias"]}
+    data = client.post("/api/chat", json=payload).json()
+    assert seen == [("escola-a/ciencias",)]
+    assert data["sources"] and {s["shard"] for s in data["sources"]} == {"escola-a/ciencias"}
+    assert client.post("/api/chat", json={**payload, "tenant": "escola-b"}).status_code == 404
+    assert client.post("/api/chat", json={**payload, "subjects": ["Ciências!"]}).status_code == 400
+
+    report = client.get("/api/rag/shards", params={"tenant": "escola-a"}).json()
+    assert report["shards"]["escola-a/ciencias"]["loaded"] and report["shards"]["escola-a/ciencias"]["vectors"] == 3
+    assert not report["shards"]["escola-a/historia"]["loaded"]
+
+
+def test_shard_with_another_embed_model_fails_loudly(shard_root, api, tmp_path):
+    data_dir = tmp_path / "data" / "geografia"
+    data_dir.mkdir()
+    (data_dir / "geografia.md").write_text("relevo planalto planície\n", encoding="utf-8")
+    ingest.main([
+        "--tenant", "escola-a", "--subject", "geografia", "--data-dir", str(data_dir),
+        "--embed-model", "text-embedding-3-small",
+    ])
+
+    # A busca não some com o shard em silêncio
+    with pytest.raises(registry.IndexMismatchError, match="geografia"):
+        retriever.search_chunks("relevo", k=2, shards=shards.resolve_shards("escola-a"))
+    assert retriever.search_chunks("relevo", k=2, shards=["escola-a/historia"])
+
+    res = TestClient(api.app).get("/readyz", params={"agentId": "tutor"})
+    assert res.status_code == 503
+    assert res.json()["shards"]["escola-a/geografia"] == {
+        "state": "mismatch", "embed_model": "text-embedding-3-small", "vectors": 1, "agents": ["tutor"],
+    }
+    assert res.json()["shards"]["escola-a/historia"]["state"] == "ready"
@@ -0,0 +1,87 @@
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_importing_the_api_is_lazy():
+    code = (
+        "import sys\n"
+        "import src.backend.server_fastapi\n"
+        "assert 'faiss' not in sys.modules and 'numpy' not in sys.modules, 'faiss/numpy importados'\n"
+        "import src.backend.rag.ingest\n"
+        "from src.backend import openai_client\n"
+        "assert openai_client._client is None, 'cliente OpenAI criado na importação'\n"
+    )
+    # Sem OPENAI_API_KEY: importar não pode instanciar o cliente
+    env = {"PATH": "", "PYTHONPATH": str(REPO_ROOT)}
+    result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_prewarm_reports_each_agent(api, fake_openai, monkeypatch):
+    from src.backend.rag import retriever
+
+    monkeypatch.setattr(retriever, "_get_agent_index_dir", lambda agent_id: None)
+    monkeypatch.setattr(api, "PREWARM_AGENTS", "tutor, helper")
+
+    assert api._prewarm_agents() == ["tutor", "helper"]
+    assert retriever.prewarm(api._prewarm_agents()) == {"tutor": "sem índice", "helper": "sem índice"}
+
+
+def test_progress_schema_is_created_on_first_use(tmp_path, monkeypatch):
+    from src.backend import progress_tracker
+
+    monkeypatch.setattr(progress_tracker, "DB_PATH", tmp_path / "nested" / "progress.db")
+
+    summary = progress_tracker.ProgressTracker().award_xp("s", "tutor", 5, reason="teste")
+
+    assert summary.xp == 5
+
+
+def test_readyz_reports_indexes_without_embedding(api, fake_openai, tmp_path, monkeypatch):
+    import numpy as np
+    from fastapi.testclient import TestClient
+
+    from src.backend.rag import retriever
+    from src.backend.rag.quantization import write_index_files
+
+    for cache in ("_index_cache", "_meta_cache", "_info_cache", "_shared_cache"):
+        monkeypatch.setattr(retriever, cache, {})
+    dirs = {}
+    for agent_id, model in (("planner", "text-embedding-3-small"), ("helper", "text-embedding-3-large")):
+        dirs[agent_id] = tmp_path / agent_id
+        docs = [{"id": f"d::#{i}", "source": "d", "text": f"trecho {i}"} for i in range(5)]
+        write_index_files(dirs[agent_id], np.random.rand(5, 16), docs, embed_model=model)
+    monkeypatch.setattr(retriever, "_get_agent_index_dir", lambda agent_id: dirs.get(agent_id))
+
+    def no_embeddings(**kwargs):
+        raise AssertionError("readyz não deve chamar a API de embeddings")
+
+    monkeypatch.setattr(fake_openai.embeddings, "create", no_embeddings)
+    client = TestClient(api.app)
+
+    assert client.get("/livez").json() == {"ok": True}
+
+    res = client.get("/readyz", params={"agentId": "planner"})
+    planner = res.json()["agents"]["planner"]
+    assert res.status_code == 200 and res.json()["ready"] is True
+    assert (planner["state"], planner["warm"], planner["vectors"], planner["dimensions"]) == ("cold", False, 5, 16)
+    assert planner["embed_model"] == "text-embedding-3-small" and planner["meta_bytes"] > 0
+
+    retriever._load_agent_index("planner")
+    planner = client.get("/readyz", params={"agentId": "planner"}).json()["agents"]["planner"]
+    assert (planner["state"], planner["warm"], planner["vectors"]) == ("loaded", True, 5)
+
+    # helper usa text-embedding-3-small, mas não busca no acervo: o mismatch só é informado
+    monkeypatch.setattr(api, "PREWARM_AGENTS", "")
+    res = client.get("/readyz")
+    agents = res.json()["agents"]
+    assert res.status_code == 200
+    assert agents["helper"]["state"] == "mismatch" and agents["helper"]["retrieves"] is False
+    assert agents["tutor"]["state"] == "missing" and agents["tutor"]["retrieves"] is True
+
+    # Aquecido no início, o índice dele é usado: modelo divergente deixa o serviço não pronto
+    monkeypatch.setattr(api, "PREWARM_AGENTS", "tutor,helper")
+    assert client.get("/readyz").status_code == 503
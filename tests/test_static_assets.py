@@ -0,0 +1,65 @@
+import gzip
+import shutil
+
+from fastapi.testclient import TestClient
+
+from src.backend.static_assets import StaticAssetRegistry, parse_accept_encoding
+
+
+def _registry(tmp_path):
+    (tmp_path / "index.html").write_text("<html>" + "olá " * 500 + "</html>", encoding="utf-8")
+    (tmp_path / "tiny.css").write_text("a{}", encoding="utf-8")
+    registry = StaticAssetRegistry(tmp_path)
+    registry.precompress()
+    return registry
+
+
+def test_accept_encoding_parsing():
+    assert parse_accept_encoding("gzip;q=0.5, br, *;q=0") == {"gzip": 0.5, "br": 1.0, "*": 0.0}
+
+
+def test_negotiates_precompressed_variant(tmp_path):
+    registry = _registry(tmp_path)
+    assert (tmp_path / "index.html.gz").exists()
+    assert not (tmp_path / "tiny.css.gz").exists()
+
+    plain = registry.resolve("/", accept_encoding=None)
+    gz = registry.resolve("/index.html", accept_encoding="gzip;q=1, br;q=0")
+    assert plain.file_path == tmp_path / "index.html"
+    assert "Content-Encoding" not in plain.headers
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(gz.file_path.read_bytes()) == plain.file_path.read_bytes()
+    assert gz.headers["ETag"] != plain.headers["ETag"]
+    assert gz.headers["Vary"] == "Accept-Encoding"
+    assert plain.headers["Cache-Control"] == "no-cache"
+
+
+def test_conditional_requests_and_traversal(tmp_path):
+    registry = _registry(tmp_path)
+    first = registry.resolve("/tiny.css")
+    assert registry.resolve("/tiny.css", if_none_match=first.headers["ETag"]).status == 304
+    assert registry.resolve("/tiny.css", if_none_match='W/"outro", ' + first.headers["ETag"]).status == 304
+    assert registry.resolve("/tiny.css", if_modified_since=first.headers["Last-Modified"]).status == 304
+    assert registry.resolve("/tiny.css", if_none_match='"outro"').status == 200
+
+    (tmp_path / "tiny.css").write_text("b{}", encoding="utf-8")
+    assert registry.resolve("/tiny.css", if_none_match=first.headers["ETag"]).status == 200
+
+    assert registry.resolve("/../segredo.txt").status == 403
+    assert registry.resolve("/nada.js").status == 404
+
+
+def test_fastapi_serves_public_with_validators(api, tmp_path, monkeypatch):
+    # O lifespan pré-comprime: numa cópia, para não deixar .gz no public/ do repositório
+    public = tmp_path / "public"
+    shutil.copytree(api.PUBLIC_DIR, public, ignore=shutil.ignore_patterns("*.gz", "*.br"))
+    monkeypatch.setattr(api, "static_assets", StaticAssetRegistry(public))
+    with TestClient(api.app) as client:
+        res = client.get("/main.js", headers={"Accept-Encoding": "gzip"})
+        assert res.status_code == 200
+        assert res.headers["content-encoding"] == "gzip"
+        assert "function" in res.text
+        again = client.get("/main.js", headers={"Accept-Encoding": "gzip", "If-None-Match": res.headers["etag"]})
+        assert again.status_code == 304
+        assert client.get("/health").json() == {"ok": True}
+    assert (public / "main.js.gz").exists()
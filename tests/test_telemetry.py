@@ -0,0 +1,77 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.backend import telemetry
+
+
+@pytest.fixture
+def tracing():
+    telemetry.reset()
+    telemetry.set_enabled(True)
+    yield telemetry
+    telemetry.set_enabled(False)
+    telemetry.reset()
+
+
+def test_disabled_tracing_is_a_noop():
+    telemetry.reset()
+    assert telemetry.span("x") is telemetry.span("y")
+
+    @telemetry.traced("fn")
+    def fn():
+        return 1
+
+    assert fn() == 1
+    # Sem spans/histogramas, mas os contadores dos módulos continuam no /metrics
+    text = telemetry.render_prometheus()
+    assert "_bucket" not in text and telemetry.SPAN_METRIC not in text
+    assert "# TYPE mentoria_openai_in_flight gauge" in text
+
+
+def test_spans_export_prometheus_histograms(tracing):
+    @tracing.traced("work.async")
+    async def work():
+        return "ok"
+
+    with tracing.span("work.sync"):
+        pass
+    assert asyncio.run(work()) == "ok"
+
+    text = tracing.render_prometheus()
+    assert "# TYPE mentoria_span_duration_seconds histogram" in text
+    assert 'mentoria_span_duration_seconds_count{span="work.sync"} 1' in text
+    assert 'mentoria_span_duration_seconds_bucket{span="work.async",le="+Inf"} 1' in text
+
+
+def test_grade_reports_server_timing_and_metrics(api, tracing, monkeypatch):
+    monkeypatch.setattr(tracing, "SERVER_TIMING_ENABLED", True)
+
+    class Runner:
+        @staticmethod
+        async def run(agent, prompt, **kwargs):
+            return SimpleNamespace(final_output=json.dumps({"score": 80, "xp_awarded": 5}))
+
+    monkeypatch.setattr(api, "Runner", Runner)
+    client = TestClient(api.app)
+    res = client.post("/api/grade", json={"answer": "42"})
+
+    timing = res.headers["server-timing"]
+    assert "assessment_run;dur=" in timing
+    assert "progress_award_xp_batch;dur=" in timing
+    metrics = client.get("/metrics").text
+    assert 'span="http.request"' in metrics
+    assert 'span="progress.load_profile"' in metrics
+
+
+def test_profile_load_and_version_probe_have_their_own_spans(progress_db, tracing):
+    tracker = progress_db.ProgressTracker()
+    tracker.version("s1", "tutor")
+    text = tracing.render_prometheus()
+    assert 'span="progress.version"' in text and 'span="progress.load_profile"' not in text
+
+    tracker.get_progress("s1", "tutor")
+    assert 'mentoria_span_duration_seconds_count{span="progress.load_profile"} 1' in tracing.render_prometheus()
@@ -0,0 +1,65 @@
+import json
+import sqlite3
+
+from src.backend import transcripts
+
+LONG_REPLY = "Frações equivalentes representam a mesma parte do todo. " * 20
+
+
+def _rows(db_path, query):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(query).fetchall()
+
+
+def test_codec_round_trip_and_content_addressing():
+    conn = sqlite3.connect(":memory:")
+    transcripts.create_table(conn)
+    content = {"reply": LONG_REPLY, "message": "oi"}
+
+    digest = transcripts.store(conn, content)
+    assert transcripts.store(conn, dict(reversed(list(content.items())))) == digest
+    assert transcripts.load(conn, digest) == content
+    codec, body, size = conn.execute("SELECT codec, body, size FROM transcripts").fetchone()
+    assert codec == transcripts.default_codec() and len(body) < size
+    assert transcripts.load(conn, "inexistente") is None
+
+
+def test_long_payloads_are_offloaded_once_and_restored(progress_db):
+    tracker = progress_db.ProgressTracker()
+    for _ in range(3):
+        tracker.log_event("aluno-1", "tutor", "chat", {"message": "Praticar", "reply": LONG_REPLY})
+
+    stored = _rows(progress_db.DB_PATH, "SELECT payload, transcript_id FROM events")
+    assert len({row[1] for row in stored}) == 1
+    assert all(len(json.loads(row[0])["reply"]) <= progress_db.EVENT_SUMMARY_CHARS + 1 for row in stored)
+    assert _rows(progress_db.DB_PATH, "SELECT COUNT(*) FROM transcripts")[0][0] == 1
+
+    recent = tracker.get_progress("aluno-1", "tutor").recent_events
+    assert all(event["truncated"] for event in recent)
+    full = tracker.get_event("aluno-1", recent[0]["id"])
+    assert full["payload"] == {"message": "Praticar", "reply": LONG_REPLY} and "truncated" not in full
+
+
+def test_vacuum_migrates_legacy_rows_and_applies_retention(progress_db):
+    tracker = progress_db.ProgressTracker()
+    tracker.log_event("aluno-1", "tutor", "chat", {"reply": "curta"})
+    with sqlite3.connect(progress_db.DB_PATH) as conn:
+        # Linha gravada antes da tabela de transcrições, com 100 dias
+        conn.execute(
+            "INSERT INTO events (session_id, agent_id, type, payload, ts) VALUES (?, ?, ?, ?, datetime('now', '-100 days'))",
+            ("aluno-1", "tutor", "chat", json.dumps({"reply": LONG_REPLY})),
+        )
+        legacy_id = conn.execute("SELECT MAX(id) FROM events").fetchone()[0]
+
+    stats = tracker.vacuum(transcript_retention_days=0)
+    assert stats["migrated"] == 1 and stats["deleted_transcripts"] == 0
+    assert tracker.get_event("aluno-1", legacy_id)["payload"]["reply"] == LONG_REPLY
+
+    stats = tracker.vacuum(transcript_retention_days=90)
+    assert stats["expired"] == 1 and stats["deleted_transcripts"] == 1
+    preview = tracker.get_event("aluno-1", legacy_id)["payload"]["reply"]
+    assert preview.endswith("…") and len(preview) <= progress_db.EVENT_SUMMARY_CHARS + 1
+
+    stats = tracker.vacuum(event_retention_days=30)
+    assert stats["deleted_events"] == 1 and tracker.get_event("aluno-1", legacy_id) is None
+    assert len(tracker.get_progress("aluno-1", "tutor").recent_events) == 1
@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from agents import Agent, ModelSettings, RunConfig, Runner
+from agents.exceptions import ModelBehaviorError
+from agents.usage import Usage
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from benchmarks.fake_openai import FakeModel
+
+from src.backend import openai_gateway, telemetry, usage
+
+
+class UsageRunner:
+    """Runner falso que devolve `usage` como o SDK e guarda os agentes recebidos."""
+
+    def __init__(self, input_tokens=1000, output_tokens=200):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.agents = []
+
+    async def run(self, agent, prompt, **kwargs):
+        self.agents.append(agent)
+        tokens = Usage(
+            requests=1,
+            input_tokens=self.input_tokens,
+            output_tokens=self.output_tokens,
+            total_tokens=self.input_tokens + self.output_tokens,
+        )
+        return SimpleNamespace(final_output="Resposta.", context_wrapper=SimpleNamespace(usage=tokens))
+
+
+def test_chat_reports_request_usage_and_aggregates_per_agent_and_session(api, monkeypatch, usage_recorder):
+    # Modelo padrão do SDK pode não estar na tabela: preço fixo para o teste
+    monkeypatch.setitem(usage_recorder.prices, "*", (1.0, 4.0))
+    runner = UsageRunner()
+    monkeypatch.setattr(api, "Runner", runner)
+    client = TestClient(api.app)
+
+    for session_id in ("aluno-1", "aluno-1", "aluno-2"):
+        data = client.post("/api/chat", json={"message": "me ajude a estudar", "sessionId": session_id, "agentId": "planner"}).json()
+    assert data["usage"]["inputTokens"] == 1000 and data["usage"]["outputTokens"] == 200
+    assert data["usage"]["requests"] == 1 and data["usage"]["costUsd"] == 0.0018
+    # max_tokens do AgentConfig chega ao modelo
+    assert runner.agents[0].model_settings.max_tokens == 1500
+
+    report = client.get("/api/usage", params={"groupBy": "agent,session", "agentId": "planner"}).json()
+    assert [(r["agent"], r["sessionId"], r["totalTokens"]) for r in report["rows"]] == [
+        ("planner", "aluno-1", 2400),
+        ("planner", "aluno-2", 1200),
+    ]
+    assert report["totals"]["requests"] == 3 and report["totals"]["costUsd"] == 0.0054
+
+    mine = client.get("/api/usage", params={"sessionId": "aluno-2", "groupBy": "model"}).json()
+    assert mine["sessionTokensToday"] == 1200 and len(mine["rows"]) == 1
+    assert client.get("/api/usage", params={"groupBy": "tenant"}).status_code == 400
+
+
+def test_session_over_budget_is_served_by_cheaper_model(api, monkeypatch):
+    runner = UsageRunner(input_tokens=800, output_tokens=400)
+    monkeypatch.setattr(api, "Runner", runner)
+    usage.set_usage_recorder(usage.UsageRecorder(session_budget=1000, budget_model="gpt-4.1-nano"))
+    client = TestClient(api.app)
+
+    payload = {"message": "me ajude a estudar", "sessionId": "aluno-1", "agentId": "planner"}
+    first = client.post("/api/chat", json=payload).json()["usage"]
+    second = client.post("/api/chat", json=payload).json()["usage"]
+    other = client.post("/api/chat", json={**payload, "sessionId": "aluno-2"}).json()["usage"]
+
+    assert "degradedTo" not in first and "degradedTo" not in other
+    assert second["degradedTo"] == "gpt-4.1-nano" and second["models"] == ["gpt-4.1-nano"]
+    assert runner.agents[1].model == "gpt-4.1-nano" and runner.agents[2].model != "gpt-4.1-nano"
+    assert usage.get_usage_recorder().stats()["degraded"] == {"planner": 1}
+
+
+def test_limit_agent_keeps_explicit_settings():
+    agent = Agent(name="a", instructions="x", model="gpt-4o-mini")
+    limited = openai_gateway.limit_agent(agent, 300)
+    assert limited.model_settings.max_tokens == 300 and agent.model_settings.max_tokens is None
+
+    fixed = Agent(name="b", instructions="x", model_settings=ModelSettings(max_tokens=50, temperature=0.2))
+    kept = openai_gateway.limit_agent(fixed, 300, model="gpt-4.1-nano")
+    assert (kept.model_settings.max_tokens, kept.model_settings.temperature, kept.model) == (50, 0.2, "gpt-4.1-nano")
+
+
+def test_embeddings_are_recorded_once_and_exported(fake_openai, usage_recorder):
+    gateway = openai_gateway.get_gateway()
+    with usage.usage_scope("ingest") as request_usage:
+        gateway.create_embeddings("text-embedding-3-small", ["uma frase", "outra frase"], None)
+
+    assert request_usage.requests == 1 and request_usage.input_tokens > 0
+    assert request_usage.models == {"text-embedding-3-small"}
+    assert usage_recorder.price("gpt-4o-mini-2024-07-18") == (0.15, 0.60)
+    assert usage_recorder.price("modelo-desconhecido") == (0.0, 0.0)
+
+    text = telemetry.render_prometheus()
+    assert 'mentoria_usage_requests_total{agent="ingest",kind="embedding",model="text-embedding-3-small"} 1' in text
+    assert 'direction="input"' in text and "mentoria_usage_cost_usd_total" in text
+
+    assert usage_recorder.flush() == 1 and usage_recorder.flush() == 0
+    rows = usage_recorder.tracker.usage_summary("2000-01-01", ["agent", "kind"])
+    assert rows[0]["agent_id"] == "ingest" and rows[0]["input_tokens"] == request_usage.input_tokens
+
+
+def test_scopes_follow_threads_and_nest_into_one_request(usage_recorder):
+    async def scenario():
+        with usage.usage_scope("tutor", "aluno-1") as request_usage:
+            await asyncio.to_thread(usage_recorder.record, "gpt-4o-mini", "llm", 100, 10)
+            with usage.usage_scope("router"):
+                usage_recorder.record("gpt-4o-mini", "llm", 50, 5)
+        return request_usage
+
+    request_usage = asyncio.run(scenario())
+    assert (request_usage.requests, request_usage.total_tokens) == (2, 165)
+    assert usage.current_scope() == usage.UsageScope()
+    assert {(t["agent"], t["inputTokens"]) for t in usage_recorder.stats()["totals"]} == {("tutor", 100), ("router", 50)}
+
+
+def test_failed_runs_still_count_toward_the_budget(usage_recorder):
+    class Grade(BaseModel):
+        score: int
+
+    model = FakeModel("gpt-4.1-nano", reply=lambda _input: "sem JSON")
+    agent = Agent(name="avaliador", instructions="x", model=model, output_type=Grade)
+
+    async def scenario():
+        with usage.usage_scope("assessment", "aluno-1") as request_usage:
+            with pytest.raises(ModelBehaviorError):
+                await openai_gateway.get_gateway().run_agent(
+                    Runner, agent, "avalie", run_config=RunConfig(tracing_disabled=True)
+                )
+        return request_usage
+
+    request_usage = asyncio.run(scenario())
+    # O SDK não expõe `run_data` no erro: o consumo vem das respostas do modelo
+    assert request_usage.requests == 1 and request_usage.output_tokens == len("sem JSON") // 4
+    assert usage_recorder.session_tokens("aluno-1") == request_usage.total_tokens > 0